@@ -0,0 +1,152 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Coroutine, List, Optional, Tuple, TypeVar
+
+from nfv_test_api.host import Host, split_ip_batch_command
+from nfv_test_api.metrics import command_family, exec_metrics
+
+LOGGER = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+_event_loop_lock = threading.Lock()
+
+
+def event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the event loop shared by the whole process, it runs in its own thread.
+    """
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_event_loop.run_forever, name="event-loop", daemon=True
+            ).start()
+
+        return _event_loop
+
+
+def run_coroutine(coroutine: Coroutine[Any, Any, R]) -> R:
+    """
+    Run the coroutine on the shared event loop, and wait for its result.  This can not be
+    called from the event loop itself.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, event_loop()).result()
+
+
+async def run_in_thread(function: Callable[..., R], *args: Any) -> R:
+    """
+    Run a blocking function in the default executor of the running loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+async def _read(stream: asyncio.StreamReader, chunks: List[bytes]) -> None:
+    while True:
+        chunk = await stream.read(64 * 1024)
+        if not chunk:
+            return
+
+        chunks.append(chunk)
+
+
+class AsyncHost:
+    """
+    Does the same work as a Host, with processes managed by the event loop instead of a
+    blocked thread each.  The ip commands which go to an ip batch worker of the host are
+    still sent to it from a thread, they only take a few milliseconds.
+    """
+
+    def __init__(self, host: Host) -> None:
+        self.host = host
+
+    async def exec(self, command: List[str], timeout: float = 10) -> Tuple[str, str]:
+        if split_ip_batch_command(command) is not None:
+            return await run_in_thread(self.host.exec, command, timeout)
+
+        start = time.monotonic()
+        stdout, stderr, status = "", "", "error"
+        try:
+            stdout, stderr, status = await self._exec(command, timeout)
+            return stdout, stderr
+        finally:
+            exec_metrics.observe(
+                command_family(command),
+                self.host.namespace,
+                status,
+                time.monotonic() - start,
+                len(stdout) + len(stderr),
+            )
+
+    async def _exec(self, command: List[str], timeout: float) -> Tuple[str, str, str]:
+        """
+        Run the command, and return its output and its status for the metrics.
+        """
+        cmd = self.host.shell_entry_point + command
+        LOGGER.debug("Running command %s", cmd)
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        assert process.stdout is not None and process.stderr is not None
+
+        # Reading the output on the side, so that we keep what we got so far if we
+        # have to kill the process
+        stdout: List[bytes] = []
+        stderr: List[bytes] = []
+        output = asyncio.gather(
+            _read(process.stdout, stdout), _read(process.stderr, stderr)
+        )
+        status = None
+        try:
+            await asyncio.wait_for(asyncio.shield(output), timeout)
+        except asyncio.TimeoutError:
+            # Kill the process and return the output we had so far
+            LOGGER.warning("Command %s timed out after %s seconds", cmd, timeout)
+            status = "timeout"
+            process.terminate()
+            try:
+                await asyncio.wait_for(output, 1)
+            except asyncio.TimeoutError:
+                # The process ignores SIGTERM, or a child of it still holds its output open
+                LOGGER.warning(
+                    "The output of %s is still open after terminating it", cmd
+                )
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+
+        returncode = await process.wait()
+        return (
+            b"".join(stdout).decode(errors="replace"),
+            b"".join(stderr).decode(errors="replace"),
+            status or str(returncode),
+        )
+
+    async def hostname(self) -> str:
+        stdout, stderr = await self.exec(["hostname"])
+        if stderr:
+            raise RuntimeError(f"Failed to run hostname command on host: {stderr}")
+
+        return stdout.strip()
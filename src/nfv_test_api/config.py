@@ -14,12 +14,22 @@
    limitations under the License.
 """
 import pathlib
+from enum import Enum
 from typing import Any, Dict, Optional
 
 import yaml
 from pydantic import BaseModel
 
 
+class ReadBackend(str, Enum):
+    """
+    How the services read the state of links, addresses, routes and namespaces.
+    """
+
+    IP = "ip"
+    NETLINK = "netlink"
+
+
 class Config(BaseModel):
     host: str = "127.0.0.1"
     port: int = 8080
@@ -31,6 +41,22 @@ class Config(BaseModel):
     enb_log_folder: str = "enb_log/"
     ue_4g_config_folder: str = "ue_4g_config/"
     ue_4g_log_folder: str = "ue_4g_log/"
+    read_backend: ReadBackend = ReadBackend.IP
+    # Serve the netlink reads from an in-memory snapshot kept up to date with the kernel
+    # notifications, only used with the netlink read backend
+    state_cache: bool = False
+    # Look the namespaces up in an index kept up to date by watching /run/netns, instead
+    # of listing them all for every lookup
+    namespace_index: bool = True
+    # How often the counters of the interfaces are sampled to compute their rates, and
+    # for how long the samples are kept, in seconds
+    stats_sample_interval: float = 1.0
+    stats_history: float = 300
+    # The number of namespaces read at the same time when building the inventory
+    inventory_workers: int = 16
+    # The number of namespaces set up at the same time when applying a template, or torn
+    # down at the same time when deleting many of them
+    namespace_workers: int = 16
 
 
 CONFIG = None
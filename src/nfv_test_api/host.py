@@ -13,37 +13,773 @@
    See the License for the specific language governing permissions and
    limitations under the License.
 """
+import codecs
+import errno
 import logging
+import os
+import re
+import select
+import selectors
 import subprocess
-from typing import List, Tuple
+import threading
+import time
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generator, List, Optional, Set, Tuple, TypeVar
+
+from nfv_test_api.metrics import command_family, exec_metrics
+from nfv_test_api.netlink import (
+    IFLA_IFNAME,
+    NETNS_RUN_DIR,
+    RTM_DELLINK,
+    RTM_NEWLINK,
+    RTNLGRP_LINK,
+    NetlinkSocket,
+    link_message,
+    open_socket,
+    setns,
+    string,
+)
 
 LOGGER = logging.getLogger(__name__)
 
+R = TypeVar("R")
+
+# The ip commands which can be sent to a batch worker, as their verb by object, None being
+# the object alone, which shows them.  ip keeps some global state from one batch command to
+# the next, so only the commands we send and which don't disturb the ones after them are
+# listed:
+# - addr, route and nexthop show reset their filter before listing, route get doesn't use it
+# - link show is left out, it sets a flag which is never cleared, the addr show commands
+#   after it in the same worker don't list the addresses anymore
+# - netns exec is left out, it runs any command, netns add goes back to the namespace of
+#   the worker once the new one is mounted
+# - the other changes are single requests to the kernel, which leave nothing behind
+# Anything else gets its own process.
+#
+# ip also caches the index of every link it resolves the name of, for as long as it runs.
+# The cache is only right until the link is deleted, renamed or moved to another
+# namespace, by another process or along with another link (the peer of a veth), a
+# LinkNameWatch tells when the workers have to be restarted.
+IP_BATCH_COMMANDS: Dict[str, Set[Optional[str]]] = {
+    "link": {"add", "set", "change", "del", "delete"},
+    "address": {None, "show", "list", "lst", "add", "del", "delete"},
+    "route": {
+        None,
+        "show",
+        "list",
+        "lst",
+        "get",
+        "add",
+        "replace",
+        "change",
+        "del",
+        "delete",
+    },
+    "nexthop": {None, "show", "list", "add", "replace", "del", "delete"},
+    "netns": {"add", "set", "del", "delete"},
+}
+IP_BATCH_COMMANDS["addr"] = IP_BATCH_COMMANDS["address"]
+IP_BATCH_OPTIONS = {"-j", "-details", "-s", "-4", "-6"}
+
+# ip splits batch lines on whitespace and interprets quotes and comments
+IP_BATCH_UNSAFE_ARGUMENT = re.compile(r"[\s\"'#\\]")
+
+
+class IpBatchWorkerError(RuntimeError):
+    """
+    Raised when a command could not be handed over to an ip batch worker.
+    """
+
+
+class IpBatchWorker:
+    """
+    A long-lived `ip -force -batch -` co-process.  Commands are written one per line on its
+    stdin, each one followed by a sentinel line that ip can't parse.  ip reports the failure of
+    the sentinel on stderr with its line number, which tells us where the output of the command
+    ends.
+    """
+
+    SENTINEL = "nfvtestapisentinel"
+    SENTINEL_ERROR = f'Object "{SENTINEL}" is unknown, try "ip help".'
+    COMMAND_FAILED = re.compile(r"^Command failed -:\d+$")
+
+    def __init__(
+        self, command: List[str], popen: Callable[..., subprocess.Popen]
+    ) -> None:
+        self._command = command
+        self._popen = popen
+        self._process: Optional[subprocess.Popen] = None
+        self._line = 0
+        self._lock = threading.Lock()
+
+    def _start(self) -> subprocess.Popen:
+        LOGGER.debug("Starting ip batch worker %s", self._command)
+        self._process = self._popen(
+            self._command,
+            shell=False,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self._line = 0
+        return self._process
+
+    def _stop(self) -> None:
+        if self._process is None:
+            return
+
+        process, self._process = self._process, None
+        if process.poll() is None:
+            process.kill()
+
+        process.communicate()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stop()
+
+    def exec(self, args: List[str], timeout: float = 10) -> Tuple[str, str]:
+        stdout, errors = self.exec_many([args], timeout)
+        return stdout, errors[0]
+
+    def exec_many(
+        self, commands: List[List[str]], timeout: float = 10
+    ) -> Tuple[str, List[str]]:
+        """
+        Send several commands to the worker at once.  ip keeps going when one of them fails.
+        Returns what they printed on stdout, all together, and what each of them printed on
+        stderr, in the order of the commands.
+        """
+        with self._lock:
+            process = self._process
+            if process is None or process.poll() is not None:
+                process = self._start()
+
+            assert process.stdin is not None
+            assert process.stdout is not None
+            assert process.stderr is not None
+
+            pending = "".join(
+                " ".join(args) + "\n" + self.SENTINEL + "\n" for args in commands
+            ).encode()
+            self._line += 2 * len(commands)
+            done_marker = f"Command failed -:{self._line}\n".encode()
+
+            stdout = bytearray()
+            stderr = bytearray()
+            stdin_fd = process.stdin.fileno()
+            buffers = {process.stdout.fileno(): stdout, process.stderr.fileno(): stderr}
+            deadline = time.monotonic() + timeout
+            with selectors.DefaultSelector() as selector:
+                for fd in buffers:
+                    selector.register(fd, selectors.EVENT_READ)
+                selector.register(stdin_fd, selectors.EVENT_WRITE)
+
+                while not stderr.endswith(done_marker):
+                    remaining = deadline - time.monotonic()
+                    events = selector.select(remaining) if remaining > 0 else []
+                    if not events:
+                        # Kill the worker and return the output we had so far
+                        LOGGER.error(
+                            "Commands %s timed out in ip batch worker", commands
+                        )
+                        self._stop()
+                        break
+
+                    for key, _ in events:
+                        if key.fd == stdin_fd:
+                            # The worker's output is read while writing, so that it
+                            # can't block on a full pipe while we block on its input.  A
+                            # writable pipe takes at least PIPE_BUF bytes without blocking.
+                            try:
+                                written = os.write(stdin_fd, pending[: select.PIPE_BUF])
+                            except BrokenPipeError as e:
+                                self._stop()
+                                raise IpBatchWorkerError(
+                                    f"The ip batch worker is gone: {e}"
+                                )
+
+                            pending = pending[written:]
+                            if not pending:
+                                selector.unregister(stdin_fd)
+                            continue
+
+                        chunk = os.read(key.fd, 65536)
+                        if not chunk:
+                            selector.unregister(key.fd)
+                        buffers[key.fd].extend(chunk)
+
+                    if not set(buffers.keys()) & set(selector.get_map().keys()):
+                        # Both pipes are closed, the worker died
+                        self._stop()
+                        break
+                else:
+                    # ip flushes stdout after each command, so everything the command
+                    # printed is already in the pipe, we just need to drain it
+                    selector.unregister(process.stderr.fileno())
+                    stdout_fd = process.stdout.fileno()
+                    while stdout_fd in selector.get_map() and selector.select(0):
+                        chunk = os.read(stdout_fd, 65536)
+                        if not chunk:
+                            break
+                        stdout.extend(chunk)
+
+            # The error of each sentinel closes the output of the command before it
+            errors: List[str] = []
+            error_lines: List[str] = []
+            for line in stderr.decode(errors="replace").splitlines(keepends=True):
+                if line.rstrip("\n") == self.SENTINEL_ERROR:
+                    errors.append("".join(error_lines))
+                    error_lines = []
+                elif not self.COMMAND_FAILED.match(line.rstrip("\n")):
+                    error_lines.append(line)
+
+            # Whatever is left belongs to the first command which didn't complete, ip
+            # exits on some invalid arguments
+            incomplete = "The ip batch worker didn't complete the command\n"
+            if len(errors) < len(commands):
+                errors.append("".join(error_lines) or incomplete)
+            errors += [incomplete] * (len(commands) - len(errors))
+
+            return stdout.decode(errors="replace"), errors
+
+
+class LinkNameWatch:
+    """
+    Follows the names of the links of a host with the notifications of the kernel, to tell
+    when a name ip may have cached the index of doesn't point to that link anymore.
+    """
+
+    def __init__(self, open_socket: Callable[[], NetlinkSocket]) -> None:
+        """
+        :param open_socket: Opens a netlink socket on the host to watch.
+        """
+        self._open_socket = open_socket
+        self._lock = threading.Lock()
+        self._events: Optional[NetlinkSocket] = None
+        self._names: Dict[int, str] = {}
+
+    def _close(self) -> None:
+        if self._events is not None:
+            self._events.close()
+            self._events = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _start(self) -> None:
+        # Subscribing before the names are dumped, so that no change can be missed
+        self._events = self._open_socket()
+        self._events.subscribe(RTNLGRP_LINK)
+        with self._open_socket() as netlink_socket:
+            self._names = netlink_socket.link_names()
+
+    def check(self, restart: Callable[[], None]) -> None:
+        """
+        Call restart if a link was deleted, renamed or moved to another namespace since the
+        previous check.  Also on the first check, and when notifications were lost, as
+        there is no way to tell then.  The other checks wait for it to return, so that no
+        command goes to a worker which wasn't restarted yet.
+        """
+        with self._lock:
+            if self._events is None:
+                self._start()
+                restart()
+                return
+
+            changed = False
+            try:
+                for kind, body in self._events.events():
+                    if kind not in (RTM_NEWLINK, RTM_DELLINK):
+                        continue
+
+                    header, link_attributes = link_message(body)
+                    if kind == RTM_DELLINK:
+                        # Moving a link to another namespace deletes it from this one
+                        self._names.pop(header[2], None)
+                        changed = True
+                        continue
+
+                    name = string(link_attributes.get(IFLA_IFNAME, b""))
+                    previous = self._names.get(header[2])
+                    self._names[header[2]] = name
+                    changed = changed or (previous is not None and previous != name)
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+
+                LOGGER.warning("Link notifications were lost, restarting the watch")
+                self._close()
+                self._start()
+                changed = True
+
+            if changed:
+                restart()
+
+
+def removes_link_name(args: List[str]) -> bool:
+    """
+    Whether the arguments of an ip batch command delete, rename or move a link, after which
+    the index ip cached for its name, or for the names of the links deleted along with it,
+    is wrong.
+    """
+    if args[0] != "link" or len(args) < 2:
+        return False
+
+    return args[1] in ("del", "delete") or (
+        args[1] in ("set", "change") and bool({"name", "netns"} & set(args[2:]))
+    )
+
+
+_ip_batch_workers: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], IpBatchWorker] = {}
+_link_name_watches: Dict[Tuple[str, ...], LinkNameWatch] = {}
+_ip_batch_workers_lock = threading.Lock()
+
+
+def split_ip_batch_command(
+    command: List[str],
+) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Split an ip command into its global options and the arguments that can be sent to a batch
+    worker.  Returns None if the command can not be run in a batch worker.
+    """
+    if not command or command[0] != "ip":
+        return None
+
+    index = 1
+    while index < len(command) and command[index].startswith("-"):
+        if command[index] not in IP_BATCH_OPTIONS:
+            return None
+        index += 1
+
+    args = command[index:]
+    if not args or args[0] not in IP_BATCH_COMMANDS:
+        return None
+
+    if (args[1] if len(args) > 1 else None) not in IP_BATCH_COMMANDS[args[0]]:
+        return None
+
+    if any(not arg or IP_BATCH_UNSAFE_ARGUMENT.search(arg) for arg in args):
+        return None
+
+    return command[1:index], args
+
+
+class NamespaceExecutor:
+    """
+    A thread pinned to a network namespace with setns().  The processes of the namespace are
+    started from this thread, and its netlink sockets opened in it, so they belong to the
+    namespace without going through `ip netns exec`.
+    """
+
+    def __init__(self, namespace: str) -> None:
+        self.namespace = namespace
+        # Opened right away, so a missing namespace is reported to the caller
+        self._namespace_fd: Optional[int] = os.open(
+            os.path.join(NETNS_RUN_DIR, namespace), os.O_RDONLY
+        )
+        stat = os.fstat(self._namespace_fd)
+        self._inode = (stat.st_dev, stat.st_ino)
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"netns-{namespace}",
+            initializer=self._enter,
+        )
+
+    def _enter(self) -> None:
+        if self._namespace_fd is None:
+            raise RuntimeError(f"The executor of namespace {self.namespace} is stopped")
+
+        setns(self._namespace_fd)
+
+    def is_current(self) -> bool:
+        """
+        Whether the namespace mounted under the name of this executor is still the one it
+        entered.  It isn't anymore once the namespace is deleted, or created again.
+        """
+        try:
+            stat = os.stat(os.path.join(NETNS_RUN_DIR, self.namespace))
+        except FileNotFoundError:
+            return False
+
+        return (stat.st_dev, stat.st_ino) == self._inode
+
+    def run(self, function: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+        """
+        Run the function in the namespace and return its result.
+        """
+        return self._executor.submit(function, *args, **kwargs).result()
+
+    def stop(self) -> None:
+        """
+        Stop the thread, after which it doesn't hold a reference to the namespace anymore.
+        """
+        self._executor.shutdown(wait=True)
+        if self._namespace_fd is not None:
+            os.close(self._namespace_fd)
+            self._namespace_fd = None
+
+
+_namespace_executors: Dict[str, NamespaceExecutor] = {}
+_namespace_executors_lock = threading.Lock()
+
+
+class CommandTimeout(RuntimeError):
+    """
+    The command was stopped before it finished because its timeout expired, what it printed
+    until then is incomplete.
+    """
+
+
+class NamespaceUnavailable(Exception):
+    """
+    The executor of a namespace can not enter it.
+    """
+
 
 class Host:
     def __init__(self, shell_entry_point: List[str] = []) -> None:
         self._shell_entry_point = shell_entry_point
+        self.namespace: Optional[str] = None
+
+    @property
+    def shell_entry_point(self) -> List[str]:
+        """
+        The prefix which makes any command run on this host, whichever thread starts it.
+        """
+        return list(self._shell_entry_point)
+
+    def popen(self, command: List[str], **kwargs: Any) -> subprocess.Popen:
+        """
+        Start a process on the host.
+        """
+        return subprocess.Popen(self._shell_entry_point + command, **kwargs)
+
+    def netlink_socket(self) -> NetlinkSocket:
+        """
+        Open a netlink socket on the host.
+        """
+        return open_socket(self.namespace)
+
+    def ip_batch_worker(self, options: List[str]) -> IpBatchWorker:
+        """
+        Get the ip batch worker running with the given global options on this host.  Workers
+        are shared by all the Host objects with the same shell entry point.  They are all
+        restarted when a link they may have cached the index of was deleted or renamed.
+        """
+        entry_point = tuple(self._shell_entry_point)
+        with _ip_batch_workers_lock:
+            if entry_point not in _link_name_watches:
+                _link_name_watches[entry_point] = LinkNameWatch(self.netlink_socket)
+            watch = _link_name_watches[entry_point]
+
+        watch.check(self.restart_ip_batch_workers)
+
+        key = (entry_point, tuple(options))
+        with _ip_batch_workers_lock:
+            if key not in _ip_batch_workers:
+                _ip_batch_workers[key] = IpBatchWorker(
+                    ["ip", *options, "-force", "-batch", "-"], self.popen
+                )
+
+            return _ip_batch_workers[key]
+
+    def restart_ip_batch_workers(self) -> None:
+        """
+        Stop the processes of the ip batch workers of this host, each one starts a new one
+        for its next command.
+        """
+        entry_point = tuple(self._shell_entry_point)
+        with _ip_batch_workers_lock:
+            workers = [
+                worker
+                for key, worker in _ip_batch_workers.items()
+                if key[0] == entry_point
+            ]
+
+        for worker in workers:
+            worker.stop()
 
-    def exec(self, command: List[str]) -> Tuple[str, str]:
+    def stop_ip_batch_workers(self) -> None:
+        """
+        Stop all the ip batch workers of this host, and the watch of its links.  They will
+        be restarted on the next command.
+        """
+        entry_point = tuple(self._shell_entry_point)
+        with _ip_batch_workers_lock:
+            workers = [
+                _ip_batch_workers.pop(key)
+                for key in list(_ip_batch_workers.keys())
+                if key[0] == entry_point
+            ]
+            watch = _link_name_watches.pop(entry_point, None)
+
+        for worker in workers:
+            worker.stop()
+
+        if watch is not None:
+            watch.close()
+
+    def close(self) -> None:
+        """
+        Stop everything running on behalf of this host.  It can still be used afterwards,
+        what is needed will be started again.
+        """
+        self.stop_ip_batch_workers()
+
+    def exec(self, command: List[str], timeout: float = 10) -> Tuple[str, str]:
+        """
+        Run the command and return what it printed on stdout and stderr.  If it doesn't
+        complete within the timeout, in seconds, it is stopped and the output it had so far
+        is returned.
+        """
+        start = time.monotonic()
+        stdout, stderr, status = "", "", "error"
+        try:
+            stdout, stderr, status = self._exec(command, timeout)
+            return stdout, stderr
+        finally:
+            exec_metrics.observe(
+                command_family(command),
+                self.namespace,
+                status,
+                time.monotonic() - start,
+                len(stdout) + len(stderr),
+            )
+
+    def _exec(self, command: List[str], timeout: float) -> Tuple[str, str, str]:
+        """
+        Run the command, and return its output and its status for the metrics.
+        """
         cmd = self._shell_entry_point + command
         LOGGER.debug("Running command %s", cmd)
-        process = subprocess.Popen(
-            cmd,
+        batch_command = split_ip_batch_command(command)
+        if batch_command is not None:
+            options, args = batch_command
+            try:
+                stdout, stderr = self.ip_batch_worker(options).exec(args, timeout)
+                return stdout, stderr, "1" if stderr else "0"
+            except IpBatchWorkerError as e:
+                LOGGER.warning("Falling back to a new process for %s: %s", cmd, e)
+
+        process = self.popen(
+            command,
             shell=False,
             universal_newlines=True,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
         )
         try:
-            # Make sure our command terminates.
-            # We set a hard timeout of 10 seconds, it should work for all
-            # the commands we run.  If it doesn't, we can create a more
-            # elaborate mechanism.
-            return process.communicate(timeout=10)
+            stdout, stderr = process.communicate(timeout=timeout)
+            return stdout, stderr, str(process.returncode)
         except subprocess.TimeoutExpired:
             # Kill the process and return the output we had so far
+            LOGGER.warning("Command %s timed out after %s seconds", cmd, timeout)
             process.terminate()
-            return process.communicate(timeout=1)
+            try:
+                stdout, stderr = process.communicate(timeout=1)
+            except subprocess.TimeoutExpired as e:
+                # A child of the process still holds its output open
+                LOGGER.warning(
+                    "The output of %s is still open after terminating it", cmd
+                )
+                process.kill()
+                stdout, stderr = (
+                    output.decode(errors="replace")
+                    if isinstance(output, bytes)
+                    else output or ""
+                    for output in (e.stdout, e.stderr)
+                )
+
+            return stdout, stderr, "timeout"
+
+    def exec_stream(
+        self,
+        command: List[str],
+        timeout: Optional[float] = 10,
+        chunk_size: int = 0,
+        idle_timeout: Optional[float] = None,
+    ) -> Generator[str, None, None]:
+        """
+        Run the command and yield what it prints on stdout as it comes, line by line, or in
+        chunks of at most chunk_size bytes if it is set.  Nothing is kept in memory once
+        it has been yielded.
+
+        The command is stopped when the timeout, in seconds, expires, or when the generator is
+        closed, e.g. by breaking out of the loop consuming it.  Once the output printed before
+        the timeout has been yielded, a CommandTimeout is raised, so that it is not taken for
+        the complete output.  Raises a RuntimeError with what the command printed on stderr if
+        it failed.
+
+        :param timeout: The number of seconds the command can run, None to let it run until
+            it closes its output.
+        :param idle_timeout: The number of seconds the command can go without printing
+            anything, None for no limit.  It starts again after each chunk of output.
+        """
+        cmd = self._shell_entry_point + command
+        LOGGER.debug("Streaming the output of command %s", cmd)
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        idle_deadline = None if idle_timeout is None else start + idle_timeout
+        status = "closed"
+        output_size = 0
+        process = self.popen(
+            command,
+            shell=False,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            assert process.stdout is not None and process.stderr is not None
+            stdout_fd = process.stdout.fileno()
+            stderr = bytearray()
+            line = bytearray()
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            with selectors.DefaultSelector() as selector:
+                selector.register(stdout_fd, selectors.EVENT_READ)
+                selector.register(process.stderr.fileno(), selectors.EVENT_READ)
+                while selector.get_map():
+                    deadlines = [d for d in (deadline, idle_deadline) if d is not None]
+                    remaining = min(deadlines) - time.monotonic() if deadlines else None
+                    if remaining is not None and remaining <= 0:
+                        LOGGER.warning(
+                            "Command %s timed out after %.1f seconds",
+                            cmd,
+                            time.monotonic() - start,
+                        )
+                        status = "timeout"
+                        break
+
+                    for key, _ in selector.select(remaining):
+                        chunk = os.read(key.fd, chunk_size or 65536)
+                        output_size += len(chunk)
+                        if idle_timeout is not None:
+                            idle_deadline = time.monotonic() + idle_timeout
+                        if not chunk:
+                            selector.unregister(key.fd)
+                        elif key.fd != stdout_fd:
+                            stderr.extend(chunk)
+                        elif chunk_size:
+                            text = decoder.decode(chunk)
+                            if text:
+                                yield text
+                        else:
+                            # Only complete lines are yielded, the last one is kept
+                            # until its end comes
+                            *lines, last = chunk.split(b"\n")
+                            for part in lines:
+                                line.extend(part)
+                                yield line.decode(errors="replace") + "\n"
+                                line = bytearray()
+                            line.extend(last)
+
+            # What is left of the output when it doesn't end with a new line
+            rest = line.decode(errors="replace") + decoder.decode(b"", final=True)
+            if rest:
+                yield rest
+
+            if status == "timeout":
+                raise CommandTimeout(
+                    f"Command {' '.join(command)} timed out after "
+                    f"{time.monotonic() - start:.1f} seconds"
+                )
+
+            returncode = process.wait()
+            status = str(returncode)
+            if returncode != 0:
+                raise RuntimeError(
+                    f"Command {' '.join(command)} failed with exit code {returncode}: "
+                    f"{stderr.decode(errors='replace')}"
+                )
+
+            if stderr:
+                LOGGER.warning(
+                    "Command %s printed on stderr: %s",
+                    cmd,
+                    stderr.decode(errors="replace"),
+                )
+        finally:
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+
+            for pipe in (process.stdout, process.stderr):
+                if pipe is not None:
+                    pipe.close()
+
+            exec_metrics.observe(
+                command_family(command),
+                self.namespace,
+                status,
+                time.monotonic() - start,
+                output_size,
+            )
+
+    def exec_batch(self, commands: List[List[str]]) -> List[str]:
+        """
+        Run several commands whose output is not needed, in one round-trip to an ip batch
+        worker when they can all go to the same one.  The commands following the ones which
+        delete, rename or move links go to the worker once it is restarted, in another
+        round-trip.  The commands all run, even if some of them fail.  Returns what each
+        command printed on stderr.
+        """
+        if not commands:
+            return []
+
+        batch_commands: List[Tuple[List[str], List[str]]] = []
+        for command in commands:
+            batch_command = split_ip_batch_command(command)
+            if batch_command is None or (
+                batch_commands and batch_command[0] != batch_commands[0][0]
+            ):
+                break
+            batch_commands.append(batch_command)
+        else:
+            # A link deleted with another one (the peer of a veth) is only known to be
+            # gone once the worker sees the notifications, a run of deletions stays together
+            segments: List[List[List[str]]] = [[]]
+            for _, args in batch_commands:
+                if (
+                    segments[-1]
+                    and removes_link_name(segments[-1][-1])
+                    and not removes_link_name(args)
+                ):
+                    segments.append([])
+                segments[-1].append(args)
+
+            LOGGER.debug("Running commands %s in %d batches", commands, len(segments))
+            errors: List[str] = []
+            for segment in segments:
+                start = time.monotonic()
+                try:
+                    stdout, segment_errors = self.ip_batch_worker(
+                        batch_commands[0][0]
+                    ).exec_many(segment)
+                except IpBatchWorkerError as e:
+                    LOGGER.warning("Falling back to a process per command: %s", e)
+                    break
+
+                # The commands of the batch are not timed separately
+                exec_metrics.observe(
+                    "ip batch",
+                    self.namespace,
+                    "1" if any(segment_errors) else "0",
+                    time.monotonic() - start,
+                    len(stdout) + sum(len(error) for error in segment_errors),
+                )
+                errors += segment_errors
+
+            # The commands which didn't go to the worker get a process each
+            return errors + [
+                self.exec(command)[1] for command in commands[len(errors) :]
+            ]
+
+        return [self.exec(command)[1] for command in commands]
 
     def hostname(self) -> str:
         stdout, stderr = self.exec(["hostname"])
@@ -54,8 +790,97 @@ class Host:
 
 
 class NamespaceHost(Host):
+    """
+    A network namespace on the host.  Processes are started from a thread pinned to the
+    namespace, instead of going through `ip netns exec`.  Unlike with `ip netns exec`, they
+    share the mount namespace of the server: /sys/class/net lists the links of the host,
+    not the ones of the namespace, and the files of /etc/netns/<namespace> are not bind
+    mounted over the ones of /etc.  The commands which need either have to be prefixed
+    with the shell entry point, and run on the Host of the server.
+    """
+
     def __init__(self, namespace: str) -> None:
         super().__init__(shell_entry_point=["ip", "netns", "exec", namespace])
+        self.namespace = namespace
+        self._namespace = namespace
+
+    def executor(self) -> NamespaceExecutor:
+        """
+        Get the executor of this namespace.  Executors are shared by all the NamespaceHost
+        objects of the same namespace.  When the namespace was created again since the
+        executor entered it, the executor and the batch workers it started are stopped
+        first, and a new one enters the namespace which now has this name.
+        """
+        with _namespace_executors_lock:
+            executor = _namespace_executors.get(self._namespace)
+
+        if executor is not None and not executor.is_current():
+            LOGGER.info(
+                "Namespace %s changed, restarting its executor and workers",
+                self.namespace,
+            )
+            self.close()
+
+        with _namespace_executors_lock:
+            if self._namespace not in _namespace_executors:
+                _namespace_executors[self._namespace] = NamespaceExecutor(
+                    self._namespace
+                )
+
+            return _namespace_executors[self._namespace]
+
+    def stop_executor(self) -> None:
+        with _namespace_executors_lock:
+            executor = _namespace_executors.pop(self._namespace, None)
+
+        if executor is not None:
+            executor.stop()
+
+    def run(self, function: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+        """
+        Run the function in the namespace.  Raises NamespaceUnavailable if the executor can
+        not enter it, what the function raises is raised as it is.
+        """
+        try:
+            executor = self.executor()
+        except OSError as e:
+            raise NamespaceUnavailable(str(e)) from e
+
+        try:
+            return executor.run(function, *args, **kwargs)
+        except BrokenExecutor as e:
+            # setns() failed when the thread started
+            self.stop_executor()
+            raise NamespaceUnavailable(str(e)) from e
+
+    def ip_batch_worker(self, options: List[str]) -> IpBatchWorker:
+        # The workers are started by the executor, they are pinned to the same namespace
+        try:
+            self.executor()
+        except OSError:
+            pass
+
+        return super().ip_batch_worker(options)
+
+    def popen(self, command: List[str], **kwargs: Any) -> subprocess.Popen:
+        try:
+            return self.run(subprocess.Popen, command, **kwargs)
+        except NamespaceUnavailable as e:
+            # The namespace can not be entered, ip netns exec will report why
+            LOGGER.debug("Executor of namespace %s is broken: %s", self.namespace, e)
+            return super().popen(command, **kwargs)
+
+    def netlink_socket(self) -> NetlinkSocket:
+        try:
+            return self.run(NetlinkSocket)
+        except NamespaceUnavailable as e:
+            LOGGER.debug("Executor of namespace %s is broken: %s", self.namespace, e)
+            return super().netlink_socket()
+
+    def close(self) -> None:
+        # The batch workers and the executor thread all keep the namespace alive
+        super().close()
+        self.stop_executor()
 
     def get_raw_namespaces(self) -> List[object]:
         raise NotImplementedError(
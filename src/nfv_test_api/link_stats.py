@@ -0,0 +1,182 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from nfv_test_api.netlink import NetlinkSocket
+
+LOGGER = logging.getLogger(__name__)
+
+# The time of the sample, and the rx and tx packets and bytes at that time
+Sample = Tuple[float, int, int, int, int]
+
+
+def counters(link: Dict[str, Any]) -> Tuple[int, int, int, int]:
+    """
+    Get the rx and tx packets and bytes of a link, as returned by NetlinkSocket.link_stats.
+    """
+    rx = link["stats64"]["rx"]
+    tx = link["stats64"]["tx"]
+    return rx["packets"], rx["bytes"], tx["packets"], tx["bytes"]
+
+
+class LinkStatsSampler:
+    """
+    Samples the counters of all the links of a namespace at a fixed interval, in a thread,
+    and keeps the recent samples of each link in a ring buffer to compute their rates.
+
+    The thread is started by the first read, and stops when nothing has been read for as
+    long as the samples are kept.  Rates can only be computed once there are two samples,
+    so the first read after a while returns none.
+    """
+
+    def __init__(
+        self,
+        open_socket: Callable[[], NetlinkSocket],
+        interval: float,
+        history: float,
+    ) -> None:
+        """
+        :param open_socket: Opens a netlink socket in the namespace to sample.
+        :param interval: The time between two samples, in seconds.
+        :param history: For how long the samples are kept, in seconds.
+        """
+        self._open_socket = open_socket
+        self.interval = interval
+        self.history = history
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_read = 0.0
+        # The samples of each link, and the index of the link they were taken on
+        self._samples: Dict[str, Tuple[int, Deque[Sample]]] = {}
+
+    def close(self) -> None:
+        with self._lock:
+            thread = self._thread
+            self._stop.set()
+
+        if thread is not None:
+            thread.join()
+
+    def _run(self) -> None:
+        netlink_socket: Optional[NetlinkSocket] = None
+        try:
+            while not self._stop.is_set():
+                start = time.monotonic()
+                with self._lock:
+                    if start - self._last_read > self.history:
+                        LOGGER.debug("Stopping the idle link stats sampler")
+                        self._samples = {}
+                        self._thread = None
+                        return
+
+                try:
+                    if netlink_socket is None:
+                        netlink_socket = self._open_socket()
+                    self._add_samples(start, netlink_socket.link_stats())
+                except OSError as e:
+                    LOGGER.warning("Failed to sample the link counters: %s", str(e))
+                    if netlink_socket is not None:
+                        netlink_socket.close()
+                        netlink_socket = None
+
+                self._stop.wait(max(0.0, start + self.interval - time.monotonic()))
+        finally:
+            if netlink_socket is not None:
+                netlink_socket.close()
+
+    def _add_samples(self, now: float, links: List[Dict[str, Any]]) -> None:
+        max_samples = int(self.history / self.interval) + 1
+        with self._lock:
+            samples: Dict[str, Tuple[int, Deque[Sample]]] = {}
+            for link in links:
+                sample = (now, *counters(link))
+                index, link_samples = self._samples.get(
+                    link["ifname"], (link["ifindex"], deque(maxlen=max_samples))
+                )
+                if index != link["ifindex"] or (
+                    link_samples
+                    and any(
+                        current < previous
+                        for current, previous in zip(sample[1:], link_samples[-1][1:])
+                    )
+                ):
+                    # The link has been replaced, or its counters reset
+                    index, link_samples = link["ifindex"], deque(maxlen=max_samples)
+
+                link_samples.append(sample)
+                samples[link["ifname"]] = (index, link_samples)
+
+            # The links which are gone are dropped
+            self._samples = samples
+
+    def rates(self, name: str, windows: Sequence[float]) -> List[Dict[str, float]]:
+        """
+        Get the average rates of a link over each of the windows, in packets and bits per
+        second.  The duration of each rate is the time actually covered by the samples,
+        it is shorter than the window when the samples don't go back that far.  Starts the
+        sampling if it is not running.
+        """
+        with self._lock:
+            self._last_read = time.monotonic()
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="link-stats", daemon=True
+                )
+                self._thread.start()
+
+            if name not in self._samples:
+                return []
+
+            link_samples = list(self._samples[name][1])
+
+        if len(link_samples) < 2:
+            return []
+
+        last = link_samples[-1]
+        rates = []
+        for window in windows:
+            # The oldest sample within the window, or the one just before the last if
+            # the window is shorter than the interval
+            first = next(
+                (
+                    sample
+                    for sample in link_samples[:-1]
+                    if last[0] - sample[0] <= window + self.interval / 2
+                ),
+                link_samples[-2],
+            )
+            duration = last[0] - first[0]
+            rx_packets, rx_bytes, tx_packets, tx_bytes = (
+                current - previous for current, previous in zip(last[1:], first[1:])
+            )
+            rates.append(
+                {
+                    "window": window,
+                    "duration": duration,
+                    "rx_pps": rx_packets / duration,
+                    "rx_bps": rx_bytes * 8 / duration,
+                    "tx_pps": tx_packets / duration,
+                    "tx_bps": tx_bytes * 8 / duration,
+                }
+            )
+
+        return rates
@@ -0,0 +1,236 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import bisect
+import os
+import threading
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+# Seconds, from the ip batch worker round-trips to the long running actions
+DURATION_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+# Bytes, from empty outputs to the dumps of thousands of links
+SIZE_BUCKETS = (0, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# The aliases ip accepts for its objects and commands, mapped on a single name
+IP_OBJECTS = {"a": "addr", "address": "addr", "l": "link", "r": "route", "ro": "route"}
+IP_VERBS = {"a": "add", "d": "del", "delete": "del", "s": "show", "list": "show"}
+
+
+class Histogram:
+    """
+    A histogram with fixed buckets.  Like in prometheus, the count of a bucket is the
+    count of the observations smaller or equal to its upper bound.  It is not thread-safe,
+    its owner has to lock it.
+    """
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        # The last count is for the observations above all the bounds
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> List[int]:
+        """
+        The count of each bucket, including the ones of the buckets below it.  The last
+        one is the +Inf bucket.
+        """
+        counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            counts.append(total)
+
+        return counts
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        return histogram
+
+
+def command_family(command: List[str]) -> str:
+    """
+    Get the family a command is accounted in: the object and the command for ip (e.g. `ip
+    link set`), the name of the executable for anything else.
+    """
+    if not command:
+        return ""
+
+    executable = os.path.basename(command[0])
+    if executable != "ip":
+        return executable
+
+    args = [arg for arg in command[1:] if not arg.startswith("-")]
+    if not args:
+        return "ip"
+
+    ip_object = IP_OBJECTS.get(args[0], args[0])
+    verb = args[1] if len(args) > 1 else "show"
+    return f"ip {ip_object} {IP_VERBS.get(verb, verb)}"
+
+
+ExecKey = Tuple[str, str, str]
+
+
+class ExecMetrics:
+    """
+    The duration and the output size of all the commands, and of all the netlink calls,
+    by family, namespace and status.  The status is the exit code of the command, "timeout"
+    if it had to be killed, "closed" if its output was not consumed until the end, or
+    "error" if it couldn't run.  The output size of a netlink call is the size of the
+    messages it received, the reads served from a state cache don't have any.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._durations: Dict[ExecKey, Histogram] = {}
+        self._sizes: Dict[ExecKey, Histogram] = {}
+
+    def observe(
+        self,
+        family: str,
+        namespace: Optional[str],
+        status: str,
+        duration: float,
+        output_size: Optional[int],
+    ) -> None:
+        """
+        Record a command or a netlink call, its output size is None when it doesn't have
+        any, it is then only counted in the durations.
+        """
+        key = (family, namespace or "", status)
+        with self._lock:
+            if key not in self._durations:
+                self._durations[key] = Histogram(DURATION_BUCKETS)
+                self._sizes[key] = Histogram(SIZE_BUCKETS)
+
+            self._durations[key].observe(duration)
+            if output_size is not None:
+                self._sizes[key].observe(output_size)
+
+    def snapshot(self) -> List[Tuple[ExecKey, Histogram, Histogram]]:
+        """
+        Get a copy of the duration and the output size histograms of each family,
+        namespace and status.
+        """
+        with self._lock:
+            return [
+                (key, duration.copy(), self._sizes[key].copy())
+                for key, duration in self._durations.items()
+            ]
+
+
+exec_metrics = ExecMetrics()
+
+RequestKey = Tuple[str, str, str]
+
+
+class RequestMetrics:
+    """
+    The duration of the requests served by the api, by flask-restx namespace, method and
+    status code.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._durations: Dict[RequestKey, Histogram] = {}
+
+    def observe(
+        self, namespace: str, method: str, status_code: int, duration: float
+    ) -> None:
+        key = (namespace, method, str(status_code))
+        with self._lock:
+            if key not in self._durations:
+                self._durations[key] = Histogram(DURATION_BUCKETS)
+
+            self._durations[key].observe(duration)
+
+    def snapshot(self) -> List[Tuple[RequestKey, Histogram]]:
+        """
+        Get a copy of the duration histogram of each namespace, method and status code.
+        """
+        with self._lock:
+            return [(key, duration.copy()) for key, duration in self._durations.items()]
+
+
+request_metrics = RequestMetrics()
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class PrometheusText:
+    """
+    Writes metrics in the prometheus text exposition format, version 0.0.4.  All the
+    samples of a metric have to be added right after its declaration.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self) -> None:
+        self._lines: List[str] = []
+
+    def declare(self, name: str, kind: str, description: str) -> None:
+        self._lines.append(f"# HELP {name} {description}")
+        self._lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, labels: Mapping[str, str], value: float) -> None:
+        if labels:
+            label_values = ",".join(
+                f'{label}="{escape_label_value(label_value)}"'
+                for label, label_value in labels.items()
+            )
+            name = f"{name}{{{label_values}}}"
+
+        self._lines.append(f"{name} {value}")
+
+    def histogram(
+        self, name: str, labels: Mapping[str, str], histogram: Histogram
+    ) -> None:
+        bounds = [str(float(bound)) for bound in histogram.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, histogram.cumulative_counts()):
+            self.sample(f"{name}_bucket", {**labels, "le": bound}, count)
+
+        self.sample(f"{name}_sum", labels, histogram.sum)
+        self.sample(f"{name}_count", labels, histogram.count)
+
+    def render(self) -> str:
+        return "\n".join(self._lines) + "\n"
@@ -0,0 +1,352 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import ctypes
+import errno
+import logging
+import os
+import struct
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from nfv_test_api.netlink import (
+    NETNS_RUN_DIR,
+    NETNSA_NSID,
+    RTGENMSG,
+    RTM_DELNSID,
+    RTM_NEWNSID,
+    RTNLGRP_NSID,
+    NetlinkSocket,
+    attributes,
+    s32,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+
+INOTIFY_EVENT = struct.Struct("iIII")
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+def _check(result: int) -> int:
+    if result < 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+
+    return result
+
+
+class DirectoryWatch:
+    """
+    Watches the entries of a directory being added and removed, with inotify.
+    """
+
+    MASK = (
+        IN_CREATE
+        | IN_DELETE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_DELETE_SELF
+        | IN_MOVE_SELF
+    )
+
+    def __init__(self, path: str) -> None:
+        self._fd = _check(_libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC))
+        try:
+            _check(_libc.inotify_add_watch(self._fd, os.fsencode(path), self.MASK))
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def events(self) -> Iterator[Tuple[int, str]]:
+        """
+        Yield the mask and the name of every event received so far, without waiting for
+        new ones.  The events without a name concern the directory itself.
+        """
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+
+            offset = 0
+            while offset + INOTIFY_EVENT.size <= len(data):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset : offset + length].split(b"\0", 1)[0]
+                offset += length
+                yield mask, os.fsdecode(name)
+
+
+class NamespaceIndex:
+    """
+    The namespaces of the host, by name and by id, like `ip netns list-id` shows them: all
+    the namespaces with an id, with the name they have in /run/netns if any.
+
+    The index is built once, and then kept up to date with the files being added and
+    removed in /run/netns, with the notifications of the kernel about namespace ids, and
+    with the changes we make.  The pending events are all applied before serving a read,
+    a change only costs the lookup of the id of the namespaces it concerns.
+    """
+
+    def __init__(self, open_socket: Callable[[], NetlinkSocket]) -> None:
+        """
+        :param open_socket: Opens a netlink socket in the namespace the ids are relative to.
+        """
+        self._open_socket = open_socket
+        self._lock = threading.Lock()
+        self._events: Optional[NetlinkSocket] = None
+        self._socket: Optional[NetlinkSocket] = None
+        self._watch: Optional[DirectoryWatch] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._built = False
+        self._ids: Dict[int, Optional[str]] = {}
+        self._names: Dict[str, int] = {}
+
+    def _close(self) -> None:
+        for netlink_socket in (self._events, self._socket):
+            if netlink_socket is not None:
+                netlink_socket.close()
+
+        if self._watch is not None:
+            self._watch.close()
+
+        self._events = None
+        self._socket = None
+        self._watch = None
+        self._reset()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _nsid(self, netlink_socket: NetlinkSocket, name: str) -> int:
+        """
+        Get the id of the namespace with the given name, -1 if it doesn't have any.
+        """
+        try:
+            fd = os.open(os.path.join(NETNS_RUN_DIR, name), os.O_RDONLY)
+        except OSError:
+            return -1
+
+        try:
+            return netlink_socket.nsid(fd)
+        except OSError as e:
+            # The file is not a namespace (yet), ip netns add mounts it after creating it
+            LOGGER.debug("Failed to get the id of namespace %s: %s", name, e)
+            return -1
+        finally:
+            os.close(fd)
+
+    def _set_name(self, netlink_socket: NetlinkSocket, name: str) -> None:
+        self._remove_name(name)
+        nsid = self._nsid(netlink_socket, name)
+        if nsid < 0:
+            return
+
+        previous = self._ids.get(nsid)
+        if previous is not None and previous != name and previous in self._names:
+            # Like list-id, a namespace mounted twice keeps its first name
+            return
+
+        self._ids[nsid] = name
+        self._names[name] = nsid
+
+    def _remove_name(self, name: str) -> bool:
+        """
+        Forget a name, returns whether the namespace it was the name of is left without one.
+        """
+        nsid = self._names.pop(name, None)
+        if nsid is not None and self._ids.get(nsid) == name:
+            self._ids[nsid] = None
+            return True
+
+        return False
+
+    def _names_without_id(self) -> List[str]:
+        try:
+            names = os.listdir(NETNS_RUN_DIR)
+        except FileNotFoundError:
+            return []
+
+        return [name for name in sorted(names) if name not in self._names]
+
+    def _build(self, netlink_socket: NetlinkSocket) -> None:
+        self._reset()
+        for namespace in netlink_socket.namespaces():
+            self._ids[namespace["nsid"]] = namespace.get("name")
+            if "name" in namespace:
+                self._names[namespace["name"]] = namespace["nsid"]
+
+        self._built = True
+
+    def _sync(self) -> NetlinkSocket:
+        """
+        Apply all the pending events, and get the socket to use for the lookups.
+        """
+        if self._events is None or self._socket is None:
+            # Watching before anything is read, so that no change can be missed
+            self._events = self._open_socket()
+            self._events.subscribe(RTNLGRP_NSID)
+            self._socket = self._open_socket()
+            self._reset()
+
+        if self._watch is None:
+            try:
+                self._watch = DirectoryWatch(NETNS_RUN_DIR)
+                self._built = False
+            except FileNotFoundError:
+                # ip creates the directory with the first namespace, until then the
+                # index is built again on every read
+                self._built = False
+
+        changed_names: Dict[str, bool] = {}
+        unnamed_ids = False
+        watch_lost = False
+        for mask, name in self._watch.events() if self._watch is not None else []:
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                watch_lost = True
+            elif mask & IN_Q_OVERFLOW:
+                LOGGER.warning("Lost track of %s, rebuilding the index", NETNS_RUN_DIR)
+                self._built = False
+            elif name:
+                changed_names[name] = bool(mask & (IN_CREATE | IN_MOVED_TO))
+
+        if watch_lost and self._watch is not None:
+            # The directory is gone, it is watched again once it is created back
+            self._watch.close()
+            self._watch = None
+            self._built = False
+
+        try:
+            for kind, body in self._events.events():
+                nsid_attributes = attributes(body, RTGENMSG.size)
+                if NETNSA_NSID not in nsid_attributes:
+                    continue
+
+                nsid = s32(nsid_attributes[NETNSA_NSID])
+                if kind == RTM_NEWNSID:
+                    self._ids.setdefault(nsid, None)
+                    unnamed_ids = True
+                elif kind == RTM_DELNSID:
+                    previous = self._ids.pop(nsid, None)
+                    if previous is not None:
+                        self._names.pop(previous, None)
+        except OSError as e:
+            if e.errno != errno.ENOBUFS:
+                raise
+
+            LOGGER.warning("Namespace id notifications were lost, rebuilding the index")
+            self._built = False
+
+        if not self._built:
+            self._build(self._socket)
+            return self._socket
+
+        for name, added in changed_names.items():
+            if added:
+                self._set_name(self._socket, name)
+            elif self._remove_name(name):
+                # The namespace can still be mounted under another name
+                unnamed_ids = True
+
+        if unnamed_ids:
+            # A new id, or one which lost its name, can belong to any of the namespaces we
+            # don't know the id of
+            for name in self._names_without_id():
+                self._set_name(self._socket, name)
+
+        return self._socket
+
+    def _read(self, read: Callable[[NetlinkSocket], Any]) -> Any:
+        with self._lock:
+            try:
+                return read(self._sync())
+            except OSError:
+                # The sockets can't be trusted anymore, they are opened again on next read
+                self._close()
+                raise
+
+    @staticmethod
+    def _namespace(nsid: int, name: Optional[str]) -> Dict[str, Any]:
+        return {"nsid": nsid, **({"name": name} if name is not None else {})}
+
+    def namespaces(self) -> List[Dict[str, Any]]:
+        """
+        Get all the namespaces with an id, like NetlinkSocket.namespaces.
+        """
+
+        def read(_: NetlinkSocket) -> List[Dict[str, Any]]:
+            return [
+                self._namespace(nsid, name) for nsid, name in sorted(self._ids.items())
+            ]
+
+        namespaces: List[Dict[str, Any]] = self._read(read)
+        return namespaces
+
+    def by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the namespace with the given name, if it has an id.
+        """
+
+        def read(_: NetlinkSocket) -> Optional[Dict[str, Any]]:
+            if name not in self._names:
+                return None
+
+            return self._namespace(self._names[name], name)
+
+        namespace: Optional[Dict[str, Any]] = self._read(read)
+        return namespace
+
+    def by_id(self, nsid: int) -> Optional[Dict[str, Any]]:
+        """
+        Get the namespace with the given id.
+        """
+
+        def read(_: NetlinkSocket) -> Optional[Dict[str, Any]]:
+            if nsid not in self._ids:
+                return None
+
+            return self._namespace(nsid, self._ids[nsid])
+
+        namespace: Optional[Dict[str, Any]] = self._read(read)
+        return namespace
+
+    def refresh(self, name: str) -> None:
+        """
+        Look up the namespace with the given name again, after we changed it.
+        """
+
+        def read(netlink_socket: NetlinkSocket) -> None:
+            if self._built:
+                self._set_name(netlink_socket, name)
+
+        self._read(read)
@@ -0,0 +1,1225 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import ctypes
+import errno
+import ipaddress
+import logging
+import os
+import socket
+import struct
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+NETNS_RUN_DIR = "/run/netns"
+CLONE_NEWNET = 0x40000000
+
+SOL_NETLINK = 270
+NETLINK_ADD_MEMBERSHIP = 1
+NETLINK_GET_STRICT_CHK = 12
+
+NLMSG_HEADER = struct.Struct("IHHII")
+NLA_HEADER = struct.Struct("HH")
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+RTM_NEWNSID = 88
+RTM_DELNSID = 89
+RTM_GETNSID = 90
+
+RTNLGRP_LINK = 1
+RTNLGRP_IPV4_IFADDR = 5
+RTNLGRP_IPV4_ROUTE = 7
+RTNLGRP_IPV6_IFADDR = 9
+RTNLGRP_IPV6_ROUTE = 11
+RTNLGRP_NSID = 28
+
+IFINFOMSG = struct.Struct("BxHiII")
+IFADDRMSG = struct.Struct("BBBBI")
+RTMSG = struct.Struct("BBBBBBBBI")
+RTGENMSG = struct.Struct("Bxxx")
+
+IFLA_ADDRESS = 1
+IFLA_BROADCAST = 2
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_LINK = 5
+IFLA_QDISC = 6
+IFLA_MASTER = 10
+IFLA_TXQLEN = 13
+IFLA_OPERSTATE = 16
+IFLA_LINKINFO = 18
+IFLA_STATS64 = 23
+IFLA_GROUP = 27
+IFLA_LINK_NETNSID = 37
+IFLA_MIN_MTU = 50
+IFLA_MAX_MTU = 51
+IFLA_PROP_LIST = 52
+IFLA_ALT_IFNAME = 53
+
+# The link attributes that are shown for a link, the others are skipped when parsing
+LINK_ATTRIBUTES = {
+    IFLA_ADDRESS,
+    IFLA_BROADCAST,
+    IFLA_IFNAME,
+    IFLA_MTU,
+    IFLA_LINK,
+    IFLA_QDISC,
+    IFLA_MASTER,
+    IFLA_TXQLEN,
+    IFLA_OPERSTATE,
+    IFLA_LINKINFO,
+    IFLA_GROUP,
+    IFLA_LINK_NETNSID,
+    IFLA_MIN_MTU,
+    IFLA_MAX_MTU,
+    IFLA_PROP_LIST,
+}
+
+# The attributes read for the counters of a link
+STATS_ATTRIBUTES = {IFLA_IFNAME, IFLA_STATS64}
+
+# The start of struct rtnl_link_stats64, the other counters are details of these ones
+LINK_STATS64 = struct.Struct("8Q")
+
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+IFLA_INFO_SLAVE_KIND = 4
+
+IFLA_VLAN_ID = 1
+IFLA_VLAN_PROTOCOL = 5
+
+IFLA_BOND_MODE = 1
+IFLA_BOND_MIIMON = 3
+IFLA_BOND_XMIT_HASH_POLICY = 14
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+IFA_BROADCAST = 4
+IFA_CACHEINFO = 6
+IFA_FLAGS = 8
+
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_PREFSRC = 7
+RTA_METRICS = 8
+RTA_MULTIPATH = 9
+RTA_TABLE = 15
+RTA_VIA = 18
+RTA_NH_ID = 30
+
+# The header of each next hop of a multipath route
+RTNEXTHOP = struct.Struct("HBBi")
+
+# The metrics of a route shown by ip as they are, the others are scaled
+ROUTE_METRICS = {2: "mtu", 3: "window", 8: "advmss", 10: "hoplimit", 11: "initcwnd"}
+
+RT_TABLE_COMPAT = 252
+RT_TABLE_DEFAULT = 253
+RT_TABLE_MAIN = 254
+RT_TABLE_LOCAL = 255
+RTM_F_CLONED = 0x200
+
+NETNSA_NSID = 1
+NETNSA_FD = 3
+
+NLA_TYPE_MASK = 0x3FFF
+
+# Above this many, the links a dump refers to are found in a dump of all of them rather
+# than fetched one by one
+RELATED_LINKS_DUMP_THRESHOLD = 16
+
+# The flags as `ip` names and orders them
+IFF_FLAGS = [
+    (0x8, "LOOPBACK"),
+    (0x2, "BROADCAST"),
+    (0x10, "POINTOPOINT"),
+    (0x1000, "MULTICAST"),
+    (0x80, "NOARP"),
+    (0x200, "ALLMULTI"),
+    (0x100, "PROMISC"),
+    (0x400, "MASTER"),
+    (0x800, "SLAVE"),
+    (0x4, "DEBUG"),
+    (0x8000, "DYNAMIC"),
+    (0x4000, "AUTOMEDIA"),
+    (0x2000, "PORTSEL"),
+    (0x20, "NOTRAILERS"),
+    (0x1, "UP"),
+    (0x10000, "LOWER_UP"),
+    (0x20000, "DORMANT"),
+    (0x40000, "ECHO"),
+]
+IFF_UP = 0x1
+IFF_RUNNING = 0x40
+
+IFA_FLAGS_NAMES = [
+    (0x2, "nodad"),
+    (0x4, "optimistic"),
+    (0x8, "dadfailed"),
+    (0x10, "home"),
+    (0x20, "deprecated"),
+    (0x40, "tentative"),
+    (0x100, "mngtmpaddr"),
+    (0x200, "noprefixroute"),
+    (0x400, "autojoin"),
+    (0x800, "stable-privacy"),
+]
+IFA_F_SECONDARY = 0x1
+IFA_F_PERMANENT = 0x80
+
+RTNH_FLAGS_NAMES = [
+    (0x1, "dead"),
+    (0x2, "pervasive"),
+    (0x4, "onlink"),
+    (0x8, "offload"),
+    (0x10, "linkdown"),
+    (0x20, "unresolved"),
+]
+
+OPER_STATES = [
+    "UNKNOWN",
+    "NOTPRESENT",
+    "DOWN",
+    "LOWERLAYERDOWN",
+    "TESTING",
+    "DORMANT",
+    "UP",
+]
+LINK_TYPES = {
+    1: "ether",
+    512: "ppp",
+    768: "ipip",
+    769: "tunnel6",
+    772: "loopback",
+    776: "sit",
+    778: "gre",
+    823: "ip6gre",
+    65534: "none",
+    65535: "void",
+}
+SCOPES = {0: "global", 200: "site", 253: "link", 254: "host", 255: "nowhere"}
+ROUTE_TYPES = {
+    1: "unicast",
+    2: "local",
+    3: "broadcast",
+    4: "anycast",
+    5: "multicast",
+    6: "blackhole",
+    7: "unreachable",
+    8: "prohibit",
+    9: "throw",
+    10: "nat",
+    11: "xresolve",
+}
+ROUTE_PROTOCOLS = {
+    1: "redirect",
+    2: "kernel",
+    3: "boot",
+    4: "static",
+    8: "gated",
+    9: "ra",
+    10: "mrt",
+    11: "zebra",
+    12: "bird",
+    16: "dhcp",
+    18: "keepalived",
+    42: "babel",
+    186: "bgp",
+    187: "isis",
+    188: "ospf",
+    189: "rip",
+    192: "eigrp",
+}
+ROUTE_TABLES = {
+    RT_TABLE_DEFAULT: "default",
+    RT_TABLE_MAIN: "main",
+    RT_TABLE_LOCAL: "local",
+}
+BOND_MODES = [
+    "balance-rr",
+    "active-backup",
+    "balance-xor",
+    "broadcast",
+    "802.3ad",
+    "balance-tlb",
+    "balance-alb",
+]
+BOND_XMIT_HASH_POLICIES = [
+    "layer2",
+    "layer3+4",
+    "layer2+3",
+    "encap2+3",
+    "encap3+4",
+    "vlan+srcmac",
+]
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+class NetlinkError(OSError):
+    """
+    An error reported by the kernel in response to a netlink request.
+    """
+
+
+def setns(fd: int, nstype: int = CLONE_NEWNET) -> None:
+    """
+    Move the calling thread into the namespace the file descriptor refers to.
+    """
+    if _libc.setns(fd, nstype) != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+
+
+@contextmanager
+def network_namespace(namespace: str) -> Iterator[None]:
+    """
+    Move the calling thread into the named network namespace for the duration of the
+    context.  Sockets created in the meantime stay bound to that namespace once the
+    thread has moved back.
+    """
+    current = os.open("/proc/thread-self/ns/net", os.O_RDONLY)
+    try:
+        target = os.open(os.path.join(NETNS_RUN_DIR, namespace), os.O_RDONLY)
+        try:
+            setns(target)
+        finally:
+            os.close(target)
+
+        try:
+            yield
+        finally:
+            setns(current)
+    finally:
+        os.close(current)
+
+
+def attribute_list(
+    data: bytes, offset: int = 0, wanted: Optional[Set[int]] = None
+) -> List[Tuple[int, bytes]]:
+    """
+    Parse a sequence of netlink attributes, as a list of (type, payload) tuples.  If a set
+    of wanted types is provided, the other attributes are skipped.
+    """
+    attributes: List[Tuple[int, bytes]] = []
+    unpack_from = NLA_HEADER.unpack_from
+    end = len(data)
+    while offset + 4 <= end:
+        length, kind = unpack_from(data, offset)
+        if length < 4:
+            break
+
+        kind &= NLA_TYPE_MASK
+        if wanted is None or kind in wanted:
+            attributes.append((kind, data[offset + 4 : offset + length]))
+        offset += (length + 3) & ~3
+
+    return attributes
+
+
+def attributes(
+    data: bytes, offset: int = 0, wanted: Optional[Set[int]] = None
+) -> Dict[int, bytes]:
+    """
+    Parse a sequence of netlink attributes, as a dict of payloads indexed by type.
+    """
+    return dict(attribute_list(data, offset, wanted))
+
+
+def attribute(kind: int, payload: bytes) -> bytes:
+    """
+    Build a netlink attribute, padded to the netlink alignment.
+    """
+    length = 4 + len(payload)
+    return struct.pack("HH", length, kind) + payload + b"\0" * (-length % 4)
+
+
+def string(payload: bytes) -> str:
+    return payload.split(b"\0", 1)[0].decode(errors="replace")
+
+
+def u8(payload: bytes) -> int:
+    return int(payload[0])
+
+
+def u32(payload: bytes) -> int:
+    return int(struct.unpack_from("I", payload)[0])
+
+
+def s32(payload: bytes) -> int:
+    return int(struct.unpack_from("i", payload)[0])
+
+
+def mac_address(payload: bytes) -> str:
+    return payload.hex(":")
+
+
+def ip_address(payload: bytes) -> str:
+    return str(ipaddress.ip_address(payload))
+
+
+def via(payload: bytes) -> Dict[str, str]:
+    """
+    Describe a gateway of another family than the route, like ip does.
+    """
+    family = struct.unpack_from("H", payload)[0]
+    return {
+        "family": "inet6" if family == socket.AF_INET6 else "inet",
+        "host": ip_address(payload[2:]),
+    }
+
+
+def scope_name(scope: int) -> Any:
+    return SCOPES.get(scope, scope)
+
+
+def link_message(
+    body: bytes,
+) -> Tuple[Tuple[int, int, int, int, int], Dict[int, bytes]]:
+    """
+    Parse the header and the attributes of a link message.  Only the attributes which are
+    shown for a link are kept.
+    """
+    return IFINFOMSG.unpack_from(body), attributes(
+        body, IFINFOMSG.size, LINK_ATTRIBUTES
+    )
+
+
+def route_message(
+    body: bytes,
+) -> Tuple[Tuple[int, int, int, int, int, int, int, int, int], Dict[int, bytes]]:
+    """
+    Parse the header and the attributes of a route message.
+    """
+    return RTMSG.unpack_from(body), attributes(body, RTMSG.size)
+
+
+def route_table(
+    header: Tuple[int, int, int, int, int, int, int, int, int],
+    route_attributes: Dict[int, bytes],
+) -> int:
+    """
+    Get the table of a route, the header only holds the ids below 256.
+    """
+    if RTA_TABLE in route_attributes:
+        return u32(route_attributes[RTA_TABLE])
+
+    return header[4]
+
+
+def oper_state_name(link_attributes: Dict[int, bytes]) -> Optional[str]:
+    if IFLA_OPERSTATE not in link_attributes:
+        return None
+
+    state = u8(link_attributes[IFLA_OPERSTATE])
+    return OPER_STATES[state] if state < len(OPER_STATES) else str(state)
+
+
+class LinkFilter(NamedTuple):
+    """
+    Selects links on their kind, their operational state, their master and the start of
+    their name.  The criteria which are None select all the links.
+    """
+
+    kind: Optional[str] = None
+    oper_state: Optional[str] = None
+    master: Optional[str] = None
+    name_prefix: Optional[str] = None
+
+    def match_attributes(
+        self, link_attributes: Dict[int, bytes], master_index: Optional[int]
+    ) -> bool:
+        """
+        Whether the link with the given attributes is selected.  The index of the master
+        to select is resolved by the caller.
+        """
+        if self.name_prefix is not None and not string(
+            link_attributes.get(IFLA_IFNAME, b"")
+        ).startswith(self.name_prefix):
+            return False
+
+        if self.master is not None and (
+            IFLA_MASTER not in link_attributes
+            or u32(link_attributes[IFLA_MASTER]) != master_index
+        ):
+            return False
+
+        if (
+            self.oper_state is not None
+            and oper_state_name(link_attributes) != self.oper_state
+        ):
+            return False
+
+        if self.kind is not None:
+            info_attributes = attributes(link_attributes.get(IFLA_LINKINFO, b""))
+            if string(info_attributes.get(IFLA_INFO_KIND, b"")) != self.kind:
+                return False
+
+        return True
+
+    def match_link(self, link: Dict[str, Any]) -> bool:
+        """
+        Whether the link, shaped like the output of `ip -j -details link`, is selected.
+        """
+        return (
+            (self.name_prefix is None or link["ifname"].startswith(self.name_prefix))
+            and (self.master is None or link.get("master") == self.master)
+            and (self.oper_state is None or link.get("operstate") == self.oper_state)
+            and (
+                self.kind is None
+                or link.get("linkinfo", {}).get("info_kind") == self.kind
+            )
+        )
+
+    def dump_attributes(self, master_index: Optional[int]) -> bytes:
+        """
+        The attributes of a link dump request asking the kernel to do the filtering it
+        can: on the master, and on the kind if its module is loaded.  The links it returns
+        still have to be matched.
+        """
+        dump_attributes = b""
+        if master_index is not None:
+            dump_attributes += attribute(IFLA_MASTER, struct.pack("I", master_index))
+        if self.kind is not None:
+            dump_attributes += attribute(
+                IFLA_LINKINFO,
+                attribute(IFLA_INFO_KIND, self.kind.encode() + b"\0"),
+            )
+
+        return dump_attributes
+
+
+class NetlinkSocket:
+    """
+    A NETLINK_ROUTE socket.  The socket is bound to the network namespace of the thread
+    that created it.  It is not meant to be shared between threads.
+    """
+
+    def __init__(self) -> None:
+        self._socket = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE
+        )
+        self._socket.bind((0, 0))
+        try:
+            # Let the kernel filter dumps on the header fields we provide
+            self._socket.setsockopt(SOL_NETLINK, NETLINK_GET_STRICT_CHK, 1)
+        except OSError:
+            pass
+
+        self._sequence = 0
+        # The number of bytes of messages received so far, for the metrics
+        self.received = 0
+
+    def close(self) -> None:
+        self._socket.close()
+
+    def fileno(self) -> int:
+        return self._socket.fileno()
+
+    def __enter__(self) -> "NetlinkSocket":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def request(
+        self, msg_type: int, payload: bytes, flags: int = 0
+    ) -> Iterator[Tuple[int, bytes]]:
+        """
+        Send a request to the kernel and yield the type and body of every message of the
+        response, until the response is complete.
+        """
+        self._sequence += 1
+        sequence = self._sequence
+        message = (
+            NLMSG_HEADER.pack(
+                NLMSG_HEADER.size + len(payload),
+                msg_type,
+                NLM_F_REQUEST | flags,
+                sequence,
+                0,
+            )
+            + payload
+        )
+        self._socket.send(message)
+
+        dump = flags & NLM_F_DUMP == NLM_F_DUMP
+        while True:
+            data = self._socket.recv(1024 * 1024)
+            self.received += len(data)
+            offset = 0
+            while offset + NLMSG_HEADER.size <= len(data):
+                length, kind, _, seq, _ = NLMSG_HEADER.unpack_from(data, offset)
+                body = data[offset + NLMSG_HEADER.size : offset + length]
+                offset += (length + 3) & ~3
+                if seq != sequence:
+                    continue
+
+                if kind == NLMSG_DONE:
+                    return
+
+                if kind == NLMSG_ERROR:
+                    error = -s32(body)
+                    if error:
+                        raise NetlinkError(error, os.strerror(error))
+                    return
+
+                yield kind, body
+                if not dump:
+                    return
+
+    def subscribe(self, *groups: int, buffer_size: int = 0) -> None:
+        """
+        Receive the notifications the kernel sends to the given multicast groups.  They
+        are read with events(), the socket shouldn't be used for requests anymore.
+
+        :param buffer_size: The size of the receive buffer to request, the notifications
+            sent while it is full are lost.
+        """
+        if buffer_size:
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+
+        for group in groups:
+            self._socket.setsockopt(SOL_NETLINK, NETLINK_ADD_MEMBERSHIP, group)
+
+    def events(self) -> Iterator[Tuple[int, bytes]]:
+        """
+        Yield the type and body of every notification received so far, without waiting
+        for new ones.  Raises an OSError with errno ENOBUFS if some notifications were lost
+        because they were not read fast enough.
+        """
+        while True:
+            try:
+                data = self._socket.recv(1024 * 1024, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                return
+
+            self.received += len(data)
+            offset = 0
+            while offset + NLMSG_HEADER.size <= len(data):
+                length, kind, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+                yield kind, data[offset + NLMSG_HEADER.size : offset + length]
+                offset += (length + 3) & ~3
+
+    def link_messages(
+        self, name: Optional[str] = None, index: int = 0, dump_attributes: bytes = b""
+    ) -> List[Tuple[Tuple[int, int, int, int, int], Dict[int, bytes]]]:
+        """
+        Get the parsed header and attributes of all the links, or of the one with the
+        given name or index.
+
+        :param dump_attributes: The attributes of the request when dumping all the links,
+            to have the kernel filter them.
+        """
+        request = IFINFOMSG.pack(0, 0, index, 0, 0)
+        if name is None and not index:
+            responses = self.request(RTM_GETLINK, request + dump_attributes, NLM_F_DUMP)
+        elif name is not None:
+            responses = self.request(
+                RTM_GETLINK, request + attribute(IFLA_IFNAME, name.encode() + b"\0")
+            )
+        else:
+            responses = self.request(RTM_GETLINK, request)
+
+        try:
+            return [
+                link_message(body) for kind, body in responses if kind == RTM_NEWLINK
+            ]
+        except NetlinkError as e:
+            if e.errno == errno.ENODEV and (name is not None or index):
+                return []
+            raise
+
+    def link_stats(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get the counters of all the links, or of the one with the given name, as dicts
+        shaped like the output of `ip -j -s link`, without the details.
+        """
+        request = IFINFOMSG.pack(0, 0, 0, 0, 0)
+        if name is None:
+            responses = self.request(RTM_GETLINK, request, NLM_F_DUMP)
+        else:
+            responses = self.request(
+                RTM_GETLINK, request + attribute(IFLA_IFNAME, name.encode() + b"\0")
+            )
+
+        links = []
+        try:
+            for kind, body in responses:
+                if kind != RTM_NEWLINK:
+                    continue
+
+                _, _, index, _, _ = IFINFOMSG.unpack_from(body)
+                link_attributes = attributes(body, IFINFOMSG.size, STATS_ATTRIBUTES)
+                if IFLA_STATS64 not in link_attributes:
+                    continue
+
+                (
+                    rx_packets,
+                    tx_packets,
+                    rx_bytes,
+                    tx_bytes,
+                    rx_errors,
+                    tx_errors,
+                    rx_dropped,
+                    tx_dropped,
+                ) = LINK_STATS64.unpack_from(link_attributes[IFLA_STATS64])
+                links.append(
+                    {
+                        "ifindex": index,
+                        "ifname": string(link_attributes.get(IFLA_IFNAME, b"")),
+                        "stats64": {
+                            "rx": {
+                                "bytes": rx_bytes,
+                                "packets": rx_packets,
+                                "errors": rx_errors,
+                                "dropped": rx_dropped,
+                            },
+                            "tx": {
+                                "bytes": tx_bytes,
+                                "packets": tx_packets,
+                                "errors": tx_errors,
+                                "dropped": tx_dropped,
+                            },
+                        },
+                    }
+                )
+        except NetlinkError as e:
+            if e.errno == errno.ENODEV and name is not None:
+                return []
+            raise
+
+        return links
+
+    def link_names(self) -> Dict[int, str]:
+        """
+        Get the names of all the links, indexed by their index.
+        """
+        return {
+            header[2]: string(link_attributes.get(IFLA_IFNAME, b""))
+            for header, link_attributes in self.link_messages()
+        }
+
+    def links(
+        self,
+        name: Optional[str] = None,
+        link_filter: Optional[LinkFilter] = None,
+        addresses: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get all the links and their addresses, or the one with the given name, as dicts
+        shaped like the output of `ip -j -details addr`.
+
+        :param link_filter: Selects the links to get, as much as possible in the kernel.
+        :param addresses: Whether to get the addresses of the links, their addr_info is
+            empty otherwise.
+        """
+        link_filter = link_filter or LinkFilter()
+        master_index: Optional[int] = None
+        if link_filter.master is not None:
+            masters = self.link_messages(link_filter.master)
+            if not masters:
+                return []
+            master_index = masters[0][0][2]
+
+        if name is not None:
+            messages = self.link_messages(name)
+        else:
+            messages = self.link_messages(
+                dump_attributes=link_filter.dump_attributes(master_index)
+            )
+
+        messages = [
+            message
+            for message in messages
+            if link_filter.match_attributes(message[1], master_index)
+        ]
+        if not messages:
+            return []
+
+        # The masters and the parents of the links are needed to describe them
+        indexes = {header[2] for header, _ in messages}
+        related: Set[int] = set()
+        for _, link_attributes in messages:
+            if IFLA_MASTER in link_attributes:
+                related.add(u32(link_attributes[IFLA_MASTER]))
+            if (
+                IFLA_LINK in link_attributes
+                and IFLA_LINK_NETNSID not in link_attributes
+            ):
+                related.add(s32(link_attributes[IFLA_LINK]))
+        related -= indexes
+
+        if len(related) > RELATED_LINKS_DUMP_THRESHOLD:
+            related_messages = [
+                message for message in self.link_messages() if message[0][2] in related
+            ]
+        else:
+            related_messages = [
+                message
+                for index in related
+                for message in self.link_messages(index=index)
+            ]
+
+        link_addresses: Dict[int, List[Dict[str, Any]]] = {}
+        if addresses:
+            link_addresses = self.addresses(
+                messages[0][0][2] if len(messages) == 1 else 0
+            )
+
+        return self.render_links(messages, related_messages, link_addresses)
+
+    def render_links(
+        self,
+        messages: List[Tuple[Tuple[int, int, int, int, int], Dict[int, bytes]]],
+        related_messages: List[Tuple[Tuple[int, int, int, int, int], Dict[int, bytes]]],
+        addresses: Dict[int, List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Build the dicts describing the links of the messages.  The related messages are
+        the other links they can refer to (their master, their parent), and the addresses
+        are indexed by the index of the link they belong to.
+        """
+        names: Dict[int, str] = {}
+        flags: Dict[int, int] = {}
+        for header, link_attributes in messages + related_messages:
+            names[header[2]] = string(link_attributes.get(IFLA_IFNAME, b""))
+            flags[header[2]] = header[3]
+
+        links = []
+        for header, link_attributes in messages:
+            link = self._link(header, link_attributes, names, flags)
+            link["addr_info"] = addresses.get(header[2], [])
+            links.append(link)
+
+        return links
+
+    def _link(
+        self,
+        header: Tuple[int, int, int, int, int],
+        link_attributes: Dict[int, bytes],
+        names: Dict[int, str],
+        flags: Dict[int, int],
+    ) -> Dict[str, Any]:
+        _, link_type, index, link_flags, _ = header
+
+        # The parent of the link is only known by name if it is in the same namespace
+        parent: Optional[int] = None
+        if IFLA_LINK in link_attributes and IFLA_LINK_NETNSID not in link_attributes:
+            parent = s32(link_attributes[IFLA_LINK])
+
+        link: Dict[str, Any] = {"ifindex": index}
+        if IFLA_LINK in link_attributes:
+            if parent is None:
+                link["link_index"] = s32(link_attributes[IFLA_LINK])
+            elif parent in names:
+                link["link"] = names[parent]
+
+        link["ifname"] = string(link_attributes.get(IFLA_IFNAME, b""))
+
+        flag_names = []
+        if link_flags & IFF_UP and not link_flags & IFF_RUNNING:
+            flag_names.append("NO-CARRIER")
+        flag_names += [name for flag, name in IFF_FLAGS if link_flags & flag]
+        if parent is not None and parent in flags and not flags[parent] & IFF_UP:
+            flag_names.append("M-DOWN")
+        link["flags"] = flag_names
+
+        if IFLA_MTU in link_attributes:
+            link["mtu"] = u32(link_attributes[IFLA_MTU])
+        if IFLA_QDISC in link_attributes:
+            link["qdisc"] = string(link_attributes[IFLA_QDISC])
+        if IFLA_MASTER in link_attributes:
+            master = u32(link_attributes[IFLA_MASTER])
+            link["master"] = names.get(master, str(master))
+        if IFLA_OPERSTATE in link_attributes:
+            link["operstate"] = oper_state_name(link_attributes)
+        if IFLA_GROUP in link_attributes:
+            group = u32(link_attributes[IFLA_GROUP])
+            link["group"] = "default" if group == 0 else str(group)
+        if IFLA_TXQLEN in link_attributes:
+            link["txqlen"] = u32(link_attributes[IFLA_TXQLEN])
+
+        link["link_type"] = LINK_TYPES.get(link_type, f"[{link_type}]")
+        if IFLA_ADDRESS in link_attributes:
+            link["address"] = mac_address(link_attributes[IFLA_ADDRESS])
+        if IFLA_BROADCAST in link_attributes:
+            link["broadcast"] = mac_address(link_attributes[IFLA_BROADCAST])
+        if IFLA_LINK_NETNSID in link_attributes:
+            link["link_netnsid"] = s32(link_attributes[IFLA_LINK_NETNSID])
+        if IFLA_MIN_MTU in link_attributes:
+            link["min_mtu"] = u32(link_attributes[IFLA_MIN_MTU])
+        if IFLA_MAX_MTU in link_attributes:
+            link["max_mtu"] = u32(link_attributes[IFLA_MAX_MTU])
+        if IFLA_LINKINFO in link_attributes:
+            link["linkinfo"] = self._link_info(link_attributes[IFLA_LINKINFO])
+        if IFLA_PROP_LIST in link_attributes:
+            link["altnames"] = [
+                string(payload)
+                for kind, payload in attribute_list(link_attributes[IFLA_PROP_LIST])
+                if kind == IFLA_ALT_IFNAME
+            ]
+
+        return link
+
+    def _link_info(self, payload: bytes) -> Dict[str, Any]:
+        """
+        Parse the kind specific information of a link.  The kind data is only decoded for
+        the kinds the models care about (vlan and bond).
+        """
+        info_attributes = attributes(payload)
+        link_info: Dict[str, Any] = {}
+        if IFLA_INFO_KIND in info_attributes:
+            kind = string(info_attributes[IFLA_INFO_KIND])
+            link_info["info_kind"] = kind
+            data = attributes(info_attributes.get(IFLA_INFO_DATA, b""))
+            if kind == "vlan" and IFLA_VLAN_ID in data:
+                link_info["info_data"] = {
+                    "id": struct.unpack("H", data[IFLA_VLAN_ID][:2])[0]
+                }
+                if IFLA_VLAN_PROTOCOL in data:
+                    protocol = struct.unpack("!H", data[IFLA_VLAN_PROTOCOL][:2])[0]
+                    link_info["info_data"]["protocol"] = (
+                        "802.1ad" if protocol == 0x88A8 else "802.1Q"
+                    )
+            elif kind == "bond" and data:
+                info_data: Dict[str, Any] = {}
+                if IFLA_BOND_MODE in data:
+                    mode = u8(data[IFLA_BOND_MODE])
+                    info_data["mode"] = (
+                        BOND_MODES[mode] if mode < len(BOND_MODES) else mode
+                    )
+                if IFLA_BOND_MIIMON in data:
+                    info_data["miimon"] = u32(data[IFLA_BOND_MIIMON])
+                if IFLA_BOND_XMIT_HASH_POLICY in data:
+                    policy = u8(data[IFLA_BOND_XMIT_HASH_POLICY])
+                    info_data["xmit_hash_policy"] = (
+                        BOND_XMIT_HASH_POLICIES[policy]
+                        if policy < len(BOND_XMIT_HASH_POLICIES)
+                        else policy
+                    )
+                link_info["info_data"] = info_data
+
+        if IFLA_INFO_SLAVE_KIND in info_attributes:
+            link_info["info_slave_kind"] = string(info_attributes[IFLA_INFO_SLAVE_KIND])
+
+        return link_info
+
+    def addresses(self, index: int = 0) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Get the addresses of all the links, or of the link with the given index, indexed
+        by the index of the link they belong to.
+        """
+        addresses: Dict[int, List[Dict[str, Any]]] = {}
+        for kind, body in self.request(
+            RTM_GETADDR, IFADDRMSG.pack(0, 0, 0, 0, index), NLM_F_DUMP
+        ):
+            if kind != RTM_NEWADDR:
+                continue
+
+            parsed = self.address(body)
+            if parsed is None:
+                continue
+
+            link_index, address = parsed
+            if index and link_index != index:
+                continue
+
+            addresses.setdefault(link_index, []).append(address)
+
+        return addresses
+
+    def address(self, body: bytes) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        Parse an address message, as the index of the link it belongs to and a dict shaped
+        like the items of addr_info in the output of `ip -j -details addr`.
+        """
+        family, prefix_len, flags, scope, link_index = IFADDRMSG.unpack_from(body)
+        address_attributes = attributes(body, IFADDRMSG.size)
+        if IFA_FLAGS in address_attributes:
+            flags = u32(address_attributes[IFA_FLAGS])
+
+        local = address_attributes.get(IFA_LOCAL, address_attributes.get(IFA_ADDRESS))
+        if local is None:
+            return None
+
+        address: Dict[str, Any] = {
+            "family": "inet" if family == socket.AF_INET else "inet6",
+            "local": ip_address(local),
+        }
+        if (
+            IFA_ADDRESS in address_attributes
+            and address_attributes[IFA_ADDRESS] != local
+        ):
+            address["address"] = ip_address(address_attributes[IFA_ADDRESS])
+        address["prefixlen"] = prefix_len
+        if IFA_BROADCAST in address_attributes:
+            address["broadcast"] = ip_address(address_attributes[IFA_BROADCAST])
+        address["scope"] = scope_name(scope)
+        if not flags & IFA_F_PERMANENT:
+            address["dynamic"] = True
+        if flags & IFA_F_SECONDARY:
+            address["secondary" if family == socket.AF_INET else "temporary"] = True
+        for flag, name in IFA_FLAGS_NAMES:
+            if flags & flag:
+                address[name] = True
+        if IFA_LABEL in address_attributes:
+            address["label"] = string(address_attributes[IFA_LABEL])
+        if IFA_CACHEINFO in address_attributes:
+            preferred, valid, _, _ = struct.unpack_from(
+                "IIII", address_attributes[IFA_CACHEINFO]
+            )
+            address["valid_life_time"] = valid
+            address["preferred_life_time"] = preferred
+
+        return link_index, address
+
+    def routes(
+        self,
+        family: int = socket.AF_INET,
+        table: Optional[int] = RT_TABLE_MAIN,
+        names: Optional[Dict[int, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get all the routes of the given family in the given table, as dicts shaped like
+        the output of `ip -j -details route`.  The names of the links, indexed by their
+        index, are fetched if they are not provided.
+        """
+        return list(self.iter_routes(family, table, names))
+
+    def iter_routes(
+        self,
+        family: int = socket.AF_INET,
+        table: Optional[int] = RT_TABLE_MAIN,
+        names: Optional[Dict[int, str]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the routes of the given family in the given table as they are received, like
+        routes().  If the table is None, the routes of all the tables are yielded, with the
+        name of their table like in the output of `ip -j -details route show table all`.
+        The socket can't be used for anything else until the dump is complete.
+        """
+        if names is None:
+            names = self.link_names()
+
+        for kind, body in self.request(
+            RTM_GETROUTE, RTMSG.pack(family, 0, 0, 0, 0, 0, 0, 0, 0), NLM_F_DUMP
+        ):
+            if kind != RTM_NEWROUTE:
+                continue
+
+            header, route_attributes = route_message(body)
+            if header[0] != family or header[8] & RTM_F_CLONED:
+                continue
+
+            route_table_id = route_table(header, route_attributes)
+            if table is not None and route_table_id != table:
+                continue
+
+            route = self.render_route(header, route_attributes, names)
+            if table is None:
+                route["table"] = ROUTE_TABLES.get(route_table_id, str(route_table_id))
+
+            yield route
+
+    def render_route(
+        self,
+        header: Tuple[int, int, int, int, int, int, int, int, int],
+        route_attributes: Dict[int, bytes],
+        names: Dict[int, str],
+    ) -> Dict[str, Any]:
+        """
+        Build the dict describing the route of a message.  The names of the links are
+        indexed by their index.
+        """
+        family, dst_len, _, _, _, protocol, scope, route_type, flags = header
+        route: Dict[str, Any] = {"type": ROUTE_TYPES.get(route_type, route_type)}
+        if RTA_DST in route_attributes:
+            dst = ip_address(route_attributes[RTA_DST])
+            max_len = 32 if family == socket.AF_INET else 128
+            route["dst"] = dst if dst_len == max_len else f"{dst}/{dst_len}"
+        else:
+            route["dst"] = "default"
+        if RTA_GATEWAY in route_attributes:
+            route["gateway"] = ip_address(route_attributes[RTA_GATEWAY])
+        if RTA_VIA in route_attributes:
+            route["via"] = via(route_attributes[RTA_VIA])
+        if RTA_OIF in route_attributes:
+            oif = u32(route_attributes[RTA_OIF])
+            route["dev"] = names.get(oif, str(oif))
+        route["protocol"] = ROUTE_PROTOCOLS.get(protocol, protocol)
+        route["scope"] = scope_name(scope)
+        if RTA_PRIORITY in route_attributes:
+            route["metric"] = u32(route_attributes[RTA_PRIORITY])
+        if RTA_PREFSRC in route_attributes:
+            route["prefsrc"] = ip_address(route_attributes[RTA_PREFSRC])
+        route["flags"] = [name for flag, name in RTNH_FLAGS_NAMES if flags & flag]
+        if RTA_NH_ID in route_attributes:
+            route["nhid"] = u32(route_attributes[RTA_NH_ID])
+        if RTA_METRICS in route_attributes:
+            metrics = {
+                ROUTE_METRICS[kind]: u32(payload)
+                for kind, payload in attribute_list(
+                    route_attributes[RTA_METRICS], wanted=set(ROUTE_METRICS)
+                )
+            }
+            if metrics:
+                route["metrics"] = [metrics]
+        if RTA_MULTIPATH in route_attributes:
+            route["nexthops"] = self.render_nexthops(
+                route_attributes[RTA_MULTIPATH], names
+            )
+
+        return route
+
+    def render_nexthops(
+        self, payload: bytes, names: Dict[int, str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Build the dicts describing the next hops of a multipath route, from the payload of
+        its RTA_MULTIPATH attribute.
+        """
+        nexthops: List[Dict[str, Any]] = []
+        offset = 0
+        while offset + RTNEXTHOP.size <= len(payload):
+            length, flags, hops, index = RTNEXTHOP.unpack_from(payload, offset)
+            if length < RTNEXTHOP.size:
+                break
+
+            nexthop_attributes = attributes(
+                payload[offset + RTNEXTHOP.size : offset + length]
+            )
+            nexthop: Dict[str, Any] = {}
+            if RTA_GATEWAY in nexthop_attributes:
+                nexthop["gateway"] = ip_address(nexthop_attributes[RTA_GATEWAY])
+            if RTA_VIA in nexthop_attributes:
+                nexthop["via"] = via(nexthop_attributes[RTA_VIA])
+            nexthop["dev"] = names.get(index, str(index))
+            # The weight is stored minus one
+            nexthop["weight"] = hops + 1
+            nexthop["flags"] = [name for flag, name in RTNH_FLAGS_NAMES if flags & flag]
+            nexthops.append(nexthop)
+            offset += (length + 3) & ~3
+
+        return nexthops
+
+    def route_count(
+        self, family: int = socket.AF_INET, table: int = RT_TABLE_MAIN
+    ) -> int:
+        """
+        Count the routes of the given family in the given table, without parsing them.
+        """
+        count = 0
+        for kind, body in self.request(
+            RTM_GETROUTE, RTMSG.pack(family, 0, 0, 0, 0, 0, 0, 0, 0), NLM_F_DUMP
+        ):
+            if kind != RTM_NEWROUTE:
+                continue
+
+            route_family, _, _, _, route_table, _, _, _, flags = RTMSG.unpack_from(body)
+            if table > 255 and route_table == RT_TABLE_COMPAT:
+                route_table = u32(
+                    attributes(body, RTMSG.size).get(RTA_TABLE, b"\0" * 4)
+                )
+            if route_family == family and route_table == table:
+                if not flags & RTM_F_CLONED:
+                    count += 1
+
+        return count
+
+    def nsid(self, fd: int) -> int:
+        """
+        Get the id the namespace the file descriptor refers to has in the namespace of
+        this socket, -1 if it doesn't have any.
+        """
+        for kind, body in self.request(
+            RTM_GETNSID,
+            RTGENMSG.pack(socket.AF_UNSPEC)
+            + attribute(NETNSA_FD, struct.pack("I", fd)),
+        ):
+            if kind == RTM_NEWNSID:
+                nsid_attributes = attributes(body, RTGENMSG.size)
+                if NETNSA_NSID in nsid_attributes:
+                    return s32(nsid_attributes[NETNSA_NSID])
+
+        return -1
+
+    def namespaces(self) -> List[Dict[str, Any]]:
+        """
+        Get all the namespaces with an id, as dicts shaped like the output of
+        `ip -j netns list-id`.
+        """
+        nsids: List[int] = []
+        for kind, body in self.request(
+            RTM_GETNSID, RTGENMSG.pack(socket.AF_UNSPEC), NLM_F_DUMP
+        ):
+            if kind == RTM_NEWNSID:
+                nsid_attributes = attributes(body, RTGENMSG.size)
+                if NETNSA_NSID in nsid_attributes:
+                    nsids.append(s32(nsid_attributes[NETNSA_NSID]))
+
+        names: Dict[int, str] = {}
+        try:
+            namespace_names = os.listdir(NETNS_RUN_DIR)
+        except FileNotFoundError:
+            namespace_names = []
+
+        for name in namespace_names:
+            try:
+                fd = os.open(os.path.join(NETNS_RUN_DIR, name), os.O_RDONLY)
+            except OSError:
+                continue
+
+            try:
+                names.setdefault(self.nsid(fd), name)
+            except NetlinkError as e:
+                LOGGER.debug("Failed to get the id of namespace %s: %s", name, e)
+            finally:
+                os.close(fd)
+
+        return [
+            {"nsid": nsid, **({"name": names[nsid]} if nsid in names else {})}
+            for nsid in nsids
+        ]
+
+
+def open_socket(namespace: Optional[str] = None) -> NetlinkSocket:
+    """
+    Open a netlink socket in the given network namespace, or in the namespace of the
+    calling thread if none is provided.
+    """
+    if namespace is None:
+        return NetlinkSocket()
+
+    with network_namespace(namespace):
+        return NetlinkSocket()
@@ -0,0 +1,418 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import errno
+import logging
+import os
+import socket
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from nfv_test_api.netlink import (
+    IFADDRMSG,
+    IFF_UP,
+    IFLA_IFNAME,
+    NETNS_RUN_DIR,
+    NLM_F_DUMP,
+    RT_TABLE_MAIN,
+    RTM_DELADDR,
+    RTM_DELLINK,
+    RTM_DELNSID,
+    RTM_DELROUTE,
+    RTM_GETADDR,
+    RTM_NEWADDR,
+    RTM_NEWLINK,
+    RTM_NEWNSID,
+    RTM_NEWROUTE,
+    RTNLGRP_IPV4_IFADDR,
+    RTNLGRP_IPV4_ROUTE,
+    RTNLGRP_IPV6_IFADDR,
+    RTNLGRP_IPV6_ROUTE,
+    RTNLGRP_LINK,
+    RTNLGRP_NSID,
+    LinkFilter,
+    NetlinkSocket,
+    link_message,
+    string,
+)
+from nfv_test_api.route_lookup import LOOKUP_TABLES, RouteLookup
+
+LOGGER = logging.getLogger(__name__)
+
+LinkMessage = Tuple[Tuple[int, int, int, int, int], Dict[int, bytes]]
+AddressKey = Tuple[int, str, str, int]
+
+# Big enough to hold the notifications of a few thousand changes between two reads
+EVENTS_BUFFER_SIZE = 8 * 1024 * 1024
+
+
+class NetlinkStateCache:
+    """
+    An in-memory snapshot of the links, addresses, routes and namespaces of a network
+    namespace, kept up to date with the notifications the kernel sends about them.
+
+    Links and addresses are updated one by one from their notifications.  Routes and
+    namespaces are only dumped again on the first read following a change, their
+    notifications don't identify them reliably enough (multipath routes, namespace names
+    which only exist as files in /run/netns).
+
+    All the pending notifications are applied before serving a read.  The kernel queues
+    them before acknowledging a change, so a read following a change we made always sees
+    it.  The dicts returned are shared between the reads, they must not be modified.
+    """
+
+    def __init__(self, open_socket: Callable[[], NetlinkSocket]) -> None:
+        """
+        :param open_socket: Opens a netlink socket in the namespace to cache the state of.
+        """
+        self._open_socket = open_socket
+        self._lock = threading.Lock()
+        self._events: Optional[NetlinkSocket] = None
+        self._socket: Optional[NetlinkSocket] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._links: Optional[Dict[int, LinkMessage]] = None
+        self._new_links: Set[int] = set()
+        self._addresses: Optional[Dict[AddressKey, Tuple[int, Dict[str, Any]]]] = None
+        self._rendered_links: Optional[List[Dict[str, Any]]] = None
+        self._routes: Dict[Tuple[int, Optional[int]], List[Dict[str, Any]]] = {}
+        self._route_counts: Dict[Tuple[int, int], int] = {}
+        self._route_lookups: Dict[int, RouteLookup] = {}
+        self._namespaces: Optional[List[Dict[str, Any]]] = None
+        self._namespaces_version = 0
+
+    def _close(self) -> None:
+        for netlink_socket in (self._events, self._socket):
+            if netlink_socket is not None:
+                netlink_socket.close()
+
+        self._events = None
+        self._socket = None
+        self._reset()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _sync(self) -> NetlinkSocket:
+        """
+        Apply all the pending notifications, and get the socket to use for the dumps.
+        """
+        if self._events is None or self._socket is None:
+            # Subscribing before anything is dumped, so that no change can be missed
+            self._events = self._open_socket()
+            self._events.subscribe(
+                RTNLGRP_LINK,
+                RTNLGRP_IPV4_IFADDR,
+                RTNLGRP_IPV6_IFADDR,
+                RTNLGRP_IPV4_ROUTE,
+                RTNLGRP_IPV6_ROUTE,
+                RTNLGRP_NSID,
+                buffer_size=EVENTS_BUFFER_SIZE,
+            )
+            self._socket = self._open_socket()
+            self._reset()
+
+        while True:
+            try:
+                for kind, body in self._events.events():
+                    self._apply(kind, body)
+                return self._socket
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+
+                LOGGER.warning("Netlink notifications were lost, dropping the cache")
+                self._reset()
+
+    def _apply(self, kind: int, body: bytes) -> None:
+        if kind in (RTM_NEWLINK, RTM_DELLINK):
+            # The routes show the names of the links
+            self._rendered_links = None
+            self._routes = {}
+            self._route_counts = {}
+            self._route_lookups = {}
+            if self._links is None:
+                return
+
+            header, link_attributes = link_message(body)
+            previous = self._links.get(header[2])
+            if kind == RTM_NEWLINK:
+                self._links[header[2]] = (header, link_attributes)
+                if previous is None:
+                    # A link is notified as soon as it is registered, before it is
+                    # fully set up (e.g. the peer of a veth), it is fetched again
+                    self._new_links.add(header[2])
+            else:
+                self._links.pop(header[2], None)
+
+            if (
+                previous is None
+                or kind == RTM_DELLINK
+                or (previous[0][3] ^ header[3]) & IFF_UP
+            ):
+                # Bringing a link up or down adds and removes addresses (ipv6 link-local
+                # ones) without notifying it right away, so they are dumped again
+                self._addresses = None
+        elif kind in (RTM_NEWADDR, RTM_DELADDR):
+            self._rendered_links = None
+            if self._addresses is None or self._socket is None:
+                return
+
+            parsed = self._socket.address(body)
+            if parsed is None:
+                return
+
+            key = self._address_key(*parsed)
+            if kind == RTM_NEWADDR:
+                self._addresses[key] = parsed
+            else:
+                self._addresses.pop(key, None)
+        elif kind in (RTM_NEWROUTE, RTM_DELROUTE):
+            self._routes = {}
+            self._route_counts = {}
+            self._route_lookups = {}
+        elif kind in (RTM_NEWNSID, RTM_DELNSID):
+            self._namespaces = None
+
+    @staticmethod
+    def _address_key(index: int, address: Dict[str, Any]) -> AddressKey:
+        return index, address["family"], address["local"], address["prefixlen"]
+
+    def _link_state(self, netlink_socket: NetlinkSocket) -> Dict[int, LinkMessage]:
+        if self._links is None:
+            self._links = {
+                message[0][2]: message for message in netlink_socket.link_messages()
+            }
+            self._new_links = set()
+
+        for index in self._new_links:
+            messages = netlink_socket.link_messages(index=index)
+            if messages:
+                self._links[index] = messages[0]
+            else:
+                self._links.pop(index, None)
+        self._new_links = set()
+
+        if self._addresses is None:
+            self._addresses = {}
+            for kind, body in netlink_socket.request(
+                RTM_GETADDR, IFADDRMSG.pack(0, 0, 0, 0, 0), NLM_F_DUMP
+            ):
+                if kind != RTM_NEWADDR:
+                    continue
+
+                parsed = netlink_socket.address(body)
+                if parsed is not None:
+                    self._addresses[self._address_key(*parsed)] = parsed
+
+        return self._links
+
+    def _addresses_by_link(self) -> Dict[int, List[Dict[str, Any]]]:
+        addresses: Dict[int, List[Dict[str, Any]]] = {}
+        # Like in the dumps, the ipv4 addresses of a link come before the ipv6 ones
+        for index, address in sorted(
+            (self._addresses or {}).values(),
+            key=lambda item: item[1]["family"] != "inet",
+        ):
+            addresses.setdefault(index, []).append(address)
+
+        return addresses
+
+    def _read(self, read: Callable[[NetlinkSocket], Any]) -> Any:
+        with self._lock:
+            try:
+                return read(self._sync())
+            except OSError:
+                # The sockets can't be trusted anymore, they are opened again on next read
+                self._close()
+                raise
+
+    def links(
+        self,
+        name: Optional[str] = None,
+        link_filter: Optional[LinkFilter] = None,
+        addresses: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get all the links and their addresses, or the one with the given name, like
+        NetlinkSocket.links.  Only the selected links are rendered.
+        """
+
+        def read(netlink_socket: NetlinkSocket) -> List[Dict[str, Any]]:
+            links = self._link_state(netlink_socket)
+            if name is None and link_filter is None:
+                if self._rendered_links is None:
+                    self._rendered_links = netlink_socket.render_links(
+                        [links[index] for index in sorted(links.keys())],
+                        [],
+                        self._addresses_by_link(),
+                    )
+
+                return list(self._rendered_links)
+
+            selected_filter = link_filter or LinkFilter()
+            master_index: Optional[int] = None
+            if selected_filter.master is not None:
+                master_index = next(
+                    (
+                        index
+                        for index, (_, link_attributes) in links.items()
+                        if string(link_attributes.get(IFLA_IFNAME, b""))
+                        == selected_filter.master
+                    ),
+                    None,
+                )
+                if master_index is None:
+                    return []
+
+            messages = [
+                links[index]
+                for index in sorted(links.keys())
+                if (
+                    name is None
+                    or string(links[index][1].get(IFLA_IFNAME, b"")) == name
+                )
+                and selected_filter.match_attributes(links[index][1], master_index)
+            ]
+            if not messages:
+                return []
+
+            return netlink_socket.render_links(
+                messages,
+                list(links.values()),
+                self._addresses_by_link() if addresses else {},
+            )
+
+        links: List[Dict[str, Any]] = self._read(read)
+        return links
+
+    def link_stats(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get the counters of all the links, or of the one with the given name, like
+        NetlinkSocket.link_stats.  The counters change without any notification, they are
+        always read from the kernel.
+        """
+
+        def read(netlink_socket: NetlinkSocket) -> List[Dict[str, Any]]:
+            return netlink_socket.link_stats(name)
+
+        links: List[Dict[str, Any]] = self._read(read)
+        return links
+
+    def routes(
+        self, family: int = socket.AF_INET, table: Optional[int] = RT_TABLE_MAIN
+    ) -> List[Dict[str, Any]]:
+        """
+        Get all the routes of the given family in the given table, or in all the tables
+        if it is None, like NetlinkSocket.routes.
+        """
+
+        def read(netlink_socket: NetlinkSocket) -> List[Dict[str, Any]]:
+            return list(self._table_routes(netlink_socket, family, table))
+
+        routes: List[Dict[str, Any]] = self._read(read)
+        return routes
+
+    def _table_routes(
+        self, netlink_socket: NetlinkSocket, family: int, table: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        if (family, table) not in self._routes:
+            names = {
+                index: string(link_attributes.get(IFLA_IFNAME, b""))
+                for index, (_, link_attributes) in self._link_state(
+                    netlink_socket
+                ).items()
+            }
+            self._routes[(family, table)] = netlink_socket.routes(family, table, names)
+
+        return self._routes[(family, table)]
+
+    def route_lookup(self, family: int = socket.AF_INET) -> RouteLookup:
+        """
+        Get the longest prefix match lookup over the routes of the given family, it is
+        only built again after the routes changed.
+        """
+
+        def read(netlink_socket: NetlinkSocket) -> RouteLookup:
+            if family not in self._route_lookups:
+                self._route_lookups[family] = RouteLookup(
+                    family,
+                    [
+                        (name, self._table_routes(netlink_socket, family, table))
+                        for name, table in LOOKUP_TABLES
+                    ],
+                )
+
+            return self._route_lookups[family]
+
+        route_lookup: RouteLookup = self._read(read)
+        return route_lookup
+
+    def link_count(self) -> int:
+        """
+        Count the links, without rendering them.
+        """
+
+        def read(netlink_socket: NetlinkSocket) -> int:
+            return len(self._link_state(netlink_socket))
+
+        count: int = self._read(read)
+        return count
+
+    def route_count(
+        self, family: int = socket.AF_INET, table: int = RT_TABLE_MAIN
+    ) -> int:
+        """
+        Count the routes of the given family in the given table, without rendering them.
+        """
+
+        def read(netlink_socket: NetlinkSocket) -> int:
+            key = (family, table)
+            if key in self._routes:
+                return len(self._routes[key])
+
+            if key not in self._route_counts:
+                self._route_counts[key] = netlink_socket.route_count(family, table)
+
+            return self._route_counts[key]
+
+        count: int = self._read(read)
+        return count
+
+    def namespaces(self) -> List[Dict[str, Any]]:
+        """
+        Get all the namespaces with an id, like NetlinkSocket.namespaces.
+        """
+
+        def read(netlink_socket: NetlinkSocket) -> List[Dict[str, Any]]:
+            # Adding or removing a namespace file doesn't always come with a notification
+            try:
+                version = os.stat(NETNS_RUN_DIR).st_mtime_ns
+            except FileNotFoundError:
+                version = 0
+
+            if self._namespaces is None or version != self._namespaces_version:
+                self._namespaces = netlink_socket.namespaces()
+                self._namespaces_version = version
+
+            return list(self._namespaces)
+
+        namespaces: List[Dict[str, Any]] = self._read(read)
+        return namespaces
+
+
+NetlinkReader = Union[NetlinkSocket, NetlinkStateCache]
@@ -0,0 +1,116 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import socket
+from ipaddress import IPv4Address, IPv6Address, ip_network
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from nfv_test_api.netlink import RT_TABLE_DEFAULT, RT_TABLE_LOCAL, RT_TABLE_MAIN
+
+# The tables of the default policy routing rules, in the order they are looked up in
+LOOKUP_TABLES = (
+    ("local", RT_TABLE_LOCAL),
+    ("main", RT_TABLE_MAIN),
+    ("default", RT_TABLE_DEFAULT),
+)
+
+Prefixes = Dict[int, Dict[int, Dict[str, Any]]]
+
+
+class RouteLookup:
+    """
+    Finds the route the kernel would use to reach an address, among the routes of one
+    family, with the default policy routing rules: the longest prefix match in the local
+    table, then in the main table, then in the default table.  A throw route sends the
+    lookup to the next table.  Among routes with the same destination, the one with the
+    lowest metric wins.
+
+    The routes of each table are indexed by prefix length, and for each length by their
+    destination, masked.  A lookup probes the lengths present in the table from the
+    longest one, that is a dict lookup for each distinct prefix length, rather than a step
+    for each bit of the address like in a binary trie.  The routes are dicts shaped like
+    the output of `ip -j -details route`, they are not copied.
+    """
+
+    def __init__(
+        self, family: int, tables: Sequence[Tuple[str, List[Dict[str, Any]]]]
+    ) -> None:
+        """
+        :param family: The family of the routes and of the addresses to look up.
+        :param tables: The name and the routes of each table, in the order they are looked
+            up in.
+        """
+        self.family = family
+        self.bits = 128 if family == socket.AF_INET6 else 32
+        self._tables: List[Tuple[str, List[int], Prefixes]] = []
+        for name, routes in tables:
+            prefixes: Prefixes = {}
+            for route in routes:
+                key = self._key(route.get("dst", "default"))
+                if key is None:
+                    continue
+
+                length, destination = key
+                by_destination = prefixes.setdefault(length, {})
+                existing = by_destination.get(destination)
+                if existing is None or route.get("metric", 0) < existing.get(
+                    "metric", 0
+                ):
+                    by_destination[destination] = route
+
+            self._tables.append((name, sorted(prefixes, reverse=True), prefixes))
+
+    def _key(self, dst: Any) -> Optional[Tuple[int, int]]:
+        if str(dst) == "default":
+            return 0, 0
+
+        network = ip_network(str(dst), strict=False)
+        if network.max_prefixlen != self.bits:
+            return None
+
+        return (
+            network.prefixlen,
+            int(network.network_address) >> (self.bits - network.prefixlen),
+        )
+
+    def __len__(self) -> int:
+        return sum(
+            len(by_destination)
+            for _, _, prefixes in self._tables
+            for by_destination in prefixes.values()
+        )
+
+    def lookup(
+        self, address: Union[IPv4Address, IPv6Address]
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Get the route used to reach the address, and the name of its table, or None if
+        there isn't any.
+        """
+        value = int(address)
+        for name, lengths, prefixes in self._tables:
+            for length in lengths:
+                route = prefixes[length].get(value >> (self.bits - length))
+                if route is not None:
+                    break
+            else:
+                continue
+
+            if route.get("type") == "throw":
+                continue
+
+            return name, route
+
+        return None
@@ -14,26 +14,34 @@
    limitations under the License.
 """
 import logging
+import time
 from typing import Optional, TypeVar
 
 import requests  # type: ignore
-from flask import Blueprint  # type: ignore
+from flask import Blueprint, Response, g, request  # type: ignore
 from flask_restx import Api  # type: ignore
 from requests.models import HTTPError  # type: ignore
 from werkzeug.exceptions import ServiceUnavailable  # type: ignore
 
+from nfv_test_api.metrics import request_metrics
 from nfv_test_api.v2.controllers.actions import namespace as actions_ns
 from nfv_test_api.v2.controllers.enodeb import namespace as enb_ns
+from nfv_test_api.v2.controllers.event import namespace as event_ns
 from nfv_test_api.v2.controllers.gnodeb import namespace as gnb_ns
 from nfv_test_api.v2.controllers.interface import namespace as interface_ns
+from nfv_test_api.v2.controllers.inventory import namespace as inventory_ns
+from nfv_test_api.v2.controllers.metrics import namespace as metrics_ns
 from nfv_test_api.v2.controllers.namespace import namespace as namespace_ns
+from nfv_test_api.v2.controllers.nexthop import namespace as nexthop_ns
 from nfv_test_api.v2.controllers.route import namespace as route_ns
 from nfv_test_api.v2.controllers.ue_4g import namespace as ue_4g_ns
 from nfv_test_api.v2.controllers.ue_5g import namespace as ue_5g_ns
 
 LOGGER = logging.getLogger(__name__)
 
-blueprint = Blueprint("api v2", __name__, url_prefix="/api/v2")
+URL_PREFIX = "/api/v2"
+
+blueprint = Blueprint("api v2", __name__, url_prefix=URL_PREFIX)
 
 api_extension = Api(
     blueprint,
@@ -46,11 +54,38 @@ api_extension = Api(
 api_extension.add_namespace(namespace_ns)
 api_extension.add_namespace(interface_ns)
 api_extension.add_namespace(route_ns)
+api_extension.add_namespace(nexthop_ns)
 api_extension.add_namespace(actions_ns)
 api_extension.add_namespace(gnb_ns)
 api_extension.add_namespace(ue_5g_ns)
 api_extension.add_namespace(enb_ns)
 api_extension.add_namespace(ue_4g_ns)
+api_extension.add_namespace(inventory_ns)
+api_extension.add_namespace(metrics_ns)
+api_extension.add_namespace(event_ns)
+
+
+@blueprint.before_request
+def start_request_timer() -> None:
+    g.request_start = time.monotonic()
+
+
+@blueprint.after_request
+def observe_request(response: Response) -> Response:
+    # The namespaces are mounted on the first part of the path (e.g. /api/v2/ue_4g/...)
+    api_namespace = ""
+    if request.url_rule is not None:
+        path = request.url_rule.rule[len(URL_PREFIX) :]
+        api_namespace = path.strip("/").split("/")[0]
+
+    request_metrics.observe(
+        api_namespace,
+        request.method,
+        response.status_code,
+        time.monotonic() - g.request_start,
+    )
+    return response
+
 
 # Ugly patches to force openapi 3.0
 from flask_restx.swagger import Swagger  # type: ignore # noqa: E402
@@ -14,18 +14,19 @@
    limitations under the License.
 """
 from http import HTTPStatus
-from typing import Dict, Optional
+from typing import Optional
 
 from flask import request  # type: ignore
 from flask_restx import Namespace, Resource  # type: ignore
 from pydantic import ValidationError
 from werkzeug.exceptions import BadRequest  # type: ignore
 
-from nfv_test_api.host import Host, NamespaceHost
+from nfv_test_api.async_host import run_coroutine
 from nfv_test_api.v2.controllers.common import add_model_schema
 from nfv_test_api.v2.data.common import InputOptionalSafeName
 from nfv_test_api.v2.data.ping import Ping, PingRequest
 from nfv_test_api.v2.services.actions import ActionsService
+from nfv_test_api.v2.services.registry import service_registry
 
 namespace = Namespace(name="actions", description="Execute some actions on the host")
 
@@ -39,19 +40,8 @@ class OnePing(Resource):
     The scope of this controller is the ping action on the host, not in a namespace.
     """
 
-    def __init__(self, api=None, *args: object, **kwargs: object):
-        super().__init__(api=api, *args, **kwargs)
-        self._default_service = ActionsService(Host())
-        self._interface_services: Dict[str, ActionsService] = dict()
-
     def get_service(self, ns_name: Optional[str]) -> ActionsService:
-        if not ns_name:
-            return self._default_service
-
-        if ns_name not in self._interface_services:
-            self._interface_services[ns_name] = ActionsService(NamespaceHost(ns_name))
-
-        return self._interface_services[ns_name]
+        return service_registry.service(ActionsService, ns_name)
 
     @namespace.expect(ping_request_model)
     @namespace.response(
@@ -72,7 +62,10 @@ class OnePing(Resource):
         except ValidationError as e:
             raise BadRequest(str(e))
 
-        return self.get_service(ns_name).ping(request_form).json_dict(), HTTPStatus.OK
+        # The ping process is watched by the shared event loop, the server thread of the
+        # request still waits for it, flask serves each request from a thread of its own
+        ping = run_coroutine(self.get_service(ns_name).ping_async(request_form))
+        return ping.json_dict(), HTTPStatus.OK
 
 
 @namespace.route("/ns/<ns_name>/ping")
@@ -19,6 +19,9 @@ from flask_restx import Namespace, SchemaModel  # type: ignore
 from pydantic import BaseModel
 from pydantic.schema import model_schema
 
+# Newline delimited json, a json document per line
+NDJSON = "application/x-ndjson"
+
 
 def add_model_schema(namespace: Namespace, model: Type[BaseModel]) -> SchemaModel:
     base_schema = model_schema(
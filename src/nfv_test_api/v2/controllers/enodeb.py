@@ -20,11 +20,11 @@ from flask_restx import Namespace, Resource  # type: ignore
 from pydantic import ValidationError
 from werkzeug.exceptions import BadRequest  # type: ignore
 
-from nfv_test_api.host import Host
 from nfv_test_api.v2.controllers.common import add_model_schema
 from nfv_test_api.v2.data.common import InputSafeEnbId
 from nfv_test_api.v2.data.enodeb import ENodeB, ENodeBCreate, ENodeBStatus
 from nfv_test_api.v2.services.enodeb import ENodeBService, ENodeBServiceHandler
+from nfv_test_api.v2.services.registry import service_registry
 
 namespace = Namespace(name="enodeb", description="Basic enodeb management")
 
@@ -46,7 +46,7 @@ class AllENodeB(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self._host = Host()
+        self._host = service_registry.host()
         self.enb_service = ENodeBService(self._host, enodeb_service_handler)
 
     @namespace.response(
@@ -105,7 +105,9 @@ class OneGNodeB(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.enb_service = ENodeBService(Host(), enodeb_service_handler)
+        self.enb_service = ENodeBService(
+            service_registry.host(), enodeb_service_handler
+        )
 
     @namespace.response(
         HTTPStatus.OK.value,
@@ -192,7 +194,9 @@ class OneGNodeB(Resource):
 class StartENodeB(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.enb_service = ENodeBService(Host(), enodeb_service_handler)
+        self.enb_service = ENodeBService(
+            service_registry.host(), enodeb_service_handler
+        )
 
     @namespace.response(HTTPStatus.OK.value, "eNodeB started")
     @namespace.response(
@@ -230,7 +234,9 @@ class StartENodeB(Resource):
 class StopENodeB(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.enb_service = ENodeBService(Host(), enodeb_service_handler)
+        self.enb_service = ENodeBService(
+            service_registry.host(), enodeb_service_handler
+        )
 
     @namespace.response(HTTPStatus.OK.value, "eNodeB stopped")
     @namespace.response(
@@ -265,7 +271,9 @@ class StopENodeB(Resource):
 class StatusENodeB(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.enb_service = ENodeBService(Host(), enodeb_service_handler)
+        self.enb_service = ENodeBService(
+            service_registry.host(), enodeb_service_handler
+        )
 
     @namespace.response(
         HTTPStatus.OK.value,
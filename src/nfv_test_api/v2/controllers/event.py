@@ -0,0 +1,134 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+from http import HTTPStatus
+from typing import Iterator, Optional
+
+from flask import Response, request, stream_with_context  # type: ignore
+from flask_restx import Namespace, Resource  # type: ignore
+from pydantic import ValidationError
+from werkzeug.exceptions import BadRequest  # type: ignore
+
+from nfv_test_api.v2.controllers.common import NDJSON, add_model_schema
+from nfv_test_api.v2.data.common import InputOptionalSafeName
+from nfv_test_api.v2.data.event import Event, EventQuery, EventType
+from nfv_test_api.v2.services.event import EventService
+from nfv_test_api.v2.services.namespace import NamespaceService
+from nfv_test_api.v2.services.registry import service_registry
+
+namespace = Namespace(
+    name="events", description="Changes of links, addresses, routes and namespaces"
+)
+
+event_model = add_model_schema(namespace, Event)
+
+SSE = "text/event-stream"
+
+
+def ndjson(events: Iterator[Event]) -> Iterator[str]:
+    for event in events:
+        yield json.dumps(event.json_dict(exclude_none=True)) + "\n"
+
+
+def server_sent_events(events: Iterator[Event]) -> Iterator[str]:
+    for event in events:
+        if event.type == EventType.HEARTBEAT:
+            # A comment, ignored by the clients
+            yield ": heartbeat\n\n"
+            continue
+
+        yield (
+            f"event: {event.type.value}\n"
+            f"data: {json.dumps(event.json_dict(exclude_none=True))}\n\n"
+        )
+
+
+@namespace.route("")
+@namespace.response(
+    code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    description="An error occurred when trying to process the request, this can also be because of bad input from the user",
+)
+class AllEvents(Resource):
+    """
+    The scope of this controller is the changes of everything that is not in a namespace.
+
+    With it you can follow them as they happen.
+    """
+
+    @namespace.response(
+        code=HTTPStatus.OK.value,
+        description="A stream of events, as server-sent events or newline delimited json",
+        model=event_model,
+    )
+    @namespace.param(
+        "types",
+        description="The types of events to get, comma separated (link, addr, route, netns)",
+    )
+    @namespace.param(
+        "if_name",
+        description="Only get the link, address and route events of this interface",
+    )
+    @namespace.param(
+        "table",
+        description="The table of the route events: main (default), local, default, all or a table id",
+    )
+    @namespace.param("timeout", description="Close the stream after so many seconds")
+    def get(self, ns_name: Optional[str] = None):
+        """
+        Follow the changes on the host
+
+        The events are streamed as server-sent events if the client accepts them
+        (text/event-stream), as newline delimited json otherwise.  The first event is of
+        type ready, the changes made after receiving it are all streamed.  A heartbeat is
+        sent when nothing happened for a while, and an overflow event if some changes
+        were lost, the state has to be read again then.
+        """
+        try:
+            # Validating input
+            InputOptionalSafeName(name=ns_name)
+            query = EventQuery(**request.args.to_dict())  # type: ignore
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        if ns_name:
+            # Ensuring the namespace exists
+            service_registry.service(NamespaceService).get_one(ns_name)
+
+        events = service_registry.service(EventService, ns_name).stream(
+            query.types, query.if_name, query.timeout, query.table_id
+        )
+        if request.accept_mimetypes.best_match([NDJSON, SSE]) == SSE:
+            return Response(
+                stream_with_context(server_sent_events(events)),
+                content_type=SSE,
+                headers={"Cache-Control": "no-cache"},
+            )
+
+        return Response(stream_with_context(ndjson(events)), content_type=NDJSON)
+
+
+@namespace.route("/ns/<ns_name>")
+@namespace.param("ns_name", description="The name of the namespace to follow")
+class AllEventsInNamespace(AllEvents):
+    """
+    The scope of this controller is the changes of everything that is in a namespace.
+
+    With it you can follow them as they happen.
+
+    This class is strictly equivalent to its parent one, the reason we extend it is to support
+    multiple route on the same class in the generated documentation:
+    https://github.com/noirbizarre/flask-restplus/issues/288
+    """
@@ -20,11 +20,11 @@ from flask_restx import Namespace, Resource  # type: ignore
 from pydantic import ValidationError
 from werkzeug.exceptions import BadRequest  # type: ignore
 
-from nfv_test_api.host import Host
 from nfv_test_api.v2.controllers.common import add_model_schema
 from nfv_test_api.v2.data.common import InputSafeNci
 from nfv_test_api.v2.data.gnodeb import GNodeB, GNodeBCreate, GNodeBStatus
 from nfv_test_api.v2.services.gnodeb import GNodeBService, GNodeBServiceHandler
+from nfv_test_api.v2.services.registry import service_registry
 
 namespace = Namespace(name="gnodeb", description="Basic gnodeb management")
 
@@ -46,7 +46,7 @@ class AllGNodeB(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self._host = Host()
+        self._host = service_registry.host()
         self.gnb_service = GNodeBService(self._host, gnodeb_service_handler)
 
     @namespace.response(
@@ -105,7 +105,9 @@ class OneGNodeB(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.gnb_service = GNodeBService(Host(), gnodeb_service_handler)
+        self.gnb_service = GNodeBService(
+            service_registry.host(), gnodeb_service_handler
+        )
 
     @namespace.response(
         HTTPStatus.OK.value, "Found a gNodeB config with a matching nci", gnodeb_model
@@ -187,7 +189,9 @@ class OneGNodeB(Resource):
 class StartGNodeB(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.gnb_service = GNodeBService(Host(), gnodeb_service_handler)
+        self.gnb_service = GNodeBService(
+            service_registry.host(), gnodeb_service_handler
+        )
 
     @namespace.response(HTTPStatus.OK.value, "gNodeB started")
     @namespace.response(
@@ -225,7 +229,9 @@ class StartGNodeB(Resource):
 class StopGNodeB(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.gnb_service = GNodeBService(Host(), gnodeb_service_handler)
+        self.gnb_service = GNodeBService(
+            service_registry.host(), gnodeb_service_handler
+        )
 
     @namespace.response(HTTPStatus.OK.value, "gNodeB stopped")
     @namespace.response(
@@ -260,7 +266,9 @@ class StopGNodeB(Resource):
 class StatusGNodeB(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.gnb_service = GNodeBService(Host(), gnodeb_service_handler)
+        self.gnb_service = GNodeBService(
+            service_registry.host(), gnodeb_service_handler
+        )
 
     @namespace.response(
         HTTPStatus.OK.value,
@@ -14,32 +14,39 @@
    limitations under the License.
 """
 from http import HTTPStatus
-from typing import Dict, Optional
+from typing import Optional, Type
 
 from flask import request  # type: ignore
 from flask_restx import Namespace, Resource  # type: ignore
 from pydantic import ValidationError
 from werkzeug.exceptions import BadRequest  # type: ignore
 
-from nfv_test_api.host import Host, NamespaceHost
 from nfv_test_api.v2.controllers.common import add_model_schema
 from nfv_test_api.v2.data.common import InputOptionalSafeName, InputSafeName
 from nfv_test_api.v2.data.interface import (
     Interface,
+    InterfaceBulkCreate,
     InterfaceCreate,
+    InterfaceQuery,
     InterfaceUpdate,
     LinkInfo,
 )
+from nfv_test_api.v2.data.interface_stats import InterfaceStats, InterfaceStatsQuery
 from nfv_test_api.v2.services.bond_interface import BondInterfaceService
+from nfv_test_api.v2.services.bulk_interface import BulkInterfaceService
 from nfv_test_api.v2.services.interface import InterfaceService
+from nfv_test_api.v2.services.interface_stats import InterfaceStatsService
 from nfv_test_api.v2.services.namespace import NamespaceService
+from nfv_test_api.v2.services.registry import service_registry
 from nfv_test_api.v2.services.vlan_interface import VlanInterfaceService
 
 namespace = Namespace(name="interfaces", description="Basic interface management")
 
 interface_model = add_model_schema(namespace, Interface)
 interface_create_model = add_model_schema(namespace, InterfaceCreate)
+interface_bulk_create_model = add_model_schema(namespace, InterfaceBulkCreate)
 interface_update_model = add_model_schema(namespace, InterfaceUpdate)
+interface_stats_model = add_model_schema(namespace, InterfaceStats)
 
 
 @namespace.route("")
@@ -54,22 +61,16 @@ class AllInterfaces(Resource):
     With it you can either get them all, or create a new one in that scope.
     """
 
-    def __init__(self, api=None, *args: object, **kwargs: object):
-        super().__init__(api=api, *args, **kwargs)
-        self._default_host = Host()
-        self._hosts: Dict[str, Host] = dict()
+    def get_service(
+        self,
+        ns_name: Optional[str],
+        service_type: Type[InterfaceService] = InterfaceService,
+    ) -> InterfaceService:
+        if ns_name:
+            # Ensuring the namespace exists
+            service_registry.service(NamespaceService).get_one(ns_name)
 
-    def get_host(self, ns_name: Optional[str]) -> Host:
-        if not ns_name:
-            return self._default_host
-
-        # Ensuring the namespace exists
-        NamespaceService(self._default_host).get_one(ns_name)
-
-        if ns_name not in self._hosts:
-            self._hosts[ns_name] = NamespaceHost(ns_name)
-
-        return self._hosts[ns_name]
+        return service_registry.service(service_type, ns_name)
 
     @namespace.response(
         code=HTTPStatus.OK.value,
@@ -77,19 +78,44 @@ class AllInterfaces(Resource):
         model=interface_model,
         as_list=True,
     )
+    @namespace.response(
+        HTTPStatus.NOT_FOUND.value,
+        "The master of the selected interfaces doesn't exist",
+    )
+    @namespace.param("kind", description="Only get the interfaces of this kind")
+    @namespace.param(
+        "oper_state", description="Only get the interfaces in this operational state"
+    )
+    @namespace.param("master", description="Only get the slaves of this interface")
+    @namespace.param(
+        "name_prefix", description="Only get the interfaces whose name starts with it"
+    )
+    @namespace.param(
+        "fields",
+        description="The fields to return for each interface, comma separated",
+    )
     def get(self, ns_name: Optional[str] = None):
         """
         Get all interfaces on the host
+
+        The interfaces can be selected on their kind, state, master and name.  The
+        selection is done by the kernel where it can.
         """
         try:
             # Validating input
             InputOptionalSafeName(name=ns_name)
+            query = InterfaceQuery(**request.args.to_dict())  # type: ignore
         except ValidationError as e:
             raise BadRequest(str(e))
 
+        interfaces = self.get_service(ns_name).get_all(
+            link_filter=query.link_filter(), addresses=query.needs_addresses()
+        )
         return [
-            interface.json_dict()
-            for interface in InterfaceService(self.get_host(ns_name)).get_all()
+            interface.json_dict(
+                include=set(query.fields) if query.fields is not None else None
+            )
+            for interface in interfaces
         ], HTTPStatus.OK
 
     @namespace.expect(interface_create_model)
@@ -113,12 +139,13 @@ class AllInterfaces(Resource):
         except ValidationError as e:
             raise BadRequest(str(e))
 
-        host = self.get_host(ns_name)
-        interface_service = InterfaceService(host)
+        service_type: Type[InterfaceService] = InterfaceService
         if create_form.type == LinkInfo.Kind.BOND:
-            interface_service = BondInterfaceService(host)
+            service_type = BondInterfaceService
         if create_form.type == LinkInfo.Kind.VLAN:
-            interface_service = VlanInterfaceService(host)
+            service_type = VlanInterfaceService
+
+        interface_service = self.get_service(ns_name, service_type)
 
         return interface_service.create(create_form).json_dict(), HTTPStatus.CREATED
 
@@ -139,6 +166,71 @@ class AllInterfacesInNamespace(AllInterfaces):
     """
 
 
+@namespace.route("/bulk")
+@namespace.response(
+    code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    description="An error occurred when trying to process the request, this can also be because of bad input from the user",
+)
+class BulkInterfaces(Resource):
+    """
+    The scope of this controller is many new interfaces that are not in a namespace.
+
+    With it you can create them all at once.
+    """
+
+    @namespace.expect(interface_bulk_create_model)
+    @namespace.response(
+        HTTPStatus.CREATED.value,
+        "All the interfaces have been created",
+        interface_model,
+        as_list=True,
+    )
+    @namespace.response(
+        HTTPStatus.CONFLICT.value,
+        "Some interfaces have the same name as existing ones, or as each other",
+    )
+    def post(self, ns_name: Optional[str] = None):
+        """
+        Create many interfaces on the host
+
+        The interfaces are all checked before any of them is created, and then created in
+        order, in one batch.  Vlan interfaces can also be given as ranges, e.g.
+        eth0.100-eth0.499.  If any of them can not be created, none of them is.
+        """
+        try:
+            # Validating input
+            InputOptionalSafeName(name=ns_name)
+            bulk_create_form = InterfaceBulkCreate(**request.json)  # type: ignore
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        if ns_name:
+            # Ensuring the namespace exists
+            service_registry.service(NamespaceService).get_one(ns_name)
+
+        interface_service = service_registry.service(BulkInterfaceService, ns_name)
+        return [
+            interface.json_dict()
+            for interface in interface_service.create_many(bulk_create_form)
+        ], HTTPStatus.CREATED
+
+
+@namespace.route("/ns/<ns_name>/bulk")
+@namespace.param(
+    "ns_name", description="The name of the namespace in which interfaces belong"
+)
+class BulkInterfacesInNamespace(BulkInterfaces):
+    """
+    The scope of this controller is many new interfaces that are in a namespace.
+
+    With it you can create them all at once.
+
+    This class is strictly equivalent to its parent one, the reason we extend it is to support
+    multiple route on the same class in the generated documentation:
+    https://github.com/noirbizarre/flask-restplus/issues/288
+    """
+
+
 @namespace.route("/<name>")
 @namespace.param("name", description="The name of the interface we mean to select")
 @namespace.response(
@@ -152,19 +244,8 @@ class OneInterface(Resource):
     With it you can either get it, update it or delete it.
     """
 
-    def __init__(self, api=None, *args: object, **kwargs: object):
-        super().__init__(api=api, *args, **kwargs)
-        self._default_service = InterfaceService(Host())
-        self._interface_services: Dict[str, InterfaceService] = dict()
-
     def get_service(self, ns_name: Optional[str]) -> InterfaceService:
-        if not ns_name:
-            return self._default_service
-
-        if ns_name not in self._interface_services:
-            self._interface_services[ns_name] = InterfaceService(NamespaceHost(ns_name))
-
-        return self._interface_services[ns_name]
+        return service_registry.service(InterfaceService, ns_name)
 
     @namespace.response(
         HTTPStatus.OK.value, "Found an interface with a matching name", interface_model
@@ -247,3 +328,74 @@ class OneInterfaceInNamespace(OneInterface):
     multiple route on the same class in the generated documentation:
     https://github.com/noirbizarre/flask-restplus/issues/288
     """
+
+
+@namespace.route("/<name>/stats")
+@namespace.param("name", description="The name of the interface we mean to select")
+@namespace.response(
+    code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    description="An error occurred when trying to process the request, this can also be because of bad input from the user",
+)
+class InterfaceStatistics(Resource):
+    """
+    The scope of this controller is the counters of any interface that is not in a
+    namespace.
+
+    With it you can get them, and the rates of the interface.
+    """
+
+    @namespace.response(
+        HTTPStatus.OK.value,
+        "The counters and rates of the interface",
+        interface_stats_model,
+    )
+    @namespace.response(
+        HTTPStatus.NOT_FOUND.value, "Couldn't find any interface with given name"
+    )
+    @namespace.param(
+        "windows",
+        description="The windows to compute the rates over, in seconds, comma separated",
+    )
+    def get(self, name: str, ns_name: Optional[str] = None):
+        """
+        Get the counters of an interface on the host
+
+        The interface is identified by its name.  The counters of all the interfaces are
+        sampled in the background from the first request on, the rates are computed from
+        these samples.  They are empty until there are two samples, and cover less than
+        the window until the interface has been sampled for that long.
+        """
+        try:
+            # Validating input
+            InputSafeName(name=name)
+            InputOptionalSafeName(name=ns_name)
+            query = InterfaceStatsQuery(**request.args.to_dict())  # type: ignore
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        if ns_name:
+            # Ensuring the namespace exists
+            service_registry.service(NamespaceService).get_one(ns_name)
+
+        return (
+            service_registry.service(InterfaceStatsService, ns_name)
+            .get_stats(name, query.windows)
+            .json_dict(),
+            HTTPStatus.OK,
+        )
+
+
+@namespace.route("/ns/<ns_name>/<name>/stats")
+@namespace.param(
+    "ns_name", description="The name of the namespace in which interfaces belong"
+)
+class InterfaceStatisticsInNamespace(InterfaceStatistics):
+    """
+    The scope of this controller is the counters of any interface that is in a namespace.
+
+    With it you can get them, and the rates of the interface.
+
+    This class is strictly equivalent to its parent one, the reason we extend it is to support
+    multiple route on the same class in the generated documentation:
+    https://github.com/noirbizarre/flask-restplus/issues/288
+    """
@@ -0,0 +1,58 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from http import HTTPStatus
+
+from flask_restx import Namespace, Resource  # type: ignore
+
+from nfv_test_api.v2.controllers.common import add_model_schema
+from nfv_test_api.v2.data.inventory import Inventory
+from nfv_test_api.v2.services.inventory import InventoryService
+from nfv_test_api.v2.services.registry import service_registry
+
+namespace = Namespace(
+    name="inventory", description="Interfaces and routes of all the namespaces"
+)
+
+inventory_model = add_model_schema(namespace, Inventory)
+
+
+@namespace.route("")
+@namespace.response(
+    code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    description="An error occurred when trying to process the request, this can also be because of bad input from the user",
+)
+class AllInventory(Resource):
+    """
+    The scope of this controller is the host and all of its namespaces.
+    """
+
+    def __init__(self, api=None, *args, **kwargs):
+        super().__init__(api=api, *args, **kwargs)
+        self.service = service_registry.service(InventoryService)
+
+    @namespace.response(
+        code=HTTPStatus.OK.value,
+        description="The interfaces and routes of the host and of each namespace",
+        model=inventory_model,
+    )
+    def get(self):
+        """
+        Get the interfaces and routes of the host and of all its namespaces
+
+        The namespaces are read in parallel.  A namespace which can not be read has an
+        error instead of its interfaces and routes.
+        """
+        return self.service.get().json_dict(), HTTPStatus.OK
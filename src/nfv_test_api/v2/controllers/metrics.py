@@ -0,0 +1,198 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import os
+import socket
+from http import HTTPStatus
+from typing import Dict, List, Optional, Union
+
+from flask import Response  # type: ignore
+from flask_restx import Namespace, Resource  # type: ignore
+
+from nfv_test_api.metrics import PrometheusText, exec_metrics, request_metrics
+from nfv_test_api.netlink import NETNS_RUN_DIR
+from nfv_test_api.v2.controllers.enodeb import enodeb_service_handler
+from nfv_test_api.v2.controllers.gnodeb import gnodeb_service_handler
+from nfv_test_api.v2.controllers.ue_4g import (
+    ue_service_handler as ue_4g_service_handler,
+)
+from nfv_test_api.v2.controllers.ue_5g import (
+    ue_service_handler as ue_5g_service_handler,
+)
+from nfv_test_api.v2.services.enodeb import ENodeBServiceHandler
+from nfv_test_api.v2.services.gnodeb import GNodeBServiceHandler
+from nfv_test_api.v2.services.registry import service_registry
+from nfv_test_api.v2.services.ue_4g import UEServiceHandler as UE4GServiceHandler
+from nfv_test_api.v2.services.ue_5g import UEServiceHandler as UE5GServiceHandler
+
+LOGGER = logging.getLogger(__name__)
+
+namespace = Namespace(name="metrics", description="Metrics in the prometheus format")
+
+PROCESS_HANDLERS: Dict[
+    str,
+    Union[
+        GNodeBServiceHandler,
+        UE5GServiceHandler,
+        ENodeBServiceHandler,
+        UE4GServiceHandler,
+    ],
+] = {
+    "gnodeb": gnodeb_service_handler,
+    "ue": ue_5g_service_handler,
+    "enodeb": enodeb_service_handler,
+    "ue_4g": ue_4g_service_handler,
+}
+
+ROUTE_FAMILIES = {"inet": socket.AF_INET, "inet6": socket.AF_INET6}
+
+
+def namespace_names() -> List[str]:
+    try:
+        return sorted(os.listdir(NETNS_RUN_DIR))
+    except FileNotFoundError:
+        return []
+
+
+def write_network_counts(metrics: PrometheusText, namespaces: List[str]) -> None:
+    """
+    Write the count of interfaces and routes of the host and of every namespace which has a
+    state cache.  The caches only dump what changed since the previous scrape.  A scrape
+    doesn't create any cache, the namespaces without one are not counted.
+    """
+    interfaces: Dict[str, int] = {}
+    routes: Dict[str, Dict[str, int]] = {}
+    state_caches = service_registry.state_caches()
+    scope: Optional[str]
+    for scope in [None, *namespaces]:
+        state_cache = state_caches.get(scope)
+        if state_cache is None:
+            continue
+
+        try:
+            interfaces[scope or ""] = state_cache.link_count()
+            routes[scope or ""] = {
+                family_name: state_cache.route_count(family)
+                for family_name, family in ROUTE_FAMILIES.items()
+            }
+        except OSError as e:
+            # The namespace has been deleted in the meantime
+            LOGGER.debug("Failed to count the interfaces of %s: %s", scope, e)
+
+    metrics.declare(
+        "nfv_test_api_interfaces",
+        "gauge",
+        "The number of interfaces per namespace with a state cache.",
+    )
+    for scope_name, count in interfaces.items():
+        metrics.sample("nfv_test_api_interfaces", {"namespace": scope_name}, count)
+
+    metrics.declare(
+        "nfv_test_api_routes",
+        "gauge",
+        "The number of routes in the main table per namespace with a state cache and "
+        "family.",
+    )
+    for scope_name, counts in routes.items():
+        for family_name, count in counts.items():
+            metrics.sample(
+                "nfv_test_api_routes",
+                {"namespace": scope_name, "family": family_name},
+                count,
+            )
+
+
+def render_metrics() -> str:
+    metrics = PrometheusText()
+
+    metrics.declare(
+        "nfv_test_api_request_duration_seconds",
+        "histogram",
+        "The duration of the requests, per api namespace, method and status code.",
+    )
+    for (api_namespace, method, code), duration in request_metrics.snapshot():
+        metrics.histogram(
+            "nfv_test_api_request_duration_seconds",
+            {"api_namespace": api_namespace, "method": method, "code": code},
+            duration,
+        )
+
+    snapshot = exec_metrics.snapshot()
+    metrics.declare(
+        "nfv_test_api_exec_duration_seconds",
+        "histogram",
+        "The duration of the commands and netlink calls, per family, namespace and status.",
+    )
+    for (family, scope, status), duration, _ in snapshot:
+        metrics.histogram(
+            "nfv_test_api_exec_duration_seconds",
+            {"family": family, "namespace": scope, "status": status},
+            duration,
+        )
+
+    metrics.declare(
+        "nfv_test_api_exec_output_bytes",
+        "histogram",
+        "The size of the output of the commands and netlink calls, per family, namespace "
+        "and status.",
+    )
+    for (family, scope, status), _, size in snapshot:
+        if not size.count:
+            # The reads served from a state cache don't have any output
+            continue
+
+        metrics.histogram(
+            "nfv_test_api_exec_output_bytes",
+            {"family": family, "namespace": scope, "status": status},
+            size,
+        )
+
+    metrics.declare(
+        "nfv_test_api_processes",
+        "gauge",
+        "The number of processes started by the api which are still running.",
+    )
+    for service, handler in PROCESS_HANDLERS.items():
+        running = sum(
+            process.poll() is None for process in list(handler.processes.values())
+        )
+        metrics.sample("nfv_test_api_processes", {"service": service}, running)
+
+    namespaces = namespace_names()
+    metrics.declare(
+        "nfv_test_api_namespaces", "gauge", "The number of network namespaces."
+    )
+    metrics.sample("nfv_test_api_namespaces", {}, len(namespaces))
+    write_network_counts(metrics, namespaces)
+
+    return metrics.render()
+
+
+@namespace.route("")
+class Metrics(Resource):
+    """
+    The scope of this controller is all the metrics of the api.
+    """
+
+    @namespace.response(
+        code=HTTPStatus.OK.value,
+        description="All the metrics, in the prometheus text format",
+    )
+    def get(self):
+        """
+        Get all the metrics
+        """
+        return Response(render_metrics(), content_type=PrometheusText.CONTENT_TYPE)
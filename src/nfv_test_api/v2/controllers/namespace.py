@@ -21,16 +21,36 @@ from flask_restx import Resource
 from pydantic import ValidationError
 from werkzeug.exceptions import BadRequest  # type: ignore
 
-from nfv_test_api.host import Host
 from nfv_test_api.v2.controllers.common import add_model_schema
 from nfv_test_api.v2.data.common import InputSafeName
-from nfv_test_api.v2.data.namespace import Namespace, NamespaceCreate
+from nfv_test_api.v2.data.namespace import (
+    Namespace,
+    NamespaceBulkDelete,
+    NamespaceBulkDeleteResult,
+    NamespaceCreate,
+)
+from nfv_test_api.v2.data.namespace_state import NamespaceState, NamespaceStateApplied
+from nfv_test_api.v2.data.namespace_template import (
+    NamespaceTemplate,
+    NamespaceTemplateApplied,
+)
+from nfv_test_api.v2.services.bulk_namespace import BulkNamespaceService
 from nfv_test_api.v2.services.namespace import NamespaceService
+from nfv_test_api.v2.services.namespace_state import apply_namespace_state
+from nfv_test_api.v2.services.namespace_template import NamespaceTemplateService
+from nfv_test_api.v2.services.registry import service_registry
 
 namespace = ApiNamespace(name="namespaces", description="Basic namespace management")
 
 namespace_model = add_model_schema(namespace, Namespace)
 namespace_create_model = add_model_schema(namespace, NamespaceCreate)
+namespace_bulk_delete_result_model = add_model_schema(
+    namespace, NamespaceBulkDeleteResult
+)
+namespace_state_model = add_model_schema(namespace, NamespaceState)
+namespace_state_applied_model = add_model_schema(namespace, NamespaceStateApplied)
+namespace_template_model = add_model_schema(namespace, NamespaceTemplate)
+namespace_template_applied_model = add_model_schema(namespace, NamespaceTemplateApplied)
 
 
 @namespace.route("")
@@ -47,8 +67,8 @@ class AllNamespaces(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.host = Host()
-        self.service = NamespaceService(self.host)
+        self.host = service_registry.host()
+        self.service = service_registry.service(NamespaceService)
 
     @namespace.response(
         code=HTTPStatus.OK.value,
@@ -85,6 +105,48 @@ class AllNamespaces(Resource):
             raise BadRequest(str(e))
         return self.service.create(create_form).json_dict(), HTTPStatus.CREATED
 
+    @namespace.param(
+        "names", description="The names of the namespaces to delete, comma separated"
+    )
+    @namespace.param(
+        "name_prefix", description="Delete the namespaces whose name starts with this"
+    )
+    @namespace.param(
+        "grace_period",
+        description="How long the processes of a namespace have to stop before they "
+        "are killed, in seconds (5 by default)",
+    )
+    @namespace.response(
+        HTTPStatus.OK.value,
+        "The selected namespaces don't exist anymore",
+        namespace_bulk_delete_result_model,
+    )
+    @namespace.response(
+        HTTPStatus.UNPROCESSABLE_ENTITY.value,
+        "Some namespaces couldn't be deleted, the others have been",
+        namespace_bulk_delete_result_model,
+    )
+    def delete(self):
+        """
+        Delete many namespaces from the host
+
+        The namespaces are selected by name, by prefix, or both.  They are torn down a few
+        at the same time: the processes running in a namespace are asked to stop, and
+        killed if they are still running after the grace period, its veths are deleted,
+        then it is unmounted and deleted.  The namespaces which don't exist are ignored.
+        """
+        try:
+            query = NamespaceBulkDelete(**request.args.to_dict())  # type: ignore
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        result = service_registry.service(BulkNamespaceService).delete_many(query)
+        return result.json_dict(), (
+            HTTPStatus.UNPROCESSABLE_ENTITY
+            if any(deleted.error is not None for deleted in result.namespaces)
+            else HTTPStatus.OK
+        )
+
 
 @namespace.route("/<name>")
 @namespace.param("name", description="The name of the namespace we mean to select")
@@ -101,8 +163,8 @@ class OneNamespace(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.host = Host()
-        self.service = NamespaceService(self.host)
+        self.host = service_registry.host()
+        self.service = service_registry.service(NamespaceService)
 
     @namespace.response(
         HTTPStatus.OK.value, "Found a namespace with a matching name", namespace_model
@@ -137,3 +199,87 @@ class OneNamespace(Resource):
             raise BadRequest(str(e))
 
         self.service.delete(name)
+
+
+@namespace.route("/<name>/state")
+@namespace.param("name", description="The name of the namespace we mean to select")
+@namespace.response(
+    code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    description="An error occurred when trying to process the request, this can also be because of bad input from the user",
+)
+class NamespaceStateResource(Resource):
+    """
+    The scope of this controller is the interfaces and routes of any namespace on the host.
+
+    With it you can bring them to a desired state.
+    """
+
+    @namespace.expect(namespace_state_model)
+    @namespace.response(
+        HTTPStatus.OK.value,
+        "The namespace is in the desired state",
+        namespace_state_applied_model,
+    )
+    def put(self, name: str):
+        """
+        Set the interfaces and routes of a namespace
+
+        The namespace is created if it doesn't exist.  Its current state is read once and
+        compared to the desired one, only the differences are applied, in one batch.  The
+        whole state is checked before changing anything, if a change fails, the other ones
+        are still applied, and applying the state again retries the missing ones.
+        """
+        try:
+            InputSafeName(name=name)
+            state = NamespaceState(**request.json)  # type: ignore
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        return apply_namespace_state(name, state).json_dict(), HTTPStatus.OK
+
+
+@namespace.route("/template")
+@namespace.response(
+    code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    description="An error occurred when trying to process the request, this can also be because of bad input from the user",
+)
+class NamespaceTemplateResource(Resource):
+    """
+    The scope of this controller is many copies of a namespace on the host.
+
+    With it you can create them, with their interfaces and routes, from a blueprint.
+    """
+
+    @namespace.expect(namespace_template_model)
+    @namespace.response(
+        HTTPStatus.OK.value,
+        "All the copies are in the desired state",
+        namespace_template_applied_model,
+    )
+    @namespace.response(
+        HTTPStatus.UNPROCESSABLE_ENTITY.value,
+        "Some copies couldn't be brought to the desired state, the others have been",
+        namespace_template_applied_model,
+    )
+    def put(self):
+        """
+        Instantiate a namespace template
+
+        The name, the state and the parent interfaces of the template are rendered for
+        each copy, with its index, its name and its subnet in each address pool.  All the
+        copies are checked before changing anything.  The missing namespaces are added in
+        one batch, the parent interfaces of all the copies are brought to their desired
+        state in another one, then the state of each copy is applied, a few copies at the
+        same time.  Applying a template again only applies what changed.
+        """
+        try:
+            template = NamespaceTemplate(**request.json)  # type: ignore
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        result = service_registry.service(NamespaceTemplateService).apply(template)
+        return result.json_dict(), (
+            HTTPStatus.UNPROCESSABLE_ENTITY
+            if any(copy.error is not None for copy in result.copies)
+            else HTTPStatus.OK
+        )
@@ -0,0 +1,210 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from http import HTTPStatus
+from typing import Optional
+
+from flask import request  # type: ignore
+from flask_restx import Namespace, Resource  # type: ignore
+from pydantic import ValidationError
+from werkzeug.exceptions import BadRequest  # type: ignore
+
+from nfv_test_api.v2.controllers.common import add_model_schema
+from nfv_test_api.v2.data.common import InputOptionalSafeName
+from nfv_test_api.v2.data.nexthop import Nexthop, NexthopCreate, NexthopUpdate
+from nfv_test_api.v2.services.namespace import NamespaceService
+from nfv_test_api.v2.services.nexthop import NexthopService
+from nfv_test_api.v2.services.registry import service_registry
+
+namespace = Namespace(
+    name="nexthops", description="Nexthop objects, shared by many routes"
+)
+
+nexthop_model = add_model_schema(namespace, Nexthop)
+nexthop_create_model = add_model_schema(namespace, NexthopCreate)
+nexthop_update_model = add_model_schema(namespace, NexthopUpdate)
+
+
+def get_service(ns_name: Optional[str]) -> NexthopService:
+    try:
+        # Validating input
+        InputOptionalSafeName(name=ns_name)
+    except ValidationError as e:
+        raise BadRequest(str(e))
+
+    if ns_name:
+        # Ensuring the namespace exists
+        service_registry.service(NamespaceService).get_one(ns_name)
+
+    return service_registry.service(NexthopService, ns_name)
+
+
+@namespace.route("")
+@namespace.response(
+    code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    description="An error occurred when trying to process the request, this can also be because of bad input from the user",
+)
+class AllNexthops(Resource):
+    """
+    The scope of this controller is all the nexthop objects that are not in a namespace.
+
+    With it you can either get them all, or create a new one in that scope.
+    """
+
+    @namespace.response(
+        code=HTTPStatus.OK.value,
+        description="Get all nexthop objects on the host",
+        model=nexthop_model,
+        as_list=True,
+    )
+    def get(self, ns_name: Optional[str] = None):
+        """
+        Get all nexthop objects on the host
+        """
+        return [
+            nexthop.json_dict() for nexthop in get_service(ns_name).get_all()
+        ], HTTPStatus.OK
+
+    @namespace.expect(nexthop_create_model)
+    @namespace.response(
+        HTTPStatus.CREATED.value, "A new nexthop object has been created", nexthop_model
+    )
+    @namespace.response(
+        HTTPStatus.CONFLICT.value,
+        "Another nexthop object with the same id already exists",
+    )
+    @namespace.response(
+        HTTPStatus.UNPROCESSABLE_ENTITY.value,
+        "Couldn't create the nexthop object because of invalid input",
+    )
+    def post(self, ns_name: Optional[str] = None):
+        """
+        Create a nexthop object on the host
+
+        Routes use it with their nhid.  The nexthop object is identified by its id, if
+        another one with the same id already exists, a conflict error is raised.
+        """
+        try:
+            create_form = NexthopCreate(**request.json)  # type: ignore
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        return (
+            get_service(ns_name).create(create_form).json_dict(),
+            HTTPStatus.CREATED,
+        )
+
+
+@namespace.route("/ns/<ns_name>")
+@namespace.param(
+    "ns_name", description="The name of the namespace in which nexthop objects belong"
+)
+class AllNexthopsInNamespace(AllNexthops):
+    """
+    The scope of this controller is all the nexthop objects that are in a namespace.
+
+    With it you can either get them all, or create a new one in that scope.
+
+    This class is strictly equivalent to its parent one, the reason we extend it is to support
+    multiple route on the same class in the generated documentation:
+    https://github.com/noirbizarre/flask-restplus/issues/288
+    """
+
+
+@namespace.route("/<int:nexthop_id>")
+@namespace.param("nexthop_id", description="The id of the nexthop object")
+@namespace.response(
+    code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    description="An error occurred when trying to process the request, this can also be because of bad input from the user",
+)
+class OneNexthop(Resource):
+    """
+    The scope of this controller is any nexthop object that is not in a namespace.
+
+    With it you can get it, update it or delete it.
+    """
+
+    @namespace.response(
+        HTTPStatus.OK.value, "Found a nexthop object with a matching id", nexthop_model
+    )
+    @namespace.response(
+        HTTPStatus.NOT_FOUND.value, "Couldn't find any nexthop object with given id"
+    )
+    def get(self, nexthop_id: int, ns_name: Optional[str] = None):
+        """
+        Get a nexthop object on the host
+        """
+        return (
+            get_service(ns_name).get_one(str(nexthop_id)).json_dict(exclude_none=True),
+            HTTPStatus.OK,
+        )
+
+    @namespace.expect(nexthop_update_model)
+    @namespace.response(
+        HTTPStatus.OK.value, "The nexthop object has been updated", nexthop_model
+    )
+    @namespace.response(
+        HTTPStatus.NOT_FOUND.value, "Couldn't find any nexthop object with given id"
+    )
+    @namespace.response(
+        HTTPStatus.UNPROCESSABLE_ENTITY.value,
+        "Couldn't update the nexthop object because of invalid input",
+    )
+    def patch(self, nexthop_id: int, ns_name: Optional[str] = None):
+        """
+        Update a nexthop object on the host
+
+        All the routes using it, directly or through a group, send their traffic to its
+        new gateway and device at once.
+        """
+        try:
+            update_form = NexthopUpdate(**request.json)  # type: ignore
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        return (
+            get_service(ns_name)
+            .update(str(nexthop_id), update_form)
+            .json_dict(exclude_none=True),
+            HTTPStatus.OK,
+        )
+
+    @namespace.response(HTTPStatus.OK.value, "The nexthop object doesn't exist anymore")
+    def delete(self, nexthop_id: int, ns_name: Optional[str] = None):
+        """
+        Delete a nexthop object from the host
+
+        The routes using it are deleted along with it, and it is removed from the groups
+        it is a member of.  This method is idempotent, if the nexthop object doesn't exist
+        it won't try to delete it again, and consider the deletion successful.
+        """
+        get_service(ns_name).delete(str(nexthop_id))
+
+
+@namespace.route("/ns/<ns_name>/<int:nexthop_id>")
+@namespace.param(
+    "ns_name",
+    description="The name of the namespace in which the nexthop object belongs",
+)
+class OneNexthopInNamespace(OneNexthop):
+    """
+    The scope of this controller is any nexthop object that is in a namespace.
+
+    With it you can get it, update it or delete it.
+
+    This class is strictly equivalent to its parent one, the reason we extend it is to support
+    multiple route on the same class in the generated documentation:
+    https://github.com/noirbizarre/flask-restplus/issues/288
+    """
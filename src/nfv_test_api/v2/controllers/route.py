@@ -13,26 +13,105 @@
    See the License for the specific language governing permissions and
    limitations under the License.
 """
+import json
 from http import HTTPStatus
-from typing import Dict, Optional
+from typing import Any, Iterator, List, Optional
 
-from flask import request  # type: ignore
+from flask import Response, request, stream_with_context  # type: ignore
 from flask_restx import Namespace, Resource  # type: ignore
 from pydantic import ValidationError
-from werkzeug.exceptions import BadRequest  # type: ignore
+from werkzeug.exceptions import BadRequest, NotFound  # type: ignore
 
-from nfv_test_api.host import Host, NamespaceHost
-from nfv_test_api.v2.controllers.common import add_model_schema
+from nfv_test_api.v2.controllers.common import NDJSON, add_model_schema
 from nfv_test_api.v2.data.common import InputOptionalSafeName
-from nfv_test_api.v2.data.route import InputDestination, Route, RouteCreate, RouteUpdate
+from nfv_test_api.v2.data.route import (
+    InputDestination,
+    Route,
+    RouteBulkCreateResult,
+    RouteCreate,
+    RouteLookupQuery,
+    RouteLookupResult,
+    RouteQuery,
+    RouteSyncQuery,
+    RouteSyncResult,
+    RouteUpdate,
+)
+from nfv_test_api.v2.services.bulk_route import BulkRouteService
 from nfv_test_api.v2.services.namespace import NamespaceService
+from nfv_test_api.v2.services.registry import service_registry
 from nfv_test_api.v2.services.route import RouteService
+from nfv_test_api.v2.services.route_lookup import RouteLookupService
+from nfv_test_api.v2.services.route_sync import RouteSyncService
 
 namespace = Namespace(name="routes", description="Read routes on the host")
 
 route_model = add_model_schema(namespace, Route)
 route_create_model = add_model_schema(namespace, RouteCreate)
 route_update_model = add_model_schema(namespace, RouteUpdate)
+route_bulk_create_result_model = add_model_schema(namespace, RouteBulkCreateResult)
+route_lookup_query_model = add_model_schema(namespace, RouteLookupQuery)
+route_lookup_result_model = add_model_schema(namespace, RouteLookupResult)
+route_sync_result_model = add_model_schema(namespace, RouteSyncResult)
+
+
+def json_array(routes: Iterator[Route]) -> Iterator[str]:
+    """
+    Write the routes as a json array, a few hundred of them at a time.  If reading them
+    fails, e.g. because ip stopped printing, the error ends the response before the array is
+    closed, so the client can't take it for the complete list.
+    """
+    yield "["
+    chunk: List[str] = []
+    for index, route in enumerate(routes):
+        chunk.append(("," if index else "") + route.json())
+        if len(chunk) == 500:
+            yield "".join(chunk)
+            chunk = []
+
+    yield "".join(chunk) + "]"
+
+
+def bulk_entries() -> List[Any]:
+    """
+    Get the entries of a bulk request, given as a json list, or as newline delimited json
+    which is parsed as it is received.
+    """
+    if request.mimetype != NDJSON:
+        entries = request.get_json(force=True)
+        if not isinstance(entries, list):
+            raise BadRequest("Expected a list of entries")
+
+        return entries
+
+    entries = []
+    for line_number, line in enumerate(request.stream, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            entries.append(json.loads(line))
+        except ValueError as e:
+            raise BadRequest(f"Invalid json on line {line_number}: {e}")
+
+    return entries
+
+
+def route_entries() -> List[RouteCreate]:
+    """
+    Get the routes of a bulk request, they are all validated before any of them is used.
+    """
+    routes: List[RouteCreate] = []
+    invalid_entries: List[str] = []
+    for index, entry in enumerate(bulk_entries()):
+        try:
+            routes.append(RouteCreate(**entry))  # type: ignore
+        except (TypeError, ValidationError) as e:
+            invalid_entries.append(f"Route {index}: {e}")
+
+    if invalid_entries:
+        raise BadRequest("\n".join(invalid_entries))
+
+    return routes
 
 
 @namespace.route("")
@@ -47,22 +126,12 @@ class AllRoutes(Resource):
     With it you can get them all.
     """
 
-    def __init__(self, api=None, *args: object, **kwargs: object):
-        super().__init__(api=api, *args, **kwargs)
-        self._default_service = RouteService(Host())
-        self._route_services: Dict[str, RouteService] = dict()
-
     def get_service(self, ns_name: Optional[str]) -> RouteService:
-        if not ns_name:
-            return self._default_service
+        if ns_name:
+            # Ensuring the namespace exists
+            service_registry.service(NamespaceService).get_one(ns_name)
 
-        # Ensuring the namespace exists
-        NamespaceService(Host()).get_one(ns_name)
-
-        if ns_name not in self._route_services:
-            self._route_services[ns_name] = RouteService(NamespaceHost(ns_name))
-
-        return self._route_services[ns_name]
+        return service_registry.service(RouteService, ns_name)
 
     @namespace.response(
         code=HTTPStatus.OK.value,
@@ -70,19 +139,46 @@ class AllRoutes(Resource):
         model=route_model,
         as_list=True,
     )
+    @namespace.param(
+        "family", description="The family of the routes: inet (default), inet6 or all"
+    )
+    @namespace.param(
+        "table",
+        description="The table of the routes: main (default), local, default, all or a table id",
+    )
+    @namespace.param("limit", description="The maximum number of routes to return")
+    @namespace.param(
+        "cursor", description="The cursor of the page to get, from the previous page"
+    )
     def get(self, ns_name: Optional[str] = None):
         """
         Get all routes on the host
+
+        By default, the ipv4 routes of the main table are returned.  Without any limit, all
+        the selected routes are streamed as they are read.  With a limit, a page of at most
+        that many routes is returned, and if more routes follow, the cursor of the next
+        page is given in the X-Next-Cursor header.
         """
         try:
             # Validating input
             InputOptionalSafeName(name=ns_name)
+            query = RouteQuery(**request.args.to_dict())  # type: ignore
         except ValidationError as e:
             raise BadRequest(str(e))
 
-        return [
-            route.json_dict() for route in self.get_service(ns_name).get_all()
-        ], HTTPStatus.OK
+        routes, next_key = self.get_service(ns_name).get_page(
+            query.families, query.table_id, query.after, query.limit
+        )
+        if query.limit is None:
+            return Response(
+                stream_with_context(json_array(routes)), content_type="application/json"
+            )
+
+        headers = {}
+        if next_key is not None:
+            headers["X-Next-Cursor"] = RouteQuery.encode_cursor(next_key)
+
+        return [route.json_dict() for route in routes], HTTPStatus.OK, headers
 
     @namespace.expect(route_create_model)
     @namespace.response(
@@ -114,6 +210,52 @@ class AllRoutes(Resource):
             HTTPStatus.CREATED,
         )
 
+    @namespace.expect([route_create_model])
+    @namespace.param(
+        "table", description="The table to sync: main (default), default or a table id"
+    )
+    @namespace.response(
+        HTTPStatus.OK.value,
+        "The routes of the table are the desired ones",
+        route_sync_result_model,
+    )
+    @namespace.response(
+        HTTPStatus.UNPROCESSABLE_ENTITY.value,
+        "Some routes couldn't be synced, the others have been",
+        route_sync_result_model,
+    )
+    def put(self, ns_name: Optional[str] = None):
+        """
+        Set all the routes of a table on the host
+
+        The desired routes are given as a json list, or as newline delimited json (with
+        content type application/x-ndjson).  They are identified by their destination and
+        their metric.  The table is read once, the missing routes are added, the ones
+        which go elsewhere are replaced, and the ones which are not desired anymore are
+        deleted, all in batches.  Only the routes added by the users (protocol boot or
+        static) are deleted.  The source and the mtu of a route are only changed when
+        they are given.  The response lists the destinations of the routes which changed,
+        and why the others couldn't be synced.
+        """
+        try:
+            # Validating input
+            InputOptionalSafeName(name=ns_name)
+            query = RouteSyncQuery(**request.args.to_dict())  # type: ignore
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        routes = route_entries()
+        if ns_name:
+            # Ensuring the namespace exists
+            service_registry.service(NamespaceService).get_one(ns_name)
+
+        result = service_registry.service(RouteSyncService, ns_name).sync(
+            routes, query.table_id
+        )
+        return result.json_dict(), (
+            HTTPStatus.UNPROCESSABLE_ENTITY if result.errors else HTTPStatus.OK
+        )
+
 
 @namespace.route("/ns/<ns_name>")
 @namespace.param(
@@ -131,11 +273,215 @@ class AllRoutesInNamespace(AllRoutes):
     """
 
 
+@namespace.route("/bulk")
+@namespace.response(
+    code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    description="An error occurred when trying to process the request, this can also be because of bad input from the user",
+)
+class BulkRoutes(Resource):
+    """
+    The scope of this controller is many new routes that are not in a namespace.
+
+    With it you can create them all at once.
+    """
+
+    @namespace.expect([route_create_model])
+    @namespace.response(
+        HTTPStatus.CREATED.value,
+        "All the routes have been created",
+        route_bulk_create_result_model,
+    )
+    @namespace.response(
+        HTTPStatus.UNPROCESSABLE_ENTITY.value,
+        "Some routes couldn't be created, the others have been",
+        route_bulk_create_result_model,
+    )
+    def post(self, ns_name: Optional[str] = None):
+        """
+        Create many routes on the host
+
+        The routes are given as a json list, or as newline delimited json (with content type
+        application/x-ndjson).  They are all validated before any of them is created.  The
+        routes whose destination is already used, or whose interface doesn't exist, are not
+        created, all the others are, in batches.  The response only counts them, and
+        reports why each failed route couldn't be created.
+        """
+        try:
+            # Validating input
+            InputOptionalSafeName(name=ns_name)
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        routes = route_entries()
+        if ns_name:
+            # Ensuring the namespace exists
+            service_registry.service(NamespaceService).get_one(ns_name)
+
+        result = service_registry.service(BulkRouteService, ns_name).create_many(routes)
+        return result.json_dict(), (
+            HTTPStatus.UNPROCESSABLE_ENTITY if result.failed else HTTPStatus.CREATED
+        )
+
+
+@namespace.route("/ns/<ns_name>/bulk")
+@namespace.param(
+    "ns_name", description="The name of the namespace in which routes belong"
+)
+class BulkRoutesInNamespace(BulkRoutes):
+    """
+    The scope of this controller is many new routes that are in a namespace.
+
+    With it you can create them all at once.
+
+    This class is strictly equivalent to its parent one, the reason we extend it is to support
+    multiple route on the same class in the generated documentation:
+    https://github.com/noirbizarre/flask-restplus/issues/288
+    """
+
+
+@namespace.route("/lookup")
+@namespace.response(
+    code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    description="An error occurred when trying to process the request, this can also be because of bad input from the user",
+)
+class RouteLookups(Resource):
+    """
+    The scope of this controller is the routes used to reach addresses from outside of any
+    namespace.
+
+    With it you can look many of them up at once.
+    """
+
+    @namespace.expect(route_lookup_query_model)
+    @namespace.response(
+        HTTPStatus.OK.value,
+        "The route used to reach each address",
+        route_lookup_result_model,
+        as_list=True,
+    )
+    def post(self, ns_name: Optional[str] = None):
+        """
+        Look up the routes used to reach many addresses
+
+        Each address is looked up like the kernel does with the default policy routing
+        rules, in the local, main and default tables, with a longest prefix match.  The
+        result of each address is in the same order as the addresses.  If check is set, the
+        kernel is also asked for the route of each address, with `ip route get`.
+        """
+        try:
+            # Validating input
+            InputOptionalSafeName(name=ns_name)
+            query = RouteLookupQuery(**request.json)  # type: ignore
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        if ns_name:
+            # Ensuring the namespace exists
+            service_registry.service(NamespaceService).get_one(ns_name)
+
+        return [
+            result.json_dict(exclude_none=True)
+            for result in service_registry.service(RouteLookupService, ns_name).lookup(
+                query
+            )
+        ], HTTPStatus.OK
+
+
+@namespace.route("/ns/<ns_name>/lookup")
+@namespace.param(
+    "ns_name", description="The name of the namespace in which routes belong"
+)
+class RouteLookupsInNamespace(RouteLookups):
+    """
+    The scope of this controller is the routes used to reach addresses from a namespace.
+
+    With it you can look many of them up at once.
+
+    This class is strictly equivalent to its parent one, the reason we extend it is to support
+    multiple route on the same class in the generated documentation:
+    https://github.com/noirbizarre/flask-restplus/issues/288
+    """
+
+
+@namespace.route("/lookup/<address>")
+@namespace.param("address", description="The address to reach")
+@namespace.response(
+    code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    description="An error occurred when trying to process the request, this can also be because of bad input from the user",
+)
+class OneRouteLookup(Resource):
+    """
+    The scope of this controller is the route used to reach an address from outside of
+    any namespace.
+
+    With it you can look it up.
+    """
+
+    @namespace.param(
+        "check",
+        description="Whether to also ask the kernel for the route, with `ip route get`",
+    )
+    @namespace.response(
+        HTTPStatus.OK.value,
+        "The route used to reach the address",
+        route_lookup_result_model,
+    )
+    @namespace.response(
+        HTTPStatus.NOT_FOUND.value,
+        "There is no route to reach the address in the tables it is looked up in",
+    )
+    def get(self, address: str, ns_name: Optional[str] = None):
+        """
+        Look up the route used to reach an address
+
+        The address is looked up like the kernel does with the default policy routing
+        rules, in the local, main and default tables, with a longest prefix match.
+        """
+        try:
+            # Validating input
+            InputOptionalSafeName(name=ns_name)
+            query = RouteLookupQuery(
+                addresses=[address], **request.args.to_dict()  # type: ignore
+            )
+        except ValidationError as e:
+            raise BadRequest(str(e))
+
+        if ns_name:
+            # Ensuring the namespace exists
+            service_registry.service(NamespaceService).get_one(ns_name)
+
+        result = service_registry.service(RouteLookupService, ns_name).lookup(query)[0]
+        if result.route is None:
+            raise NotFound(f"There is no route to reach {address}")
+
+        return result.json_dict(exclude_none=True), HTTPStatus.OK
+
+
+@namespace.route("/ns/<ns_name>/lookup/<address>")
+@namespace.param(
+    "ns_name", description="The name of the namespace in which routes belong"
+)
+class OneRouteLookupInNamespace(OneRouteLookup):
+    """
+    The scope of this controller is the route used to reach an address from a namespace.
+
+    With it you can look it up.
+
+    This class is strictly equivalent to its parent one, the reason we extend it is to support
+    multiple route on the same class in the generated documentation:
+    https://github.com/noirbizarre/flask-restplus/issues/288
+    """
+
+
 @namespace.route("/<dst_addr>")
 @namespace.param(
     "dst_addr",
     description='The destination ("default" or any address with a prefix length) of the route we mean to select',
 )
+@namespace.param(
+    "family",
+    description="The family of the default route: inet (default) or inet6, the one of the address otherwise",
+)
 @namespace.response(
     code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
     description="An error occurred when trying to process the request, this can also be because of bad input from the user",
@@ -147,19 +493,8 @@ class OneRoute(Resource):
     With it you can get it.
     """
 
-    def __init__(self, api=None, *args: object, **kwargs: object):
-        super().__init__(api=api, *args, **kwargs)
-        self._default_service = RouteService(Host())
-        self._route_services: Dict[str, RouteService] = dict()
-
     def get_service(self, ns_name: Optional[str]) -> RouteService:
-        if not ns_name:
-            return self._default_service
-
-        if ns_name not in self._route_services:
-            self._route_services[ns_name] = RouteService(NamespaceHost(ns_name))
-
-        return self._route_services[ns_name]
+        return service_registry.service(RouteService, ns_name)
 
     @namespace.response(
         HTTPStatus.OK.value, "Found an route with a matching destination", route_model
@@ -183,13 +518,16 @@ class OneRoute(Resource):
             destination = InputDestination(
                 dst_addr=dst_addr,  # type: ignore
                 dst_prefix_len=dst_prefix_len,  # type: ignore
-            ).destination_name
+                family=request.args.get("family"),  # type: ignore
+            )
             InputOptionalSafeName(name=ns_name)
         except ValidationError as e:
             raise BadRequest(str(e))
 
         return (
-            self.get_service(ns_name).get_one(destination).json_dict(exclude_none=True),
+            self.get_service(ns_name)
+            .get_one(destination.destination_name, destination.family_id)
+            .json_dict(exclude_none=True),
             HTTPStatus.OK,
         )
 
@@ -212,14 +550,16 @@ class OneRoute(Resource):
         """
         Update a route on the host
 
-        The route is identified by its destination.
+        The route is identified by its destination.  A default route is the one of the
+        given family, or of the family of the gateways it is updated with.
         """
         try:
             # Validating input
             destination = InputDestination(
                 dst_addr=dst_addr,  # type: ignore
                 dst_prefix_len=dst_prefix_len,  # type: ignore
-            ).destination_name
+                family=request.args.get("family"),  # type: ignore
+            )
             InputOptionalSafeName(name=ns_name)
             update_form = RouteUpdate(**request.json)  # type: ignore
         except ValidationError as e:
@@ -227,7 +567,7 @@ class OneRoute(Resource):
 
         return (
             self.get_service(ns_name)
-            .update(destination, update_form)
+            .update(destination.destination_name, update_form, destination.family_id)
             .json_dict(exclude_none=True),
             HTTPStatus.OK,
         )
@@ -250,12 +590,15 @@ class OneRoute(Resource):
             destination = InputDestination(
                 dst_addr=dst_addr,  # type: ignore
                 dst_prefix_len=dst_prefix_len,  # type: ignore
-            ).destination_name
+                family=request.args.get("family"),  # type: ignore
+            )
             InputOptionalSafeName(name=ns_name)
         except ValidationError as e:
             raise BadRequest(str(e))
 
-        self.get_service(ns_name).delete(destination)
+        self.get_service(ns_name).delete(
+            destination.destination_name, destination.family_id
+        )
 
 
 @namespace.route("/<dst_addr>/<int:dst_prefix_len>")
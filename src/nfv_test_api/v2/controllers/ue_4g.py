@@ -20,10 +20,10 @@ from flask_restx import Namespace, Resource  # type: ignore
 from pydantic import ValidationError
 from werkzeug.exceptions import BadRequest  # type: ignore
 
-from nfv_test_api.host import Host
 from nfv_test_api.v2.controllers.common import add_model_schema
 from nfv_test_api.v2.data.common import InputSafeImsi
 from nfv_test_api.v2.data.ue_4g import UE, UECreate, UEStatus
+from nfv_test_api.v2.services.registry import service_registry
 from nfv_test_api.v2.services.ue_4g import UEService, UEServiceHandler
 
 namespace = Namespace(name="ue_4g", description="Basic 4G user equipment management")
@@ -46,7 +46,7 @@ class AllUE(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self._host = Host()
+        self._host = service_registry.host()
         self.ue_service = UEService(self._host, ue_service_handler)
 
     @namespace.response(
@@ -103,7 +103,7 @@ class OneUE(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.ue_service = UEService(Host(), ue_service_handler)
+        self.ue_service = UEService(service_registry.host(), ue_service_handler)
 
     @namespace.response(
         HTTPStatus.OK.value, "Found a UE config with a matching imsi", ue_model
@@ -183,7 +183,7 @@ class OneUE(Resource):
 class StartUE(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.ue_service = UEService(Host(), ue_service_handler)
+        self.ue_service = UEService(service_registry.host(), ue_service_handler)
 
     @namespace.response(HTTPStatus.OK.value, "UE started")
     @namespace.response(
@@ -221,7 +221,7 @@ class StartUE(Resource):
 class StopUE(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.ue_service = UEService(Host(), ue_service_handler)
+        self.ue_service = UEService(service_registry.host(), ue_service_handler)
 
     @namespace.response(HTTPStatus.OK.value, "UE stopped")
     @namespace.response(
@@ -256,7 +256,7 @@ class StopUE(Resource):
 class StatusUE(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.ue_service = UEService(Host(), ue_service_handler)
+        self.ue_service = UEService(service_registry.host(), ue_service_handler)
 
     @namespace.response(
         HTTPStatus.OK.value,
@@ -20,10 +20,10 @@ from flask_restx import Namespace, Resource  # type: ignore
 from pydantic import ValidationError
 from werkzeug.exceptions import BadRequest  # type: ignore
 
-from nfv_test_api.host import Host
 from nfv_test_api.v2.controllers.common import add_model_schema
 from nfv_test_api.v2.data.common import InputSafeSupi
 from nfv_test_api.v2.data.ue_5g import UE, UECreate, UEStatus
+from nfv_test_api.v2.services.registry import service_registry
 from nfv_test_api.v2.services.ue_5g import UEService, UEServiceHandler
 
 namespace = Namespace(name="ue", description="Basic 5G user equipment management")
@@ -46,7 +46,7 @@ class AllUE(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self._host = Host()
+        self._host = service_registry.host()
         self.ue_service = UEService(self._host, ue_service_handler)
 
     @namespace.response(
@@ -98,7 +98,7 @@ class OneUE(Resource):
 
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.ue_service = UEService(Host(), ue_service_handler)
+        self.ue_service = UEService(service_registry.host(), ue_service_handler)
 
     @namespace.response(
         HTTPStatus.OK.value, "Found a UE config with a matching supi", ue_model
@@ -178,7 +178,7 @@ class OneUE(Resource):
 class StartUE(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.ue_service = UEService(Host(), ue_service_handler)
+        self.ue_service = UEService(service_registry.host(), ue_service_handler)
 
     @namespace.response(HTTPStatus.OK.value, "UE started")
     @namespace.response(
@@ -216,7 +216,7 @@ class StartUE(Resource):
 class StopUE(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.ue_service = UEService(Host(), ue_service_handler)
+        self.ue_service = UEService(service_registry.host(), ue_service_handler)
 
     @namespace.response(HTTPStatus.OK.value, "UE stopped")
     @namespace.response(
@@ -251,7 +251,7 @@ class StopUE(Resource):
 class StatusUE(Resource):
     def __init__(self, api=None, *args, **kwargs):
         super().__init__(api=api, *args, **kwargs)
-        self.ue_service = UEService(Host(), ue_service_handler)
+        self.ue_service = UEService(service_registry.host(), ue_service_handler)
 
     @namespace.response(
         HTTPStatus.OK.value, "Found a UE config with a matching supi", ue_status_model
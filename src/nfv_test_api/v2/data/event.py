@@ -0,0 +1,118 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from enum import Enum
+from typing import Any, List, Optional, Union
+
+from pydantic import validator
+from typing_extensions import Literal
+
+from nfv_test_api.netlink import ROUTE_TABLES
+
+from .base_model import IpBaseModel
+from .common import SafeName
+from .interface import Addr4Info, Addr6Info, Interface
+from .namespace import Namespace
+from .route import Route, check_table_id
+
+
+class EventType(str, Enum):
+    LINK = "link"
+    ADDR = "addr"
+    ROUTE = "route"
+    NETNS = "netns"
+    # The stream is listening, the changes made from then on will be notified
+    READY = "ready"
+    # Some notifications were lost, the state has to be read again
+    OVERFLOW = "overflow"
+    # Nothing happened for a while, the stream is still open
+    HEARTBEAT = "heartbeat"
+
+
+class EventAction(str, Enum):
+    NEW = "new"
+    DEL = "del"
+
+
+class Event(IpBaseModel):
+    """
+    A change in a namespace, as notified by the kernel.  The state of the changed object
+    is the one it had when the notification was sent, or None if it couldn't be parsed.
+    The interface of a link event doesn't have any address, addresses have their own
+    events.
+    """
+
+    type: EventType
+    action: Optional[EventAction]
+    if_name: Optional[SafeName]  # type: ignore
+    interface: Optional[Interface]
+    address: Optional[Union[Addr4Info, Addr6Info]]
+    route: Optional[Route]
+    namespace: Optional[Namespace]
+
+
+class EventQuery(IpBaseModel):
+    """
+    Query parameters selecting the events to stream.  The types are given as a comma
+    separated list, the interface name selects the link, address and route events of that
+    interface, the table selects the route events like it selects the routes of the routes
+    api, and the stream is closed after the timeout, in seconds.
+    """
+
+    types: Optional[List[EventType]]
+    if_name: Optional[SafeName]  # type: ignore
+    table: Union[int, Literal["main", "local", "default", "all"]] = "main"
+    timeout: Optional[float]
+
+    @validator("types", pre=True)
+    def parse_types(cls, v: Any) -> Any:
+        if isinstance(v, str):
+            return [kind.strip() for kind in v.split(",") if kind.strip()]
+
+        return v
+
+    @validator("types", each_item=True)
+    def check_type(cls, v: EventType) -> EventType:
+        if v not in (EventType.LINK, EventType.ADDR, EventType.ROUTE, EventType.NETNS):
+            raise ValueError(f"Can not select the {v.value} events")
+
+        return v
+
+    @validator("table")
+    def check_table(cls, v: Any) -> Any:
+        if isinstance(v, int):
+            check_table_id(v)
+
+        return v
+
+    @validator("timeout")
+    def check_timeout(cls, v: Optional[float]) -> Optional[float]:
+        if v is not None and v <= 0:
+            raise ValueError("The timeout must be positive")
+
+        return v
+
+    @property
+    def table_id(self) -> Optional[int]:
+        """
+        The id of the selected table, None for all of them
+        """
+        if isinstance(self.table, int):
+            return self.table
+
+        if self.table == "all":
+            return None
+
+        return {name: table for table, name in ROUTE_TABLES.items()}[self.table]
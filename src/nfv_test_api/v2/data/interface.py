@@ -13,12 +13,16 @@
    See the License for the specific language governing permissions and
    limitations under the License.
 """
+import re
 from enum import Enum
 from ipaddress import IPv4Address, IPv4Interface, IPv6Address, IPv6Interface
-from typing import List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
+from pydantic import constr, root_validator, validator
 from typing_extensions import Literal
 
+from nfv_test_api.netlink import LinkFilter
+
 from .base_model import IpBaseModel
 from .common import Family, MacAddress, SafeName, Scope
 
@@ -92,9 +96,40 @@ class InterfaceState(str, Enum):
     LOWERLAYERDOWN = "LOWERLAYERDOWN"
 
 
+class BondMode(str, Enum):
+    """
+    The modes of a bond interface, as named by ip
+    """
+
+    BALANCE_RR = "balance-rr"
+    ACTIVE_BACKUP = "active-backup"
+    BALANCE_XOR = "balance-xor"
+    BROADCAST = "broadcast"
+    LACP = "802.3ad"
+    BALANCE_TLB = "balance-tlb"
+    BALANCE_ALB = "balance-alb"
+
+
+class XmitHashPolicy(str, Enum):
+    """
+    The policies a bond interface can select the slave to send a packet on with
+    """
+
+    LAYER2 = "layer2"
+    LAYER3_4 = "layer3+4"
+    LAYER2_3 = "layer2+3"
+    ENCAP2_3 = "encap2+3"
+    ENCAP3_4 = "encap3+4"
+    VLAN_SRCMAC = "vlan+srcmac"
+
+
 class InterfaceCreate(IpBaseModel):
     """
     Input schema for creating an interface
+
+    :param bond_mode: The mode of a bond interface, 802.3ad by default
+    :param miimon: How often the link of the slaves of a bond is checked, in milliseconds
+    :param xmit_hash_policy: How a bond interface selects the slave to send on
     """
 
     name: SafeName  # type: ignore
@@ -105,6 +140,99 @@ class InterfaceCreate(IpBaseModel):
     type: LinkInfo.Kind = LinkInfo.Kind.VETH
     peer: Optional[SafeName]  # type: ignore
     slave_interfaces: Optional[List[SafeName]]  # type: ignore
+    bond_mode: Optional[BondMode]
+    miimon: Optional[int]
+    xmit_hash_policy: Optional[XmitHashPolicy]
+
+    @validator("miimon")
+    def check_miimon(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 0:
+            raise ValueError("The miimon interval can not be negative")
+
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def check_bond_options(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        if values.get("type") == LinkInfo.Kind.BOND:
+            return values
+
+        options = [
+            name
+            for name in ("bond_mode", "miimon", "xmit_hash_policy")
+            if values.get(name) is not None
+        ]
+        if options:
+            raise ValueError(
+                f"{', '.join(options)} can only be set on a bond interface, not on a "
+                f"{values['type'].value} one"
+            )
+
+        return values
+
+
+VLAN_RANGE = re.compile(
+    r"^(?P<parent>[0-9A-Za-z@#$_\-.]{1,16})\.(?P<first>[0-9]{1,4})"
+    r"-(?P=parent)\.(?P<last>[0-9]{1,4})$"
+)
+
+
+class VlanRangeCreate(IpBaseModel):
+    """
+    Input schema for creating a vlan interface for each id of a range, on the same parent
+    interface.  The range is written with the names of its first and last interfaces, e.g.
+    eth0.100-eth0.499
+    """
+
+    range: constr(regex=VLAN_RANGE.pattern)  # type: ignore
+    mtu: Optional[int]
+
+    @validator("range")
+    def check_vlan_ids(cls, v: str) -> str:
+        match = VLAN_RANGE.match(v)
+        assert match is not None
+        first, last = int(match.group("first")), int(match.group("last"))
+        if not 1 <= first <= last <= 4094:
+            raise ValueError(
+                f"The vlan ids of {v} should be increasing, between 1 and 4094"
+            )
+
+        return v
+
+    def interfaces(self) -> List[InterfaceCreate]:
+        match = VLAN_RANGE.match(self.range)
+        assert match is not None
+        parent = match.group("parent")
+        return [
+            InterfaceCreate(  # type: ignore
+                name=f"{parent}.{vlan_id}",
+                parent_dev=parent,
+                mtu=self.mtu,
+                type=LinkInfo.Kind.VLAN,
+            )
+            for vlan_id in range(
+                int(match.group("first")), int(match.group("last")) + 1
+            )
+        ]
+
+
+class InterfaceBulkCreate(IpBaseModel):
+    """
+    Input schema for creating many interfaces at once.  They are created in order, an
+    interface can use one created before it as parent.
+    """
+
+    interfaces: List[InterfaceCreate] = []
+    vlan_ranges: List[VlanRangeCreate] = []
+
+    def all_interfaces(self) -> List[InterfaceCreate]:
+        """
+        All the interfaces to create, the ones of the vlan ranges come last.
+        """
+        interfaces = list(self.interfaces)
+        for vlan_range in self.vlan_ranges:
+            interfaces += vlan_range.interfaces()
+
+        return interfaces
 
 
 class InterfaceUpdate(IpBaseModel):
@@ -146,3 +274,43 @@ class Interface(IpBaseModel):
     link_info: Optional[LinkInfo]
     addr_info: List[Union[Addr4Info, Addr6Info]]
     alt_names: Optional[List[SafeName]]  # type: ignore
+
+
+class InterfaceQuery(IpBaseModel):
+    """
+    Query parameters selecting some of the interfaces, and the fields to return for each of
+    them.  The fields are given as a comma separated list.
+    """
+
+    kind: Optional[LinkInfo.Kind]
+    oper_state: Optional[InterfaceState]
+    master: Optional[SafeName]  # type: ignore
+    name_prefix: Optional[SafeName]  # type: ignore
+    fields: Optional[List[str]]
+
+    @validator("fields", pre=True)
+    def parse_fields(cls, v: Any) -> Any:
+        if not isinstance(v, str):
+            return v
+
+        fields = [field.strip() for field in v.split(",") if field.strip()]
+        names = {name: name for name in Interface.__fields__.keys()}
+        names.update(
+            {field.alias: name for name, field in Interface.__fields__.items()}
+        )
+        unknown = [field for field in fields if field not in names]
+        if unknown:
+            raise ValueError(f"Unknown interface fields: {', '.join(unknown)}")
+
+        return [names[field] for field in fields]
+
+    def link_filter(self) -> LinkFilter:
+        return LinkFilter(
+            kind=self.kind.value if self.kind is not None else None,
+            oper_state=self.oper_state.value if self.oper_state is not None else None,
+            master=self.master,
+            name_prefix=self.name_prefix,
+        )
+
+    def needs_addresses(self) -> bool:
+        return self.fields is None or "addr_info" in self.fields
@@ -0,0 +1,85 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from typing import Any, List, Optional
+
+from pydantic import validator
+
+from .base_model import IpBaseModel
+from .common import SafeName
+
+
+class TrafficCounters(IpBaseModel):
+    """
+    The counters of an interface in one direction, as returned by the `ip -s link` command
+    """
+
+    bytes: int
+    packets: int
+    errors: int
+    dropped: int
+
+
+class LinkStats(IpBaseModel):
+    rx: TrafficCounters
+    tx: TrafficCounters
+
+
+class TrafficRates(IpBaseModel):
+    """
+    The average rates of an interface over a window of time, in packets and bits per
+    second.  The duration is the time the rates are actually computed over, it is shorter
+    than the window when the interface hasn't been sampled for that long yet.
+    """
+
+    window: float
+    duration: float
+    rx_pps: float
+    rx_bps: float
+    tx_pps: float
+    tx_bps: float
+
+
+class InterfaceStats(IpBaseModel):
+    """
+    The counters of an interface, and its rates over the requested windows
+    """
+
+    if_name: SafeName  # type: ignore
+    stats64: LinkStats
+    rates: List[TrafficRates] = []
+
+
+class InterfaceStatsQuery(IpBaseModel):
+    """
+    Query parameters selecting the windows to compute the rates over, in seconds.  The
+    windows are given as a comma separated list.
+    """
+
+    windows: Optional[List[float]]
+
+    @validator("windows", pre=True)
+    def parse_windows(cls, v: Any) -> Any:
+        if isinstance(v, str):
+            v = [window.strip() for window in v.split(",") if window.strip()]
+
+        return v
+
+    @validator("windows", each_item=True)
+    def check_window(cls, v: float) -> float:
+        if v <= 0:
+            raise ValueError("The windows must be positive")
+
+        return v
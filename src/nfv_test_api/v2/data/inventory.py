@@ -0,0 +1,40 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from typing import Dict, List, Optional
+
+from .base_model import IpBaseModel
+from .interface import Interface
+from .route import Route
+
+
+class NamespaceInventory(IpBaseModel):
+    """
+    The interfaces and routes of a namespace, or the error which prevented reading them
+    """
+
+    interfaces: List[Interface] = []
+    routes: List[Route] = []
+    error: Optional[str]
+
+
+class Inventory(IpBaseModel):
+    """
+    The interfaces and routes of the host, outside of any namespace, and of each of its
+    namespaces, by name
+    """
+
+    host_namespace: NamespaceInventory
+    namespaces: Dict[str, NamespaceInventory]
@@ -13,7 +13,9 @@
    See the License for the specific language governing permissions and
    limitations under the License.
 """
-from typing import Optional
+from typing import Any, Dict, List, Optional
+
+from pydantic import root_validator, validator
 
 from .base_model import IpBaseModel
 from .common import SafeName
@@ -43,3 +45,72 @@ class Namespace(IpBaseModel):
 
     name: Optional[SafeName]  # type: ignore
     ns_id: int
+
+
+class NamespaceBulkDelete(IpBaseModel):
+    """
+    Query parameters selecting the namespaces to delete, by name, given as a comma
+    separated list, or by prefix
+
+    :param grace_period: How long the processes of a namespace have to stop once they
+        are asked to, before they are killed, in seconds
+    """
+
+    names: Optional[List[SafeName]]  # type: ignore
+    name_prefix: Optional[SafeName]  # type: ignore
+    grace_period: float = 5
+
+    @validator("names", pre=True)
+    def parse_names(cls, v: Any) -> Any:
+        if not isinstance(v, str):
+            return v
+
+        return [name.strip() for name in v.split(",") if name.strip()]
+
+    @validator("grace_period")
+    def check_grace_period(cls, v: float) -> float:
+        if not 0 <= v <= 60:
+            raise ValueError("The grace period must be between 0 and 60 seconds")
+
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def check_selection(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        if values.get("names") is None and values.get("name_prefix") is None:
+            raise ValueError("The namespaces have to be selected by names or prefix")
+
+        return values
+
+    def selects(self, name: str) -> bool:
+        return (self.names is not None and name in self.names) or (
+            self.name_prefix is not None and name.startswith(self.name_prefix)
+        )
+
+
+class NamespaceProcess(IpBaseModel):
+    """
+    A process which was running in a namespace
+    """
+
+    pid: int
+    name: str
+
+
+class NamespaceDeleted(IpBaseModel):
+    """
+    A namespace of a bulk deletion, the processes which had to be stopped and the veths
+    which were deleted with it, or the error which prevented it
+    """
+
+    name: SafeName  # type: ignore
+    processes: List[NamespaceProcess] = []
+    veths: List[SafeName] = []  # type: ignore
+    error: Optional[str]
+
+
+class NamespaceBulkDeleteResult(IpBaseModel):
+    """
+    The namespaces of a bulk deletion
+    """
+
+    namespaces: List[NamespaceDeleted]
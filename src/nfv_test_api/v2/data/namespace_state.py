@@ -0,0 +1,74 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from ipaddress import IPv4Interface, IPv6Interface
+from typing import List, Optional, Union
+
+from typing_extensions import Literal
+
+from .base_model import IpBaseModel
+from .common import SafeName
+from .interface import Interface, InterfaceCreate, InterfaceState, LinkInfo
+from .route import Route, RouteCreate
+
+
+class InterfaceDesiredState(IpBaseModel):
+    """
+    The desired state of an interface of a namespace.  The type is only needed to create
+    the interface, the peer of a veth can be created in another namespace.  The fields
+    which are not specified are left as they are, except the addresses: an empty list
+    removes them all, but the ipv6 link-local ones which are not listed are always kept.
+    """
+
+    name: SafeName  # type: ignore
+    type: Optional[LinkInfo.Kind]
+    parent_dev: Optional[SafeName]  # type: ignore
+    peer: Optional[SafeName]  # type: ignore
+    peer_netns: Optional[SafeName]  # type: ignore
+    mtu: Optional[int]
+    master: Optional[Union[SafeName, Literal["nomaster"]]]  # type: ignore
+    state: Optional[Union[Literal[InterfaceState.UP], Literal[InterfaceState.DOWN]]]
+    addresses: Optional[List[Union[IPv4Interface, IPv6Interface]]]
+
+    def create_form(self) -> InterfaceCreate:
+        return InterfaceCreate(  # type: ignore
+            name=self.name,
+            type=self.type or LinkInfo.Kind.VETH,
+            parent_dev=self.parent_dev,
+            peer=self.peer,
+            mtu=self.mtu,
+        )
+
+
+class NamespaceState(IpBaseModel):
+    """
+    The desired state of the interfaces and routes of a namespace.  The interfaces which
+    are not listed are removed, except lo and the peers of the listed veths, and so are the
+    routes which are not listed, except the ones the kernel adds for the addresses.
+    """
+
+    interfaces: List[InterfaceDesiredState] = []
+    routes: List[RouteCreate] = []
+
+
+class NamespaceStateApplied(IpBaseModel):
+    """
+    The interfaces and routes of a namespace after applying a desired state, and the
+    commands which were needed to get there
+    """
+
+    commands: List[List[str]]
+    interfaces: List[Interface]
+    routes: List[Route]
@@ -0,0 +1,127 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from ipaddress import IPv4Network, IPv6Network
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import root_validator, validator
+
+from .base_model import IpBaseModel
+from .common import SafeName
+
+
+class AddressPool(IpBaseModel):
+    """
+    A pool of subnets of the same size, the copy of a template with index i gets the i-th
+    subnet of the network
+
+    :param prefix_len: The prefix length of the subnets of the pool
+    """
+
+    network: Union[IPv4Network, IPv6Network]
+    prefix_len: int
+
+    @root_validator(skip_on_failure=True)
+    def check_prefix_len(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        network = values["network"]
+        if not network.prefixlen <= values["prefix_len"] <= network.max_prefixlen:
+            raise ValueError(
+                f"The prefix length of the subnets must be between {network.prefixlen} "
+                f"and {network.max_prefixlen}"
+            )
+
+        return values
+
+    @property
+    def size(self) -> int:
+        """
+        The number of subnets in the pool
+        """
+        return 2 ** (self.prefix_len - self.network.prefixlen)
+
+    def subnet(self, index: int) -> Union[IPv4Network, IPv6Network]:
+        if not 0 <= index < self.size:
+            raise IndexError(f"The pool {self.network} has no subnet {index}")
+
+        subnet_size = 2 ** (self.network.max_prefixlen - self.prefix_len)
+        address = self.network.network_address + index * subnet_size
+        return self.network.__class__(f"{address}/{self.prefix_len}")
+
+
+class NamespaceTemplate(IpBaseModel):
+    """
+    A blueprint of namespace, instantiated once for each index from start to start + count
+    - 1.  The strings of the name, of the state and of the parent interfaces are formatted
+    for each copy, with these placeholders:
+
+    - {index}: the index of the copy
+    - {name}: the name of the copy, not available in the name itself
+    - {<pool>}: the subnet of the copy in the pool with this name, e.g. 10.0.0.4/30
+    - {<pool>[n]}: the n-th address of the subnet, with the prefix length of the subnet,
+      e.g. 10.0.0.5/30, n can be negative to count from the end of the subnet
+    - {<pool>[n].ip}: the same address, without prefix length
+
+    :param state: The desired state of the interfaces and routes of each copy, as in
+        `PUT /namespaces/<name>/state`, the interfaces of the copies are left as they are
+        if there is none
+    :param parent_interfaces: The desired state of interfaces of the host, for each copy,
+        e.g. veths whose peer is created in the copy, with `peer_netns` set to `{name}`.
+        The other interfaces of the host are left as they are.
+    """
+
+    name: str
+    count: int
+    start: int = 0
+    pools: Dict[SafeName, AddressPool] = {}  # type: ignore
+    state: Optional[Dict[str, Any]]
+    parent_interfaces: List[Dict[str, Any]] = []
+
+    @validator("count")
+    def check_count(cls, v: int) -> int:
+        if not 1 <= v <= 4096:
+            raise ValueError("The count must be between 1 and 4096")
+
+        return v
+
+    @validator("start")
+    def check_start(cls, v: int) -> int:
+        if v < 0:
+            raise ValueError("The start index can not be negative")
+
+        return v
+
+    @property
+    def indexes(self) -> range:
+        return range(self.start, self.start + self.count)
+
+
+class NamespaceTemplateCopy(IpBaseModel):
+    """
+    A copy of a template, and the commands which were needed to bring it and its parent
+    interfaces to their desired state, or the error which prevented it
+    """
+
+    index: int
+    name: SafeName  # type: ignore
+    commands: List[List[str]] = []
+    error: Optional[str]
+
+
+class NamespaceTemplateApplied(IpBaseModel):
+    """
+    The copies of a template, after applying it
+    """
+
+    copies: List[NamespaceTemplateCopy]
@@ -0,0 +1,102 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from ipaddress import IPv4Address, IPv6Address
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import root_validator, validator
+from typing_extensions import Literal
+
+from .base_model import IpBaseModel
+from .common import SafeName
+
+
+class NexthopGroupMember(IpBaseModel):
+    """
+    A nexthop object of a group, the traffic is shared between the members of a group in
+    proportion to their weights
+    """
+
+    id: int
+    weight: int = 1
+
+    @validator("weight")
+    def check_weight(cls, v: int) -> int:
+        if not 1 <= v <= 256:
+            raise ValueError("The weight must be between 1 and 256")
+
+        return v
+
+
+class NexthopUpdate(IpBaseModel):
+    """
+    Input for updating a nexthop object, it replaces where the traffic of all the routes
+    using it goes.  A nexthop object goes through a device, optionally via a gateway, or
+    is a group of other nexthop objects.  It can't be changed from one kind to the other.
+
+    :param family: The family of the routes which can use a nexthop object without any
+        gateway, inet by default
+    """
+
+    gateway: Optional[Union[IPv4Address, IPv6Address]]
+    dev: Optional[SafeName]  # type: ignore
+    group: Optional[List[NexthopGroupMember]]
+    family: Optional[Literal["inet", "inet6"]]
+
+    @root_validator(skip_on_failure=True)
+    def check_kind(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        if (values.get("dev") is None) == (values.get("group") is None):
+            raise ValueError("Exactly one of dev and group has to be provided")
+
+        if values.get("gateway") is not None and values.get("dev") is None:
+            raise ValueError("A gateway can only be provided with a dev")
+
+        if values.get("group") is not None and not values["group"]:
+            raise ValueError("A group needs at least one member")
+
+        return values
+
+
+class NexthopCreate(NexthopUpdate):
+    """
+    Input for creating a nexthop object
+
+    :param id: The optional id of the nexthop object, if none is provided, the first one
+        after all the existing ones is picked
+    """
+
+    id: Optional[int]
+
+    @validator("id")
+    def check_id(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 0 < v < 2**32:
+            raise ValueError("The id must be between 1 and 2^32 - 1")
+
+        return v
+
+
+class Nexthop(IpBaseModel):
+    """
+    A nexthop object, as returned by the command `ip nexthop`.  The groups don't have any
+    family, their members do.
+    """
+
+    id: int
+    gateway: Optional[Union[IPv4Address, IPv6Address]]
+    dev: Optional[SafeName]  # type: ignore
+    group: Optional[List[NexthopGroupMember]]
+    family: Optional[Literal["inet", "inet6"]]
+    protocol: Optional[Union[int, SafeName]]  # type: ignore
+    flags: List[SafeName]  # type: ignore
@@ -13,13 +13,19 @@
    See the License for the specific language governing permissions and
    limitations under the License.
 """
+import base64
+import binascii
+import json
+import socket
 from enum import Enum
 from ipaddress import IPv4Address, IPv4Interface, IPv6Address, IPv6Interface
-from typing import List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, root_validator, validator
 from typing_extensions import Literal
 
+from nfv_test_api.netlink import ROUTE_TABLES
+
 from .base_model import IpBaseModel
 from .common import SafeName, Scope
 
@@ -31,6 +37,7 @@ class InputDestination(BaseModel):
 
     dst_addr: Union[IPv4Address, IPv6Address, Literal["default"]]
     dst_prefix_len: Optional[int]
+    family: Optional[Literal["inet", "inet6"]]
 
     @validator("dst_prefix_len")
     def default_if_prefix_none(
@@ -49,6 +56,28 @@ class InputDestination(BaseModel):
 
         return v
 
+    @validator("family")
+    def family_if_default(
+        cls, v: Optional[str], values: dict, **kwargs: object
+    ) -> Optional[str]:
+        if v is not None and values.get("dst_addr") != "default":
+            raise ValueError(
+                "The family of a destination address is the one of the address"
+            )
+
+        return v
+
+    @property
+    def family_id(self) -> Optional[int]:
+        """
+        The family of the default destination, None when it is not given or when the
+        destination is an address
+        """
+        if self.family is None:
+            return None
+
+        return socket.AF_INET6 if self.family == "inet6" else socket.AF_INET
+
     @property
     def destination_name(self) -> str:
         return (
@@ -58,23 +87,177 @@ class InputDestination(BaseModel):
         )
 
 
-class RouteCreate(IpBaseModel):
+def gateway_from_via(cls: type, values: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Input for creating a route
+    ip shows the gateways of another family than the route (e.g. an ipv6 gateway for an
+    ipv4 route) in a "via" object, they are gateways all the same.
+    """
+    via = values.get("via")
+    if isinstance(via, dict) and values.get("gateway") is None:
+        return {**values, "gateway": via.get("host")}
+
+    return values
+
+
+def check_table_id(v: Optional[int]) -> Optional[int]:
+    if v is not None and not 0 < v < 2**32:
+        raise ValueError("The table id must be between 1 and 2^32 - 1")
+
+    return v
+
+
+class RouteNexthop(IpBaseModel):
+    """
+    A next hop of a multipath route, the traffic is shared between the next hops in
+    proportion to their weights
     """
 
-    dst: Union[IPv4Interface, IPv6Interface, Literal["default"]]
     gateway: Optional[Union[IPv4Address, IPv6Address]]
     dev: SafeName  # type: ignore
+    weight: int = 1
+
+    _gateway_from_via = root_validator(pre=True, allow_reuse=True)(gateway_from_via)
+
+    @validator("weight")
+    def check_weight(cls, v: int) -> int:
+        if not 1 <= v <= 256:
+            raise ValueError("The weight must be between 1 and 256")
+
+        return v
 
 
-class RouteUpdate(IpBaseModel):
+class RouteNexthops(IpBaseModel):
     """
-    Input for updating a route
+    The ways a route can forward traffic: through a device, optionally via a gateway,
+    through many next hops, or through an existing nexthop object (see `ip nexthop`).
+    Only one of them can be given.  The next hops are programmed as nexthop objects,
+    shared by all the routes with the same next hops.
     """
 
     gateway: Optional[Union[IPv4Address, IPv6Address]]
-    dev: SafeName  # type: ignore
+    dev: Optional[SafeName]  # type: ignore
+    nexthops: Optional[List[RouteNexthop]]
+    nhid: Optional[int]
+    pref_src: Optional[Union[IPv4Address, IPv6Address]]
+    mtu: Optional[int]
+
+    @root_validator(skip_on_failure=True)
+    def check_nexthops(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        given = [
+            name for name in ("dev", "nexthops", "nhid") if values.get(name) is not None
+        ]
+        if len(given) != 1:
+            raise ValueError("Exactly one of dev, nexthops and nhid has to be provided")
+
+        if values.get("gateway") is not None and values.get("dev") is None:
+            raise ValueError("A gateway can only be provided with a dev")
+
+        if values.get("nexthops") is not None and not values["nexthops"]:
+            raise ValueError("At least one next hop has to be provided")
+
+        return values
+
+    @validator("mtu")
+    def check_mtu(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v <= 0:
+            raise ValueError("The mtu must be positive")
+
+        return v
+
+    @property
+    def devices(self) -> List[str]:
+        """
+        The devices the route sends traffic through, none if it uses a nexthop object
+        """
+        if self.dev is not None:
+            return [self.dev]
+
+        return [nexthop.dev for nexthop in self.nexthops or []]
+
+
+class RouteCreate(RouteNexthops):
+    """
+    Input for creating a route, in the main table unless another one is given
+    """
+
+    dst: Union[IPv4Interface, IPv6Interface, Literal["default"]]
+    metric: Optional[int]
+    table: Optional[int]
+
+    _check_table = validator("table", allow_reuse=True)(check_table_id)
+
+
+class RouteBulkError(IpBaseModel):
+    """
+    A route of a bulk creation which couldn't be created, identified by its position in
+    the input
+    """
+
+    index: int
+    dst: Union[IPv4Interface, IPv6Interface, Literal["default"]]
+    error: str
+
+
+class RouteBulkCreateResult(IpBaseModel):
+    """
+    The outcome of a bulk creation of routes
+    """
+
+    created: int
+    failed: int
+    errors: List[RouteBulkError]
+
+
+class RouteSyncQuery(IpBaseModel):
+    """
+    Query parameters selecting the route table to sync, the main one by default
+    """
+
+    table: Union[int, Literal["main", "default"]] = "main"
+
+    @validator("table")
+    def check_table(cls, v: Any) -> Any:
+        if isinstance(v, int):
+            check_table_id(v)
+
+        return v
+
+    @property
+    def table_id(self) -> int:
+        if isinstance(self.table, int):
+            return self.table
+
+        return {name: table for table, name in ROUTE_TABLES.items()}[self.table]
+
+
+class RouteSyncError(IpBaseModel):
+    """
+    A route of a sync which couldn't be added, changed or deleted
+    """
+
+    dst: Union[IPv4Interface, IPv6Interface, Literal["default"]]
+    metric: Optional[int]
+    error: str
+
+
+class RouteSyncResult(IpBaseModel):
+    """
+    The outcome of the sync of a route table: the destinations of the routes which have
+    been added, changed and deleted, the count of the ones which were already as desired,
+    and the errors of the ones which couldn't be synced
+    """
+
+    added: List[Union[IPv4Interface, IPv6Interface, Literal["default"]]]
+    changed: List[Union[IPv4Interface, IPv6Interface, Literal["default"]]]
+    deleted: List[Union[IPv4Interface, IPv6Interface, Literal["default"]]]
+    unchanged: int
+    errors: List[RouteSyncError]
+
+
+class RouteUpdate(RouteNexthops):
+    """
+    Input for updating a route, it replaces how the route forwards traffic
+    """
 
 
 class Route(IpBaseModel):
@@ -103,9 +286,158 @@ class Route(IpBaseModel):
     type: Type
     dst: Union[IPv4Interface, IPv6Interface, Literal["default"]]
     gateway: Optional[Union[IPv4Address, IPv6Address]]
-    dev: SafeName  # type: ignore
+    # The routes which don't forward anything (e.g. blackhole) don't have any device
+    dev: Optional[SafeName]  # type: ignore
     protocol: Union[Protocol, int, SafeName]  # type: ignore
     scope: Union[Scope, int]
     flags: List[SafeName]  # type: ignore
     pref_src: Optional[Union[IPv4Address, IPv6Address]]
     metric: Optional[int]
+    table: Optional[SafeName]  # type: ignore
+    nhid: Optional[int]
+    nexthops: Optional[List[RouteNexthop]]
+    mtu: Optional[int]
+
+    _gateway_from_via = root_validator(pre=True, allow_reuse=True)(gateway_from_via)
+
+    @root_validator(pre=True)
+    def mtu_from_metrics(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        # ip shows the metrics of a route as a list holding a single object
+        for metrics in values.get("metrics") or []:
+            if isinstance(metrics, dict) and "mtu" in metrics:
+                return {**values, "mtu": metrics["mtu"]}
+
+        return values
+
+
+# Orders the routes of the pages: family, table id, destination address and prefix length,
+# metric, then type and device, which tell apart the routes the kernel adds for each link
+RouteKey = Tuple[int, int, int, int, int, str, str]
+ROUTE_KEY_TYPES = (int, int, int, int, int, str, str)
+
+
+class RouteQuery(IpBaseModel):
+    """
+    Query parameters selecting the routes to list, by family and table, and the page of
+    them to return.  Without any limit, all the selected routes are returned.  The cursor
+    is the one returned with the previous page, with the same family and table, it holds
+    the key of the last route of that page.
+    """
+
+    family: Literal["inet", "inet6", "all"] = "inet"
+    table: Union[int, Literal["main", "local", "default", "all"]] = "main"
+    limit: Optional[int]
+    cursor: Optional[str]
+
+    @validator("table")
+    def check_table(cls, v: Any) -> Any:
+        if isinstance(v, int):
+            check_table_id(v)
+
+        return v
+
+    @validator("limit")
+    def check_limit(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v <= 0:
+            raise ValueError("The limit must be positive")
+
+        return v
+
+    @validator("cursor")
+    def check_cursor(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None:
+            cls.decode_cursor(v)
+
+        return v
+
+    @staticmethod
+    def encode_cursor(key: RouteKey) -> str:
+        return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> RouteKey:
+        try:
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValueError("Invalid cursor")
+
+        if (
+            not isinstance(key, list)
+            or len(key) != len(ROUTE_KEY_TYPES)
+            or any(
+                type(value) is not value_type
+                for value, value_type in zip(key, ROUTE_KEY_TYPES)
+            )
+        ):
+            raise ValueError("Invalid cursor")
+
+        route_key: RouteKey = tuple(key)  # type: ignore
+        return route_key
+
+    @property
+    def after(self) -> Optional[RouteKey]:
+        """
+        The key of the last route of the previous page, None for the first page
+        """
+        return self.decode_cursor(self.cursor) if self.cursor is not None else None
+
+    @property
+    def families(self) -> List[int]:
+        if self.family == "inet6":
+            return [socket.AF_INET6]
+
+        if self.family == "all":
+            return [socket.AF_INET, socket.AF_INET6]
+
+        return [socket.AF_INET]
+
+    @property
+    def table_id(self) -> Optional[int]:
+        """
+        The id of the selected table, None for all of them
+        """
+        if isinstance(self.table, int):
+            return self.table
+
+        if self.table == "all":
+            return None
+
+        return {name: table for table, name in ROUTE_TABLES.items()}[self.table]
+
+
+class RouteLookupQuery(IpBaseModel):
+    """
+    Input for looking up the routes used to reach addresses
+
+    :param check: Whether to also ask the kernel, with `ip route get`, which route it
+        uses for each address
+    """
+
+    addresses: List[Union[IPv4Address, IPv6Address]]
+    check: bool = False
+
+
+class RouteCheck(IpBaseModel):
+    """
+    The route the kernel uses to reach an address, as returned by the command `ip route
+    get`, or the error it returned when it has no route for it.  It matches the route
+    found by the lookup when they have the same type, device and gateway, or when neither
+    of them can forward anything to the address.
+    """
+
+    type: Optional[str]
+    dev: Optional[SafeName]  # type: ignore
+    gateway: Optional[Union[IPv4Address, IPv6Address]]
+    error: Optional[str]
+    matches: bool
+
+
+class RouteLookupResult(IpBaseModel):
+    """
+    The route used to reach an address, and the table it belongs to
+    """
+
+    address: Union[IPv4Address, IPv6Address]
+    table: Optional[str]
+    route: Optional[Route]
+    check: Optional[RouteCheck]
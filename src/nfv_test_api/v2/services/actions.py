@@ -14,22 +14,28 @@
    limitations under the License.
 """
 import logging
+from typing import List
 
 from pingparsing import PingParsing
 from pydantic import ValidationError
 
+from nfv_test_api.async_host import AsyncHost
 from nfv_test_api.host import Host
 from nfv_test_api.v2.data.ping import Ping, PingRequest
 
 LOGGER = logging.getLogger(__name__)
 
+# The time ping gets to print its statistics once its deadline is reached
+PING_TIMEOUT_MARGIN = 2
+
 
 class ActionsService:
     def __init__(self, host: Host) -> None:
         self.host = host
+        self.async_host = AsyncHost(host)
         self.ping_parser = PingParsing()
 
-    def ping(self, ping_request: PingRequest) -> Ping:
+    def ping_command(self, ping_request: PingRequest) -> List[str]:
         command = [
             "ping",
             "-c",
@@ -43,8 +49,24 @@ class ActionsService:
             command += ["-I", str(ping_request.interface)]
 
         command += [str(ping_request.destination)]
-        stdout, stderr = self.host.exec(command)
+        return command
+
+    def ping_timeout(self, ping_request: PingRequest) -> float:
+        return ping_request.timeout + PING_TIMEOUT_MARGIN
+
+    def ping(self, ping_request: PingRequest) -> Ping:
+        stdout, stderr = self.host.exec(
+            self.ping_command(ping_request), timeout=self.ping_timeout(ping_request)
+        )
+        return self.parse_ping(stdout, stderr)
+
+    async def ping_async(self, ping_request: PingRequest) -> Ping:
+        stdout, stderr = await self.async_host.exec(
+            self.ping_command(ping_request), timeout=self.ping_timeout(ping_request)
+        )
+        return self.parse_ping(stdout, stderr)
 
+    def parse_ping(self, stdout: str, stderr: str) -> Ping:
         if stderr:
             LOGGER.error("Ping stderr: %s", stderr)
             if not stdout:
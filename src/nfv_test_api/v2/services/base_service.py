@@ -13,25 +13,135 @@
    See the License for the specific language governing permissions and
    limitations under the License.
 """
+import logging
+import time
 from abc import abstractmethod
-from typing import Any, Dict, Generic, List, Optional, TypeVar, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
 
 from pydantic.main import BaseModel
 
+from nfv_test_api.async_host import run_in_thread
+from nfv_test_api.config import ReadBackend, get_config
 from nfv_test_api.host import Host
+from nfv_test_api.metrics import exec_metrics
+from nfv_test_api.netlink import NetlinkSocket
+from nfv_test_api.netlink_state import NetlinkReader
 from nfv_test_api.v2.data.base_model import IpBaseModel
 from nfv_test_api.v2.data.common import CommandStatus
+from nfv_test_api.v2.services.registry import service_registry
 
 T = TypeVar("T", bound=IpBaseModel)
 TC = TypeVar("TC", bound=BaseModel)
 TU = TypeVar("TU", bound=BaseModel)
 K = TypeVar("K", bound=object)
+R = TypeVar("R")
+
+LOGGER = logging.getLogger(__name__)
 
 
 class BaseService(Generic[T, TC, TU]):
     def __init__(self, host: Host) -> None:
         self.host = host
 
+    def netlink_read(
+        self, read: Callable[[NetlinkReader], R], host: Optional[Host] = None
+    ) -> Optional[R]:
+        """
+        Run a read on a netlink socket in the namespace of the host, if the netlink read
+        backend is selected in the config.  Returns None when the read should go through
+        ip instead, either because it is the selected backend, or because the netlink
+        read failed.  The read is served from the state cache of the namespace when it is
+        enabled.
+        """
+        config = get_config()
+        if config.read_backend != ReadBackend.NETLINK:
+            return None
+
+        host = host or self.host
+        family = "netlink cache" if config.state_cache else "netlink"
+        start = time.monotonic()
+        status = "error"
+        # The reads served from the cache don't receive anything themselves
+        netlink_socket: Optional[NetlinkSocket] = None
+        try:
+            if config.state_cache:
+                result = read(service_registry.state_cache(host.namespace))
+            else:
+                with host.netlink_socket() as netlink_socket:
+                    result = read(netlink_socket)
+
+            status = "0"
+            return result
+        except OSError as e:
+            LOGGER.warning(
+                "Netlink read failed in namespace %s, falling back to ip: %s",
+                host.namespace,
+                str(e),
+            )
+            status = str(e.errno)
+            return None
+        finally:
+            exec_metrics.observe(
+                family,
+                host.namespace,
+                status,
+                time.monotonic() - start,
+                None if netlink_socket is None else netlink_socket.received,
+            )
+
+    def netlink_stream(
+        self, read: Callable[[NetlinkReader], Iterable[R]], host: Optional[Host] = None
+    ) -> Optional[Iterator[R]]:
+        """
+        Like netlink_read, for reads whose results are consumed as they are received.  The
+        netlink socket is kept open until the iterator is exhausted or closed, a failure
+        while iterating can't fall back to ip anymore.  With the state cache, the read is
+        served at once from the cache and only its result is iterated on.
+        """
+        config = get_config()
+        if config.read_backend != ReadBackend.NETLINK:
+            return None
+
+        if config.state_cache:
+            results = self.netlink_read(lambda reader: list(read(reader)), host)
+            return None if results is None else iter(results)
+
+        return self._netlink_stream(read, host or self.host)
+
+    def _netlink_stream(
+        self, read: Callable[[NetlinkReader], Iterable[R]], host: Host
+    ) -> Iterator[R]:
+        start = time.monotonic()
+        status = "closed"
+        netlink_socket: Optional[NetlinkSocket] = None
+        try:
+            with host.netlink_socket() as netlink_socket:
+                yield from read(netlink_socket)
+
+            status = "0"
+        except OSError as e:
+            status = str(e.errno)
+            raise
+        finally:
+            exec_metrics.observe(
+                "netlink",
+                host.namespace,
+                status,
+                time.monotonic() - start,
+                None if netlink_socket is None else netlink_socket.received,
+            )
+
     @abstractmethod
     def get_all_raw(self) -> List[Dict[str, Any]]:
         pass
@@ -69,3 +179,24 @@ class BaseService(Generic[T, TC, TU]):
     @abstractmethod
     def status(self) -> CommandStatus:
         pass
+
+    # The async variants run the blocking methods in a thread of the event loop's executor,
+    # services which have a native implementation overwrite them
+
+    async def get_all_async(self) -> List[T]:
+        return await run_in_thread(self.get_all)
+
+    async def get_one_async(self, identifier: str) -> T:
+        return await run_in_thread(self.get_one, identifier)
+
+    async def create_async(self, o: TC) -> T:
+        return await run_in_thread(self.create, o)
+
+    async def update_async(self, identifier: str, o: TU) -> T:
+        return await run_in_thread(self.update, identifier, o)
+
+    async def delete_async(self, identifier: str) -> None:
+        await run_in_thread(self.delete, identifier)
+
+    async def status_async(self) -> CommandStatus:
+        return await run_in_thread(self.status)
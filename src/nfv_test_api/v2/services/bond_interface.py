@@ -14,14 +14,15 @@
    limitations under the License.
 """
 import logging
+from typing import List
 
-from werkzeug.exceptions import BadRequest  # type: ignore
+from werkzeug.exceptions import BadRequest, Conflict, NotFound  # type: ignore
 
 from nfv_test_api.host import Host
 from nfv_test_api.v2.data.interface import (
+    BondMode,
     Interface,
     InterfaceCreate,
-    InterfaceState,
     LinkInfo,
 )
 from nfv_test_api.v2.services.interface import InterfaceService
@@ -30,9 +31,27 @@ LOGGER = logging.getLogger(__name__)
 
 
 class BondInterfaceService(InterfaceService):
+    """
+    Creates bond interfaces.  The bond is created with all its options at once, and then
+    its slaves are all attached to it in a single batch.
+    """
+
     def __init__(self, host: Host) -> None:
         super().__init__(host)
 
+    def create_command(self, o: InterfaceCreate) -> List[str]:
+        # The options are sent by ip as netlink attributes of the new link, the mode can
+        # only be set on a bond without slaves
+        command = super().create_command(o)
+        command += ["mode", (o.bond_mode or BondMode.LACP).value]
+        if o.miimon is not None:
+            command += ["miimon", str(o.miimon)]
+
+        if o.xmit_hash_policy is not None:
+            command += ["xmit_hash_policy", o.xmit_hash_policy.value]
+
+        return command
+
     def create(self, o: InterfaceCreate) -> Interface:
         if o.type != LinkInfo.Kind.BOND:
             raise BadRequest(
@@ -44,24 +63,52 @@ class BondInterfaceService(InterfaceService):
                 "You need to specify the slave interfaces for the bond interface you create"
             )
 
-        slave_interfaces = [
-            self.get_one(identifier) for identifier in o.slave_interfaces
-        ]
+        existing_interfaces = {
+            raw_interface["ifname"]: raw_interface
+            for raw_interface in self.get_all_raw(addresses=False)
+        }
+        if o.name in existing_interfaces:
+            raise Conflict("An interface with this name already exists")
 
-        interface = super().create(o)
-        interface = self.set_state(interface, InterfaceState.DOWN)
-        for slave_interface in slave_interfaces:
-            slave_interface = self.set_state(slave_interface, InterfaceState.DOWN)
-            slave_interface = self.set_master(slave_interface, "nomaster")
+        for slave in o.slave_interfaces:
+            if slave not in existing_interfaces:
+                raise NotFound(f"Could not find any interface with name {slave}")
 
-        _, stderr = self.host.exec(
-            ["sh", "-c", f"echo 4 > /sys/class/net/{interface.if_name}/bonding/mode"]
-        )
+        command = self.create_command(o)
+        _, stderr = self.host.exec(command)
         if stderr:
-            raise RuntimeError(f"Failed to change bonding mode of interface: {stderr}")
+            raise RuntimeError(
+                f"Failed to create interface with command {command}: {stderr}"
+            )
 
-        for slave_interface in slave_interfaces:
-            slave_interface = self.set_master(slave_interface, interface.if_name)
-            slave_interface = self.set_state(slave_interface, InterfaceState.UP)
+        commands: List[List[str]] = []
+        for slave in o.slave_interfaces:
+            # A slave has to be down to be attached
+            commands.append(["ip", "link", "set", "dev", slave, "down"])
+            if existing_interfaces[slave].get("master") is not None:
+                commands.append(["ip", "link", "set", "dev", slave, "nomaster"])
+            commands.append(["ip", "link", "set", "dev", slave, "master", o.name])
+            commands.append(["ip", "link", "set", "dev", slave, "up"])
+        commands.append(["ip", "link", "set", "dev", o.name, "up"])
+
+        errors = self.host.exec_batch(commands)
+        failures = [
+            f"Failed to attach the slaves of the bond with command {command}: {stderr}"
+            for command, stderr in zip(commands, errors)
+            if stderr
+        ]
+        if failures:
+            # Deleting the bond releases the slaves which were attached to it
+            _, stderr = self.host.exec(["ip", "link", "del", o.name])
+            if stderr:
+                LOGGER.error("Failed to remove interface %s: %s", o.name, stderr)
+
+            raise RuntimeError("\n".join(failures))
+
+        interface = self.get_one_or_default(o.name)
+        if not interface:
+            raise RuntimeError(
+                "The interface should have been created but can not be found"
+            )
 
-        return self.set_state(interface, InterfaceState.UP)
+        return interface
@@ -0,0 +1,133 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+from typing import List, Set
+
+from werkzeug.exceptions import BadRequest, Conflict  # type: ignore
+
+from nfv_test_api.host import Host
+from nfv_test_api.v2.data.interface import (
+    Interface,
+    InterfaceBulkCreate,
+    InterfaceCreate,
+    LinkInfo,
+)
+from nfv_test_api.v2.services.interface import InterfaceService
+from nfv_test_api.v2.services.vlan_interface import VlanInterfaceService
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BulkInterfaceService(InterfaceService):
+    """
+    Creates many interfaces at once.  They are all checked together against the interfaces
+    of the host, read once, then created in a single batch and read again once.  If any of
+    them can not be created, none of them is.
+    """
+
+    def __init__(self, host: Host) -> None:
+        super().__init__(host)
+        self.vlan_service = VlanInterfaceService(host)
+
+    def create_command(self, o: InterfaceCreate) -> List[str]:
+        if o.type == LinkInfo.Kind.VLAN:
+            return self.vlan_service.create_command(o)
+
+        if o.type == LinkInfo.Kind.BOND:
+            raise BadRequest(f"Bond interface {o.name} can not be created in bulk")
+
+        return super().create_command(o)
+
+    def create_many(self, o: InterfaceBulkCreate) -> List[Interface]:
+        interfaces = o.all_interfaces()
+        existing_names = {
+            raw_interface["ifname"] for raw_interface in self.get_all_raw()
+        }
+
+        bad_requests: List[str] = []
+        conflicts: List[str] = []
+        commands: List[List[str]] = []
+        names: Set[str] = set()
+        for interface in interfaces:
+            try:
+                commands.append(self.create_command(interface))
+            except BadRequest as e:
+                bad_requests.append(e.description)
+
+            if interface.parent_dev is not None and not (
+                interface.parent_dev in existing_names or interface.parent_dev in names
+            ):
+                bad_requests.append(
+                    f"The parent interface {interface.parent_dev} of {interface.name} "
+                    "doesn't exist and is not created before it"
+                )
+
+            for name in [interface.name, interface.peer]:
+                if name is None:
+                    continue
+
+                if name in existing_names:
+                    conflicts.append(f"An interface with name {name} already exists")
+                elif name in names:
+                    conflicts.append(f"Interface {name} is created more than once")
+                names.add(name)
+
+        if bad_requests:
+            raise BadRequest("\n".join(bad_requests))
+
+        if conflicts:
+            raise Conflict("\n".join(conflicts))
+
+        LOGGER.debug("Creating %d interfaces in one batch", len(commands))
+        errors = self.host.exec_batch(commands)
+        failures = [
+            f"Failed to create interface with command {command}: {stderr}"
+            for command, stderr in zip(commands, errors)
+            if stderr
+        ]
+        if failures:
+            # Removing the ones which were created, deleting a veth removes its peer
+            created = [
+                interface.name
+                for interface, stderr in zip(interfaces, errors)
+                if not stderr
+            ]
+            rollback_errors = self.host.exec_batch(
+                [["ip", "link", "del", name] for name in reversed(created)]
+            )
+            for name, stderr in zip(reversed(created), rollback_errors):
+                if stderr:
+                    LOGGER.error("Failed to remove interface %s: %s", name, stderr)
+
+            raise RuntimeError("\n".join(failures))
+
+        raw_interfaces = {
+            raw_interface["ifname"]: raw_interface
+            for raw_interface in self.get_all_raw()
+        }
+        created_interfaces: List[Interface] = []
+        for interface in interfaces:
+            if interface.name not in raw_interfaces:
+                raise RuntimeError(
+                    f"The interface {interface.name} should have been created but can "
+                    "not be found"
+                )
+
+            created_interface = Interface(**raw_interfaces[interface.name])
+            created_interface.attach_host(self.host)
+            created_interfaces.append(created_interface)
+
+        return created_interfaces
@@ -0,0 +1,221 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import os
+import signal
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from werkzeug.exceptions import HTTPException  # type: ignore
+
+from nfv_test_api.host import Host
+from nfv_test_api.netlink import NETNS_RUN_DIR, LinkFilter
+from nfv_test_api.v2.data.namespace import (
+    NamespaceBulkDelete,
+    NamespaceBulkDeleteResult,
+    NamespaceDeleted,
+    NamespaceProcess,
+)
+from nfv_test_api.v2.services.interface import InterfaceService
+from nfv_test_api.v2.services.namespace import NamespaceService, namespace_pool
+from nfv_test_api.v2.services.registry import service_registry
+
+LOGGER = logging.getLogger(__name__)
+
+# How long the processes have to go away once they are killed, in seconds
+KILL_TIMEOUT = 2
+
+NamespaceInode = Tuple[int, int]
+
+
+def namespace_inode(path: str) -> NamespaceInode:
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino
+
+
+def namespace_processes(namespace: NamespaceInode) -> List[NamespaceProcess]:
+    """
+    Find the processes running in a namespace, the way `ip netns pids` does.  The
+    processes which are gone, or are zombies, don't hold the namespace anymore.
+    """
+    processes: List[NamespaceProcess] = []
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit() or int(entry.name) == os.getpid():
+            continue
+
+        try:
+            if namespace_inode(f"/proc/{entry.name}/ns/net") != namespace:
+                continue
+
+            with open(f"/proc/{entry.name}/comm") as comm:
+                name = comm.read().strip()
+        except OSError:
+            continue
+
+        processes.append(NamespaceProcess(pid=int(entry.name), name=name))  # type: ignore
+
+    return processes
+
+
+def signal_processes(processes: List[NamespaceProcess], signum: int) -> None:
+    for process in processes:
+        try:
+            os.kill(process.pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def wait_processes(namespace: NamespaceInode, timeout: float) -> List[NamespaceProcess]:
+    """
+    Wait for the processes of the namespace to be gone, and return the ones which are
+    still running after the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    processes = namespace_processes(namespace)
+    while processes and time.monotonic() < deadline:
+        time.sleep(0.05)
+        processes = namespace_processes(namespace)
+
+    return processes
+
+
+class BulkNamespaceService(NamespaceService):
+    """
+    Tears many namespaces down at once, a few of them at the same time.  Whatever would
+    keep a namespace alive is removed before deleting it: the processes running in it
+    (e.g. UERANSIM or srsRAN ones started with `ip netns exec`) are asked to stop, then
+    killed after a grace period, and its veths are deleted, so that their peers in other
+    namespaces are gone when the deletion returns.
+    """
+
+    def __init__(self, host: Host) -> None:
+        super().__init__(host)
+
+    def stop_processes(
+        self, namespace: NamespaceInode, grace_period: float
+    ) -> List[NamespaceProcess]:
+        processes = namespace_processes(namespace)
+        if not processes:
+            return processes
+
+        LOGGER.debug("Stopping processes %s", processes)
+        signal_processes(processes, signal.SIGTERM)
+        remaining = wait_processes(namespace, grace_period)
+        if remaining:
+            LOGGER.warning("Killing processes %s, they didn't stop", remaining)
+            signal_processes(remaining, signal.SIGKILL)
+            remaining = wait_processes(namespace, KILL_TIMEOUT)
+
+        if remaining:
+            raise RuntimeError(f"Failed to kill processes {remaining}")
+
+        # The processes started in the meantime are killed too, but not reported
+        return processes
+
+    def delete_veths(self, name: str) -> List[str]:
+        veths: List[str] = []
+        for raw_interface in service_registry.service(
+            InterfaceService, name
+        ).get_all_raw(link_filter=LinkFilter(kind="veth"), addresses=False):
+            # The link of a veth is its peer, when it is in the same namespace
+            if raw_interface.get("link") not in veths:
+                veths.append(raw_interface["ifname"])
+
+        commands = [["ip", "link", "del", veth] for veth in veths]
+        errors = service_registry.host(name).exec_batch(commands)
+        failures = [
+            f"Failed to delete veth with command {command}: {stderr}"
+            for command, stderr in zip(commands, errors)
+            if stderr
+        ]
+        if failures:
+            raise RuntimeError("\n".join(failures))
+
+        return veths
+
+    def teardown(self, name: str, grace_period: float) -> NamespaceDeleted:
+        """
+        Stop the processes of a namespace, delete its veths, then delete it.
+        """
+        processes: List[NamespaceProcess] = []
+        veths: List[str] = []
+        error: Optional[str] = None
+        try:
+            # Our own processes and threads first, they are not to be killed
+            service_registry.invalidate(name)
+            processes = self.stop_processes(
+                namespace_inode(os.path.join(NETNS_RUN_DIR, name)), grace_period
+            )
+            veths = self.delete_veths(name)
+            service_registry.invalidate(name)
+
+            # Unmounts the namespace and removes its mount point
+            _, stderr = self.host.exec(["ip", "netns", "del", name])
+            if stderr:
+                raise RuntimeError(f"Failed to delete namespace: {stderr}")
+        except (HTTPException, RuntimeError, OSError) as e:
+            LOGGER.warning("Failed to tear namespace %s down: %s", name, e)
+            error = e.description if isinstance(e, HTTPException) else str(e)
+        finally:
+            self.index_read(lambda index: index.refresh(name))
+
+        return NamespaceDeleted(  # type: ignore
+            name=name, processes=processes, veths=veths, error=error
+        )
+
+    def is_own_namespace(self, name: str) -> bool:
+        try:
+            return namespace_inode(
+                os.path.join(NETNS_RUN_DIR, name)
+            ) == namespace_inode("/proc/self/ns/net")
+        except OSError:
+            # Deleted in the meantime, there is nothing to protect
+            return False
+
+    def delete_many(self, o: NamespaceBulkDelete) -> NamespaceBulkDeleteResult:
+        names = [
+            raw_namespace["name"]
+            for raw_namespace in self.get_all_raw()
+            if raw_namespace.get("name") is not None
+            and o.selects(raw_namespace["name"])
+        ]
+
+        deleted: Dict[str, NamespaceDeleted] = {}
+        teardowns: Dict[str, "Future[NamespaceDeleted]"] = {}
+        pool = namespace_pool()
+        for name in names:
+            if self.is_own_namespace(name):
+                deleted[name] = NamespaceDeleted(  # type: ignore
+                    name=name, error="The api runs in this namespace"
+                )
+            else:
+                teardowns[name] = pool.submit(self.teardown, name, o.grace_period)
+
+        for name, teardown in teardowns.items():
+            deleted[name] = teardown.result()
+
+        # Checking that they are all gone with a single lookup
+        remaining = {raw_namespace.get("name") for raw_namespace in self.get_all_raw()}
+        for name, namespace in deleted.items():
+            if namespace.error is None and name in remaining:
+                namespace.error = (
+                    "The namespace should have been deleted but can still be found"
+                )
+
+        return NamespaceBulkDeleteResult(  # type: ignore
+            namespaces=[deleted[name] for name in names]
+        )
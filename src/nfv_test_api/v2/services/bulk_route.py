@@ -0,0 +1,149 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import socket
+from ipaddress import IPv4Network, IPv6Network, ip_network
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+from nfv_test_api.host import Host
+from nfv_test_api.netlink import RT_TABLE_MAIN
+from nfv_test_api.v2.data.route import (
+    RouteBulkCreateResult,
+    RouteBulkError,
+    RouteCreate,
+)
+from nfv_test_api.v2.services.interface import InterfaceService
+from nfv_test_api.v2.services.nexthop import NexthopService
+from nfv_test_api.v2.services.route import RouteService, route_family
+
+LOGGER = logging.getLogger(__name__)
+
+# Each batch has to complete within the timeout of the ip batch worker, the kernel adds a
+# few tens of thousands of routes per second
+BATCH_SIZE = 5000
+
+RouteKey = Tuple[int, int, Union[IPv4Network, IPv6Network]]
+
+
+def route_key(dst: str, family: int, table: int = RT_TABLE_MAIN) -> RouteKey:
+    """
+    Identify a route by its family, its table and its destination, the way `ip route add`
+    detects duplicates.
+    """
+    if dst == "default":
+        network = ip_network("::/0" if family == socket.AF_INET6 else "0.0.0.0/0")
+        return family, table, network
+
+    return family, table, ip_network(dst, strict=False)
+
+
+class BulkRouteService(RouteService):
+    """
+    Creates many routes at once.  They are all checked against the routes and the
+    interfaces of the host, read once, then created in batches.  Unlike the interfaces, the
+    routes are independent of each other: the ones which can't be created are reported and
+    all the others are created anyway.  They are not read again.
+    """
+
+    def __init__(self, host: Host) -> None:
+        super().__init__(host)
+        self.interface_service = InterfaceService(host)
+
+    def create_many(self, routes: Iterable[RouteCreate]) -> RouteBulkCreateResult:
+        routes = list(routes)
+        tables = {
+            (route_family(route), route.table or RT_TABLE_MAIN) for route in routes
+        }
+        existing_routes: Set[RouteKey] = {
+            route_key(raw_route["dst"], family, table)
+            for family, table in sorted(tables)
+            for raw_route in self.iter_all_raw([family], table)
+        }
+        existing_devices = {
+            raw_interface["ifname"]
+            for raw_interface in self.interface_service.get_all_raw(addresses=False)
+        }
+
+        errors: List[RouteBulkError] = []
+        pending: List[Tuple[int, RouteCreate]] = []
+        for index, route in enumerate(routes):
+            key = route_key(
+                str(route.dst), route_family(route), route.table or RT_TABLE_MAIN
+            )
+            missing_devices = [
+                dev for dev in route.devices if dev not in existing_devices
+            ]
+            error = None
+            if key in existing_routes:
+                error = "A route with this destination already exists"
+            elif missing_devices:
+                error = f"Could not find any interface with name {missing_devices[0]}"
+
+            if error is not None:
+                errors.append(
+                    RouteBulkError(index=index, dst=route.dst, error=error)  # type: ignore
+                )
+                continue
+
+            # A route given twice is only created once, the second one conflicts
+            existing_routes.add(key)
+            pending.append((index, route))
+
+        # The routes with the same next hops share a nexthop object, all the missing ones
+        # are created first.  If some can't be, the routes using them fail on their own.
+        multipath_routes = [
+            (index, route) for index, route in pending if route.nexthops is not None
+        ]
+        nhids: Dict[int, int] = {}
+        if multipath_routes:
+            nexthop_ids, nexthop_commands = NexthopService(self.host).resolve(
+                [
+                    (route_family(route), route.nexthops or [])
+                    for _, route in multipath_routes
+                ]
+            )
+            nhids = {
+                index: nhid for (index, _), nhid in zip(multipath_routes, nexthop_ids)
+            }
+            for command, stderr in zip(
+                nexthop_commands, self.host.exec_batch(nexthop_commands)
+            ):
+                if stderr:
+                    LOGGER.warning(
+                        "Failed to create nexthop with %s: %s", command, stderr
+                    )
+
+        LOGGER.debug("Creating %d routes in batches of %d", len(pending), BATCH_SIZE)
+        created = 0
+        for start in range(0, len(pending), BATCH_SIZE):
+            batch = pending[start : start + BATCH_SIZE]
+            commands = [
+                self.create_command(route, nhids.get(index)) for index, route in batch
+            ]
+            for (index, route), stderr in zip(batch, self.host.exec_batch(commands)):
+                if stderr:
+                    errors.append(
+                        RouteBulkError(  # type: ignore
+                            index=index, dst=route.dst, error=stderr.strip()
+                        )
+                    )
+                else:
+                    created += 1
+
+        errors.sort(key=lambda error: error.index)
+        return RouteBulkCreateResult(  # type: ignore
+            created=created, failed=len(errors), errors=errors
+        )
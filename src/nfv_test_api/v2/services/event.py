@@ -0,0 +1,306 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import errno
+import logging
+import select
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import pydantic
+from pydantic import ValidationError
+
+from nfv_test_api.host import Host
+from nfv_test_api.netlink import (
+    IFLA_IFNAME,
+    IFLA_LINK,
+    IFLA_LINK_NETNSID,
+    IFLA_MASTER,
+    NETNSA_NSID,
+    ROUTE_TABLES,
+    RT_TABLE_MAIN,
+    RTA_OIF,
+    RTGENMSG,
+    RTM_DELADDR,
+    RTM_DELLINK,
+    RTM_DELNSID,
+    RTM_DELROUTE,
+    RTM_F_CLONED,
+    RTM_NEWADDR,
+    RTM_NEWLINK,
+    RTM_NEWNSID,
+    RTM_NEWROUTE,
+    RTNLGRP_IPV4_IFADDR,
+    RTNLGRP_IPV4_ROUTE,
+    RTNLGRP_IPV6_IFADDR,
+    RTNLGRP_IPV6_ROUTE,
+    RTNLGRP_LINK,
+    RTNLGRP_NSID,
+    NetlinkSocket,
+    attributes,
+    link_message,
+    route_message,
+    route_table,
+    s32,
+    string,
+    u32,
+)
+from nfv_test_api.netlink_state import EVENTS_BUFFER_SIZE, LinkMessage
+from nfv_test_api.v2.data.event import Event, EventAction, EventType
+from nfv_test_api.v2.data.interface import Addr4Info, Addr6Info, Interface
+from nfv_test_api.v2.data.namespace import Namespace
+from nfv_test_api.v2.data.route import Route
+from nfv_test_api.v2.services.namespace import NamespaceService
+from nfv_test_api.v2.services.registry import service_registry
+
+LOGGER = logging.getLogger(__name__)
+
+# The multicast groups notifying the changes of each type of event
+EVENT_GROUPS = {
+    EventType.LINK: (RTNLGRP_LINK,),
+    EventType.ADDR: (RTNLGRP_IPV4_IFADDR, RTNLGRP_IPV6_IFADDR),
+    EventType.ROUTE: (RTNLGRP_IPV4_ROUTE, RTNLGRP_IPV6_ROUTE),
+    EventType.NETNS: (RTNLGRP_NSID,),
+}
+
+# Seconds without any event after which a heartbeat is sent, so that the clients which
+# are gone are noticed
+HEARTBEAT_INTERVAL = 15.0
+
+
+class EventService:
+    """
+    Streams the changes of the links, addresses, routes and namespaces of a namespace, as
+    the kernel notifies them.
+    """
+
+    def __init__(self, host: Host) -> None:
+        self.host = host
+
+    def stream(
+        self,
+        types: Optional[Sequence[EventType]] = None,
+        if_name: Optional[str] = None,
+        timeout: Optional[float] = None,
+        table: Optional[int] = RT_TABLE_MAIN,
+    ) -> Iterator[Event]:
+        """
+        Yield the events of the given types, the ones of the given interface only if one
+        is provided, until the timeout expires if one is provided.  The route events are the
+        ones of the given table, of all of them if it is None.  The first event is a
+        ready event, sent once the stream is listening, the changes made after receiving
+        it will all be streamed.
+        """
+        selected = list(types or EVENT_GROUPS.keys())
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        events = self.host.netlink_socket()
+        netlink_socket: Optional[NetlinkSocket] = None
+        try:
+            # Listening before reading anything, so that no change can be missed
+            events.subscribe(
+                *(group for kind in selected for group in EVENT_GROUPS[kind]),
+                buffer_size=EVENTS_BUFFER_SIZE,
+            )
+            netlink_socket = self.host.netlink_socket()
+            links, namespace_names = self._read_state(netlink_socket, selected)
+            yield Event(type=EventType.READY)  # type: ignore
+
+            while True:
+                wait = HEARTBEAT_INTERVAL
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        return
+
+                readable, _, _ = select.select([events], [], [], wait)
+                if not readable:
+                    if deadline is None or time.monotonic() < deadline:
+                        yield Event(type=EventType.HEARTBEAT)  # type: ignore
+                    continue
+
+                try:
+                    messages = list(events.events())
+                except OSError as e:
+                    if e.errno != errno.ENOBUFS:
+                        raise
+
+                    LOGGER.warning("Netlink notifications were lost, reading again")
+                    links, namespace_names = self._read_state(netlink_socket, selected)
+                    yield Event(type=EventType.OVERFLOW)  # type: ignore
+                    continue
+
+                for kind, body in messages:
+                    event = self._event(
+                        netlink_socket, links, namespace_names, kind, body, table
+                    )
+                    if event is None or event.type not in selected:
+                        continue
+                    if if_name is not None and event.if_name != if_name:
+                        continue
+
+                    yield event
+        finally:
+            events.close()
+            if netlink_socket is not None:
+                netlink_socket.close()
+
+    def _read_state(
+        self, netlink_socket: NetlinkSocket, types: List[EventType]
+    ) -> Tuple[Dict[int, LinkMessage], Dict[int, Optional[str]]]:
+        """
+        Read the links and the namespaces the events can refer to.
+        """
+        links = {message[0][2]: message for message in netlink_socket.link_messages()}
+        namespace_names: Dict[int, Optional[str]] = {}
+        if EventType.NETNS in types:
+            for raw_namespace in service_registry.service(
+                NamespaceService, self.host.namespace
+            ).get_all_raw():
+                namespace_names[raw_namespace["nsid"]] = raw_namespace.get("name")
+
+        return links, namespace_names
+
+    @staticmethod
+    def _link_name(links: Dict[int, LinkMessage], index: int) -> Optional[str]:
+        if index not in links:
+            return None
+
+        return string(links[index][1].get(IFLA_IFNAME, b""))
+
+    def _event(
+        self,
+        netlink_socket: NetlinkSocket,
+        links: Dict[int, LinkMessage],
+        namespace_names: Dict[int, Optional[str]],
+        kind: int,
+        body: bytes,
+        table: Optional[int] = RT_TABLE_MAIN,
+    ) -> Optional[Event]:
+        """
+        Build the event of a notification, and apply it to the links and namespaces it
+        can refer to.
+        """
+        # The types of the new messages are all multiples of 4, their del follows them
+        action = EventAction.NEW if kind % 4 == 0 else EventAction.DEL
+        if kind in (RTM_NEWLINK, RTM_DELLINK):
+            header, link_attributes = link_message(body)
+            if kind == RTM_NEWLINK:
+                links[header[2]] = (header, link_attributes)
+            else:
+                links.pop(header[2], None)
+
+            related = []
+            if IFLA_MASTER in link_attributes:
+                related.append(u32(link_attributes[IFLA_MASTER]))
+            if (
+                IFLA_LINK in link_attributes
+                and IFLA_LINK_NETNSID not in link_attributes
+            ):
+                related.append(s32(link_attributes[IFLA_LINK]))
+
+            raw_interface = netlink_socket.render_links(
+                [(header, link_attributes)],
+                [links[index] for index in related if index in links],
+                {},
+            )[0]
+            interface: Optional[Interface] = None
+            try:
+                interface = Interface(**raw_interface)
+            except ValidationError as e:
+                LOGGER.error(f"Failed to parse an interface: {raw_interface}\n{str(e)}")
+
+            return Event(  # type: ignore
+                type=EventType.LINK,
+                action=action,
+                if_name=raw_interface["ifname"],
+                interface=interface,
+            )
+
+        if kind in (RTM_NEWADDR, RTM_DELADDR):
+            parsed = netlink_socket.address(body)
+            if parsed is None:
+                return None
+
+            index, raw_address = parsed
+            address: Optional[Union[Addr4Info, Addr6Info]] = None
+            try:
+                address = pydantic.parse_obj_as(
+                    Union[Addr4Info, Addr6Info], raw_address  # type: ignore
+                )
+            except ValidationError as e:
+                LOGGER.error(f"Failed to parse an address: {raw_address}\n{str(e)}")
+
+            return Event(  # type: ignore
+                type=EventType.ADDR,
+                action=action,
+                if_name=self._link_name(links, index),
+                address=address,
+            )
+
+        if kind in (RTM_NEWROUTE, RTM_DELROUTE):
+            route_header, route_attributes = route_message(body)
+            # Like the routes api, the cached routes are not shown, and only the ones of
+            # the selected table
+            if route_header[8] & RTM_F_CLONED:
+                return None
+            route_table_id = route_table(route_header, route_attributes)
+            if table is not None and route_table_id != table:
+                return None
+
+            names: Dict[int, str] = {}
+            if RTA_OIF in route_attributes:
+                oif = u32(route_attributes[RTA_OIF])
+                names[oif] = self._link_name(links, oif) or str(oif)
+
+            raw_route = netlink_socket.render_route(
+                route_header, route_attributes, names
+            )
+            raw_route["table"] = ROUTE_TABLES.get(route_table_id, str(route_table_id))
+            route: Optional[Route] = None
+            try:
+                route = Route(**raw_route)
+            except ValidationError as e:
+                LOGGER.error(f"Failed to parse a route: {raw_route}\n{str(e)}")
+
+            return Event(  # type: ignore
+                type=EventType.ROUTE,
+                action=action,
+                if_name=raw_route.get("dev"),
+                route=route,
+            )
+
+        if kind in (RTM_NEWNSID, RTM_DELNSID):
+            nsid_attributes = attributes(body, RTGENMSG.size)
+            if NETNSA_NSID not in nsid_attributes:
+                return None
+
+            nsid = s32(nsid_attributes[NETNSA_NSID])
+            if kind == RTM_NEWNSID:
+                namespace = service_registry.service(
+                    NamespaceService, self.host.namespace
+                ).get_one_by_id_or_default(nsid)
+                namespace_names[nsid] = namespace.name if namespace else None
+                name = namespace_names[nsid]
+            else:
+                # The name of the namespace is gone with it, it is the one we knew
+                name = namespace_names.pop(nsid, None)
+
+            return Event(  # type: ignore
+                type=EventType.NETNS,
+                action=action,
+                namespace=Namespace(name=name, ns_id=nsid),  # type: ignore
+            )
+
+        return None
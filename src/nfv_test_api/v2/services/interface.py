@@ -16,13 +16,14 @@
 import json
 import logging
 from ipaddress import IPv4Interface, IPv6Interface, ip_interface
-from typing import Any, Dict, List, Optional, Set, Union
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 import pydantic
 from pydantic import ValidationError
 from werkzeug.exceptions import Conflict, NotFound  # type: ignore
 
-from nfv_test_api.host import Host, NamespaceHost
+from nfv_test_api.host import Host
+from nfv_test_api.netlink import LinkFilter
 from nfv_test_api.v2.data.common import CommandStatus
 from nfv_test_api.v2.data.interface import (
     Interface,
@@ -32,25 +33,160 @@ from nfv_test_api.v2.data.interface import (
 )
 from nfv_test_api.v2.services.base_service import BaseService, K
 from nfv_test_api.v2.services.namespace import NamespaceService
+from nfv_test_api.v2.services.registry import service_registry
 
 LOGGER = logging.getLogger(__name__)
 
 
+class InterfaceTransaction:
+    """
+    Collects changes to an interface, to apply them all at once with commit().  The
+    changes are sent to the host as one batch, in the order they were added, and the
+    interface is read again once at the end.
+    """
+
+    def __init__(self, service: "InterfaceService", interface: Interface) -> None:
+        self.service = service
+        self.interface = interface
+        self._changes: List[Tuple[List[str], str]] = []
+
+    def _add(self, command: List[str], failure: str) -> "InterfaceTransaction":
+        self._changes.append((command, failure))
+        return self
+
+    def set_state(self, state: InterfaceState) -> "InterfaceTransaction":
+        return self._add(
+            ["ip", "link", "set", self.interface.if_name, state.name.lower()],
+            "Failed to set link state",
+        )
+
+    def set_mtu(self, mtu: int) -> "InterfaceTransaction":
+        return self._add(
+            ["ip", "link", "set", self.interface.if_name, "mtu", str(mtu)],
+            "Failed to set link mtu",
+        )
+
+    def set_master(self, new_master: str) -> "InterfaceTransaction":
+        command = ["ip", "link", "set", "dev", self.interface.if_name]
+        if new_master == "nomaster":
+            command += ["nomaster"]
+        else:
+            command += ["master", new_master]
+
+        return self._add(command, "Failed to set link master")
+
+    def add_address(
+        self, address: Union[IPv4Interface, IPv6Interface]
+    ) -> "InterfaceTransaction":
+        return self._add(
+            ["ip", "address", "add", str(address), "dev", self.interface.if_name],
+            "Failed to add address",
+        )
+
+    def del_address(
+        self, address: Union[IPv4Interface, IPv6Interface]
+    ) -> "InterfaceTransaction":
+        return self._add(
+            ["ip", "address", "del", str(address), "dev", self.interface.if_name],
+            "Failed to delete address",
+        )
+
+    def commit(self) -> Interface:
+        """
+        Apply all the changes, and get the interface as it is afterwards.  All the changes
+        are tried, if some of them fail, an error reporting each of them is raised.
+        """
+        if not self._changes:
+            return self.interface
+
+        host = self.interface.host
+        errors = host.exec_batch([command for command, _ in self._changes])
+        self._changes, changes = [], self._changes
+
+        failures = [
+            f"{failure} with command {command}: {stderr}"
+            for (command, failure), stderr in zip(changes, errors)
+            if stderr
+        ]
+        if failures:
+            raise RuntimeError("\n".join(failures))
+
+        self.interface = self.service.get_one(self.interface.if_name, host=host)
+        return self.interface
+
+
 class InterfaceService(BaseService[Interface, InterfaceCreate, InterfaceUpdate]):
     def __init__(self, host: Host) -> None:
         super().__init__(host)
 
-    def get_all_raw(self, host: Optional[Host] = None) -> List[Dict[str, Any]]:
-        stdout, stderr = (host or self.host).exec(["ip", "-j", "-details", "addr"])
+    def get_all_raw(
+        self,
+        host: Optional[Host] = None,
+        link_filter: Optional[LinkFilter] = None,
+        addresses: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the interfaces selected by the filter, all of them by default.  If the addresses
+        are not needed, the addr_info of the interfaces is left empty.  Raises NotFound if
+        the filter selects the slaves of a master which doesn't exist.
+        """
+        master = link_filter.master if link_filter is not None else None
+        raw_interfaces_list = self.netlink_read(
+            lambda netlink_socket: netlink_socket.links(
+                link_filter=link_filter, addresses=addresses
+            ),
+            host,
+        )
+        if raw_interfaces_list is not None:
+            # The links of a master which doesn't exist are not told apart from the ones of
+            # a master without any slave, the master is only looked up in that case
+            if (
+                not raw_interfaces_list
+                and master is not None
+                and self.get_one_raw(master, host) is None
+            ):
+                raise NotFound(f"Could not find any interface with name {master}")
+
+            return raw_interfaces_list
+
+        # ip filters on the kind and the master itself
+        command = ["ip", "-j", "-details", "addr" if addresses else "link", "show"]
+        if link_filter is not None and link_filter.kind is not None:
+            command += ["type", link_filter.kind]
+        if master is not None:
+            command += ["master", master]
+
+        stdout, stderr = (host or self.host).exec(command)
+        if master is not None and "Device does not exist" in stderr:
+            # The master might have been deleted since the request came in
+            raise NotFound(f"Could not find any interface with name {master}")
         if stderr:
             raise RuntimeError(f"Failed to run addr command on host: {stderr}")
 
-        raw_interfaces = json.loads(stdout or "[]")
-        return pydantic.parse_obj_as(List[Dict[str, Any]], raw_interfaces)
-
-    def get_all(self, host: Optional[Host] = None) -> List[Interface]:
+        raw_interfaces = pydantic.parse_obj_as(
+            List[Dict[str, Any]], json.loads(stdout or "[]")
+        )
+        if link_filter is not None:
+            raw_interfaces = [
+                raw_interface
+                for raw_interface in raw_interfaces
+                if link_filter.match_link(raw_interface)
+            ]
+
+        if not addresses:
+            for raw_interface in raw_interfaces:
+                raw_interface["addr_info"] = []
+
+        return raw_interfaces
+
+    def get_all(
+        self,
+        host: Optional[Host] = None,
+        link_filter: Optional[LinkFilter] = None,
+        addresses: bool = True,
+    ) -> List[Interface]:
         interfaces: List[Interface] = []
-        for raw_interface in self.get_all_raw(host):
+        for raw_interface in self.get_all_raw(host, link_filter, addresses):
             try:
                 interface = Interface(**raw_interface)
                 interface.attach_host(host or self.host)
@@ -65,6 +201,12 @@ class InterfaceService(BaseService[Interface, InterfaceCreate, InterfaceUpdate])
     def get_one_raw(
         self, identifier: str, host: Optional[Host] = None
     ) -> Optional[Dict[str, Any]]:
+        raw_interfaces_list = self.netlink_read(
+            lambda netlink_socket: netlink_socket.links(identifier), host
+        )
+        if raw_interfaces_list is not None:
+            return raw_interfaces_list[0] if raw_interfaces_list else None
+
         stdout, stderr = (host or self.host).exec(
             ["ip", "-j", "-details", "addr", "show", identifier]
         )
@@ -106,11 +248,10 @@ class InterfaceService(BaseService[Interface, InterfaceCreate, InterfaceUpdate])
 
         return interface
 
-    def create(self, o: InterfaceCreate) -> Interface:
-        existing_interface = self.get_one_or_default(o.name)
-        if existing_interface:
-            raise Conflict("An interface with this name already exists")
-
+    def create_command(self, o: InterfaceCreate) -> List[str]:
+        """
+        Get the command creating the given interface.
+        """
         command = [
             "ip",
             "link",
@@ -135,6 +276,14 @@ class InterfaceService(BaseService[Interface, InterfaceCreate, InterfaceUpdate])
         if o.peer is not None:
             command += ["peer", o.peer]
 
+        return command
+
+    def create(self, o: InterfaceCreate) -> Interface:
+        existing_interface = self.get_one_or_default(o.name)
+        if existing_interface:
+            raise Conflict("An interface with this name already exists")
+
+        command = self.create_command(o)
         _, stderr = self.host.exec(command)
         if stderr:
             raise RuntimeError(
@@ -149,17 +298,25 @@ class InterfaceService(BaseService[Interface, InterfaceCreate, InterfaceUpdate])
 
         return existing_interface
 
+    def transaction(self, interface: Interface) -> InterfaceTransaction:
+        return InterfaceTransaction(self, interface)
+
     def update(self, identifier: str, o: InterfaceUpdate) -> Interface:
         interface = self.get_one(identifier)
+        transaction = self.transaction(interface)
 
         if o.mtu is not None:
-            interface = self.set_mtu(interface, o.mtu)
+            transaction.set_mtu(o.mtu)
 
         if o.master is not None:
-            interface = self.set_master(interface, o.master)
+            transaction.set_master(o.master)
 
         if o.state is not None:
-            interface = self.set_state(interface, o.state)
+            transaction.set_state(o.state)
+            if o.state == InterfaceState.DOWN and o.addresses is not None:
+                # Bringing a link down can flush its ipv6 addresses, the addresses are
+                # compared to what is left afterwards
+                interface = transaction.commit()
 
         if o.addresses is not None:
             existing_addresses: Set[Union[IPv4Interface, IPv6Interface]] = {
@@ -174,10 +331,12 @@ class InterfaceService(BaseService[Interface, InterfaceCreate, InterfaceUpdate])
             missing_addresses = desired_addresses - existing_addresses
 
             for addr in extra_addresses:
-                interface = self.del_address(interface, addr)
+                transaction.del_address(addr)
 
             for addr in missing_addresses:
-                interface = self.add_address(interface, addr)
+                transaction.add_address(addr)
+
+        interface = transaction.commit()
 
         if o.name is not None:
             interface = self.rename(interface, o.name)
@@ -188,97 +347,23 @@ class InterfaceService(BaseService[Interface, InterfaceCreate, InterfaceUpdate])
         return interface
 
     def set_state(self, interface: Interface, state: InterfaceState) -> Interface:
-        command = [
-            "ip",
-            "link",
-            "set",
-            interface.if_name,
-            state.name.lower(),
-        ]
-        _, stderr = interface.host.exec(command)
-        if stderr:
-            raise RuntimeError(
-                f"Failed to set link state with command {command}: {stderr}"
-            )
-
-        return self.get_one(interface.if_name, host=interface.host)
+        return self.transaction(interface).set_state(state).commit()
 
     def set_mtu(self, interface: Interface, mtu: int) -> Interface:
-        command = [
-            "ip",
-            "link",
-            "set",
-            interface.if_name,
-            "mtu",
-            str(mtu),
-        ]
-        _, stderr = interface.host.exec(command)
-        if stderr:
-            raise RuntimeError(
-                f"Failed to set link mtu with command {command}: {stderr}"
-            )
-
-        return self.get_one(interface.if_name, host=interface.host)
+        return self.transaction(interface).set_mtu(mtu).commit()
 
     def set_master(self, interface: Interface, new_master: str) -> Interface:
-        command = [
-            "ip",
-            "link",
-            "set",
-            "dev",
-            interface.if_name,
-        ]
-
-        if new_master == "nomaster":
-            command += ["nomaster"]
-        else:
-            command += ["master", new_master]
-
-        _, stderr = interface.host.exec(command)
-        if stderr:
-            raise RuntimeError(
-                f"Failed to set link master with command {command}: {stderr}"
-            )
-
-        return self.get_one(interface.if_name, host=interface.host)
+        return self.transaction(interface).set_master(new_master).commit()
 
     def add_address(
         self, interface: Interface, address: Union[IPv4Interface, IPv6Interface]
     ) -> Interface:
-        command = [
-            "ip",
-            "address",
-            "add",
-            str(address),
-            "dev",
-            interface.if_name,
-        ]
-        _, stderr = interface.host.exec(command)
-        if stderr:
-            raise RuntimeError(
-                f"Failed to add address with command {command}: {stderr}"
-            )
-
-        return self.get_one(interface.if_name, host=interface.host)
+        return self.transaction(interface).add_address(address).commit()
 
     def del_address(
         self, interface: Interface, address: Union[IPv4Interface, IPv6Interface]
     ) -> Interface:
-        command = [
-            "ip",
-            "address",
-            "del",
-            str(address),
-            "dev",
-            interface.if_name,
-        ]
-        _, stderr = interface.host.exec(command)
-        if stderr:
-            raise RuntimeError(
-                f"Failed to delete address with command {command}: {stderr}"
-            )
-
-        return self.get_one(interface.if_name, host=interface.host)
+        return self.transaction(interface).del_address(address).commit()
 
     def rename(self, interface: Interface, new_name: str) -> Interface:
         previous_state = interface.oper_state
@@ -310,12 +395,14 @@ class InterfaceService(BaseService[Interface, InterfaceCreate, InterfaceUpdate])
     def move(self, interface: Interface, new_namespace: Union[str, int]) -> Interface:
         namespace_name: Optional[str] = None
         if isinstance(new_namespace, int):
-            for namespace in NamespaceService(self.host).get_all():
-                if namespace.ns_id == new_namespace:
-                    namespace_name = namespace.name
-                    break
+            # The ids are relative to the namespace the interface is in
+            namespace = service_registry.service(
+                NamespaceService, self.host.namespace
+            ).get_one_by_id_or_default(new_namespace)
+            if namespace is not None:
+                namespace_name = namespace.name
         else:
-            NamespaceService(Host()).get_one(new_namespace)
+            service_registry.service(NamespaceService).get_one(new_namespace)
             namespace_name = new_namespace
 
         if not namespace_name:
@@ -341,7 +428,7 @@ class InterfaceService(BaseService[Interface, InterfaceCreate, InterfaceUpdate])
                 f"Failed to move interface to new namespace with command {command}: {stderr}"
             )
 
-        interface = InterfaceService(NamespaceHost(namespace_name)).get_one(
+        interface = service_registry.service(InterfaceService, namespace_name).get_one(
             interface.if_name
         )
         if previous_state == InterfaceState.UP:
@@ -0,0 +1,82 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import pydantic
+from werkzeug.exceptions import BadRequest, NotFound  # type: ignore
+
+from nfv_test_api.v2.data.interface_stats import InterfaceStats
+from nfv_test_api.v2.services.interface import InterfaceService
+from nfv_test_api.v2.services.registry import service_registry
+
+LOGGER = logging.getLogger(__name__)
+
+# The windows the rates are computed over when none are requested, in seconds
+DEFAULT_RATE_WINDOWS = (1.0, 10.0, 60.0)
+
+
+class InterfaceStatsService(InterfaceService):
+    """
+    Reads the counters of the interfaces, and their rates from the samples taken in the
+    background.
+    """
+
+    def get_stats_raw(self, identifier: str) -> Optional[Dict[str, Any]]:
+        raw_links = self.netlink_read(
+            lambda netlink_socket: netlink_socket.link_stats(identifier)
+        )
+        if raw_links is None:
+            stdout, stderr = self.host.exec(
+                ["ip", "-j", "-s", "link", "show", "dev", identifier]
+            )
+            if "does not exist" in stderr:
+                return None
+            if stderr:
+                raise RuntimeError(f"Failed to run link show command on host: {stderr}")
+
+            raw_links = pydantic.parse_obj_as(
+                List[Dict[str, Any]], json.loads(stdout or "[]")
+            )
+
+        if not raw_links:
+            return None
+
+        return raw_links[0]
+
+    def get_stats(
+        self, identifier: str, windows: Optional[Sequence[float]] = None
+    ) -> InterfaceStats:
+        sampler = service_registry.link_stats_sampler(self.host.namespace)
+        if windows is None:
+            windows = [
+                window for window in DEFAULT_RATE_WINDOWS if window <= sampler.history
+            ]
+
+        too_long = [window for window in windows if window > sampler.history]
+        if too_long:
+            raise BadRequest(
+                f"The samples are only kept for {sampler.history}s, can not compute "
+                f"rates over {', '.join(str(window) for window in too_long)}s"
+            )
+
+        raw_stats = self.get_stats_raw(identifier)
+        if raw_stats is None:
+            raise NotFound(f"Could not find any interface with name {identifier}")
+
+        rates = sampler.rates(identifier, windows)
+        return InterfaceStats(**{**raw_stats, "rates": rates})
@@ -0,0 +1,91 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from werkzeug.exceptions import NotFound  # type: ignore
+
+from nfv_test_api.config import get_config
+from nfv_test_api.host import Host, NamespaceHost
+from nfv_test_api.v2.data.inventory import Inventory, NamespaceInventory
+from nfv_test_api.v2.services.interface import InterfaceService
+from nfv_test_api.v2.services.namespace import NamespaceService
+from nfv_test_api.v2.services.registry import service_registry
+from nfv_test_api.v2.services.route import RouteService
+
+LOGGER = logging.getLogger(__name__)
+
+
+def inventory_pool() -> ThreadPoolExecutor:
+    """
+    Get the pool reading the namespaces.
+    """
+    return service_registry.pool("inventory", get_config().inventory_workers)
+
+
+class InventoryService:
+    """
+    Reads the interfaces and routes of the host and of all of its namespaces at once.
+    """
+
+    def __init__(self, host: Host) -> None:
+        self.host = host
+
+    def namespace_inventory(self, namespace: Optional[str]) -> NamespaceInventory:
+        # The namespaces the api doesn't work in are read with a host of their own, which
+        # is closed afterwards.  Registering them would keep a thread and ip batch workers
+        # in each one until it is deleted through the api, which might never happen.  The
+        # state cache, when it is enabled, is still kept for each namespace.
+        host: Host
+        registered = namespace is None or namespace in service_registry.namespaces()
+        if registered:
+            host = service_registry.host(namespace)
+        else:
+            host = NamespaceHost(str(namespace))
+
+        try:
+            return NamespaceInventory(  # type: ignore
+                interfaces=InterfaceService(host).get_all(),
+                routes=RouteService(host).get_all(),
+            )
+        except (RuntimeError, OSError, NotFound) as e:
+            # The namespace might have been deleted in the meantime
+            LOGGER.warning("Failed to read the inventory of %s: %s", namespace, e)
+            return NamespaceInventory(error=str(e))  # type: ignore
+        finally:
+            if not registered:
+                host.close()
+
+    def get(self) -> Inventory:
+        names: List[str] = []
+        for namespace in service_registry.service(NamespaceService).get_all():
+            if namespace.name is not None:
+                names.append(namespace.name)
+
+        pool = inventory_pool()
+        host_inventory = pool.submit(self.namespace_inventory, None)
+        namespace_inventories = {
+            name: pool.submit(self.namespace_inventory, name) for name in names
+        }
+
+        return Inventory(  # type: ignore
+            host_namespace=host_inventory.result(),
+            namespaces={
+                name: inventory.result()
+                for name, inventory in namespace_inventories.items()
+            },
+        )
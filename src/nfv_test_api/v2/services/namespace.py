@@ -15,25 +15,67 @@
 """
 import json
 import logging
-from typing import Any, Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
 
 import pydantic
 from pydantic import ValidationError
 from werkzeug.exceptions import Conflict, NotFound  # type: ignore
 
+from nfv_test_api.config import get_config
 from nfv_test_api.host import Host
+from nfv_test_api.namespace_index import NamespaceIndex
 from nfv_test_api.v2.data.common import CommandStatus
 from nfv_test_api.v2.data.namespace import Namespace, NamespaceCreate, NamespaceUpdate
 from nfv_test_api.v2.services.base_service import BaseService, K
+from nfv_test_api.v2.services.registry import service_registry
 
 LOGGER = logging.getLogger(__name__)
 
+R = TypeVar("R")
+
+
+def namespace_pool() -> ThreadPoolExecutor:
+    """
+    Get the pool setting the namespaces up and tearing them down.
+    """
+    return service_registry.pool("namespace", get_config().namespace_workers)
+
 
 class NamespaceService(BaseService[Namespace, NamespaceCreate, NamespaceUpdate]):
     def __init__(self, host: Host) -> None:
         super().__init__(host)
 
+    def index_read(self, read: Callable[[NamespaceIndex], R]) -> Optional[R]:
+        """
+        Run a lookup in the namespace index, if it is enabled in the config.  Returns None
+        when the lookup should list the namespaces instead, either because the index is
+        disabled, or because it failed.
+        """
+        if not get_config().namespace_index:
+            return None
+
+        try:
+            return read(service_registry.namespace_index(self.host.namespace))
+        except OSError as e:
+            LOGGER.warning(
+                "Namespace index lookup failed in namespace %s, listing them instead: %s",
+                self.host.namespace,
+                str(e),
+            )
+            return None
+
     def get_all_raw(self) -> List[Dict[str, Any]]:
+        raw_namespaces = self.index_read(lambda index: index.namespaces())
+        if raw_namespaces is not None:
+            return raw_namespaces
+
+        raw_namespaces = self.netlink_read(
+            lambda netlink_socket: netlink_socket.namespaces()
+        )
+        if raw_namespaces is not None:
+            return raw_namespaces
+
         stdout, stderr = self.host.exec(["ip", "-j", "-details", "netns", "list-id"])
         if stderr:
             raise RuntimeError(f"Failed to run netns list-id command on host: {stderr}")
@@ -56,6 +98,11 @@ class NamespaceService(BaseService[Namespace, NamespaceCreate, NamespaceUpdate])
         return namespaces
 
     def get_one_raw(self, identifier: str) -> Optional[Dict[str, Any]]:
+        # Wrapped, so that a namespace missing from the index is told apart from a failure
+        indexed = self.index_read(lambda index: (index.by_name(identifier),))
+        if indexed is not None:
+            return indexed[0]
+
         raw_namespaces_list = [
             raw_namespace
             for raw_namespace in self.get_all_raw()
@@ -82,6 +129,29 @@ class NamespaceService(BaseService[Namespace, NamespaceCreate, NamespaceUpdate])
         namespace.attach_host(self.host)
         return namespace
 
+    def get_one_by_id_or_default(
+        self, ns_id: int, default: Optional[K] = None
+    ) -> Union[Namespace, None, K]:
+        indexed = self.index_read(lambda index: (index.by_id(ns_id),))
+        if indexed is not None:
+            raw_namespace = indexed[0]
+        else:
+            raw_namespace = next(
+                (
+                    raw_namespace
+                    for raw_namespace in self.get_all_raw()
+                    if raw_namespace.get("nsid") == ns_id
+                ),
+                None,
+            )
+
+        if raw_namespace is None:
+            return default
+
+        namespace = Namespace(**raw_namespace)
+        namespace.attach_host(self.host)
+        return namespace
+
     def get_one(self, identifier: str) -> Namespace:
         namespace = self.get_one_or_default(identifier)
         if not namespace:
@@ -95,7 +165,7 @@ class NamespaceService(BaseService[Namespace, NamespaceCreate, NamespaceUpdate])
             raise Conflict("A namespace with this name already exists")
 
         if o.ns_id is not None:
-            if o.ns_id in [ns.ns_id for ns in self.get_all()]:
+            if self.get_one_by_id_or_default(o.ns_id):
                 raise Conflict("A namespace with this id already exists")
 
         _, stderr = self.host.exec(["ip", "netns", "add", o.name])
@@ -108,6 +178,7 @@ class NamespaceService(BaseService[Namespace, NamespaceCreate, NamespaceUpdate])
         if stderr:
             raise RuntimeError(f"Failed to set namespace id: {stderr}")
 
+        self.index_read(lambda index: index.refresh(o.name))
         existing_namespace = self.get_one_or_default(o.name)
         if existing_namespace:
             return existing_namespace
@@ -124,10 +195,14 @@ class NamespaceService(BaseService[Namespace, NamespaceCreate, NamespaceUpdate])
         if not existing_namespace:
             return
 
+        # The processes and threads we run inside of the namespace would keep it alive
+        service_registry.invalidate(identifier)
+
         _, stderr = self.host.exec(["ip", "netns", "del", identifier])
         if stderr:
             raise RuntimeError(f"Failed to delete namespace: {stderr}")
 
+        self.index_read(lambda index: index.refresh(identifier))
         existing_namespace = self.get_one_or_default(identifier)
         if not existing_namespace:
             return
@@ -0,0 +1,435 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import socket
+from ipaddress import IPv4Interface, IPv6Interface, ip_interface, ip_network
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from pydantic import ValidationError
+from werkzeug.exceptions import BadRequest  # type: ignore
+
+from nfv_test_api.host import Host
+from nfv_test_api.v2.data.interface import Interface, InterfaceState, LinkInfo
+from nfv_test_api.v2.data.namespace import NamespaceCreate
+from nfv_test_api.v2.data.namespace_state import (
+    InterfaceDesiredState,
+    NamespaceState,
+    NamespaceStateApplied,
+)
+from nfv_test_api.v2.data.route import Route, RouteCreate
+from nfv_test_api.v2.services.bulk_interface import BulkInterfaceService
+from nfv_test_api.v2.services.namespace import NamespaceService
+from nfv_test_api.v2.services.registry import service_registry
+from nfv_test_api.v2.services.route import MANAGED_ROUTE_PROTOCOLS, RouteService
+
+LOGGER = logging.getLogger(__name__)
+
+RouteKey = Tuple[int, str]
+Address = Union[IPv4Interface, IPv6Interface]
+
+
+def route_key(family: int, dst: str) -> RouteKey:
+    if dst == "default":
+        return family, dst
+
+    return family, str(ip_network(dst, strict=False))
+
+
+def desired_route_key(route: RouteCreate) -> RouteKey:
+    if route.dst == "default":
+        family = socket.AF_INET
+        if route.gateway is not None and route.gateway.version == 6:
+            family = socket.AF_INET6
+        return family, "default"
+
+    family = socket.AF_INET if route.dst.version == 4 else socket.AF_INET6
+    return family, str(route.dst.network)
+
+
+def addresses(raw_interface: Dict[str, Any]) -> Set[Address]:
+    return {
+        ip_interface(f"{addr_info['local']}/{addr_info['prefixlen']}")
+        for addr_info in raw_interface.get("addr_info", [])
+    }
+
+
+def is_link_local(address: Address) -> bool:
+    return address.version == 6 and address.ip.is_link_local
+
+
+class NamespaceStateService:
+    """
+    Brings the interfaces and routes of a namespace to a desired state.  The current state
+    is read once, compared to the desired one, and the differences are applied in a
+    single batch.  If there are none, nothing else is done.
+    """
+
+    def __init__(self, host: Host) -> None:
+        self.host = host
+        self.interface_service = BulkInterfaceService(host)
+        self.route_service = RouteService(host)
+
+    def read(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[RouteKey, Dict[str, Any]]]:
+        """
+        Get the raw interfaces of the namespace by name, and its raw routes by family and
+        destination.
+        """
+        interfaces = {
+            raw_interface["ifname"]: raw_interface
+            for raw_interface in self.interface_service.get_all_raw()
+        }
+        routes = {
+            route_key(family, raw_route["dst"]): raw_route
+            for family in (socket.AF_INET, socket.AF_INET6)
+            for raw_route in self.route_service.get_all_raw(family)
+        }
+        return interfaces, routes
+
+    def applied(
+        self,
+        commands: List[List[str]],
+        interfaces: Dict[str, Dict[str, Any]],
+        routes: Dict[RouteKey, Dict[str, Any]],
+    ) -> NamespaceStateApplied:
+        parsed_interfaces: List[Interface] = []
+        for raw_interface in interfaces.values():
+            try:
+                parsed_interfaces.append(Interface(**raw_interface))
+            except ValidationError as e:
+                LOGGER.error(f"Failed to parse an interface: {raw_interface}\n{str(e)}")
+
+        parsed_routes: List[Route] = []
+        for raw_route in routes.values():
+            try:
+                parsed_routes.append(Route(**raw_route))
+            except ValidationError as e:
+                LOGGER.error(f"Failed to parse a route: {raw_route}\n{str(e)}")
+
+        return NamespaceStateApplied(  # type: ignore
+            commands=commands, interfaces=parsed_interfaces, routes=parsed_routes
+        )
+
+    def interface_commands(
+        self,
+        desired: InterfaceDesiredState,
+        existing: Optional[Dict[str, Any]],
+        create: bool,
+    ) -> List[List[str]]:
+        """
+        Get the commands bringing an interface to its desired state.  If it doesn't exist,
+        it is created first, unless it is the peer of a veth created before it.
+        """
+        commands: List[List[str]] = []
+        if create:
+            command = self.interface_service.create_command(desired.create_form())
+            if desired.peer_netns is not None:
+                command += ["netns", desired.peer_netns]
+            commands.append(command)
+        elif desired.mtu is not None and (
+            existing is None or existing.get("mtu") != desired.mtu
+        ):
+            commands.append(
+                ["ip", "link", "set", desired.name, "mtu", str(desired.mtu)]
+            )
+
+        if desired.master is not None:
+            current_master = existing.get("master") if existing else None
+            if desired.master == "nomaster" and current_master is not None:
+                commands.append(["ip", "link", "set", "dev", desired.name, "nomaster"])
+            elif desired.master not in ("nomaster", current_master):
+                commands.append(
+                    ["ip", "link", "set", "dev", desired.name, "master", desired.master]
+                )
+
+        if desired.addresses is not None:
+            current_addresses = addresses(existing) if existing else set()
+            desired_addresses = set(desired.addresses)
+            for address in sorted(current_addresses - desired_addresses, key=str):
+                if not is_link_local(address):
+                    commands.append(
+                        ["ip", "address", "del", str(address), "dev", desired.name]
+                    )
+            for address in sorted(desired_addresses - current_addresses, key=str):
+                commands.append(
+                    ["ip", "address", "add", str(address), "dev", desired.name]
+                )
+
+        if desired.state is not None:
+            # The administrative state, the operational one also depends on the carrier
+            is_up = existing is not None and "UP" in existing.get("flags", [])
+            if is_up != (desired.state == InterfaceState.UP):
+                commands.append(
+                    ["ip", "link", "set", desired.name, desired.state.name.lower()]
+                )
+
+        return commands
+
+    def route_command(self, route: RouteCreate) -> List[str]:
+        family = desired_route_key(route)[0]
+        command = ["ip", "route", "replace", str(route.dst)]
+        command += self.route_service.nexthops_arguments(route, family)
+        if route.dst == "default" and family == socket.AF_INET6:
+            command.insert(1, "-6")
+
+        return command
+
+    def commands(
+        self,
+        state: NamespaceState,
+        interfaces: Dict[str, Dict[str, Any]],
+        routes: Dict[RouteKey, Dict[str, Any]],
+    ) -> List[List[str]]:
+        """
+        Get the commands bringing the namespace from its current interfaces and routes to
+        the desired state.
+        """
+        plan = StatePlan(state, interfaces)
+        plan.check()
+
+        commands: List[List[str]] = []
+        desired_routes = {desired_route_key(route): route for route in state.routes}
+        for key, raw_route in routes.items():
+            if raw_route.get("dev") in plan.deleted:
+                # Gone with its interface
+                continue
+
+            if (
+                key not in desired_routes
+                and raw_route.get("protocol") in MANAGED_ROUTE_PROTOCOLS
+            ):
+                command = ["ip", "route", "del", key[1]]
+                if key[0] == socket.AF_INET6:
+                    command.insert(1, "-6")
+                commands.append(command)
+
+        commands += [["ip", "link", "del", name] for name in plan.removed]
+
+        for desired in state.interfaces:
+            existing: Optional[Dict[str, Any]] = None
+            if desired.name not in plan.created:
+                existing = interfaces[desired.name]
+                if existing.get("master") in plan.deleted:
+                    # Deleting the master releases its slaves
+                    existing = {**existing, "master": None}
+
+            commands += self.interface_commands(
+                desired,
+                existing,
+                desired.name in plan.created and desired.name not in plan.peers_created,
+            )
+
+        for key, route in desired_routes.items():
+            current_route = routes.get(key)
+            if (
+                current_route is not None
+                and current_route.get("dev") not in plan.deleted
+                and self.route_service.same_route(route, current_route)
+            ):
+                continue
+            commands.append(self.route_command(route))
+
+        return commands
+
+    def apply_commands(self, state: NamespaceState) -> List[List[str]]:
+        """
+        Bring the namespace to the desired state, and return the commands which were
+        needed, without reading the namespace again.
+        """
+        interfaces, routes = self.read()
+        commands = self.commands(state, interfaces, routes)
+        if not commands:
+            return commands
+
+        LOGGER.debug(
+            "Applying the state of the namespace in %d commands", len(commands)
+        )
+        errors = self.host.exec_batch(commands)
+        failures = [
+            f"Failed to apply the state with command {command}: {stderr}"
+            for command, stderr in zip(commands, errors)
+            if stderr
+        ]
+        if failures:
+            raise RuntimeError("\n".join(failures))
+
+        return commands
+
+    def apply(self, state: NamespaceState) -> NamespaceStateApplied:
+        commands = self.apply_commands(state)
+        interfaces, routes = self.read()
+        return self.applied(commands, interfaces, routes)
+
+
+class StatePlan:
+    """
+    The interfaces to remove and to create to get from the current interfaces of a
+    namespace to its desired state.
+    """
+
+    def __init__(
+        self, state: NamespaceState, interfaces: Dict[str, Dict[str, Any]]
+    ) -> None:
+        self.state = state
+        self.interfaces = interfaces
+
+        # The other end of each veth of the namespace
+        self.peers: Dict[str, str] = {
+            name: raw_interface["link"]
+            for name, raw_interface in interfaces.items()
+            if raw_interface.get("linkinfo", {}).get("info_kind") == "veth"
+            and "link" in raw_interface
+        }
+
+        # The interfaces of the state, the listed ones and the peers of the listed veths
+        self.listed = {desired.name for desired in state.interfaces}
+        self.kept = {"lo"} | self.listed
+        for desired in state.interfaces:
+            if desired.peer is not None and desired.peer_netns is None:
+                self.kept.add(desired.peer)
+
+        # The interfaces which are deleted, and all the ones which are gone with them
+        self.removed: List[str] = []
+        self.deleted: Set[str] = set()
+        for name in interfaces.keys():
+            if name in self.kept and not self.recreated(name):
+                continue
+            if name not in self.kept and self.peers.get(name) in self.kept:
+                continue
+            if name not in self.deleted:
+                self.removed.append(name)
+                self.deleted.add(name)
+                if name in self.peers:
+                    self.deleted.add(self.peers[name])
+
+        self.created = {
+            name
+            for name in self.listed
+            if name not in interfaces or name in self.deleted
+        }
+        # The interfaces created as the peer of a veth listed before them
+        self.peers_created: Dict[str, str] = {}
+        for desired in state.interfaces:
+            if (
+                desired.name in self.created
+                and desired.peer is not None
+                and desired.peer_netns is None
+            ):
+                self.peers_created[desired.peer] = desired.name
+
+    def recreated(self, name: str) -> bool:
+        """
+        Whether the interface exists with another kind than the desired one.
+        """
+        kind = self.interfaces[name].get("linkinfo", {}).get("info_kind")
+        return any(
+            desired.name == name
+            and desired.type is not None
+            and kind is not None
+            and kind != desired.type
+            for desired in self.state.interfaces
+        )
+
+    def check(self) -> None:
+        """
+        Check that the state can be applied, before changing anything.
+        """
+        problems: List[str] = []
+        existing = set(self.interfaces.keys()) - self.deleted
+        listed: Set[str] = set()
+        for desired in self.state.interfaces:
+            if desired.name in listed:
+                problems.append(f"Interface {desired.name} is listed more than once")
+            listed.add(desired.name)
+
+            if desired.name in self.created and desired.name not in self.peers_created:
+                if desired.type is None:
+                    problems.append(
+                        f"Interface {desired.name} doesn't exist, its type is needed "
+                        "to create it"
+                    )
+                elif desired.type == LinkInfo.Kind.BOND:
+                    problems.append(
+                        f"Bond interface {desired.name} can not be created from a state"
+                    )
+
+                if desired.peer is not None and desired.peer_netns is None:
+                    if desired.peer in existing:
+                        problems.append(
+                            f"The peer {desired.peer} of {desired.name} already exists"
+                        )
+                if desired.parent_dev is not None and desired.parent_dev not in (
+                    existing | self.kept
+                ):
+                    problems.append(
+                        f"The parent interface {desired.parent_dev} of {desired.name} "
+                        "doesn't exist"
+                    )
+                if (
+                    desired.peer_netns is not None
+                    and service_registry.service(NamespaceService).get_one_raw(
+                        desired.peer_netns
+                    )
+                    is None
+                ):
+                    problems.append(
+                        f"The namespace {desired.peer_netns} of the peer of "
+                        f"{desired.name} doesn't exist"
+                    )
+
+            if desired.master not in (None, "nomaster") and desired.master not in (
+                existing | self.kept
+            ):
+                problems.append(
+                    f"The master {desired.master} of {desired.name} doesn't exist"
+                )
+
+        keys: Set[RouteKey] = set()
+        for route in self.state.routes:
+            key = desired_route_key(route)
+            if key in keys:
+                problems.append(f"The route to {route.dst} is listed more than once")
+            keys.add(key)
+
+            if route.nexthops is not None or route.table is not None:
+                problems.append(
+                    f"The route to {route.dst} can not have next hops nor a table in a "
+                    "state, they can be created on their own"
+                )
+            if route.metric is not None:
+                problems.append(
+                    f"The route to {route.dst} can not have a metric in a state, it is "
+                    "identified by its destination"
+                )
+            if route.dev is not None and route.dev not in self.kept:
+                problems.append(
+                    f"The interface {route.dev} of the route to {route.dst} is not "
+                    "in the state"
+                )
+
+        if problems:
+            raise BadRequest("\n".join(problems))
+
+
+def apply_namespace_state(name: str, state: NamespaceState) -> NamespaceStateApplied:
+    """
+    Apply the state to the namespace with the given name, it is created if it doesn't
+    exist yet.
+    """
+    namespace_service = service_registry.service(NamespaceService)
+    if namespace_service.get_one_or_default(name) is None:
+        namespace_service.create(NamespaceCreate(name=name))  # type: ignore
+
+    return service_registry.service(NamespaceStateService, name).apply(state)
@@ -0,0 +1,338 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+from ipaddress import (
+    IPv4Interface,
+    IPv4Network,
+    IPv6Interface,
+    IPv6Network,
+    ip_interface,
+)
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Set, Union
+
+from werkzeug.exceptions import BadRequest, HTTPException  # type: ignore
+
+from nfv_test_api.host import Host
+from nfv_test_api.v2.data.common import InputSafeName
+from nfv_test_api.v2.data.interface import LinkInfo
+from nfv_test_api.v2.data.namespace_state import InterfaceDesiredState, NamespaceState
+from nfv_test_api.v2.data.namespace_template import (
+    NamespaceTemplate,
+    NamespaceTemplateApplied,
+    NamespaceTemplateCopy,
+)
+from nfv_test_api.v2.services.bulk_interface import BulkInterfaceService
+from nfv_test_api.v2.services.namespace import NamespaceService, namespace_pool
+from nfv_test_api.v2.services.namespace_state import NamespaceStateService
+from nfv_test_api.v2.services.registry import service_registry
+
+LOGGER = logging.getLogger(__name__)
+
+# Each batch has to complete within the timeout of the ip batch worker, adding a namespace
+# or a veth takes about a millisecond
+BATCH_SIZE = 2000
+
+
+class PoolSubnet:
+    """
+    The subnet of a copy of a template in an address pool, as it is given to str.format.
+    It is formatted as the subnet, its items are its addresses with its prefix length, and
+    it has the attributes of the subnet.
+    """
+
+    def __init__(self, subnet: Union[IPv4Network, IPv6Network]) -> None:
+        self.subnet = subnet
+
+    def __getitem__(self, key: Union[int, str]) -> Union[IPv4Interface, IPv6Interface]:
+        # str.format only converts the positive indexes to int
+        try:
+            index = int(key)
+        except ValueError:
+            raise KeyError(key)
+
+        return ip_interface(f"{self.subnet[index]}/{self.subnet.prefixlen}")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.subnet, name)
+
+    def __str__(self) -> str:
+        return str(self.subnet)
+
+
+def render(value: Any, fields: Mapping[str, Any]) -> Any:
+    """
+    Format all the strings of a json value with the given fields.
+    """
+    if isinstance(value, str):
+        return value.format_map(fields)
+
+    if isinstance(value, list):
+        return [render(item, fields) for item in value]
+
+    if isinstance(value, dict):
+        return {key: render(item, fields) for key, item in value.items()}
+
+    return value
+
+
+class TemplateCopy(NamedTuple):
+    number: int
+    name: str
+    state: Optional[NamespaceState]
+    parent_interfaces: List[InterfaceDesiredState]
+
+
+class NamespaceTemplateService:
+    """
+    Instantiates namespace templates.  All the copies are rendered and checked before
+    changing anything.  The missing namespaces are then added in one batch, the parent
+    interfaces of all the copies are brought to their desired state in another one, and
+    the states of the copies are applied a few namespaces at a time.  A copy which fails
+    doesn't stop the other ones, applying the template again retries it.
+    """
+
+    def __init__(self, host: Host) -> None:
+        self.host = host
+        self.namespace_service = NamespaceService(host)
+        self.interface_service = BulkInterfaceService(host)
+        self.state_service = NamespaceStateService(host)
+
+    def render(self, template: NamespaceTemplate) -> List[TemplateCopy]:
+        """
+        Render all the copies of the template.  The copies are rendered the same way, if
+        one of them is invalid, the template is, it is reported right away.
+        """
+        copies: List[TemplateCopy] = []
+        for index in template.indexes:
+            fields: Dict[str, Any] = {"index": index}
+            try:
+                for pool_name, pool in template.pools.items():
+                    fields[pool_name] = PoolSubnet(pool.subnet(index))
+
+                name = template.name.format_map(fields)
+                InputSafeName(name=name)
+                fields["name"] = name
+                copies.append(
+                    TemplateCopy(
+                        number=index,
+                        name=name,
+                        state=(
+                            NamespaceState(**render(template.state, fields))
+                            if template.state is not None
+                            else None
+                        ),
+                        parent_interfaces=[
+                            InterfaceDesiredState(**render(interface, fields))
+                            for interface in template.parent_interfaces
+                        ],
+                    )
+                )
+            except KeyError as e:
+                raise BadRequest(
+                    f"Copy {index} of the template is invalid: unknown placeholder {e}"
+                )
+            except (IndexError, AttributeError, ValueError) as e:
+                # Including the ValidationErrors, they are ValueErrors
+                raise BadRequest(f"Copy {index} of the template is invalid: {e}")
+
+        return copies
+
+    def check(
+        self, copies: List[TemplateCopy], interfaces: Dict[str, Dict[str, Any]]
+    ) -> None:
+        """
+        Check that the copies are distinct, and that their parent interfaces can be
+        created, before changing anything.  The states of the copies are checked when they
+        are applied, their interfaces depend on the parent interfaces.
+        """
+        problems: List[str] = []
+        names: Set[str] = set()
+        parent_names: Set[str] = set()
+        for copy in copies:
+            if copy.name in names:
+                problems.append(
+                    f"Namespace {copy.name} is the name of copy {copy.number} and of "
+                    "a copy before it"
+                )
+                break
+            names.add(copy.name)
+
+            for desired in copy.parent_interfaces:
+                listed = {desired.name}
+                if desired.name in interfaces:
+                    pass
+                elif desired.type is None:
+                    problems.append(
+                        f"Parent interface {desired.name} doesn't exist, its type is "
+                        "needed to create it"
+                    )
+                elif desired.type == LinkInfo.Kind.BOND:
+                    problems.append(
+                        f"Bond interface {desired.name} can not be created from a "
+                        "template"
+                    )
+                elif desired.peer is not None and desired.peer_netns is None:
+                    listed.add(desired.peer)
+                    if desired.peer in interfaces:
+                        problems.append(
+                            f"The peer {desired.peer} of {desired.name} already exists"
+                        )
+
+                for name in sorted(listed & parent_names):
+                    problems.append(f"Parent interface {name} is listed more than once")
+                parent_names |= listed
+
+        if problems:
+            raise BadRequest("\n".join(problems))
+
+    def exec_batches(self, commands: List[List[str]]) -> List[str]:
+        errors: List[str] = []
+        for start in range(0, len(commands), BATCH_SIZE):
+            errors += self.host.exec_batch(commands[start : start + BATCH_SIZE])
+
+        return errors
+
+    def add_namespaces(self, names: List[str]) -> Dict[str, str]:
+        """
+        Add the namespaces which don't exist yet, and return the errors of the ones which
+        couldn't be added, by name.
+        """
+        existing = {
+            raw_namespace.get("name")
+            for raw_namespace in self.namespace_service.get_all_raw()
+        }
+        missing = [name for name in names if name not in existing]
+        if not missing:
+            return {}
+
+        LOGGER.debug("Adding %d namespaces", len(missing))
+        commands: List[List[str]] = []
+        for name in missing:
+            commands.append(["ip", "netns", "add", name])
+            commands.append(["ip", "netns", "set", name, "auto"])
+
+        errors = self.exec_batches(commands)
+        failures: Dict[str, str] = {}
+        for command, stderr in zip(commands, errors):
+            if stderr:
+                failures[command[3]] = failures.get(command[3], "") + (
+                    f"Failed to add the namespace with command {command}: {stderr}"
+                )
+
+        for name in missing:
+            self.namespace_service.index_read(lambda index: index.refresh(name))
+
+        return failures
+
+    def parent_commands(
+        self, copy: TemplateCopy, interfaces: Dict[str, Dict[str, Any]]
+    ) -> List[List[str]]:
+        commands: List[List[str]] = []
+        for desired in copy.parent_interfaces:
+            existing = interfaces.get(desired.name)
+            commands += self.state_service.interface_commands(
+                desired, existing, existing is None
+            )
+
+        return commands
+
+    def apply_copy(self, copy: TemplateCopy) -> NamespaceTemplateCopy:
+        if copy.state is None:
+            return NamespaceTemplateCopy(  # type: ignore
+                index=copy.number, name=copy.name
+            )
+
+        try:
+            commands = service_registry.service(
+                NamespaceStateService, copy.name
+            ).apply_commands(copy.state)
+        except (HTTPException, RuntimeError, OSError) as e:
+            LOGGER.warning(
+                "Failed to apply the state of namespace %s: %s", copy.name, e
+            )
+            error = e.description if isinstance(e, HTTPException) else str(e)
+            return NamespaceTemplateCopy(  # type: ignore
+                index=copy.number, name=copy.name, error=error
+            )
+        finally:
+            # Don't keep an ip batch worker and a thread in each copy, they are started
+            # again when the namespace is used
+            service_registry.host(copy.name).close()
+
+        return NamespaceTemplateCopy(  # type: ignore
+            index=copy.number, name=copy.name, commands=commands
+        )
+
+    def apply(self, template: NamespaceTemplate) -> NamespaceTemplateApplied:
+        copies = self.render(template)
+        interfaces = {
+            raw_interface["ifname"]: raw_interface
+            for raw_interface in self.interface_service.get_all_raw()
+        }
+        self.check(copies, interfaces)
+
+        failures = self.add_namespaces([copy.name for copy in copies])
+
+        parent_commands = {
+            copy.name: self.parent_commands(copy, interfaces)
+            for copy in copies
+            if copy.name not in failures
+        }
+        commands = [
+            command
+            for copy_commands in parent_commands.values()
+            for command in copy_commands
+        ]
+        LOGGER.debug(
+            "Applying the parent interfaces of %d copies in %d commands",
+            len(parent_commands),
+            len(commands),
+        )
+        errors = iter(self.exec_batches(commands))
+        for name, copy_commands in parent_commands.items():
+            for command in copy_commands:
+                stderr = next(errors)
+                if stderr:
+                    failures[name] = failures.get(name, "") + (
+                        f"Failed to apply the parent interfaces with command {command}: "
+                        f"{stderr}"
+                    )
+
+        pool = namespace_pool()
+        results = {
+            copy.name: pool.submit(self.apply_copy, copy)
+            for copy in copies
+            if copy.name not in failures
+        }
+
+        applied: List[NamespaceTemplateCopy] = []
+        for copy in copies:
+            if copy.name in failures:
+                applied.append(
+                    NamespaceTemplateCopy(  # type: ignore
+                        index=copy.number,
+                        name=copy.name,
+                        commands=parent_commands.get(copy.name, []),
+                        error=failures[copy.name],
+                    )
+                )
+                continue
+
+            result = results[copy.name].result()
+            result.commands = parent_commands[copy.name] + result.commands
+            applied.append(result)
+
+        return NamespaceTemplateApplied(copies=applied)  # type: ignore
@@ -0,0 +1,282 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+import logging
+import socket
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import pydantic
+from pydantic import ValidationError
+from typing_extensions import Literal
+from werkzeug.exceptions import Conflict, NotFound, UnprocessableEntity  # type: ignore
+
+from nfv_test_api.host import Host
+from nfv_test_api.v2.data.common import CommandStatus
+from nfv_test_api.v2.data.nexthop import (
+    Nexthop,
+    NexthopCreate,
+    NexthopGroupMember,
+    NexthopUpdate,
+)
+from nfv_test_api.v2.data.route import RouteNexthop
+from nfv_test_api.v2.services.base_service import BaseService, K
+
+LOGGER = logging.getLogger(__name__)
+
+Family = Literal["inet", "inet6"]
+
+# A nexthop object through a device, by family, gateway and device
+NexthopKey = Tuple[str, Optional[str], str]
+
+# A group of nexthop objects, by id and weight of each member
+GroupKey = Tuple[Tuple[int, int], ...]
+
+
+def nexthop_family(gateway: Any, family: Optional[Family]) -> Family:
+    """
+    The family of a nexthop object is the one of its gateway, or the given one if it doesn't
+    have any.
+    """
+    if gateway is not None:
+        return "inet6" if gateway.version == 6 else "inet"
+
+    return family or "inet"
+
+
+class NexthopService(BaseService[Nexthop, NexthopCreate, NexthopUpdate]):
+    """
+    Manages the nexthop objects of the kernel.  Many routes can share a nexthop object, or
+    a group of them, and are all repointed at once when it is updated.
+    """
+
+    def __init__(self, host: Host) -> None:
+        super().__init__(host)
+
+    def get_all_raw(self) -> List[Dict[str, Any]]:
+        stdout, stderr = self.host.exec(["ip", "-j", "-details", "nexthop", "show"])
+        if stderr:
+            raise RuntimeError(f"Failed to run nexthop command on host: {stderr}")
+
+        raw_nexthops = pydantic.parse_obj_as(
+            List[Dict[str, Any]], json.loads(stdout or "[]")
+        )
+
+        # ip doesn't show the family of the nexthop objects, the ipv6 ones are listed apart
+        stdout, stderr = self.host.exec(["ip", "-6", "-j", "nexthop", "show"])
+        if stderr:
+            raise RuntimeError(f"Failed to run nexthop command on host: {stderr}")
+
+        ipv6_ids = {raw_nexthop["id"] for raw_nexthop in json.loads(stdout or "[]")}
+        for raw_nexthop in raw_nexthops:
+            if "group" not in raw_nexthop:
+                raw_nexthop["family"] = (
+                    "inet6" if raw_nexthop["id"] in ipv6_ids else "inet"
+                )
+
+        return raw_nexthops
+
+    def get_all(self) -> List[Nexthop]:
+        nexthops: List[Nexthop] = []
+        for raw_nexthop in self.get_all_raw():
+            try:
+                nexthop = Nexthop(**raw_nexthop)
+                nexthop.attach_host(self.host)
+                nexthops.append(nexthop)
+            except ValidationError as e:
+                LOGGER.error(f"Failed to parse a nexthop: {raw_nexthop}\n" f"{str(e)}")
+
+        return nexthops
+
+    def get_one_raw(self, identifier: str) -> Optional[Dict[str, Any]]:
+        return next(
+            (
+                raw_nexthop
+                for raw_nexthop in self.get_all_raw()
+                if str(raw_nexthop["id"]) == identifier
+            ),
+            None,
+        )
+
+    def get_one_or_default(
+        self, identifier: str, default: Optional[K] = None
+    ) -> Union[Nexthop, None, K]:
+        raw_nexthop = self.get_one_raw(identifier)
+        if raw_nexthop is None:
+            return default
+
+        nexthop = Nexthop(**raw_nexthop)
+        nexthop.attach_host(self.host)
+        return nexthop
+
+    def get_one(self, identifier: str) -> Nexthop:
+        nexthop = self.get_one_or_default(identifier)
+        if not nexthop:
+            raise NotFound(f"Could not find any nexthop with id {identifier}")
+
+        return nexthop
+
+    @staticmethod
+    def nexthop_command(verb: str, nexthop_id: int, o: NexthopUpdate) -> List[str]:
+        command = ["ip", "nexthop", verb, "id", str(nexthop_id)]
+        if o.group is not None:
+            return command + [
+                "group",
+                "/".join(f"{member.id},{member.weight}" for member in o.group),
+            ]
+
+        if nexthop_family(o.gateway, o.family) == "inet6":
+            command.insert(1, "-6")
+        if o.gateway is not None:
+            command += ["via", str(o.gateway)]
+
+        return command + ["dev", str(o.dev)]
+
+    def create(self, o: NexthopCreate) -> Nexthop:
+        raw_nexthops = self.get_all_raw()
+        nexthop_id = o.id
+        if nexthop_id is None:
+            nexthop_id = max((raw["id"] for raw in raw_nexthops), default=0) + 1
+        elif any(raw_nexthop["id"] == nexthop_id for raw_nexthop in raw_nexthops):
+            raise Conflict("A nexthop with this id already exists")
+
+        command = self.nexthop_command("add", nexthop_id, o)
+        _, stderr = self.host.exec(command)
+        if stderr:
+            raise UnprocessableEntity(
+                f"Failed to create nexthop with command {command}: {stderr}"
+            )
+
+        existing_nexthop = self.get_one_or_default(str(nexthop_id))
+        if not existing_nexthop:
+            raise RuntimeError(
+                "The nexthop should have been created but can not be found"
+            )
+
+        return existing_nexthop
+
+    def update(self, identifier: str, o: NexthopUpdate) -> Nexthop:
+        existing_nexthop = self.get_one(identifier)
+        if o.family is None and existing_nexthop.family is not None:
+            o = o.copy(update={"family": existing_nexthop.family})
+
+        command = self.nexthop_command("replace", existing_nexthop.id, o)
+        _, stderr = self.host.exec(command)
+        if stderr:
+            raise UnprocessableEntity(
+                f"Failed to update nexthop with command {command}: {stderr}"
+            )
+
+        return self.get_one(identifier)
+
+    def delete(self, identifier: str) -> None:
+        existing_nexthop = self.get_one_or_default(identifier)
+        if not existing_nexthop:
+            return
+
+        command = ["ip", "nexthop", "del", "id", identifier]
+        _, stderr = self.host.exec(command)
+        if stderr:
+            raise RuntimeError(
+                f"Failed to delete nexthop with command {command}: {stderr}"
+            )
+
+    def status(self) -> CommandStatus:
+        command = ["ip", "-details", "nexthop"]
+        stdout, stderr = self.host.exec(command)
+
+        return CommandStatus(
+            command=command,
+            stdout=stdout,
+            stderr=stderr,
+        )
+
+    def resolve(
+        self, routes_nexthops: Sequence[Tuple[int, Sequence[RouteNexthop]]]
+    ) -> Tuple[List[int], List[List[str]]]:
+        """
+        Get the nexthop object to use for each set of next hops, given with the family of
+        its route.  The existing nexthop objects are reused, the missing ones are given a
+        new id, and the commands creating them are returned along with the ids.  The routes
+        with the same next hops get the same nexthop object: a single next hop is a nexthop
+        object through a device, many of them a group of those.
+        """
+        raw_nexthops = self.get_all_raw()
+        next_id = max((raw["id"] for raw in raw_nexthops), default=0) + 1
+        nexthops: Dict[NexthopKey, int] = {}
+        groups: Dict[GroupKey, int] = {}
+        for raw_nexthop in raw_nexthops:
+            if "group" in raw_nexthop:
+                key = tuple(
+                    sorted(
+                        (member["id"], member.get("weight", 1))
+                        for member in raw_nexthop["group"]
+                    )
+                )
+                groups.setdefault(key, raw_nexthop["id"])
+            elif "dev" in raw_nexthop and not raw_nexthop.get("flags"):
+                nexthop_key = (
+                    raw_nexthop["family"],
+                    raw_nexthop.get("gateway"),
+                    raw_nexthop["dev"],
+                )
+                nexthops.setdefault(nexthop_key, raw_nexthop["id"])
+
+        ids: List[int] = []
+        commands: List[List[str]] = []
+        for family, route_nexthops in routes_nexthops:
+            members: List[Tuple[int, int]] = []
+            for route_nexthop in route_nexthops:
+                nexthop_update = NexthopUpdate(  # type: ignore
+                    gateway=route_nexthop.gateway,
+                    dev=route_nexthop.dev,
+                    family=nexthop_family(
+                        route_nexthop.gateway,
+                        "inet6" if family == socket.AF_INET6 else "inet",
+                    ),
+                )
+                nexthop_key = (
+                    str(nexthop_update.family),
+                    str(route_nexthop.gateway) if route_nexthop.gateway else None,
+                    route_nexthop.dev,
+                )
+                if nexthop_key not in nexthops:
+                    nexthops[nexthop_key] = next_id
+                    commands.append(
+                        self.nexthop_command("add", next_id, nexthop_update)
+                    )
+                    next_id += 1
+                members.append((nexthops[nexthop_key], route_nexthop.weight))
+
+            if len(members) == 1:
+                ids.append(members[0][0])
+                continue
+
+            group_key = tuple(sorted(members))
+            if group_key not in groups:
+                groups[group_key] = next_id
+                group = [
+                    NexthopGroupMember(id=member, weight=weight)  # type: ignore
+                    for member, weight in group_key
+                ]
+                commands.append(
+                    self.nexthop_command(
+                        "add", next_id, NexthopUpdate(group=group)  # type: ignore
+                    )
+                )
+                next_id += 1
+            ids.append(groups[group_key])
+
+        return ids, commands
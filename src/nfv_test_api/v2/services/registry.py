@@ -0,0 +1,175 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from nfv_test_api.config import get_config
+from nfv_test_api.host import Host, NamespaceHost
+from nfv_test_api.link_stats import LinkStatsSampler
+from nfv_test_api.namespace_index import NamespaceIndex
+from nfv_test_api.netlink_state import NetlinkStateCache
+
+LOGGER = logging.getLogger(__name__)
+
+S = TypeVar("S")
+
+
+class ServiceRegistry:
+    """
+    The hosts, services, state caches, namespace indexes and link stats samplers shared by
+    all the requests, one of each per namespace, and the worker pools of the bulk requests.
+    The controllers are instantiated for every request, anything they would keep for
+    themselves is lost at the end of it, so the state that should outlive a request is
+    attached to the hosts and services of this registry instead.
+
+    The None namespace is the host itself.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._hosts: Dict[Optional[str], Host] = {None: Host()}
+        self._services: Dict[Tuple[Optional[str], Callable[[Host], Any]], Any] = {}
+        self._state_caches: Dict[Optional[str], NetlinkStateCache] = {}
+        self._namespace_indexes: Dict[Optional[str], NamespaceIndex] = {}
+        self._link_stats_samplers: Dict[Optional[str], LinkStatsSampler] = {}
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+
+    def host(self, namespace: Optional[str] = None) -> Host:
+        """
+        Get the host for the given namespace.  This doesn't check that the namespace exists.
+        """
+        with self._lock:
+            if namespace not in self._hosts:
+                self._hosts[namespace] = NamespaceHost(str(namespace))
+
+            return self._hosts[namespace]
+
+    def service(
+        self, service_type: Callable[[Host], S], namespace: Optional[str] = None
+    ) -> S:
+        """
+        Get the service of the given type for the given namespace.  This doesn't check that
+        the namespace exists.
+        """
+        host = self.host(namespace)
+        with self._lock:
+            key = (namespace, service_type)
+            if key not in self._services:
+                self._services[key] = service_type(host)
+
+            service: S = self._services[key]
+            return service
+
+    def state_cache(self, namespace: Optional[str] = None) -> NetlinkStateCache:
+        """
+        Get the netlink state cache for the given namespace.
+        """
+        host = self.host(namespace)
+        with self._lock:
+            if namespace not in self._state_caches:
+                self._state_caches[namespace] = NetlinkStateCache(host.netlink_socket)
+
+            return self._state_caches[namespace]
+
+    def state_caches(self) -> Dict[Optional[str], NetlinkStateCache]:
+        """
+        Get the netlink state caches created so far, by namespace.  Unlike state_cache(),
+        this doesn't create anything.
+        """
+        with self._lock:
+            return dict(self._state_caches)
+
+    def namespace_index(self, namespace: Optional[str] = None) -> NamespaceIndex:
+        """
+        Get the index of the namespaces, with the ids they have in the given namespace.
+        """
+        host = self.host(namespace)
+        with self._lock:
+            if namespace not in self._namespace_indexes:
+                self._namespace_indexes[namespace] = NamespaceIndex(host.netlink_socket)
+
+            return self._namespace_indexes[namespace]
+
+    def link_stats_sampler(self, namespace: Optional[str] = None) -> LinkStatsSampler:
+        """
+        Get the sampler of the link counters of the given namespace.
+        """
+        host = self.host(namespace)
+        config = get_config()
+        with self._lock:
+            if namespace not in self._link_stats_samplers:
+                self._link_stats_samplers[namespace] = LinkStatsSampler(
+                    host.netlink_socket,
+                    config.stats_sample_interval,
+                    config.stats_history,
+                )
+
+            return self._link_stats_samplers[namespace]
+
+    def pool(self, name: str, max_workers: int) -> ThreadPoolExecutor:
+        """
+        Get the worker pool with the given name, shared by all the requests so that the
+        number of namespaces they work on at the same time stays bounded.  The number of
+        workers is the one given when the pool was first requested.
+        """
+        with self._lock:
+            if name not in self._pools:
+                self._pools[name] = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix=name
+                )
+
+            return self._pools[name]
+
+    def namespaces(self) -> List[str]:
+        """
+        Get the namespaces something is registered for.
+        """
+        with self._lock:
+            return [
+                namespace for namespace in self._hosts.keys() if namespace is not None
+            ]
+
+    def invalidate(self, namespace: str) -> None:
+        """
+        Drop the host and the services of a namespace, and stop everything running in it on
+        their behalf.  This should be called before deleting the namespace.
+        """
+        with self._lock:
+            host = self._hosts.pop(namespace, None)
+            state_cache = self._state_caches.pop(namespace, None)
+            namespace_index = self._namespace_indexes.pop(namespace, None)
+            link_stats_sampler = self._link_stats_samplers.pop(namespace, None)
+            for key in [key for key in self._services.keys() if key[0] == namespace]:
+                del self._services[key]
+
+        LOGGER.debug("Invalidating the host and services of namespace %s", namespace)
+        if state_cache is not None:
+            state_cache.close()
+
+        if namespace_index is not None:
+            namespace_index.close()
+
+        if link_stats_sampler is not None:
+            link_stats_sampler.close()
+
+        # The host might never have been registered, but what runs in the namespace is
+        # shared by all of its hosts, closing a new one is enough to stop it
+        (host or NamespaceHost(namespace)).close()
+
+
+service_registry = ServiceRegistry()
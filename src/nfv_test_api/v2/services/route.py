@@ -13,34 +13,276 @@
    See the License for the specific language governing permissions and
    limitations under the License.
 """
+import heapq
 import json
 import logging
-from typing import Any, Dict, List, Optional, Union
+import socket
+from ipaddress import ip_address, ip_network
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import pydantic
 from pydantic import ValidationError
 from werkzeug.exceptions import Conflict, NotFound, UnprocessableEntity  # type: ignore
 
 from nfv_test_api.host import Host
+from nfv_test_api.netlink import ROUTE_TABLES, RT_TABLE_MAIN, NetlinkSocket
+from nfv_test_api.netlink_state import NetlinkReader
 from nfv_test_api.v2.data.common import CommandStatus
-from nfv_test_api.v2.data.route import Route, RouteCreate, RouteUpdate
+from nfv_test_api.v2.data.route import (
+    Route,
+    RouteCreate,
+    RouteKey,
+    RouteNexthops,
+    RouteUpdate,
+)
 from nfv_test_api.v2.services.base_service import BaseService, K
+from nfv_test_api.v2.services.nexthop import NexthopService
 
 LOGGER = logging.getLogger(__name__)
 
+JSON_SEPARATORS = " \t\r\n,"
+
+TABLE_IDS = {name: table for table, name in ROUTE_TABLES.items()}
+
+# The protocols of the routes added by the users, the others are managed by the kernel
+# or by daemons
+MANAGED_ROUTE_PROTOCOLS = {"boot", "static"}
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator[Any]:
+    """
+    Parse the text of a json array as it comes, in chunks, and yield its items one by one.
+    Only the text of the item being received is kept in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    for chunk in chunks:
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in JSON_SEPARATORS:
+                position += 1
+            if position == len(buffer):
+                break
+
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError(f"Expected a json array, got {buffer[:80]}")
+
+                started = True
+                position += 1
+                continue
+
+            if buffer[position] == "]":
+                return
+
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The item is not complete yet
+                break
+
+            yield item
+
+        buffer = buffer[position:]
+
+    if buffer.strip():
+        raise ValueError(f"The json array is not complete: {buffer[:80]}")
+
+
+def route_family(o: RouteCreate) -> int:
+    if o.dst != "default":
+        return socket.AF_INET6 if o.dst.version == 6 else socket.AF_INET
+
+    return gateway_family(o)
+
+
+def gateway_family(o: RouteNexthops) -> int:
+    """
+    The family of the gateways of the route, ip takes the one of a default route from them.
+    """
+    gateways = [o.gateway] + [nexthop.gateway for nexthop in o.nexthops or []]
+    for gateway in gateways:
+        if gateway is not None:
+            return socket.AF_INET6 if gateway.version == 6 else socket.AF_INET
+
+    return socket.AF_INET
+
+
+def route_key(family: int, raw_route: Dict[str, Any]) -> RouteKey:
+    """
+    Get the key ordering the pages of routes, for a raw route of the given family which
+    has the name of its table.
+    """
+    table = raw_route["table"]
+    table_id = TABLE_IDS[table] if table in TABLE_IDS else int(table)
+    dst = raw_route.get("dst", "default")
+    network = ip_network(
+        ("0.0.0.0/0" if family == socket.AF_INET else "::/0")
+        if dst == "default"
+        else dst,
+        strict=False,
+    )
+    return (
+        family,
+        table_id,
+        int(network.network_address),
+        network.prefixlen,
+        int(raw_route.get("metric", 0)),
+        str(raw_route.get("type", "unicast")),
+        str(raw_route.get("dev", "")),
+    )
+
+
+def raw_gateway(raw_route: Dict[str, Any]) -> str:
+    """
+    Get the gateway of a raw route, or of one of its next hops, it is empty if there is
+    none.  The kernel shows the addresses in their canonical form.
+    """
+    return str(raw_route.get("gateway") or raw_route.get("via", {}).get("host") or "")
+
 
 class RouteService(BaseService[Route, RouteCreate, RouteUpdate]):
     def __init__(self, host: Host) -> None:
         super().__init__(host)
 
-    def get_all_raw(self) -> List[Dict[str, Any]]:
-        stdout, stderr = self.host.exec(["ip", "-j", "-details", "route"])
+    def get_all_raw(self, family: int = socket.AF_INET) -> List[Dict[str, Any]]:
+        """
+        Get the routes of the main table, the ipv4 ones by default.
+        """
+        raw_routes = self.netlink_read(
+            lambda netlink_socket: netlink_socket.routes(family)
+        )
+        if raw_routes is not None:
+            return raw_routes
+
+        command = ["ip", "-j", "-details", "route"]
+        if family == socket.AF_INET6:
+            command.insert(1, "-6")
+
+        stdout, stderr = self.host.exec(command)
         if stderr:
             raise RuntimeError(f"Failed to run route command on host: {stderr}")
 
         raw_routes = json.loads(stdout or "[]")
         return pydantic.parse_obj_as(List[Dict[str, Any]], raw_routes)
 
+    def iter_all_raw(
+        self, families: Sequence[int], table: Optional[int]
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        Yield the routes of the given families in the given table, or in all the tables if
+        it is None, as they are read.  Each route has the name of its table.
+        """
+        table_name = "all" if table is None else ROUTE_TABLES.get(table, str(table))
+        default_table = "main" if table is None else table_name
+        for family in families:
+
+            def read(netlink_reader: NetlinkReader) -> Iterable[Dict[str, Any]]:
+                if isinstance(netlink_reader, NetlinkSocket):
+                    return netlink_reader.iter_routes(family, table)
+
+                return netlink_reader.routes(family, table)
+
+            raw_routes = self.netlink_stream(read)
+            if raw_routes is None:
+                raw_routes = self._ip_routes(family, table_name)
+
+            for raw_route in raw_routes:
+                if "table" not in raw_route:
+                    # The routes of the cache are shared, they are not modified
+                    raw_route = {**raw_route, "table": default_table}
+
+                yield raw_route
+
+    def _ip_routes(self, family: int, table_name: str) -> Iterator[Dict[str, Any]]:
+        # Without a family, the dump of all the tables has the routes of all of them
+        command = ["ip", "-j", "-details", "route", "show", "table", table_name]
+        command.insert(1, "-6" if family == socket.AF_INET6 else "-4")
+
+        try:
+            # The output of a full table doesn't fit in memory, nor in the usual timeout,
+            # ip only has to keep printing it.  If it stalls, the CommandTimeout goes up
+            # to the caller, the routes yielded so far are not all of them.
+            yield from iter_json_array(
+                self.host.exec_stream(
+                    command, timeout=None, chunk_size=65536, idle_timeout=10
+                )
+            )
+        except RuntimeError as e:
+            # Each family has its own tables, they only exist once they have a route
+            if "table does not exist" not in str(e):
+                raise
+
+    def get_page(
+        self,
+        families: Sequence[int],
+        table: Optional[int],
+        after: Optional[RouteKey] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[Iterator[Route], Optional[RouteKey]]:
+        """
+        Get the routes of the given families in the given table, whose key comes after the
+        given one.  With a limit, it returns at most that many routes, in the order of their
+        keys, and the key of the last one if there are more routes after them.  Otherwise,
+        it returns all the routes, as they are read.
+
+        A page keeps the routes with the smallest keys while the table is read, so it only
+        holds limit routes at a time.  The routes added or removed between two pages don't
+        move the other routes from one page to another.
+        """
+        if limit is None:
+            raw_routes = self._iter_keyed(families, table, after)
+            return self._parse_routes(raw_route for _, raw_route in raw_routes), None
+
+        page: List[Tuple[RouteKey, Dict[str, Any]]] = []
+        for family in families:
+            if after is not None and family < after[0]:
+                # The whole family is on the previous pages
+                continue
+
+            page += heapq.nsmallest(
+                limit + 1 - len(page),
+                self._iter_keyed([family], table, after),
+                key=lambda item: item[0],
+            )
+            if len(page) > limit:
+                # The families are the first part of the key, the next ones come after
+                break
+
+        next_key = page[limit - 1][0] if len(page) > limit else None
+        return self._parse_routes(raw_route for _, raw_route in page[:limit]), next_key
+
+    def _iter_keyed(
+        self, families: Sequence[int], table: Optional[int], after: Optional[RouteKey]
+    ) -> Iterator[Tuple[RouteKey, Dict[str, Any]]]:
+        for family in families:
+            for raw_route in self.iter_all_raw([family], table):
+                key = route_key(family, raw_route)
+                if after is None or key > after:
+                    yield key, raw_route
+
+    def _parse_routes(self, raw_routes: Iterable[Dict[str, Any]]) -> Iterator[Route]:
+        for raw_route in raw_routes:
+            try:
+                route = Route(**raw_route)
+                route.attach_host(self.host)
+                yield route
+            except ValidationError as e:
+                LOGGER.error(f"Failed to parse a route: {raw_route}\n" f"{str(e)}")
+
     def get_all(self) -> List[Route]:
         routes: List[Route] = []
         for raw_route in self.get_all_raw():
@@ -53,15 +295,48 @@ class RouteService(BaseService[Route, RouteCreate, RouteUpdate]):
 
         return routes
 
-    def get_one_raw(self, identifier: str) -> Optional[Dict[str, Any]]:
-        stdout, stderr = self.host.exec(
-            ["ip", "-j", "-details", "route", "show", identifier]
+    def get_one_raw(
+        self,
+        identifier: str,
+        family: Optional[int] = None,
+        table: int = RT_TABLE_MAIN,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Get the route with the given destination in the given table, the main one by
+        default.  The family only has to be given for the default routes, it is the one of
+        the destination otherwise.
+        """
+        if identifier != "default":
+            family = socket.AF_INET
+            if ip_network(identifier, strict=False).version == 6:
+                family = socket.AF_INET6
+        elif family is None:
+            family = socket.AF_INET
+
+        all_raw_routes = self.netlink_read(
+            lambda netlink_socket: netlink_socket.routes(family, table)
         )
-        if stderr:
-            raise RuntimeError(f"Failed to get a route on host: {stderr}")
+        if all_raw_routes is not None:
+            # Same as ip, the destination has to match exactly
+            raw_routes_list = [
+                raw_route
+                for raw_route in all_raw_routes
+                if self._same_destination(raw_route.get("dst", ""), identifier)
+            ]
+        else:
+            command = ["ip", "-j", "-details", "route", "show", identifier]
+            if family == socket.AF_INET6:
+                command.insert(1, "-6")
+            if table != RT_TABLE_MAIN:
+                command += ["table", str(table)]
+
+            stdout, stderr = self.host.exec(command)
+            if stderr:
+                raise RuntimeError(f"Failed to get a route on host: {stderr}")
+
+            raw_routes = json.loads(stdout or "[]")
+            raw_routes_list = pydantic.parse_obj_as(List[Dict[str, Any]], raw_routes)
 
-        raw_routes = json.loads(stdout or "[]")
-        raw_routes_list = pydantic.parse_obj_as(List[Dict[str, Any]], raw_routes)
         if not raw_routes_list:
             return None
 
@@ -70,12 +345,27 @@ class RouteService(BaseService[Route, RouteCreate, RouteUpdate]):
                 f"Expected to get one interface here but got multiple ones: {raw_routes_list}"
             )
 
-        return raw_routes_list[0]
+        raw_route = raw_routes_list[0]
+        if table != RT_TABLE_MAIN and "table" not in raw_route:
+            raw_route = {**raw_route, "table": ROUTE_TABLES.get(table, str(table))}
+
+        return raw_route
+
+    @staticmethod
+    def _same_destination(dst: str, identifier: str) -> bool:
+        if dst == "default" or identifier == "default":
+            return dst == identifier
+
+        return ip_network(dst, strict=False) == ip_network(identifier, strict=False)
 
     def get_one_or_default(
-        self, identifier: str, default: Optional[K] = None
+        self,
+        identifier: str,
+        default: Optional[K] = None,
+        family: Optional[int] = None,
+        table: int = RT_TABLE_MAIN,
     ) -> Union[Route, None, K]:
-        raw_route = self.get_one_raw(identifier)
+        raw_route = self.get_one_raw(identifier, family, table)
         if raw_route is None:
             return default
 
@@ -83,29 +373,131 @@ class RouteService(BaseService[Route, RouteCreate, RouteUpdate]):
         route.attach_host(self.host)
         return route
 
-    def get_one(self, identifier: str) -> Route:
-        route = self.get_one_or_default(identifier)
+    def get_one(self, identifier: str, family: Optional[int] = None) -> Route:
+        route = self.get_one_or_default(identifier, None, family)
         if not route:
             raise NotFound(f"Could not find any route with destination {identifier}")
 
         return route
 
+    @staticmethod
+    def nexthops_arguments(
+        o: RouteNexthops, family: int, nhid: Optional[int] = None
+    ) -> List[str]:
+        """
+        Get the arguments of `ip route` telling where the route sends the traffic.  The
+        next hops of the route are given by the id of their nexthop object.
+        """
+        if o.dev is None:
+            arguments = ["nhid", str(nhid if nhid is not None else o.nhid)]
+        else:
+            arguments = ["dev", o.dev]
+            if o.gateway is not None:
+                arguments.append("via")
+                if o.gateway.version == 6 and family == socket.AF_INET:
+                    # An ipv4 route going through an ipv6 gateway
+                    arguments.append("inet6")
+                arguments.append(str(o.gateway))
+
+        if o.pref_src is not None:
+            arguments += ["src", str(o.pref_src)]
+        if o.mtu is not None:
+            arguments += ["mtu", str(o.mtu)]
+
+        return arguments
+
+    def create_command(
+        self, o: RouteCreate, nhid: Optional[int] = None, verb: str = "add"
+    ) -> List[str]:
+        family = route_family(o)
+        command = ["ip", "route", verb, str(o.dst)]
+        command += self.nexthops_arguments(o, family, nhid)
+        if o.metric is not None:
+            command += ["metric", str(o.metric)]
+        if o.table is not None:
+            command += ["table", str(o.table)]
+        if o.dst == "default" and family == socket.AF_INET6:
+            command.insert(1, "-6")
+
+        return command
+
+    @staticmethod
+    def same_route(o: RouteNexthops, raw_route: Dict[str, Any]) -> bool:
+        """
+        Whether the raw route already sends the traffic where the input says.  The
+        source and the mtu are only compared when the input has them.
+        """
+        if raw_route.get("type", "unicast") != "unicast":
+            return False
+
+        if o.nhid is not None:
+            return raw_route.get("nhid") == o.nhid
+
+        if o.nexthops is not None:
+            nexthops = [
+                (str(nexthop.gateway or ""), nexthop.dev, nexthop.weight)
+                for nexthop in o.nexthops
+            ]
+            raw_nexthops = [
+                (
+                    raw_gateway(raw_nexthop),
+                    raw_nexthop.get("dev"),
+                    raw_nexthop.get("weight", 1),
+                )
+                for raw_nexthop in raw_route.get("nexthops", [])
+            ]
+            if sorted(nexthops) != sorted(raw_nexthops):
+                return False
+        elif raw_route.get("dev") != o.dev or "nhid" in raw_route:
+            return False
+        elif raw_gateway(raw_route) != str(o.gateway or ""):
+            return False
+
+        if o.pref_src is not None and (
+            raw_route.get("prefsrc") is None
+            or ip_address(raw_route["prefsrc"]) != o.pref_src
+        ):
+            return False
+
+        if o.mtu is not None and o.mtu not in [
+            metrics.get("mtu") for metrics in raw_route.get("metrics", [])
+        ]:
+            return False
+
+        return True
+
+    def nexthop_id(self, family: int, o: RouteNexthops) -> Optional[int]:
+        """
+        Get the id of the nexthop object of the next hops of the route, creating it if
+        needed.  Returns None if the route doesn't have any next hops.
+        """
+        if o.nexthops is None:
+            return None
+
+        (nhid,), commands = NexthopService(self.host).resolve([(family, o.nexthops)])
+        for command, stderr in zip(commands, self.host.exec_batch(commands)):
+            if stderr:
+                raise UnprocessableEntity(
+                    f"Failed to create nexthop with command {command}: {stderr}"
+                )
+
+        return nhid
+
     def create(self, o: RouteCreate) -> Route:
-        existing_route = self.get_one_or_default(str(o.dst))
+        family = route_family(o)
+        table = o.table or RT_TABLE_MAIN
+        existing_route = self.get_one_or_default(str(o.dst), None, family, table)
         if existing_route:
             raise Conflict("A route with this destination already exists")
 
-        command = ["ip", "route", "add", str(o.dst), "dev", o.dev]
-        if o.gateway is not None:
-            command += ["via", str(o.gateway)]
-
+        command = self.create_command(o, self.nexthop_id(family, o))
         _, stderr = self.host.exec(command)
         if stderr:
             raise UnprocessableEntity(
                 f"Failed to create route with command {command}: {stderr}"
             )
 
-        existing_route = self.get_one_or_default(str(o.dst))
+        existing_route = self.get_one_or_default(str(o.dst), None, family, table)
         if not existing_route:
             raise RuntimeError(
                 "The route should have been created but can not be found"
@@ -113,12 +505,28 @@ class RouteService(BaseService[Route, RouteCreate, RouteUpdate]):
 
         return existing_route
 
-    def update(self, identifier: str, o: RouteUpdate) -> Route:
-        existing_route = self.get_one(identifier)
-
-        command = ["ip", "route", "change", identifier, "dev", o.dev]
-        if o.gateway is not None:
-            command += ["via", str(o.gateway)]
+    def update(
+        self, identifier: str, o: RouteUpdate, family: Optional[int] = None
+    ) -> Route:
+        """
+        Update the route with the given destination.  The family only has to be given for
+        the default routes, it is the one of the gateways of the input otherwise.
+        """
+        if identifier != "default":
+            family = socket.AF_INET
+            if ip_network(identifier, strict=False).version == 6:
+                family = socket.AF_INET6
+        elif family is None:
+            family = gateway_family(o)
+
+        existing_route = self.get_one(identifier, family)
+        command = ["ip", "route", "change", identifier]
+        if identifier == "default" and family == socket.AF_INET6:
+            command.insert(1, "-6")
+        command += self.nexthops_arguments(o, family, self.nexthop_id(family, o))
+        if existing_route.metric is not None:
+            # The metric is part of what identifies the route
+            command += ["metric", str(existing_route.metric)]
 
         _, stderr = self.host.exec(command)
         if stderr:
@@ -126,14 +534,20 @@ class RouteService(BaseService[Route, RouteCreate, RouteUpdate]):
                 f"Failed to update route with command {command}: {stderr}"
             )
 
-        return existing_route
+        return self.get_one(identifier, family)
 
-    def delete(self, identifier: str) -> None:
-        existing_route = self.get_one_or_default(identifier)
+    def delete(self, identifier: str, family: Optional[int] = None) -> None:
+        """
+        Delete the route with the given destination, if it exists.  The family only has
+        to be given for the default routes, the ipv4 one is deleted otherwise.
+        """
+        existing_route = self.get_one_or_default(identifier, None, family)
         if not existing_route:
             return
 
         command = ["ip", "route", "del", identifier]
+        if identifier == "default" and family == socket.AF_INET6:
+            command.insert(1, "-6")
         _, stderr = existing_route.host.exec(command)
         if stderr:
             raise RuntimeError(
@@ -0,0 +1,168 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+import logging
+import socket
+from ipaddress import IPv4Address, IPv6Address
+from typing import Any, Dict, List, Optional, Union
+
+import pydantic
+
+from nfv_test_api.host import Host
+from nfv_test_api.netlink_state import NetlinkReader, NetlinkStateCache
+from nfv_test_api.route_lookup import LOOKUP_TABLES, RouteLookup
+from nfv_test_api.v2.data.route import (
+    Route,
+    RouteCheck,
+    RouteLookupQuery,
+    RouteLookupResult,
+)
+from nfv_test_api.v2.services.route import RouteService
+
+LOGGER = logging.getLogger(__name__)
+
+# The kernel doesn't return these routes, it returns an error for the addresses they match
+UNUSABLE_ROUTE_TYPES = {"unreachable", "blackhole", "prohibit"}
+
+
+class RouteLookupService(RouteService):
+    """
+    Finds the routes used to reach addresses.  With the netlink state cache, the lookup
+    over all the routes of a family is kept until the routes change, otherwise it is
+    built from a dump of the routes for each request, whatever the number of addresses
+    looked up in it.
+    """
+
+    def __init__(self, host: Host) -> None:
+        super().__init__(host)
+
+    def get_route_lookup(self, family: int = socket.AF_INET) -> RouteLookup:
+        def read(netlink_reader: NetlinkReader) -> RouteLookup:
+            if isinstance(netlink_reader, NetlinkStateCache):
+                return netlink_reader.route_lookup(family)
+
+            names = netlink_reader.link_names()
+            return RouteLookup(
+                family,
+                [
+                    (name, netlink_reader.routes(family, table, names))
+                    for name, table in LOOKUP_TABLES
+                ],
+            )
+
+        route_lookup = self.netlink_read(read)
+        if route_lookup is not None:
+            return route_lookup
+
+        tables = []
+        for name, _ in LOOKUP_TABLES:
+            command = ["ip", "-j", "-details", "route", "show", "table", name]
+            if family == socket.AF_INET6:
+                command.insert(1, "-6")
+
+            stdout, stderr = self.host.exec(command)
+            if stderr:
+                raise RuntimeError(f"Failed to run route command on host: {stderr}")
+
+            tables.append(
+                (
+                    name,
+                    pydantic.parse_obj_as(
+                        List[Dict[str, Any]], json.loads(stdout or "[]")
+                    ),
+                )
+            )
+
+        return RouteLookup(family, tables)
+
+    def check(
+        self,
+        address: Union[IPv4Address, IPv6Address],
+        raw_route: Optional[Dict[str, Any]],
+    ) -> RouteCheck:
+        """
+        Ask the kernel which route it uses to reach the address, and compare it with the
+        route found by the lookup.
+        """
+        forwards = raw_route is not None and (
+            raw_route.get("type", "unicast") not in UNUSABLE_ROUTE_TYPES
+        )
+
+        stdout, stderr = self.host.exec(["ip", "-j", "route", "get", str(address)])
+        if stderr:
+            return RouteCheck(  # type: ignore
+                error=stderr.strip(), matches=not forwards
+            )
+
+        kernel_route = json.loads(stdout)[0]
+        kernel_type = kernel_route.get("type", "unicast")
+        kernel_next_hop = (kernel_route.get("dev"), str(kernel_route.get("gateway")))
+        matches = False
+        if raw_route is not None and forwards:
+            route_type = raw_route.get("type", "unicast")
+            next_hops = {
+                (next_hop.get("dev"), str(next_hop.get("gateway")))
+                for next_hop in raw_route.get("nexthops", [raw_route])
+            }
+            if kernel_type == "local":
+                # Local addresses are reached through the loopback, whatever the device
+                # of their route
+                matches = route_type == "local"
+            elif route_type == "unicast" and kernel_type in ("multicast", "broadcast"):
+                # The kernel reports the type of the destination instead, it sends to it
+                # directly on the device of the route
+                matches = kernel_next_hop[0] in {dev for dev, _ in next_hops}
+            else:
+                matches = route_type == kernel_type and kernel_next_hop in next_hops
+
+        return RouteCheck(  # type: ignore
+            type=kernel_type,
+            dev=kernel_route.get("dev"),
+            gateway=kernel_route.get("gateway"),
+            matches=matches,
+        )
+
+    def lookup(self, query: RouteLookupQuery) -> List[RouteLookupResult]:
+        route_lookups: Dict[int, RouteLookup] = {}
+        # Many addresses are reached through the same routes, their models are only
+        # built once
+        routes: Dict[int, Route] = {}
+        results: List[RouteLookupResult] = []
+        for address in query.addresses:
+            family = socket.AF_INET6 if address.version == 6 else socket.AF_INET
+            if family not in route_lookups:
+                route_lookups[family] = self.get_route_lookup(family)
+
+            match = route_lookups[family].lookup(address)
+            table, raw_route = match if match is not None else (None, None)
+            route: Optional[Route] = None
+            if raw_route is not None:
+                route = routes.get(id(raw_route))
+                if route is None:
+                    route = Route(**raw_route)
+                    route.attach_host(self.host)
+                    routes[id(raw_route)] = route
+
+            results.append(
+                RouteLookupResult(  # type: ignore
+                    address=address,
+                    table=table,
+                    route=route,
+                    check=self.check(address, raw_route) if query.check else None,
+                )
+            )
+
+        return results
@@ -0,0 +1,229 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import socket
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+from werkzeug.exceptions import BadRequest  # type: ignore
+
+from nfv_test_api.host import Host
+from nfv_test_api.netlink import RT_TABLE_MAIN
+from nfv_test_api.v2.data.route import RouteCreate, RouteSyncError, RouteSyncResult
+from nfv_test_api.v2.services.bulk_route import BATCH_SIZE, BulkRouteService
+from nfv_test_api.v2.services.nexthop import NexthopService
+from nfv_test_api.v2.services.route import MANAGED_ROUTE_PROTOCOLS, route_family
+
+LOGGER = logging.getLogger(__name__)
+
+# The metric the kernel gives to the routes added without any
+DEFAULT_METRICS: Dict[int, int] = {socket.AF_INET: 0, socket.AF_INET6: 1024}
+
+# The destinations of the default routes, by family
+DEFAULT_DESTINATIONS: Dict[int, str] = {
+    socket.AF_INET: "0.0.0.0/0",
+    socket.AF_INET6: "::/0",
+}
+
+# A route of a table, by family, destination and metric
+SyncKey = Tuple[int, str, int]
+
+
+def raw_sync_key(raw_route: Dict[str, Any], family: int) -> SyncKey:
+    """
+    Identify a route of a table the way the kernel does, the same destination can be
+    used by many routes with different metrics.  The destinations shown by the kernel are
+    already in their canonical form, they are not parsed again, only the host prefix
+    length is added to the addresses.
+    """
+    dst = raw_route["dst"]
+    if dst == "default":
+        dst = DEFAULT_DESTINATIONS[family]
+    elif "/" not in dst:
+        dst += "/128" if family == socket.AF_INET6 else "/32"
+
+    metric = raw_route.get("metric")
+    return family, dst, DEFAULT_METRICS[family] if metric is None else metric
+
+
+def sync_key(route: RouteCreate) -> SyncKey:
+    family = route_family(route)
+    dst = (
+        DEFAULT_DESTINATIONS[family]
+        if route.dst == "default"
+        else str(route.dst.network)
+    )
+    metric = DEFAULT_METRICS[family] if route.metric is None else route.metric
+    return family, dst, metric
+
+
+class Change(NamedTuple):
+    """
+    A change of a route of the table, its kind is the list of the result it goes in
+    """
+
+    kind: str
+    dst: str
+    metric: int
+    command: List[str]
+
+
+class RouteSyncService(BulkRouteService):
+    """
+    Brings a route table to a desired state.  The table is read once, the routes which
+    are missing are added, the ones which differ are replaced, and the ones which are not
+    desired anymore are deleted, all in batches.  Only the routes added by the users (see
+    MANAGED_ROUTE_PROTOCOLS) are deleted, the ones of the kernel and of the daemons are
+    left alone.  Syncing a table which is already as desired only costs the read.
+    """
+
+    def __init__(self, host: Host) -> None:
+        super().__init__(host)
+
+    def read_table(self, table: int) -> Dict[SyncKey, Dict[str, Any]]:
+        return {
+            raw_sync_key(raw_route, family): raw_route
+            for family in (socket.AF_INET, socket.AF_INET6)
+            for raw_route in self.iter_all_raw([family], table)
+        }
+
+    def sync(
+        self, routes: Sequence[RouteCreate], table: int = RT_TABLE_MAIN
+    ) -> RouteSyncResult:
+        # The routes are all put in the synced table
+        table_value = None if table == RT_TABLE_MAIN else table
+        desired: Dict[SyncKey, RouteCreate] = {}
+        problems: List[str] = []
+        for index, route in enumerate(routes):
+            if route.table not in (None, table):
+                problems.append(
+                    f"Route {index}: the route to {route.dst} is not in table {table}"
+                )
+                continue
+
+            key = sync_key(route)
+            if key in desired:
+                problems.append(
+                    f"Route {index}: the route to {route.dst} is listed more than once"
+                )
+            desired[key] = route.copy(update={"table": table_value})
+
+        if problems:
+            raise BadRequest("\n".join(problems))
+
+        existing = self.read_table(table)
+        existing_devices = {
+            raw_interface["ifname"]
+            for raw_interface in self.interface_service.get_all_raw(addresses=False)
+        }
+
+        errors: List[RouteSyncError] = []
+        changes: List[Change] = []
+        for key, raw_route in existing.items():
+            if (
+                key in desired
+                or raw_route.get("protocol") not in MANAGED_ROUTE_PROTOCOLS
+            ):
+                continue
+
+            family, _, metric = key
+            command = ["ip", "route", "del", raw_route["dst"], "metric", str(metric)]
+            command += ["table", str(table)]
+            if family == socket.AF_INET6:
+                command.insert(1, "-6")
+            changes.append(Change("deleted", raw_route["dst"], metric, command))
+
+        updates: List[Tuple[str, SyncKey, RouteCreate]] = []
+        unchanged = 0
+        for key, route in desired.items():
+            current_route = existing.get(key)
+            if current_route is not None and self.same_route(route, current_route):
+                unchanged += 1
+                continue
+
+            missing_devices = [
+                dev for dev in route.devices if dev not in existing_devices
+            ]
+            if missing_devices:
+                errors.append(
+                    RouteSyncError(  # type: ignore
+                        dst=route.dst,
+                        metric=key[2],
+                        error=f"Could not find any interface with name {missing_devices[0]}",
+                    )
+                )
+                continue
+
+            updates.append(
+                ("added" if current_route is None else "changed", key, route)
+            )
+
+        # The routes with the same next hops share a nexthop object, the missing ones are
+        # created first
+        nhids: Dict[SyncKey, int] = {}
+        multipath_routes = [
+            (key, route) for _, key, route in updates if route.nexthops is not None
+        ]
+        if multipath_routes:
+            nexthop_ids, nexthop_commands = NexthopService(self.host).resolve(
+                [
+                    (route_family(route), route.nexthops or [])
+                    for _, route in multipath_routes
+                ]
+            )
+            nhids = {key: nhid for (key, _), nhid in zip(multipath_routes, nexthop_ids)}
+            for command, stderr in zip(
+                nexthop_commands, self.host.exec_batch(nexthop_commands)
+            ):
+                if stderr:
+                    LOGGER.warning(
+                        "Failed to create nexthop with %s: %s", command, stderr
+                    )
+
+        # Replacing works for the new routes as well as for the changed ones
+        changes += [
+            Change(
+                kind,
+                str(route.dst),
+                key[2],
+                self.create_command(route, nhids.get(key), "replace"),
+            )
+            for kind, key, route in updates
+        ]
+        LOGGER.debug("Syncing table %d with %d changes", table, len(changes))
+
+        done: Dict[str, List[Any]] = {"added": [], "changed": [], "deleted": []}
+        for start in range(0, len(changes), BATCH_SIZE):
+            batch = changes[start : start + BATCH_SIZE]
+            stderrs = self.host.exec_batch([change.command for change in batch])
+            for change, stderr in zip(batch, stderrs):
+                if stderr:
+                    errors.append(
+                        RouteSyncError(
+                            dst=change.dst,  # type: ignore
+                            metric=change.metric,
+                            error=stderr.strip(),
+                        )
+                    )
+                else:
+                    done[change.kind].append(change.dst)
+
+        return RouteSyncResult(  # type: ignore
+            added=done["added"],
+            changed=done["changed"],
+            deleted=done["deleted"],
+            unchanged=unchanged,
+            errors=errors,
+        )
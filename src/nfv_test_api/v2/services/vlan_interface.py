@@ -14,6 +14,7 @@
    limitations under the License.
 """
 import logging
+from typing import List
 
 from werkzeug.exceptions import BadRequest, Conflict  # type: ignore
 
@@ -28,7 +29,10 @@ class VlanInterfaceService(InterfaceService):
     def __init__(self, host: Host) -> None:
         super().__init__(host)
 
-    def create(self, o: InterfaceCreate) -> Interface:
+    def vlan_id(self, o: InterfaceCreate) -> int:
+        """
+        Get the id of the vlan interface to create, from its name.
+        """
         if o.type != LinkInfo.Kind.VLAN:
             raise BadRequest(
                 f"You can only create a vlan interface with a type vlan, got {o.type.name} instead"
@@ -39,12 +43,6 @@ class VlanInterfaceService(InterfaceService):
                 "You need to specify the parent interface for the vlan interface you create"
             )
 
-        existing_interface = self.get_one_or_default(o.name)
-        if existing_interface:
-            raise Conflict("An interface with this name already exists")
-
-        # Ensuring parent interface exists
-        self.get_one(o.parent_dev)
         try:
             if not o.name.startswith(o.parent_dev):
                 raise ValueError(f"'{o.name}' doesn't start with '{o.parent_dev}'")
@@ -53,13 +51,17 @@ class VlanInterfaceService(InterfaceService):
             if not remainder.startswith("."):
                 raise ValueError(f"'{o.name}' doesn't have a dot after the parent name")
 
-            vlan_id = int(remainder[1:])
+            return int(remainder[1:])
         except ValueError as e:
             LOGGER.error(str(e))
             raise BadRequest(
                 "A vlan type interface should be named with the following format: <parent_dev>.<vlan_id>"
             )
 
+    def create_command(self, o: InterfaceCreate) -> List[str]:
+        vlan_id = self.vlan_id(o)
+        assert o.parent_dev is not None
+
         command = [
             "ip",
             "link",
@@ -80,6 +82,20 @@ class VlanInterfaceService(InterfaceService):
             command += ["mtu", str(o.mtu)]
 
         command += ["type", "vlan", "id", str(vlan_id)]
+        return command
+
+    def create(self, o: InterfaceCreate) -> Interface:
+        self.vlan_id(o)
+
+        existing_interface = self.get_one_or_default(o.name)
+        if existing_interface:
+            raise Conflict("An interface with this name already exists")
+
+        # Ensuring parent interface exists
+        assert o.parent_dev is not None
+        self.get_one(o.parent_dev)
+
+        command = self.create_command(o)
         _, stderr = self.host.exec(command)
         if stderr:
             raise RuntimeError(
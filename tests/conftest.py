@@ -14,7 +14,9 @@
    limitations under the License.
 """
 import logging
+import os
 import pathlib
+import subprocess
 import typing
 import uuid
 
@@ -25,6 +27,11 @@ from docker.models import images  # type: ignore
 
 LOGGER = logging.getLogger(__name__)
 
+# Some tests create namespaces on the machine running them
+requires_root = pytest.mark.skipif(
+    os.geteuid() != 0, reason="Network namespaces can only be created by root"
+)
+
 
 @pytest.fixture(scope="session")
 def free_image_tag(
@@ -70,3 +77,47 @@ def nfv_test_api_image(
     image = docker_client.images.get(free_image_tag)
     assert isinstance(image, images.Image)
     return image
+
+
+@pytest.fixture
+def network_namespace() -> typing.Generator[str, None, None]:
+    """
+    This fixture creates an empty network namespace on the machine running the tests, and
+    deletes it once the test is done.
+    """
+    # Imported here, the tests using the docker image don't need the package installed
+    from nfv_test_api.host import NamespaceHost
+
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    subprocess.run(["ip", "netns", "add", name], check=True)
+
+    yield name
+
+    NamespaceHost(name).close()
+    subprocess.run(["ip", "netns", "del", name], check=False)
+
+
+@pytest.fixture(params=["ip", "netlink"])
+def read_backend(
+    request: pytest.FixtureRequest,
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> str:
+    """
+    This fixture sets the config of the api up for the services used directly by a test,
+    once with each read backend.
+    """
+    import nfv_test_api.config
+
+    monkeypatch.setattr(nfv_test_api.config, "CONFIG", None)
+    nfv_test_api.config.get_config(
+        config_dict={
+            "read_backend": request.param,
+            **{
+                f"{kind}_{folder}_folder": str(tmp_path / f"{kind}_{folder}")
+                for kind in ["gnb", "ue_5g", "enb", "ue_4g"]
+                for folder in ["config", "log"]
+            },
+        }
+    )
+    return str(request.param)
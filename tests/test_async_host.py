@@ -0,0 +1,111 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import asyncio
+import json
+import logging
+import shutil
+import time
+import typing
+from ipaddress import IPv4Address
+
+import pytest
+
+from nfv_test_api.async_host import AsyncHost, run_coroutine
+from nfv_test_api.host import Host
+from nfv_test_api.v2.data.ping import PingRequest
+from nfv_test_api.v2.services.actions import ActionsService
+
+LOGGER = logging.getLogger(__name__)
+
+
+def test_exec() -> None:
+    host = AsyncHost(Host())
+    assert run_coroutine(host.exec(["echo", "hello"])) == ("hello\n", "")
+
+    # The ip commands go to the batch worker of the host
+    stdout, stderr = run_coroutine(host.exec(["ip", "-j", "addr", "show", "dev", "lo"]))
+    assert not stderr
+    assert json.loads(stdout)[0]["ifname"] == "lo"
+
+
+def test_exec_timeout() -> None:
+    host = AsyncHost(Host())
+    start = time.monotonic()
+    stdout, _ = run_coroutine(
+        host.exec(["sh", "-c", "echo started; sleep 10"], timeout=0.5)
+    )
+    assert time.monotonic() - start < 5
+    assert stdout == "started\n"
+
+
+def test_exec_batch_timeout(monkeypatch: pytest.MonkeyPatch) -> None:
+    # The timeout is passed on to the ip commands sent to the batch worker
+    host = Host()
+    timeouts: typing.List[float] = []
+
+    def recording_exec(
+        command: typing.List[str], timeout: float = 10
+    ) -> typing.Tuple[str, str]:
+        timeouts.append(timeout)
+        return "", ""
+
+    monkeypatch.setattr(host, "exec", recording_exec)
+    run_coroutine(AsyncHost(host).exec(["ip", "addr", "show"], timeout=3))
+    assert timeouts == [3]
+
+
+def test_exec_timeout_ignored() -> None:
+    # A process ignoring SIGTERM is killed
+    host = AsyncHost(Host())
+    start = time.monotonic()
+    stdout, _ = run_coroutine(
+        host.exec(
+            ["sh", "-c", "trap '' TERM; echo started; exec sleep 10"], timeout=0.5
+        )
+    )
+    assert time.monotonic() - start < 5
+    assert stdout == "started\n"
+
+
+def test_exec_undecodable() -> None:
+    host = AsyncHost(Host())
+    stdout, _ = run_coroutine(host.exec(["printf", "\\377ok"]))
+    assert stdout == "\ufffdok"
+
+
+def test_exec_concurrent() -> None:
+    host = AsyncHost(Host())
+
+    async def sleep_all() -> typing.List[typing.Tuple[str, str]]:
+        return list(
+            await asyncio.gather(*[host.exec(["sleep", "0.5"]) for _ in range(50)])
+        )
+
+    # The processes are all watched by the event loop at the same time
+    start = time.monotonic()
+    assert run_coroutine(sleep_all()) == [("", "")] * 50
+    assert time.monotonic() - start < 5
+
+
+@pytest.mark.skipif(shutil.which("ping") is None, reason="ping is not installed")
+def test_ping_async() -> None:
+    service = ActionsService(Host())
+    ping_request = PingRequest(  # type: ignore
+        destination=IPv4Address("127.0.0.1"), count=2, interval=0.2
+    )
+    ping = run_coroutine(service.ping_async(ping_request))
+    assert ping.packet_transmit == 2
+    assert ping.packet_receive == 2
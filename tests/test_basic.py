@@ -24,3 +24,26 @@ def test_get_interfaces(nfv_test_api_endpoint: str) -> None:
     # Get all the interfaces of the container
     response = requests.get(f"{nfv_test_api_endpoint}/interfaces")
     response.raise_for_status()
+
+
+def test_get_metrics(nfv_test_api_endpoint: str) -> None:
+    requests.get(f"{nfv_test_api_endpoint}/interfaces").raise_for_status()
+
+    # Get the metrics in the prometheus text format
+    response = requests.get(f"{nfv_test_api_endpoint}/metrics")
+    response.raise_for_status()
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert (
+        'nfv_test_api_request_duration_seconds_count{api_namespace="interfaces",'
+        'method="GET",code="200"}' in response.text
+    )
+    assert "nfv_test_api_namespaces " in response.text
+
+
+def test_get_inventory(nfv_test_api_endpoint: str) -> None:
+    # Get the interfaces and routes of the host and of all its namespaces
+    response = requests.get(f"{nfv_test_api_endpoint}/inventory")
+    response.raise_for_status()
+    inventory = response.json()
+    assert inventory["host_namespace"]["interfaces"]
+    assert isinstance(inventory["namespaces"], dict)
@@ -0,0 +1,260 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+import logging
+import os
+import subprocess
+import time
+import typing
+
+import pytest
+from conftest import requires_root
+
+from nfv_test_api.host import (
+    CommandTimeout,
+    Host,
+    IpBatchWorker,
+    NamespaceHost,
+    _namespace_executors,
+    split_ip_batch_command,
+)
+from nfv_test_api.netlink import NETNS_RUN_DIR
+
+LOGGER = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def worker() -> typing.Generator[IpBatchWorker, None, None]:
+    worker = IpBatchWorker(["ip", "-j", "-force", "-batch", "-"], subprocess.Popen)
+
+    yield worker
+
+    worker.stop()
+
+
+def test_batch_sentinel(worker: IpBatchWorker) -> None:
+    stdout, errors = worker.exec_many(
+        [["addr", "show", "dev", "lo"], ["route", "show", "table", "local"]]
+    )
+    assert errors == ["", ""]
+    interfaces, routes = [json.loads(line) for line in stdout.splitlines()]
+    assert [interface["ifname"] for interface in interfaces] == ["lo"]
+    assert "127.0.0.1" in [route["dst"] for route in routes]
+
+    # The line numbers of the sentinels carry on from one call to the next
+    stdout, errors = worker.exec_many([["addr", "show", "dev", "lo"]])
+    assert errors == [""]
+    assert json.loads(stdout)[0]["ifname"] == "lo"
+
+
+def test_batch_failure(worker: IpBatchWorker) -> None:
+    # ip keeps going after a failure, which is reported on the command which failed
+    stdout, errors = worker.exec_many(
+        [
+            ["addr", "show", "dev", "lo"],
+            ["addr", "show", "dev", "nfvmissing0"],
+            ["route", "show", "table", "local"],
+        ]
+    )
+    assert errors[0] == ""
+    assert "nfvmissing0" in errors[1]
+    assert errors[2] == ""
+    assert len(stdout.splitlines()) == 2
+
+
+def test_batch_timeout(worker: IpBatchWorker) -> None:
+    # ip monitor never completes, the worker is stopped
+    _, errors = worker.exec_many(
+        [["monitor", "link"], ["addr", "show", "dev", "lo"]], timeout=0.5
+    )
+    assert errors == ["The ip batch worker didn't complete the command\n"] * 2
+
+    # And started again for the next commands
+    stdout, errors = worker.exec_many([["addr", "show", "dev", "lo"]])
+    assert errors == [""]
+    assert json.loads(stdout)[0]["ifname"] == "lo"
+
+
+@pytest.mark.parametrize(
+    "command, batched",
+    [
+        (["ip", "-j", "-details", "addr", "show", "dev", "lo"], True),
+        (["ip", "-details", "addr"], True),
+        (["ip", "-j", "route", "get", "10.0.0.1"], True),
+        (["ip", "link", "set", "dev", "lo", "up"], True),
+        (["ip", "netns", "add", "test"], True),
+        (["ip", "-j", "link", "show", "dev", "lo"], False),
+        (["ip", "-j", "link"], False),
+        (["ip", "netns", "exec", "test", "ip", "link", "del", "lo"], False),
+        (["ip", "netns", "list-id"], False),
+        (["ip", "neigh", "flush", "all"], False),
+        (["ip", "-b", "commands"], False),
+        (["ip", "addr", "add", "10.0.0.1/8", "dev", "lo # comment"], False),
+    ],
+)
+def test_split_ip_batch_command(command: typing.List[str], batched: bool) -> None:
+    assert (split_ip_batch_command(command) is not None) == batched
+
+
+def test_link_show_then_addr_show() -> None:
+    # ip link show would stop the next addr show of a batch worker from listing the
+    # addresses
+    host = Host()
+    stdout, stderr = host.exec(["ip", "-j", "link", "show", "dev", "lo"])
+    assert not stderr
+    assert "addr_info" not in json.loads(stdout)[0]
+
+    stdout, stderr = host.exec(["ip", "-j", "addr", "show", "dev", "lo"])
+    assert not stderr
+    assert "127.0.0.1" in [addr["local"] for addr in json.loads(stdout)[0]["addr_info"]]
+
+
+def link_index(host: Host, name: str) -> int:
+    stdout, stderr = host.exec(["ip", "-j", "-details", "addr", "show", "dev", name])
+    assert not stderr
+    return int(json.loads(stdout)[0]["ifindex"])
+
+
+@requires_root
+def test_link_created_again(network_namespace: str) -> None:
+    host = NamespaceHost(network_namespace)
+    veth = ["type", "veth", "peer", "name", "veth1"]
+    assert host.exec_batch([["ip", "link", "add", "veth0", *veth]]) == [""]
+    first = link_index(host, "veth0")
+
+    # The workers don't keep the index of a link deleted and created again by another
+    # process
+    subprocess.run(["ip", "-n", network_namespace, "link", "del", "veth0"], check=True)
+    subprocess.run(
+        ["ip", "-n", network_namespace, "link", "add", "veth0", *veth], check=True
+    )
+    second = link_index(host, "veth0")
+    assert second != first
+
+    # Nor within a batch, where the link is deleted along with its peer
+    assert host.exec_batch(
+        [
+            ["ip", "link", "del", "veth1"],
+            ["ip", "link", "add", "veth0", *veth],
+            ["ip", "link", "set", "veth0", "up"],
+        ]
+    ) == ["", "", ""]
+    assert link_index(host, "veth0") not in (first, second)
+
+    # Or renamed
+    subprocess.run(
+        ["ip", "-n", network_namespace, "link", "set", "veth0", "name", "veth2"],
+        check=True,
+    )
+    _, stderr = host.exec(["ip", "-j", "-details", "addr", "show", "dev", "veth0"])
+    assert "does not exist" in stderr
+
+
+def test_exec_timeout() -> None:
+    # The output printed before the timeout is kept
+    start = time.monotonic()
+    stdout, _ = Host().exec(["sh", "-c", "echo started; exec sleep 10"], timeout=0.5)
+    assert time.monotonic() - start < 5
+    assert stdout == "started\n"
+
+
+def test_exec_stream() -> None:
+    host = Host()
+    assert list(host.exec_stream(["printf", "a\\nb\\nc"])) == ["a\n", "b\n", "c"]
+    assert "".join(host.exec_stream(["seq", "10000"], chunk_size=100)) == "".join(
+        f"{i}\n" for i in range(1, 10001)
+    )
+
+    with pytest.raises(RuntimeError, match="failed with exit code 3"):
+        list(host.exec_stream(["sh", "-c", "echo out; echo err >&2; exit 3"]))
+
+
+def test_exec_stream_timeout() -> None:
+    start = time.monotonic()
+    lines = []
+    with pytest.raises(CommandTimeout):
+        command = ["sh", "-c", "echo started; exec sleep 10"]
+        for line in Host().exec_stream(command, timeout=0.5):
+            lines.append(line)
+    assert time.monotonic() - start < 5
+    # The output printed before the timeout comes first
+    assert lines == ["started\n"]
+
+
+def test_exec_stream_idle_timeout() -> None:
+    # A command which keeps printing runs for longer than the idle timeout
+    host = Host()
+    command = ["sh", "-c", "for i in 1 2 3 4 5; do echo $i; sleep 0.2; done"]
+    lines = list(host.exec_stream(command, timeout=None, idle_timeout=0.5))
+    assert lines == [f"{i}\n" for i in range(1, 6)]
+
+    # A silent one is stopped
+    start = time.monotonic()
+    command = ["sh", "-c", "echo started; exec sleep 10"]
+    lines = []
+    with pytest.raises(CommandTimeout):
+        for line in host.exec_stream(command, timeout=None, idle_timeout=0.5):
+            lines.append(line)
+    assert time.monotonic() - start < 5
+    assert lines == ["started\n"]
+
+
+def test_exec_stream_closed() -> None:
+    # The command is stopped when its output is not consumed until the end
+    stream = Host().exec_stream(["sh", "-c", "echo $$; exec sleep 10"], timeout=None)
+    pid = int(next(stream))
+    stream.close()
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+
+
+def namespace_of(host: NamespaceHost) -> str:
+    stdout, stderr = host.exec(["readlink", "/proc/self/ns/net"])
+    assert not stderr
+    return stdout.strip()
+
+
+@requires_root
+def test_namespace_created_again(network_namespace: str) -> None:
+    host = NamespaceHost(network_namespace)
+    first = namespace_of(host)
+    host.exec_batch([["ip", "addr", "add", "10.0.0.1/8", "dev", "lo"]])
+
+    subprocess.run(["ip", "netns", "del", network_namespace], check=True)
+    subprocess.run(["ip", "netns", "add", network_namespace], check=True)
+
+    # The executor and the batch workers don't stay in the deleted namespace
+    second = namespace_of(host)
+    assert second != first
+    assert (
+        second
+        == f"net:[{os.stat(os.path.join(NETNS_RUN_DIR, network_namespace)).st_ino}]"
+    )
+    assert host.exec_batch([["ip", "addr", "add", "10.0.0.1/8", "dev", "lo"]]) == [""]
+    stdout, _ = host.exec(["ip", "-j", "addr", "show", "dev", "lo"])
+    assert "10.0.0.1" in stdout
+
+
+@requires_root
+def test_missing_binary(network_namespace: str) -> None:
+    host = NamespaceHost(network_namespace)
+    executor = host.executor()
+
+    # A command which doesn't exist doesn't stop the executor of the namespace
+    with pytest.raises(FileNotFoundError):
+        host.popen(["nfv-test-api-missing-binary"])
+
+    assert _namespace_executors[network_namespace] is executor
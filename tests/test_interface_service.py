@@ -0,0 +1,122 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import subprocess
+import typing
+from ipaddress import IPv4Interface
+
+import pytest
+from conftest import requires_root
+from werkzeug.exceptions import NotFound  # type: ignore
+
+from nfv_test_api.host import NamespaceHost
+from nfv_test_api.netlink import LinkFilter
+from nfv_test_api.v2.data.interface import InterfaceState, InterfaceUpdate
+from nfv_test_api.v2.services.interface import InterfaceService
+
+LOGGER = logging.getLogger(__name__)
+
+pytestmark = requires_root
+
+
+@pytest.fixture
+def service(network_namespace: str, read_backend: str) -> InterfaceService:
+    command = ["link", "add", "veth0", "type", "veth", "peer", "name", "veth1"]
+    subprocess.run(["ip", "-n", network_namespace, *command], check=True)
+    return InterfaceService(NamespaceHost(network_namespace))
+
+
+def count_batches(
+    service: InterfaceService, monkeypatch: pytest.MonkeyPatch
+) -> typing.List[typing.List[typing.List[str]]]:
+    batches: typing.List[typing.List[typing.List[str]]] = []
+    exec_batch = service.host.exec_batch
+
+    def recording_exec_batch(
+        commands: typing.List[typing.List[str]],
+    ) -> typing.List[str]:
+        batches.append(commands)
+        return exec_batch(commands)
+
+    monkeypatch.setattr(service.host, "exec_batch", recording_exec_batch)
+    return batches
+
+
+def test_update(service: InterfaceService, monkeypatch: pytest.MonkeyPatch) -> None:
+    batches = count_batches(service, monkeypatch)
+    update = InterfaceUpdate(  # type: ignore
+        mtu=1400,
+        state=InterfaceState.UP,
+        addresses=[IPv4Interface("10.0.0.1/24"), IPv4Interface("10.0.1.1/24")],
+    )
+    interface = service.update("veth0", update)
+
+    # All the changes are sent at once
+    assert len(batches) == 1
+    assert interface.mtu == 1400
+    assert interface.flags is not None and "UP" in interface.flags
+    assert sorted(str(addr.local) for addr in interface.addr_info) == [
+        "10.0.0.1",
+        "10.0.1.1",
+    ]
+
+    # Only the addresses which differ are changed
+    update = InterfaceUpdate(  # type: ignore
+        addresses=[IPv4Interface("10.0.1.1/24"), IPv4Interface("10.0.2.1/24")],
+    )
+    interface = service.update("veth0", update)
+    assert batches[1] == [
+        ["ip", "address", "del", "10.0.0.1/24", "dev", "veth0"],
+        ["ip", "address", "add", "10.0.2.1/24", "dev", "veth0"],
+    ]
+    assert sorted(str(addr.local) for addr in interface.addr_info) == [
+        "10.0.1.1",
+        "10.0.2.1",
+    ]
+
+
+def test_update_failure(service: InterfaceService) -> None:
+    update = InterfaceUpdate(mtu=1400, master="missing0")  # type: ignore
+    with pytest.raises(RuntimeError) as e:
+        service.update("veth0", update)
+
+    assert "Failed to set link master" in str(e.value)
+    assert "Failed to set link mtu" not in str(e.value)
+
+    # The other changes are still applied
+    assert service.get_one("veth0").mtu == 1400
+
+
+def test_master_filter(service: InterfaceService, network_namespace: str) -> None:
+    for command in [
+        ["link", "add", "br0", "type", "bridge"],
+        ["link", "add", "br1", "type", "bridge"],
+        ["link", "set", "veth1", "master", "br0"],
+    ]:
+        subprocess.run(["ip", "-n", network_namespace, *command], check=True)
+
+    def slaves(master: str) -> typing.List[str]:
+        link_filter = LinkFilter(master=master)
+        return [i.if_name for i in service.get_all(link_filter=link_filter)]
+
+    assert slaves("br0") == ["veth1"]
+    assert slaves("br1") == []
+
+    # The master is not looked up before listing its slaves, the error tells it is missing
+    with pytest.raises(NotFound):
+        slaves("missing0")
+
+    assert slaves("br0") == ["veth1"]
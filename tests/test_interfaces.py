@@ -13,17 +13,23 @@
    See the License for the specific language governing permissions and
    limitations under the License.
 """
+import json
 import logging
+import time
+import typing
 from ipaddress import IPv4Interface
 
 import requests
 
 from nfv_test_api.v2.data.interface import (
+    BondMode,
     Interface,
+    InterfaceBulkCreate,
     InterfaceCreate,
     InterfaceState,
     InterfaceUpdate,
     LinkInfo,
+    XmitHashPolicy,
 )
 from nfv_test_api.v2.data.namespace import Namespace, NamespaceCreate
 
@@ -92,3 +98,745 @@ def test_25_move_interface(nfv_test_api_endpoint: str, nfv_test_api_logs: None)
     )
     LOGGER.debug(response.json())
     response.raise_for_status()
+
+
+def test_bulk_create_interfaces(
+    nfv_test_api_endpoint: str, nfv_test_api_logs: None
+) -> None:
+    # Create many veth pairs at once
+    bulk_create = InterfaceBulkCreate(  # type: ignore
+        interfaces=[
+            InterfaceCreate(  # type: ignore
+                name=f"bulk{i}",
+                type=LinkInfo.Kind.VETH,
+                peer=f"bulkpeer{i}",
+            )
+            for i in range(100)
+        ],
+    )
+    response = requests.post(
+        f"{nfv_test_api_endpoint}/interfaces/bulk", json=bulk_create.json_dict()
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+
+    created_interfaces = [Interface(**interface) for interface in response.json()]
+    assert [interface.if_name for interface in created_interfaces] == [
+        f"bulk{i}" for i in range(100)
+    ]
+
+    # Creating them again conflicts, and nothing is created
+    bulk_create.interfaces.append(
+        InterfaceCreate(name="bulknew", type=LinkInfo.Kind.VETH, peer="bulknewpeer")  # type: ignore
+    )
+    response = requests.post(
+        f"{nfv_test_api_endpoint}/interfaces/bulk", json=bulk_create.json_dict()
+    )
+    assert response.status_code == 409
+
+    response = requests.get(f"{nfv_test_api_endpoint}/interfaces/bulknew")
+    assert response.status_code == 404
+
+
+def test_filter_interfaces(nfv_test_api_endpoint: str, nfv_test_api_logs: None) -> None:
+    # Create a veth pair, only one end is selected by the name prefix
+    new_interface = InterfaceCreate(  # type: ignore
+        name="filter0",
+        type=LinkInfo.Kind.VETH,
+        peer="peer0",
+    )
+    response = requests.post(
+        f"{nfv_test_api_endpoint}/interfaces", json=new_interface.json_dict()
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/interfaces",
+        params={
+            "kind": "veth",
+            "name_prefix": "filter",
+            "fields": "if_name,oper_state",
+        },
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert response.json() == [{"if_name": "filter0", "oper_state": "DOWN"}]
+
+    # The listing without addresses doesn't change how the next reads see them
+    response = requests.get(f"{nfv_test_api_endpoint}/interfaces/filter0")
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    response = requests.get(f"{nfv_test_api_endpoint}/interfaces/lo")
+    response.raise_for_status()
+    assert "127.0.0.1" in [addr["local"] for addr in response.json()["addr_info"]]
+
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/interfaces", params={"fields": "unknown"}
+    )
+    assert response.status_code == 400
+
+
+def test_create_interface_again(
+    nfv_test_api_endpoint: str, nfv_test_api_logs: None
+) -> None:
+    new_interface = InterfaceCreate(  # type: ignore
+        name="again0",
+        type=LinkInfo.Kind.VETH,
+        peer="againpeer0",
+    )
+    if_indexes = []
+    for _ in range(2):
+        response = requests.post(
+            f"{nfv_test_api_endpoint}/interfaces", json=new_interface.json_dict()
+        )
+        LOGGER.debug(response.json())
+        response.raise_for_status()
+
+        # The interface is read with its new index, not the one of the deleted interface
+        response = requests.get(f"{nfv_test_api_endpoint}/interfaces/again0")
+        LOGGER.debug(response.json())
+        response.raise_for_status()
+        if_indexes.append(Interface(**response.json()).if_index)
+
+        response = requests.delete(f"{nfv_test_api_endpoint}/interfaces/again0")
+        response.raise_for_status()
+
+    assert if_indexes[0] != if_indexes[1]
+    response = requests.get(f"{nfv_test_api_endpoint}/interfaces/again0")
+    assert response.status_code == 404
+
+
+def test_create_bond(nfv_test_api_endpoint: str, nfv_test_api_logs: None) -> None:
+    # Create the slaves of the bond
+    for i in range(2):
+        new_interface = InterfaceCreate(  # type: ignore
+            name=f"bondslave{i}",
+            type=LinkInfo.Kind.VETH,
+            peer=f"bondpeer{i}",
+        )
+        response = requests.post(
+            f"{nfv_test_api_endpoint}/interfaces", json=new_interface.json_dict()
+        )
+        LOGGER.debug(response.json())
+        response.raise_for_status()
+
+    new_bond = InterfaceCreate(  # type: ignore
+        name="bond0",
+        type=LinkInfo.Kind.BOND,
+        slave_interfaces=["bondslave0", "bondslave1"],
+        bond_mode=BondMode.BALANCE_XOR,
+        miimon=100,
+        xmit_hash_policy=XmitHashPolicy.LAYER3_4,
+    )
+    response = requests.post(
+        f"{nfv_test_api_endpoint}/interfaces", json=new_bond.json_dict()
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+
+    bond = Interface(**response.json())
+    assert bond.link_info is not None
+    assert bond.link_info.info_kind == LinkInfo.Kind.BOND
+    assert bond.link_info.info_data is not None
+    assert bond.link_info.info_data["mode"] == "balance-xor"
+    assert bond.link_info.info_data["miimon"] == 100
+    assert bond.link_info.info_data["xmit_hash_policy"] == "layer3+4"
+
+    # The slaves are enslaved, and can still be read with their addresses
+    for i in range(2):
+        response = requests.get(f"{nfv_test_api_endpoint}/interfaces/bondslave{i}")
+        LOGGER.debug(response.json())
+        response.raise_for_status()
+        assert Interface(**response.json()).master == "bond0"
+
+    # The bond options are refused on any other kind of interface
+    new_interface = InterfaceCreate(  # type: ignore
+        name="bondslave2",
+        type=LinkInfo.Kind.VETH,
+        peer="bondpeer2",
+    )
+    response = requests.post(
+        f"{nfv_test_api_endpoint}/interfaces",
+        json={**new_interface.json_dict(), "miimon": 100},
+    )
+    assert response.status_code == 400
+
+    response = requests.get(f"{nfv_test_api_endpoint}/interfaces/bondslave2")
+    assert response.status_code == 404
+
+    # Cleanup
+    for name in ["bond0", "bondslave0", "bondslave1"]:
+        response = requests.delete(f"{nfv_test_api_endpoint}/interfaces/{name}")
+        response.raise_for_status()
+
+
+def test_interface_stats(nfv_test_api_endpoint: str, nfv_test_api_logs: None) -> None:
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/interfaces/lo/stats", params={"windows": "1,10"}
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    stats = response.json()
+    assert stats["if_name"] == "lo"
+    assert set(stats["stats64"]["rx"].keys()) == {
+        "bytes",
+        "packets",
+        "errors",
+        "dropped",
+    }
+
+    # The rates need samples from before the request
+    time.sleep(2)
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/interfaces/lo/stats", params={"windows": "1,10"}
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert [rates["window"] for rates in response.json()["rates"]] == [1, 10]
+
+    response = requests.get(f"{nfv_test_api_endpoint}/interfaces/unknown0/stats")
+    assert response.status_code == 404
+
+
+def test_interface_events(nfv_test_api_endpoint: str, nfv_test_api_logs: None) -> None:
+    with requests.get(
+        f"{nfv_test_api_endpoint}/events",
+        params={"types": "link", "if_name": "events0", "timeout": "5"},
+        stream=True,
+    ) as stream:
+        stream.raise_for_status()
+        events = (json.loads(line) for line in stream.iter_lines() if line)
+        assert next(events)["type"] == "ready"
+
+        new_interface = InterfaceCreate(  # type: ignore
+            name="events0",
+            type=LinkInfo.Kind.VETH,
+            peer="events1",
+        )
+        response = requests.post(
+            f"{nfv_test_api_endpoint}/interfaces", json=new_interface.json_dict()
+        )
+        LOGGER.debug(response.json())
+        response.raise_for_status()
+
+        event = next(events)
+        LOGGER.debug(event)
+        assert event["type"] == "link"
+        assert event["action"] == "new"
+        assert event["interface"]["if_name"] == "events0"
+
+
+def test_namespace_state(nfv_test_api_endpoint: str, nfv_test_api_logs: None) -> None:
+    state = {
+        "interfaces": [
+            {"name": "lo", "state": "UP"},
+            {
+                "name": "state0",
+                "type": "veth",
+                "peer": "state1",
+                "addresses": ["10.123.0.1/24"],
+                "state": "UP",
+            },
+        ],
+        "routes": [{"dst": "10.124.0.0/16", "gateway": "10.123.0.2", "dev": "state0"}],
+    }
+    response = requests.put(
+        f"{nfv_test_api_endpoint}/namespaces/state-test/state", json=state
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert response.json()["commands"]
+    assert {interface["if_name"] for interface in response.json()["interfaces"]} == {
+        "lo",
+        "state0",
+        "state1",
+    }
+
+    # Nothing to change the second time
+    response = requests.put(
+        f"{nfv_test_api_endpoint}/namespaces/state-test/state", json=state
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert response.json()["commands"] == []
+
+    response = requests.delete(f"{nfv_test_api_endpoint}/namespaces/state-test")
+    response.raise_for_status()
+
+
+def test_namespace_state_kind_changed(
+    nfv_test_api_endpoint: str, nfv_test_api_logs: None
+) -> None:
+    # The interfaces are recreated with another kind, and configured and read under their
+    # new index.  Deleting one end of the veth deletes the other one along with it.
+    states: typing.List[typing.List[typing.Dict[str, typing.Any]]] = [
+        [
+            {
+                "name": "kind0",
+                "type": "veth",
+                "peer": "kind1",
+                "addresses": ["10.125.0.1/24"],
+            },
+            {"name": "kind1", "type": "veth", "addresses": ["10.125.1.1/24"]},
+        ],
+        [
+            {"name": "kind0", "type": "bridge", "addresses": ["10.126.0.1/24"]},
+            {"name": "kind1", "type": "bridge", "addresses": ["10.126.1.1/24"]},
+        ],
+    ]
+    for interfaces in states:
+        response = requests.put(
+            f"{nfv_test_api_endpoint}/namespaces/kind-test/state",
+            json={"interfaces": interfaces},
+        )
+        LOGGER.debug(response.json())
+        response.raise_for_status()
+
+        for interface in interfaces:
+            response = requests.get(
+                f"{nfv_test_api_endpoint}/interfaces/ns/kind-test/{interface['name']}"
+            )
+            LOGGER.debug(response.json())
+            response.raise_for_status()
+            assert response.json()["link_info"]["info_kind"] == interface["type"]
+            assert [
+                f"{addr['local']}/{addr['prefix_len']}"
+                for addr in response.json()["addr_info"]
+            ] == interface.get("addresses", [])
+
+    response = requests.delete(f"{nfv_test_api_endpoint}/namespaces/kind-test")
+    response.raise_for_status()
+
+
+def test_bulk_create_routes(
+    nfv_test_api_endpoint: str, nfv_test_api_logs: None
+) -> None:
+    state = {
+        "interfaces": [
+            {
+                "name": "bulkroute0",
+                "type": "veth",
+                "peer": "bulkroute1",
+                "addresses": ["10.125.0.1/24"],
+                "state": "UP",
+            },
+        ],
+        "routes": [],
+    }
+    response = requests.put(
+        f"{nfv_test_api_endpoint}/namespaces/bulk-route-test/state", json=state
+    )
+    response.raise_for_status()
+
+    routes = [{"dst": f"10.126.{i}.0/24", "dev": "bulkroute0"} for i in range(200)]
+    response = requests.post(
+        f"{nfv_test_api_endpoint}/routes/ns/bulk-route-test/bulk",
+        data="".join(json.dumps(route) + "\n" for route in routes),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert response.json() == {"created": 200, "failed": 0, "errors": []}
+
+    # The existing routes are reported, the new ones are created anyway
+    routes = [
+        {"dst": "10.126.0.0/24", "dev": "bulkroute0"},
+        {"dst": "10.127.0.0/24", "dev": "bulkroute0"},
+        {"dst": "10.128.0.0/24", "dev": "missing"},
+    ]
+    response = requests.post(
+        f"{nfv_test_api_endpoint}/routes/ns/bulk-route-test/bulk", json=routes
+    )
+    LOGGER.debug(response.json())
+    assert response.status_code == 422
+    assert response.json()["created"] == 1
+    assert [error["index"] for error in response.json()["errors"]] == [0, 2]
+
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/routes/ns/bulk-route-test/10.127.0.0/24"
+    )
+    response.raise_for_status()
+
+    # Checking the devices of the routes doesn't change how the interfaces are read
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/interfaces/ns/bulk-route-test/bulkroute0"
+    )
+    response.raise_for_status()
+    assert [addr["local"] for addr in response.json()["addr_info"]] == ["10.125.0.1"]
+
+    response = requests.delete(f"{nfv_test_api_endpoint}/namespaces/bulk-route-test")
+    response.raise_for_status()
+
+
+def test_route_lookup(nfv_test_api_endpoint: str, nfv_test_api_logs: None) -> None:
+    state = {
+        "interfaces": [
+            {
+                "name": "lookup0",
+                "type": "veth",
+                "peer": "lookup1",
+                "addresses": ["10.130.0.1/24"],
+                "state": "UP",
+            },
+        ],
+        "routes": [
+            {"dst": "10.131.0.0/16", "gateway": "10.130.0.2", "dev": "lookup0"},
+            {"dst": "10.131.1.0/24", "gateway": "10.130.0.3", "dev": "lookup0"},
+        ],
+    }
+    response = requests.put(
+        f"{nfv_test_api_endpoint}/namespaces/lookup-test/state", json=state
+    )
+    response.raise_for_status()
+
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/routes/ns/lookup-test/lookup/10.131.1.1",
+        params={"check": "true"},
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert response.json()["route"]["gateway"] == "10.130.0.3"
+    assert response.json()["check"]["matches"]
+
+    response = requests.post(
+        f"{nfv_test_api_endpoint}/routes/ns/lookup-test/lookup",
+        json={"addresses": ["10.131.2.1", "10.130.0.1", "10.132.0.1"]},
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert [result.get("table") for result in response.json()] == [
+        "main",
+        "local",
+        None,
+    ]
+    assert response.json()[0]["route"]["gateway"] == "10.130.0.2"
+
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/routes/ns/lookup-test/lookup/10.132.0.1"
+    )
+    assert response.status_code == 404
+
+    response = requests.delete(f"{nfv_test_api_endpoint}/namespaces/lookup-test")
+    response.raise_for_status()
+
+
+def test_route_pages(nfv_test_api_endpoint: str, nfv_test_api_logs: None) -> None:
+    state = {
+        "interfaces": [
+            {
+                "name": "pages0",
+                "type": "veth",
+                "peer": "pages1",
+                "addresses": ["10.140.0.1/24", "fd14::1/64"],
+                "state": "UP",
+            },
+        ],
+        "routes": [
+            {"dst": f"10.141.{i}.0/24", "gateway": "10.140.0.2", "dev": "pages0"}
+            for i in range(10)
+        ],
+    }
+    response = requests.put(
+        f"{nfv_test_api_endpoint}/namespaces/pages-test/state", json=state
+    )
+    response.raise_for_status()
+
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/routes/ns/pages-test",
+        params={"family": "all", "table": "all"},
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    all_routes = response.json()
+    assert {route["table"] for route in all_routes} == {"main", "local"}
+    assert any(":" in route["dst"] for route in all_routes)
+
+    routes = []
+    params = {"family": "all", "table": "all", "limit": "4"}
+    while True:
+        response = requests.get(
+            f"{nfv_test_api_endpoint}/routes/ns/pages-test", params=params
+        )
+        response.raise_for_status()
+        assert len(response.json()) <= 4
+        routes.extend(response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+
+        cursor = response.headers["X-Next-Cursor"]
+        if "cursor" not in params:
+            # A route added before the cursor doesn't move the next pages
+            response = requests.post(
+                f"{nfv_test_api_endpoint}/routes/ns/pages-test",
+                json={"dst": "10.139.0.0/24", "gateway": "10.140.0.2", "dev": "pages0"},
+            )
+            response.raise_for_status()
+
+        params["cursor"] = cursor
+
+    # The pages are in the order of the routes' family, table and destination
+    assert [route["dst"] for route in routes[:3]] == [
+        "10.140.0.0/24",
+        "10.141.0.0/24",
+        "10.141.1.0/24",
+    ]
+    assert sorted(routes, key=json.dumps) == sorted(all_routes, key=json.dumps)
+
+    response = requests.delete(f"{nfv_test_api_endpoint}/namespaces/pages-test")
+    response.raise_for_status()
+
+
+def test_multipath_routes(nfv_test_api_endpoint: str, nfv_test_api_logs: None) -> None:
+    state = {
+        "interfaces": [
+            {
+                "name": "ecmp0",
+                "type": "veth",
+                "peer": "ecmp1",
+                "addresses": ["10.150.0.1/24"],
+                "state": "UP",
+            },
+            {
+                "name": "ecmp2",
+                "type": "veth",
+                "peer": "ecmp3",
+                "addresses": ["10.150.1.1/24"],
+                "state": "UP",
+            },
+            # The nexthop objects need a carrier on their device
+            {"name": "ecmp1", "state": "UP"},
+            {"name": "ecmp3", "state": "UP"},
+        ],
+    }
+    response = requests.put(
+        f"{nfv_test_api_endpoint}/namespaces/ecmp-test/state", json=state
+    )
+    response.raise_for_status()
+
+    nexthops = [
+        {"gateway": "10.150.0.2", "dev": "ecmp0", "weight": 2},
+        {"gateway": "10.150.1.2", "dev": "ecmp2"},
+    ]
+    response = requests.post(
+        f"{nfv_test_api_endpoint}/routes/ns/ecmp-test",
+        json={"dst": "10.151.0.0/24", "nexthops": nexthops, "metric": 10, "mtu": 1400},
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    route = response.json()
+    assert route["metric"] == 10
+    assert route["mtu"] == 1400
+    assert [nexthop["weight"] for nexthop in route["nexthops"]] == [2, 1]
+
+    response = requests.post(
+        f"{nfv_test_api_endpoint}/routes/ns/ecmp-test/bulk",
+        json=[{"dst": f"10.152.{i}.0/24", "nexthops": nexthops} for i in range(100)],
+    )
+    response.raise_for_status()
+
+    # All the routes share the same group of nexthop objects
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/routes/ns/ecmp-test/10.152.99.0/24"
+    )
+    response.raise_for_status()
+    assert response.json()["nhid"] == route["nhid"]
+
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/nexthops/ns/ecmp-test/{route['nhid']}"
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    first_member = response.json()["group"][0]["id"]
+
+    # Repointing all of them at once
+    response = requests.patch(
+        f"{nfv_test_api_endpoint}/nexthops/ns/ecmp-test/{first_member}",
+        json={"gateway": "10.150.0.3", "dev": "ecmp0"},
+    )
+    response.raise_for_status()
+
+    response = requests.get(
+        f"{nfv_test_api_endpoint}/routes/ns/ecmp-test/10.152.50.0/24"
+    )
+    response.raise_for_status()
+    assert "10.150.0.3" in [
+        nexthop["gateway"] for nexthop in response.json()["nexthops"]
+    ]
+
+    response = requests.delete(f"{nfv_test_api_endpoint}/namespaces/ecmp-test")
+    response.raise_for_status()
+
+
+def test_sync_routes(nfv_test_api_endpoint: str, nfv_test_api_logs: None) -> None:
+    state = {
+        "interfaces": [
+            {
+                "name": "sync0",
+                "type": "veth",
+                "peer": "sync1",
+                "addresses": ["10.160.0.1/24"],
+                "state": "UP",
+            },
+        ],
+    }
+    response = requests.put(
+        f"{nfv_test_api_endpoint}/namespaces/sync-test/state", json=state
+    )
+    response.raise_for_status()
+
+    routes = [
+        {"dst": f"10.161.{i}.0/24", "gateway": "10.160.0.2", "dev": "sync0"}
+        for i in range(100)
+    ]
+    response = requests.put(f"{nfv_test_api_endpoint}/routes/ns/sync-test", json=routes)
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert len(response.json()["added"]) == 100
+
+    # Nothing to do the second time
+    response = requests.put(f"{nfv_test_api_endpoint}/routes/ns/sync-test", json=routes)
+    response.raise_for_status()
+    assert response.json()["unchanged"] == 100
+
+    routes = routes[1:]
+    routes[0] = {**routes[0], "gateway": "10.160.0.3"}
+    routes.append({"dst": "10.162.0.0/24", "dev": "sync0"})
+    response = requests.put(f"{nfv_test_api_endpoint}/routes/ns/sync-test", json=routes)
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert response.json()["added"] == ["10.162.0.0/24"]
+    assert response.json()["changed"] == ["10.161.1.0/24"]
+    assert response.json()["deleted"] == ["10.161.0.0/24"]
+    assert response.json()["unchanged"] == 98
+
+    # The route of the address of the interface is not deleted
+    response = requests.put(f"{nfv_test_api_endpoint}/routes/ns/sync-test", json=[])
+    response.raise_for_status()
+    response = requests.get(f"{nfv_test_api_endpoint}/routes/ns/sync-test")
+    response.raise_for_status()
+    assert [route["dst"] for route in response.json()] == ["10.160.0.0/24"]
+
+    # Reading the routing table doesn't change how the interfaces are read next
+    response = requests.get(f"{nfv_test_api_endpoint}/interfaces/ns/sync-test/sync0")
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert [addr["local"] for addr in response.json()["addr_info"]] == ["10.160.0.1"]
+
+    response = requests.delete(f"{nfv_test_api_endpoint}/namespaces/sync-test")
+    response.raise_for_status()
+
+
+def test_namespace_template(
+    nfv_test_api_endpoint: str, nfv_test_api_logs: None
+) -> None:
+    template = {
+        "name": "site-{index}",
+        "count": 20,
+        "pools": {"wan": {"network": "10.170.0.0/24", "prefix_len": 30}},
+        "parent_interfaces": [
+            {
+                "name": "site{index}",
+                "type": "veth",
+                "peer": "eth0",
+                "peer_netns": "{name}",
+                "addresses": ["{wan[1]}"],
+                "state": "UP",
+            },
+        ],
+        "state": {
+            "interfaces": [
+                {"name": "eth0", "addresses": ["{wan[2]}"], "state": "UP"},
+            ],
+            "routes": [{"dst": "default", "gateway": "{wan[1].ip}", "dev": "eth0"}],
+        },
+    }
+    response = requests.put(
+        f"{nfv_test_api_endpoint}/namespaces/template", json=template
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert [copy["name"] for copy in response.json()["copies"]] == [
+        f"site-{i}" for i in range(20)
+    ]
+
+    response = requests.get(f"{nfv_test_api_endpoint}/routes/ns/site-3")
+    response.raise_for_status()
+    routes = {route["dst"]: route for route in response.json()}
+    assert routes["default"]["gateway"] == "10.170.0.13"
+
+    # Nothing to do the second time
+    response = requests.put(
+        f"{nfv_test_api_endpoint}/namespaces/template", json=template
+    )
+    response.raise_for_status()
+    assert not any(copy["commands"] for copy in response.json()["copies"])
+
+    for i in range(20):
+        response = requests.delete(f"{nfv_test_api_endpoint}/namespaces/site-{i}")
+        response.raise_for_status()
+
+
+def test_bulk_delete_namespaces(
+    nfv_test_api_endpoint: str, nfv_test_api_logs: None
+) -> None:
+    state = {
+        "interfaces": [{"name": "td0", "type": "veth", "peer": "td1"}],
+    }
+    for i in range(5):
+        response = requests.put(
+            f"{nfv_test_api_endpoint}/namespaces/teardown-{i}/state", json=state
+        )
+        response.raise_for_status()
+
+    response = requests.delete(
+        f"{nfv_test_api_endpoint}/namespaces",
+        params={"name_prefix": "teardown-", "grace_period": "1"},
+    )
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert sorted(namespace["name"] for namespace in response.json()["namespaces"]) == [
+        f"teardown-{i}" for i in range(5)
+    ]
+    # Deleting one end of a veth deletes the other one
+    assert all(
+        len(namespace["veths"]) == 1 for namespace in response.json()["namespaces"]
+    )
+
+    response = requests.get(f"{nfv_test_api_endpoint}/namespaces")
+    response.raise_for_status()
+    assert not [
+        namespace
+        for namespace in response.json()
+        if (namespace["name"] or "").startswith("teardown-")
+    ]
+
+    # Nothing left to delete
+    response = requests.delete(
+        f"{nfv_test_api_endpoint}/namespaces", params={"names": "teardown-0"}
+    )
+    response.raise_for_status()
+    assert response.json()["namespaces"] == []
+
+    # A namespace created again under the same name is read with its addresses
+    new_state = {
+        "interfaces": [
+            {
+                "name": "td0",
+                "type": "veth",
+                "peer": "td1",
+                "addresses": ["10.180.0.1/24"],
+            },
+        ],
+    }
+    response = requests.put(
+        f"{nfv_test_api_endpoint}/namespaces/teardown-0/state", json=new_state
+    )
+    response.raise_for_status()
+    response = requests.get(f"{nfv_test_api_endpoint}/interfaces/ns/teardown-0/td0")
+    LOGGER.debug(response.json())
+    response.raise_for_status()
+    assert [addr["local"] for addr in response.json()["addr_info"]] == ["10.180.0.1"]
+
+    response = requests.delete(f"{nfv_test_api_endpoint}/namespaces/teardown-0")
+    response.raise_for_status()
@@ -0,0 +1,122 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import typing
+
+import pytest
+
+from nfv_test_api.host import Host
+from nfv_test_api.metrics import ExecKey, Histogram, command_family, exec_metrics
+from nfv_test_api.v2.controllers import metrics
+from nfv_test_api.v2.services.interface import InterfaceService
+from nfv_test_api.v2.services.registry import ServiceRegistry
+
+LOGGER = logging.getLogger(__name__)
+
+
+def test_histogram() -> None:
+    histogram = Histogram([1, 10])
+    for value in [0.5, 1, 5, 100]:
+        histogram.observe(value)
+
+    # A value on the bound of a bucket is counted in it
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.cumulative_counts() == [2, 3, 4]
+    assert histogram.count == 4
+    assert histogram.sum == 106.5
+
+    # The copies don't move with the histogram
+    copy = histogram.copy()
+    histogram.observe(1)
+    assert copy.cumulative_counts() == [2, 3, 4]
+
+
+@pytest.mark.parametrize(
+    "command, family",
+    [
+        (["ip", "-j", "-details", "addr", "show", "dev", "lo"], "ip addr show"),
+        (["ip", "a"], "ip addr show"),
+        (["ip", "-details", "route"], "ip route show"),
+        (["ip", "link", "delete", "veth0"], "ip link del"),
+        (["ip", "-batch", "-"], "ip"),
+        (["/usr/bin/ping", "-c", "4", "10.0.0.1"], "ping"),
+        ([], ""),
+    ],
+)
+def test_command_family(command: typing.List[str], family: str) -> None:
+    assert command_family(command) == family
+
+
+def observations(key: ExecKey) -> typing.Tuple[int, float]:
+    for observed_key, durations, sizes in exec_metrics.snapshot():
+        if observed_key == key:
+            return durations.count, sizes.sum
+
+    return 0, 0
+
+
+def test_exec_metrics() -> None:
+    host = Host()
+    count, size = observations(("echo", "", "0"))
+    host.exec(["echo", "hello"])
+    assert observations(("echo", "", "0")) == (count + 1, size + len("hello\n"))
+
+    count, _ = observations(("sleep", "", "timeout"))
+    host.exec(["sleep", "10"], timeout=0.2)
+    assert observations(("sleep", "", "timeout"))[0] == count + 1
+
+    count, _ = observations(("nfv-test-api-missing-binary", "", "error"))
+    with pytest.raises(FileNotFoundError):
+        host.exec(["nfv-test-api-missing-binary"])
+    assert observations(("nfv-test-api-missing-binary", "", "error"))[0] == count + 1
+
+
+def test_netlink_metrics(read_backend: str) -> None:
+    service = InterfaceService(Host())
+    count, size = observations(("netlink", "", "0"))
+    links = service.netlink_read(lambda netlink_reader: netlink_reader.links())
+    if read_backend == "ip":
+        assert links is None
+        assert observations(("netlink", "", "0")) == (count, size)
+        return
+
+    # The size of a netlink read is the one of the messages it received
+    assert links
+    new_count, new_size = observations(("netlink", "", "0"))
+    assert new_count == count + 1
+    assert new_size > size
+
+
+def test_render_metrics(read_backend: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    registry = ServiceRegistry()
+    monkeypatch.setattr(metrics, "service_registry", registry)
+    registry.host("metrics-test")
+
+    # A scrape doesn't create any state cache, nor drops what is registered
+    text = metrics.render_metrics()
+    assert "nfv_test_api_namespaces " in text
+    assert "nfv_test_api_interfaces{" not in text
+    assert registry.state_caches() == {}
+    assert registry.namespaces() == ["metrics-test"]
+
+    # The namespaces which have one are counted
+    state_cache = registry.state_cache()
+    try:
+        text = metrics.render_metrics()
+        assert 'nfv_test_api_interfaces{namespace=""}' in text
+        assert 'nfv_test_api_routes{namespace="",family="inet"}' in text
+    finally:
+        state_cache.close()
@@ -0,0 +1,214 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import os
+import pathlib
+import socket
+import subprocess
+import typing
+import uuid
+
+import pytest
+from conftest import requires_root
+
+from nfv_test_api import namespace_index, netlink
+from nfv_test_api.namespace_index import NamespaceIndex
+from nfv_test_api.netlink import NetlinkSocket, open_socket
+
+LOGGER = logging.getLogger(__name__)
+
+pytestmark = requires_root
+
+
+class NetnsDir:
+    """
+    A directory the index looks the namespaces up in instead of /run/netns.  The namespaces
+    created with ip are mounted in it under the names the tests give them.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self.namespaces: typing.List[str] = []
+        self.mounts: typing.List[pathlib.Path] = []
+
+    def create_namespace(self) -> str:
+        """
+        Create a namespace with ip, it gets an id in the namespace of the tests.
+        """
+        namespace = f"test-{uuid.uuid4().hex[:8]}"
+        subprocess.run(["ip", "netns", "add", namespace], check=True)
+        self.namespaces.append(namespace)
+        subprocess.run(["ip", "netns", "set", namespace, "auto"], check=True)
+        return namespace
+
+    def mount(self, namespace: str, name: str) -> None:
+        self.path.mkdir(exist_ok=True)
+        path = self.path / name
+        path.touch()
+        subprocess.run(
+            ["mount", "--bind", os.path.join("/run/netns", namespace), str(path)],
+            check=True,
+        )
+        self.mounts.append(path)
+
+    def unmount(self, name: str) -> None:
+        path = self.path / name
+        subprocess.run(["umount", str(path)], check=True)
+        path.unlink()
+        self.mounts.remove(path)
+
+    def nsid(self, name: str) -> int:
+        fd = os.open(self.path / name, os.O_RDONLY)
+        try:
+            with open_socket() as netlink_socket:
+                return netlink_socket.nsid(fd)
+        finally:
+            os.close(fd)
+
+    def cleanup(self) -> None:
+        for path in self.mounts:
+            subprocess.run(["umount", str(path)], check=False)
+
+        for namespace in self.namespaces:
+            subprocess.run(["ip", "netns", "del", namespace], check=False)
+
+
+@pytest.fixture
+def netns_dir(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> typing.Generator[NetnsDir, None, None]:
+    # It doesn't exist until the first namespace is mounted in it
+    path = tmp_path / "netns"
+    monkeypatch.setattr(namespace_index, "NETNS_RUN_DIR", str(path))
+    monkeypatch.setattr(netlink, "NETNS_RUN_DIR", str(path))
+    netns_dir = NetnsDir(path)
+
+    yield netns_dir
+
+    netns_dir.cleanup()
+
+
+@pytest.fixture
+def index() -> typing.Generator[NamespaceIndex, None, None]:
+    index = NamespaceIndex(open_socket)
+
+    yield index
+
+    index.close()
+
+
+def named(index: NamespaceIndex) -> typing.Dict[str, int]:
+    return {
+        namespace["name"]: namespace["nsid"]
+        for namespace in index.namespaces()
+        if "name" in namespace
+    }
+
+
+def built_again() -> typing.Dict[str, int]:
+    index = NamespaceIndex(open_socket)
+    try:
+        return named(index)
+    finally:
+        index.close()
+
+
+def test_missing_directory(netns_dir: NetnsDir, index: NamespaceIndex) -> None:
+    assert named(index) == {}
+
+    namespace = netns_dir.create_namespace()
+    netns_dir.mount(namespace, "first")
+    assert index.by_name("first") == {"name": "first", "nsid": netns_dir.nsid("first")}
+
+    # Once the directory exists, it is watched
+    netns_dir.mount(netns_dir.create_namespace(), "second")
+    assert named(index) == built_again()
+    assert set(named(index)) == {"first", "second"}
+
+
+def test_watch_overflow(
+    netns_dir: NetnsDir, index: NamespaceIndex, caplog: pytest.LogCaptureFixture
+) -> None:
+    netns_dir.mount(netns_dir.create_namespace(), "first")
+    assert set(named(index)) == {"first"}
+
+    # More changes than inotify queues by default
+    netns_dir.mount(netns_dir.create_namespace(), "second")
+    for i in range(20000):
+        (netns_dir.path / f"file{i}").touch()
+    netns_dir.unmount("first")
+
+    assert named(index) == built_again()
+    assert set(named(index)) == {"second"}
+    assert "rebuilding the index" in caplog.text
+
+
+def test_lost_notifications(
+    netns_dir: NetnsDir, caplog: pytest.LogCaptureFixture
+) -> None:
+    def open_small_socket() -> NetlinkSocket:
+        netlink_socket = open_socket()
+        # The smallest buffer the kernel allows only holds a few notifications
+        with socket.socket(fileno=os.dup(netlink_socket.fileno())) as dup:
+            dup.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1)
+        return netlink_socket
+
+    index = NamespaceIndex(open_small_socket)
+    try:
+        netns_dir.mount(netns_dir.create_namespace(), "first")
+        assert set(named(index)) == {"first"}
+
+        namespaces = [netns_dir.create_namespace() for _ in range(20)]
+        for i, namespace in enumerate(namespaces):
+            netns_dir.mount(namespace, f"ns{i}")
+
+        assert named(index) == built_again()
+        assert len(named(index)) == 21
+        assert "Namespace id notifications were lost" in caplog.text
+    finally:
+        index.close()
+
+
+def test_mounted_twice(netns_dir: NetnsDir, index: NamespaceIndex) -> None:
+    namespace = netns_dir.create_namespace()
+    netns_dir.mount(namespace, "first")
+    nsid = netns_dir.nsid("first")
+    assert named(index) == {"first": nsid}
+
+    # Like ip netns list-id, the namespace keeps its first name
+    netns_dir.mount(namespace, "second")
+    assert named(index) == {"first": nsid}
+    assert index.by_id(nsid) == {"name": "first", "nsid": nsid}
+
+    # Until it is unmounted
+    netns_dir.unmount("first")
+    assert named(index) == {"second": nsid}
+    assert index.by_name("first") is None
+
+
+def test_added_again(netns_dir: NetnsDir, index: NamespaceIndex) -> None:
+    netns_dir.mount(netns_dir.create_namespace(), "first")
+    first = netns_dir.nsid("first")
+    assert named(index) == {"first": first}
+
+    # Another namespace takes the name
+    netns_dir.unmount("first")
+    assert index.by_name("first") is None
+    netns_dir.mount(netns_dir.create_namespace(), "first")
+    second = netns_dir.nsid("first")
+    assert second != first
+    assert index.by_name("first") == {"name": "first", "nsid": second}
+    assert named(index) == built_again()
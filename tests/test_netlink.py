@@ -0,0 +1,164 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+import logging
+import socket
+import subprocess
+import typing
+
+import pytest
+from conftest import requires_root
+
+from nfv_test_api import netlink_state
+from nfv_test_api.netlink import LinkFilter, open_socket
+from nfv_test_api.netlink_state import NetlinkStateCache
+from nfv_test_api.v2.data.interface import Interface, LinkInfo
+from nfv_test_api.v2.data.route import Route
+
+LOGGER = logging.getLogger(__name__)
+
+pytestmark = requires_root
+
+
+def ip(namespace: str, *args: str) -> typing.Any:
+    stdout = subprocess.run(
+        ["ip", "-n", namespace, "-j", "-details", *args],
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    return json.loads(stdout)
+
+
+def interfaces(
+    raw_interfaces: typing.List[typing.Dict[str, typing.Any]]
+) -> typing.List[Interface]:
+    # The netlink backend only decodes the data of the kinds of links the api creates
+    result: typing.List[Interface] = []
+    for raw_interface in raw_interfaces:
+        interface = Interface(**raw_interface)
+        if interface.link_info is not None:
+            interface.link_info.info_slave_data = None
+            if interface.link_info.info_kind == LinkInfo.Kind.BRIDGE:
+                interface.link_info.info_data = None
+        result.append(interface)
+
+    return result
+
+
+@pytest.fixture
+def links(network_namespace: str) -> str:
+    for command in [
+        ["link", "add", "veth0", "type", "veth", "peer", "name", "veth1"],
+        ["link", "add", "br0", "type", "bridge"],
+        ["link", "set", "veth1", "master", "br0"],
+        ["link", "set", "veth0", "up"],
+        ["addr", "add", "10.1.0.1/24", "dev", "veth0"],
+        ["-6", "addr", "add", "fd00:1::1/64", "dev", "veth0", "nodad"],
+        ["route", "add", "10.2.0.0/24", "via", "10.1.0.2", "metric", "5"],
+    ]:
+        subprocess.run(["ip", "-n", network_namespace, *command], check=True)
+
+    return network_namespace
+
+
+def test_links(links: str) -> None:
+    with open_socket(links) as netlink_socket:
+        assert interfaces(netlink_socket.links()) == interfaces(ip(links, "addr"))
+        assert interfaces(netlink_socket.links("veth0")) == interfaces(
+            ip(links, "addr", "show", "dev", "veth0")
+        )
+
+        # The filters select the same links as ip
+        veths = netlink_socket.links(link_filter=LinkFilter(kind="veth"))
+        assert interfaces(veths) == interfaces(
+            ip(links, "addr", "show", "type", "veth")
+        )
+        slaves = netlink_socket.links(link_filter=LinkFilter(master="br0"))
+        assert interfaces(slaves) == interfaces(
+            ip(links, "addr", "show", "master", "br0")
+        )
+
+        # Without the addresses
+        assert [
+            link["addr_info"] for link in netlink_socket.links(addresses=False)
+        ] == [[]] * 4
+
+
+@pytest.mark.parametrize("family", [socket.AF_INET, socket.AF_INET6])
+def test_routes(links: str, family: int) -> None:
+    option = "-4" if family == socket.AF_INET else "-6"
+    with open_socket(links) as netlink_socket:
+        assert [Route(**route) for route in netlink_socket.routes(family)] == [
+            Route(**route) for route in ip(links, option, "route")
+        ]
+
+
+@pytest.fixture
+def state_cache(links: str) -> typing.Generator[NetlinkStateCache, None, None]:
+    state_cache = NetlinkStateCache(lambda: open_socket(links))
+
+    yield state_cache
+
+    state_cache.close()
+
+
+def test_state_cache(links: str, state_cache: NetlinkStateCache) -> None:
+    assert interfaces(state_cache.links()) == interfaces(ip(links, "addr"))
+    assert [Route(**route) for route in state_cache.routes()] == [
+        Route(**route) for route in ip(links, "-4", "route")
+    ]
+
+    # The changes made after the first read are seen by the next one
+    for command in [
+        ["addr", "add", "10.3.0.1/24", "dev", "veth0"],
+        ["addr", "del", "10.1.0.1/24", "dev", "veth0"],
+        ["link", "set", "veth1", "nomaster"],
+        ["link", "add", "veth2", "type", "veth", "peer", "name", "veth3"],
+        ["link", "del", "br0"],
+        ["route", "add", "10.4.0.0/24", "via", "10.3.0.2"],
+    ]:
+        subprocess.run(["ip", "-n", links, *command], check=True)
+
+    assert interfaces(state_cache.links()) == interfaces(ip(links, "addr"))
+    assert interfaces(state_cache.links("veth2")) == interfaces(
+        ip(links, "addr", "show", "dev", "veth2")
+    )
+    assert [Route(**route) for route in state_cache.routes()] == [
+        Route(**route) for route in ip(links, "-4", "route")
+    ]
+
+
+def test_state_cache_lost_notifications(
+    links: str, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    # The smallest buffer the kernel allows can't hold the notifications of the batch
+    monkeypatch.setattr(netlink_state, "EVENTS_BUFFER_SIZE", 1)
+    state_cache = NetlinkStateCache(lambda: open_socket(links))
+    try:
+        state_cache.links()
+        subprocess.run(
+            ["ip", "-n", links, "-batch", "-"],
+            input="".join(
+                f"addr add 10.5.{i}.1/24 dev veth0\n" for i in range(200)
+            ).encode(),
+            check=True,
+        )
+
+        # The cache is dropped and built again
+        assert interfaces(state_cache.links()) == interfaces(ip(links, "addr"))
+        assert "Netlink notifications were lost" in caplog.text
+    finally:
+        state_cache.close()
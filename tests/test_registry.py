@@ -0,0 +1,103 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from conftest import requires_root
+
+from nfv_test_api.host import Host, NamespaceHost, _namespace_executors
+from nfv_test_api.v2.services import inventory
+from nfv_test_api.v2.services.interface import InterfaceService
+from nfv_test_api.v2.services.inventory import InventoryService
+from nfv_test_api.v2.services.registry import ServiceRegistry
+from nfv_test_api.v2.services.route import RouteService
+
+LOGGER = logging.getLogger(__name__)
+
+# The registry doesn't touch the namespaces until something is run in them
+NAMESPACE = "registry-test"
+
+
+def test_shared_services() -> None:
+    registry = ServiceRegistry()
+    assert type(registry.host()) is Host
+    assert isinstance(registry.host(NAMESPACE), NamespaceHost)
+    assert registry.host(NAMESPACE) is registry.host(NAMESPACE)
+
+    # One service of each type per namespace, on the host of the namespace
+    service = registry.service(InterfaceService, NAMESPACE)
+    assert service.host is registry.host(NAMESPACE)
+    assert registry.service(InterfaceService, NAMESPACE) is service
+    assert registry.service(InterfaceService) is not service
+    assert registry.service(RouteService, NAMESPACE).host is service.host
+    assert registry.namespaces() == [NAMESPACE]
+
+    # Concurrent requests get the same service
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        services = list(
+            executor.map(
+                lambda _: registry.service(RouteService, "registry-threads"),
+                range(64),
+            )
+        )
+    assert all(s is services[0] for s in services)
+
+
+def test_invalidate() -> None:
+    registry = ServiceRegistry()
+    host = registry.host(NAMESPACE)
+    service = registry.service(InterfaceService, NAMESPACE)
+    host_service = registry.service(InterfaceService)
+
+    registry.invalidate(NAMESPACE)
+    assert registry.namespaces() == []
+
+    # The namespace gets new ones, the host keeps its own
+    assert registry.host(NAMESPACE) is not host
+    assert registry.service(InterfaceService, NAMESPACE) is not service
+    assert registry.service(InterfaceService) is host_service
+
+
+def test_pool() -> None:
+    registry = ServiceRegistry()
+    pool = registry.pool("registry-test", 2)
+    assert registry.pool("registry-test", 4) is pool
+    assert registry.pool("other", 2) is not pool
+    assert pool.submit(lambda: 1).result() == 1
+
+
+@requires_root
+def test_inventory_leaves_namespace(
+    network_namespace: str, read_backend: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    registry = ServiceRegistry()
+    monkeypatch.setattr(inventory, "service_registry", registry)
+    service = InventoryService(registry.host())
+
+    namespace_inventory = service.namespace_inventory(network_namespace)
+    assert namespace_inventory.error is None
+    assert [i.if_name for i in namespace_inventory.interfaces] == ["lo"]
+
+    # Nothing keeps running in the namespace once it is read
+    assert registry.namespaces() == []
+    assert network_namespace not in _namespace_executors
+
+    # Unless the api works in it
+    registry.service(InterfaceService, network_namespace).get_all()
+    service.namespace_inventory(network_namespace)
+    assert registry.namespaces() == [network_namespace]
+    assert network_namespace in _namespace_executors
@@ -0,0 +1,108 @@
+"""
+       Copyright 2021 Inmanta
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import socket
+import subprocess
+from ipaddress import IPv4Address, IPv6Address
+
+import pydantic
+import pytest
+from conftest import requires_root
+
+from nfv_test_api.host import NamespaceHost
+from nfv_test_api.v2.data.event import EventQuery, EventType
+from nfv_test_api.v2.data.route import InputDestination, RouteUpdate
+from nfv_test_api.v2.services.event import EventService
+from nfv_test_api.v2.services.route import RouteService
+
+LOGGER = logging.getLogger(__name__)
+
+pytestmark = requires_root
+
+
+@pytest.fixture
+def service(network_namespace: str, read_backend: str) -> RouteService:
+    for command in [
+        ["link", "add", "veth0", "type", "veth", "peer", "name", "veth1"],
+        ["link", "set", "veth0", "up"],
+        ["addr", "add", "10.1.0.1/24", "dev", "veth0"],
+        ["-6", "addr", "add", "fd00:1::1/64", "dev", "veth0", "nodad"],
+        ["route", "add", "default", "via", "10.1.0.2"],
+        ["-6", "route", "add", "default", "via", "fd00:1::2"],
+    ]:
+        subprocess.run(["ip", "-n", network_namespace, *command], check=True)
+
+    return RouteService(NamespaceHost(network_namespace))
+
+
+def test_update_default(service: RouteService) -> None:
+    # The family of the default route is the one of the gateway
+    update = RouteUpdate(dev="veth0", gateway=IPv6Address("fd00:1::3"))  # type: ignore
+    route = service.update("default", update)
+    assert route.gateway == IPv6Address("fd00:1::3")
+
+    # Or the one given
+    route = service.update(
+        "default", RouteUpdate(dev="veth0"), socket.AF_INET6  # type: ignore
+    )
+    assert route.gateway is None
+    assert service.get_one("default", socket.AF_INET6).dev == "veth0"
+
+    # The ipv4 one didn't change
+    assert service.get_one("default").gateway == IPv4Address("10.1.0.2")
+
+    service.delete("default", socket.AF_INET6)
+    assert service.get_one_or_default("default", None, socket.AF_INET6) is None
+    assert service.get_one_or_default("default") is not None
+
+
+def test_destination_family() -> None:
+    destination = InputDestination(dst_addr="default", family="inet6")  # type: ignore
+    assert destination.family_id == socket.AF_INET6
+
+    # The family of an address is not given separately
+    with pytest.raises(pydantic.ValidationError):
+        InputDestination(
+            dst_addr="10.0.0.0", dst_prefix_len=8, family="inet6"  # type: ignore
+        )
+
+
+def test_route_events(service: RouteService, network_namespace: str) -> None:
+    def add_routes() -> None:
+        for table in ["100", "main"]:
+            subprocess.run(
+                ["ip", "-n", network_namespace, "route", "add", "10.2.0.0/16"]
+                + ["dev", "veth0", "table", table],
+                check=True,
+            )
+
+    # Like the routes api, the events are the ones of the main table by default
+    events = EventService(service.host).stream([EventType.ROUTE], timeout=2)
+    assert next(events).type == EventType.READY
+    add_routes()
+    assert [event.route.table for event in events if event.route] == ["main"]
+
+    for table in ["100", "main"]:
+        subprocess.run(
+            ["ip", "-n", network_namespace, "route", "del", "10.2.0.0/16"]
+            + ["table", table],
+            check=True,
+        )
+    table_id = EventQuery(table="all").table_id  # type: ignore
+    events = EventService(service.host).stream([EventType.ROUTE], None, 2, table_id)
+    assert next(events).type == EventType.READY
+    add_routes()
+    assert [event.route.table for event in events if event.route] == ["100", "main"]